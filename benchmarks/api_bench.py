@@ -0,0 +1,360 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+API Benchmark
+قياس أداء /api/files و/stream و/api/upload و/api/auth/login والتنظيف بدون اتصال بالشبكة
+
+يشغّل خادم Bot API وهمياً وخادم PostgREST وهمياً، ثم يشغّل التطبيق الحقيقي عليهما
+ويقيس p50/p95/p99 والإنتاجية والذاكرة، ويقارن النتائج بخط أساس JSON.
+
+الاستخدام:
+    python -m benchmarks.api_bench --concurrency 8 --requests 200
+    python -m benchmarks.api_bench --save-baseline
+"""
+
+import argparse
+import logging
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, List, Tuple
+
+import bcrypt
+import requests
+
+from .baseline import compare_to_baseline, print_results, save_baseline, summarize
+from .fake_postgrest import FakeDatabase, FakePostgrest
+from .fake_telegram import MISSING_PREFIX, FakeTelegram, TelegramBehaviour
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), 'baselines', 'api.json')
+SCENARIOS = ('files', 'stream', 'upload', 'login', 'cleanup')
+
+BENCH_EMAIL = 'admin@bench.local'
+BENCH_PASSWORD = 'bench-password'
+BENCH_SESSION = 'bench-session-token'
+# مفتاح بصيغة JWT شكلياً لأن عميل supabase يرفض غير ذلك
+FAKE_SUPABASE_KEY = 'eyJhbGciOiJIUzI1NiJ9.eyJyb2xlIjoiYW5vbiJ9.bench'
+# حدود الإنتاج (تليجرام، تسجيل الدخول، طابور التشفير) تقيس الانتظار المقصود لا أداء الخادم،
+# لذلك تُرفع أمام الخادم الوهمي؛ حالة المنظم داخل العملية حتى لا يرث تشغيل حجوزات تشغيل سابق.
+# القيم المضبوطة مسبقاً في البيئة لها الأولوية.
+BENCH_LIMITS = {
+    'TELEGRAM_RATE_STATE_FILE': '',
+    'LOGIN_RATE_STATE_FILE': '',
+    'TELEGRAM_BOT_RATE_PER_SECOND': '10000',
+    'TELEGRAM_BOT_BURST': '1000',
+    'TELEGRAM_CHAT_RATE_PER_MINUTE': '600000',
+    'TELEGRAM_CHAT_BURST': '1000',
+    'CLEANUP_CALLS_PER_SECOND': '10000',
+    'LOGIN_IP_LIMIT': '100000',
+    'LOGIN_ACCOUNT_LIMIT': '100000',
+    'HASH_MAX_PENDING': '64',
+}
+
+
+def _rpc_create_user_by_admin(db: FakeDatabase, params: Dict[str, Any]) -> bool:
+    if db.filtered('users', [('user_id', f"eq.{params['p_user_id']}")]):
+        return False
+    db.insert('users', {'user_id': params['p_user_id'], 'full_name': params['p_full_name'], 'is_active': False})
+    return True
+
+
+def _rpc_open_session(db: FakeDatabase, params: Dict[str, Any]) -> None:
+    db.insert('sessions', {
+        'user_id': params['p_user_id'],
+        'session_token': params['p_session_token'],
+        'expires_at': params['p_expires_at']
+    })
+    for user in db.filtered('users', [('id', f"eq.{params['p_user_id']}")]):
+        user['last_login'] = datetime.now(timezone.utc).isoformat()
+        if params.get('p_password_hash'):
+            user['password_hash'] = params['p_password_hash']
+
+
+def _find_otp(db: FakeDatabase, params: Dict[str, Any]) -> Tuple[str, Dict[str, Any]]:
+    codes = db.filtered('otp_codes', [
+        ('user_id', f"eq.{params['p_user_id']}"), ('email', f"eq.{params['p_email']}"),
+        ('code', f"eq.{params['p_code']}"), ('is_used', 'eq.false')
+    ])
+    if not codes:
+        return 'invalid', {}
+    otp = codes[-1]
+    expires_at = datetime.fromisoformat(otp['expires_at'].replace('Z', '+00:00'))
+    if expires_at.tzinfo is None:
+        expires_at = expires_at.replace(tzinfo=timezone.utc)
+    if expires_at < datetime.now(timezone.utc):
+        return 'expired', otp
+    return 'valid', otp
+
+
+def _rpc_check_otp(db: FakeDatabase, params: Dict[str, Any]) -> str:
+    return _find_otp(db, params)[0]
+
+
+def _rpc_activate_user(db: FakeDatabase, params: Dict[str, Any]) -> str:
+    status, otp = _find_otp(db, params)
+    if status != 'valid':
+        return status
+    for user in db.filtered('users', [('id', f"eq.{params['p_user_id']}")]):
+        user.update({
+            'email': params['p_email'], 'password_hash': params['p_password_hash'],
+            'is_active': True, 'activated_at': datetime.now(timezone.utc).isoformat()
+        })
+    otp['is_used'] = True
+    return 'activated'
+
+
+def seed_database(db: FakeDatabase, file_count: int, missing_ratio: float, bcrypt_rounds: int) -> None:
+    """تعبئة قاعدة البيانات الوهمية ببيانات واقعية"""
+    password_hash = bcrypt.hashpw(
+        BENCH_PASSWORD.encode('utf-8'), bcrypt.gensalt(bcrypt_rounds)
+    ).decode('utf-8')
+
+    db.insert('users', {
+        'user_id': 'ADMIN001', 'full_name': 'Bench Admin', 'email': BENCH_EMAIL,
+        'password_hash': password_hash, 'is_active': True, 'is_admin': True
+    })
+    db.insert('roles', {'name': 'admin', 'permissions': {
+        'upload': True, 'delete': True, 'edit': True, 'manage_users': True, 'view_all': True
+    }})
+    db.insert('user_roles', {'user_id': 1, 'role_id': 1})
+    db.insert('sessions', {
+        'user_id': 1, 'session_token': BENCH_SESSION,
+        'expires_at': (datetime.now(timezone.utc) + timedelta(days=7)).isoformat()
+    })
+
+    missing_every = int(1 / missing_ratio) if missing_ratio else 0
+    start = datetime.now(timezone.utc) - timedelta(days=30)
+    extensions = ('pdf', 'jpg', 'mp4', 'mp3', 'docx')
+    for i in range(1, file_count + 1):
+        extension = extensions[i % len(extensions)]
+        prefix = MISSING_PREFIX if missing_every and i % missing_every == 0 else ''
+        db.insert('files', {
+            'file_name': f"lecture_{i}.{extension}",
+            'file_size': 1024 * (i % 2048 + 1),
+            'file_type': 'document',
+            'mime_type': 'application/octet-stream',
+            'telegram_file_id': f"{prefix}bench-file-{i}.{extension}",
+            'message_id': i,
+            'caption': f"ملف تجريبي رقم {i}",
+            'uploaded_by': 1,
+            'created_at': (start + timedelta(minutes=i)).isoformat()
+        })
+
+    db.register_rpc('increment_share_link_access', lambda db, params: None)
+    db.register_rpc('create_user_by_admin', _rpc_create_user_by_admin)
+    db.register_rpc('open_session', _rpc_open_session)
+    db.register_rpc('check_otp', _rpc_check_otp)
+    db.register_rpc('activate_user', _rpc_activate_user)
+
+
+def configure_environment(postgrest_url: str, telegram_url: str) -> None:
+    """ضبط المتغيرات البيئية قبل استيراد التطبيق"""
+    os.environ.update({
+        'BOT_TOKEN': '1000:bench-primary-token',
+        'TARGET_GROUP_ID': '-1001000000000',
+        'SUPABASE_URL': postgrest_url,
+        'SUPABASE_KEY': FAKE_SUPABASE_KEY,
+        'TELEGRAM_API_BASE': telegram_url,
+        'SECRET_KEY': 'bench-secret',
+        'TIMING_LOG_THRESHOLD_MS': '1e9',
+        'SMTP_EMAIL': '',
+        'SMTP_PASSWORD': '',
+    })
+    for key, value in BENCH_LIMITS.items():
+        os.environ.setdefault(key, value)
+    os.environ.pop('PROMETHEUS_MULTIPROC_DIR', None)
+
+
+def start_app() -> Tuple[Any, str]:
+    """تشغيل تطبيق Flask الحقيقي على منفذ محلي"""
+    from werkzeug.serving import make_server
+
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from src.api.main import create_app, init_worker
+
+    app = create_app()
+    # كما يفعل عامل gunicorn قبل أول طلب (post_worker_init)
+    init_worker()
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}"
+
+
+def run_load(worker: Callable[[requests.Session, int], bool], total: int, concurrency: int) -> Dict[str, float]:
+    """تشغيل total طلب بتوازي concurrency وقياس كل طلب"""
+    local = threading.local()
+    latencies: List[float] = []
+    errors = 0
+    lock = threading.Lock()
+
+    def task(index: int) -> None:
+        nonlocal errors
+        if not hasattr(local, 'session'):
+            local.session = requests.Session()
+        start = time.perf_counter()
+        try:
+            ok = worker(local.session, index)
+        except requests.RequestException:
+            ok = False
+        elapsed = (time.perf_counter() - start) * 1000
+        with lock:
+            latencies.append(elapsed)
+            errors += 0 if ok else 1
+
+    wall_start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(task, range(total)))
+    return summarize(latencies, time.perf_counter() - wall_start, errors)
+
+
+def build_scenarios(base_url: str, file_count: int, upload_size: int) -> Dict[str, Callable[[requests.Session, int], bool]]:
+    """تعريف سيناريوهات الطلبات"""
+    auth = {'Authorization': BENCH_SESSION}
+    upload_payload = b'\x00' * upload_size
+
+    def files(session: requests.Session, i: int) -> bool:
+        page = i % max(1, file_count // 30) + 1
+        r = session.get(f"{base_url}/api/files", params={'page': page}, headers=auth)
+        return r.status_code == 200
+
+    def stream(session: requests.Session, i: int) -> bool:
+        file_index = i % file_count + 1
+        with session.get(f"{base_url}/stream/bench-file-{file_index}.pdf", stream=True) as r:
+            for _ in r.iter_content(chunk_size=256 * 1024):
+                pass
+            return r.status_code == 200
+
+    def upload(session: requests.Session, i: int) -> bool:
+        r = session.post(
+            f"{base_url}/api/upload",
+            headers=auth,
+            files={'file': (f"bench_upload_{i}.pdf", upload_payload, 'application/pdf')},
+            data={'caption': 'رفع تجريبي'}
+        )
+        return r.status_code == 200
+
+    def login(session: requests.Session, i: int) -> bool:
+        r = session.post(
+            f"{base_url}/api/auth/login",
+            json={'email': BENCH_EMAIL, 'password': BENCH_PASSWORD}
+        )
+        return r.status_code == 200
+
+    return {'files': files, 'stream': stream, 'upload': upload, 'login': login}
+
+
+def run_cleanup(base_url: str, file_count: int) -> Dict[str, float]:
+    """تشغيل التنظيف اليدوي مرة واحدة وقياس سرعة الفحص"""
+    start = time.perf_counter()
+    r = requests.post(f"{base_url}/api/cleanup", headers={'Authorization': BENCH_SESSION})
+    elapsed = time.perf_counter() - start
+    result = summarize([elapsed * 1000], elapsed, 0 if r.status_code == 200 else 1)
+    result['files_per_second'] = round(file_count / elapsed, 2) if elapsed else 0.0
+    result['deleted'] = r.json().get('deleted_count', 0) if r.status_code == 200 else 0
+    return result
+
+
+def parse_args(argv: List[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='قياس أداء الـ API بدون شبكة')
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS), help='السيناريوهات مفصولة بفواصل')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--requests', type=int, default=200, help='عدد الطلبات لكل سيناريو')
+    parser.add_argument('--login-requests', type=int, default=20, help='عدد طلبات تسجيل الدخول (bcrypt مكلف)')
+    parser.add_argument('--files', type=int, default=100, help='عدد الملفات في قاعدة البيانات')
+    parser.add_argument('--missing-ratio', type=float, default=0.1, help='نسبة الملفات المحذوفة من تليجرام')
+    parser.add_argument('--bcrypt-rounds', type=int, default=12)
+    parser.add_argument('--upload-size', type=int, default=256 * 1024)
+    parser.add_argument('--tg-file-size', type=int, default=1024 * 1024)
+    parser.add_argument('--tg-latency-ms', type=float, default=20.0)
+    parser.add_argument('--tg-throttle-every', type=int, default=0, help='إرجاع 429 كل N استدعاء (0 = معطل)')
+    parser.add_argument('--tg-bandwidth-mbps', type=float, default=0.0, help='حد عرض النطاق للتحميل (0 = بدون حد)')
+    parser.add_argument('--db-latency-ms', type=float, default=10.0)
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+    parser.add_argument('--save-baseline', action='store_true', help='حفظ النتائج كخط أساس جديد')
+    parser.add_argument('--threshold', type=float, default=0.25, help='نسبة التراجع المسموح بها')
+    parser.add_argument('--min-delta-ms', type=float, default=50.0,
+                        help='أقل فرق في زمن الاستجابة يُعد تراجعاً (تذبذب التوقيت)')
+    parser.add_argument('--output', help='حفظ النتائج في ملف JSON')
+    return parser.parse_args(argv)
+
+
+def main(argv: List[str] = None) -> int:
+    args = parse_args(sys.argv[1:] if argv is None else argv)
+    logging.basicConfig(level=logging.WARNING)
+    logging.getLogger().setLevel(logging.WARNING)
+
+    db = FakeDatabase()
+    seed_database(db, args.files, args.missing_ratio, args.bcrypt_rounds)
+    behaviour = TelegramBehaviour(
+        file_size=args.tg_file_size,
+        latency_ms=args.tg_latency_ms,
+        throttle_every=args.tg_throttle_every,
+        bandwidth_mbps=args.tg_bandwidth_mbps
+    )
+
+    with FakePostgrest(db, latency_ms=args.db_latency_ms) as postgrest, FakeTelegram(behaviour) as telegram:
+        configure_environment(postgrest.url, telegram.url)
+        server, base_url = start_app()
+        logging.getLogger().setLevel(logging.WARNING)
+        logging.getLogger('werkzeug').setLevel(logging.WARNING)
+
+        scenarios = build_scenarios(base_url, args.files, args.upload_size)
+        selected = [name.strip() for name in args.scenarios.split(',') if name.strip()]
+        results: Dict[str, Any] = {
+            'meta': {
+                'concurrency': args.concurrency,
+                'requests': args.requests,
+                'files': args.files,
+                'tg_latency_ms': args.tg_latency_ms,
+                'db_latency_ms': args.db_latency_ms,
+                'tg_file_size': args.tg_file_size,
+            },
+            'scenarios': {}
+        }
+
+        for name in selected:
+            if name == 'cleanup':
+                continue
+            total = args.login_requests if name == 'login' else args.requests
+            print(f"▶️ {name} ({total} طلب، توازي {args.concurrency})")
+            results['scenarios'][name] = run_load(scenarios[name], total, args.concurrency)
+
+        # التنظيف يحذف الملفات الناقصة لذلك يعمل أخيراً
+        if 'cleanup' in selected:
+            print("▶️ cleanup")
+            results['scenarios']['cleanup'] = run_cleanup(base_url, len(db.table('files')))
+
+        results['db_calls'] = {f"{method} {table}": n for (method, table), n in sorted(db.calls.items())}
+        telegram_calls: Dict[str, int] = {}
+        for (_, method), n in telegram.calls.items():
+            telegram_calls[method] = telegram_calls.get(method, 0) + n
+        results['telegram_calls'] = dict(sorted(telegram_calls.items()))
+        server.shutdown()
+
+    print("\n📊 النتائج:")
+    print_results(results)
+
+    if args.output:
+        save_baseline(args.output, results)
+
+    if args.save_baseline:
+        save_baseline(args.baseline, results)
+        print(f"\n💾 تم حفظ خط الأساس: {args.baseline}")
+        return 0
+
+    regressions = compare_to_baseline(args.baseline, results, args.threshold, args.min_delta_ms)
+    if regressions:
+        print(f"\n❌ تراجع في الأداء يتجاوز {args.threshold:.0%}:")
+        for line in regressions:
+            print(f"  - {line}")
+        return 1
+
+    print("\n✅ لا يوجد تراجع مقارنة بخط الأساس")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
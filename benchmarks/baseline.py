@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark Baselines
+حساب الإحصائيات وحفظ خطوط الأساس ومقارنتها لكشف التراجع في الأداء
+"""
+
+import json
+import math
+import os
+import resource
+from typing import Any, Dict, List, Sequence
+
+# المقاييس التي يكون الأعلى فيها أفضل
+HIGHER_IS_BETTER = {'rps', 'updates_per_second', 'files_per_second'}
+# المقاييس التي تُقارن (الباقي للعرض فقط)
+COMPARED = {'p50_ms', 'p95_ms', 'p99_ms', 'rps', 'updates_per_second', 'files_per_second'}
+
+
+def percentile(values: Sequence[float], pct: float) -> float:
+    """النسبة المئوية بطريقة nearest-rank"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, math.ceil(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def summarize(latencies_ms: List[float], wall_seconds: float, errors: int) -> Dict[str, float]:
+    """ملخص زمن الاستجابة والإنتاجية"""
+    return {
+        'requests': len(latencies_ms),
+        'errors': errors,
+        'p50_ms': round(percentile(latencies_ms, 50), 2),
+        'p95_ms': round(percentile(latencies_ms, 95), 2),
+        'p99_ms': round(percentile(latencies_ms, 99), 2),
+        'rps': round(len(latencies_ms) / wall_seconds, 2) if wall_seconds else 0.0,
+        'rss_mb': round(current_rss_mb(), 1),
+    }
+
+
+def current_rss_mb() -> float:
+    """الذاكرة المقيمة الحالية للعملية"""
+    try:
+        with open('/proc/self/statm') as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf('SC_PAGE_SIZE') / 1024 / 1024
+    except (OSError, ValueError):
+        # ru_maxrss بالكيلوبايت على لينكس
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def save_baseline(path: str, results: Dict[str, Any]) -> None:
+    """حفظ النتائج كخط أساس"""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2, ensure_ascii=False, sort_keys=True)
+        f.write('\n')
+
+
+def compare_to_baseline(
+    path: str, results: Dict[str, Any], threshold: float, min_delta_ms: float = 0.0
+) -> List[str]:
+    """
+    مقارنة النتائج بخط الأساس وإرجاع قائمة التراجعات
+
+    Args:
+        min_delta_ms: فرق زمن الاستجابة الأقل من هذا لا يُعد تراجعاً مهما كانت نسبته
+            (تذبذب الجدولة على مسارات سريعة)
+    """
+    if not os.path.exists(path):
+        return []
+
+    with open(path, encoding='utf-8') as f:
+        baseline = json.load(f)
+
+    regressions = []
+    base_meta, meta = baseline.get('meta', {}), results.get('meta', {})
+    mismatched = sorted(k for k in meta if k in base_meta and meta[k] != base_meta[k])
+    if mismatched:
+        print(f"⚠️ إعدادات التشغيل تختلف عن خط الأساس ({', '.join(mismatched)}) - المقارنة تقريبية")
+
+    for scenario, metrics in results.get('scenarios', {}).items():
+        base = baseline.get('scenarios', {}).get(scenario)
+        if not base:
+            continue
+        # أخطاء جديدة تراجع دائماً (الطلبات الفاشلة السريعة قد تُحسّن زمن الاستجابة)
+        if metrics.get('errors', 0) > base.get('errors', 0):
+            regressions.append(f"{scenario}.errors: {base.get('errors', 0)} → {metrics['errors']}")
+        for name, value in metrics.items():
+            if name not in COMPARED or not base.get(name):
+                continue
+            change = (value - base[name]) / base[name]
+            worse = change < -threshold if name in HIGHER_IS_BETTER else change > threshold
+            if worse and name.endswith('_ms') and value - base[name] < min_delta_ms:
+                worse = False
+            if worse:
+                regressions.append(
+                    f"{scenario}.{name}: {base[name]} → {value} ({change:+.0%})"
+                )
+    return regressions
+
+
+def print_results(results: Dict[str, Any]) -> None:
+    """طباعة جدول النتائج"""
+    for scenario, metrics in results.get('scenarios', {}).items():
+        fields = '  '.join(f"{k}={v}" for k, v in metrics.items())
+        print(f"  {scenario:<12} {fields}")
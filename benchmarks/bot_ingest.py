@@ -0,0 +1,306 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Bot Ingestion Benchmark
+مولّد حمل لأرشفة البوت: تحديثات تليجرام اصطناعية عبر سلسلة معالجات Application الحقيقية
+
+يولّد مستندات وصوراً وفيديو وصوتيات ورسائل صوتية وألبومات ورسائل محوّلة ووصفاً
+يحمل وسم الرافع، ويمررها إلى process_update على خادم Bot API وهمي وقاعدة بيانات وهمية.
+يقيس معدل الأرشفة وزمن كل تحديث وزمن حجب حلقة الأحداث واستدعاءات قاعدة البيانات لكل تحديث.
+
+الاستخدام:
+    python -m benchmarks.bot_ingest --updates 500 --concurrency 1,8
+    python -m benchmarks.bot_ingest --save-baseline
+"""
+
+import argparse
+import asyncio
+import itertools
+import logging
+import os
+import random
+import sys
+import time
+from typing import Any, Dict, List, Optional
+
+from .api_bench import configure_environment
+from .baseline import compare_to_baseline, print_results, save_baseline, summarize
+from .fake_postgrest import FakeDatabase, FakePostgrest
+from .fake_telegram import FakeTelegram, TelegramBehaviour
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), 'baselines', 'bot.json')
+TARGET_GROUP_ID = -1001000000000
+UPLOADER_TAG = "📤 رفع بواسطة:"
+LOOP_TICK = 0.005
+
+# توزيع أنواع الرسائل (أوزان نسبية)
+DEFAULT_MIX = {
+    'document': 40,
+    'photo': 20,
+    'video': 10,
+    'audio': 8,
+    'voice': 7,
+    'album': 10,
+    'text': 5,
+}
+
+
+class UpdateFactory:
+    """توليد تحديثات تليجرام واقعية كقواميس JSON"""
+
+    def __init__(self, seed: int, forward_ratio: float, tagged_ratio: float, foreign_ratio: float):
+        self.random = random.Random(seed)
+        self.forward_ratio = forward_ratio
+        self.tagged_ratio = tagged_ratio
+        self.foreign_ratio = foreign_ratio
+        self.update_ids = itertools.count(1)
+        self.message_ids = itertools.count(1)
+        self.file_ids = itertools.count(1)
+        self.album_ids = itertools.count(1)
+
+    def _file(self, extension: str, **extra: Any) -> Dict[str, Any]:
+        n = next(self.file_ids)
+        return {
+            'file_id': f"bench-ingest-{n}.{extension}",
+            'file_unique_id': f"U{n:015d}",
+            'file_size': self.random.randint(16 * 1024, 20 * 1024 * 1024),
+            **extra
+        }
+
+    def _media(self, kind: str) -> Dict[str, Any]:
+        if kind == 'document':
+            extension = self.random.choice(('pdf', 'docx', 'pptx', 'zip'))
+            return {'document': self._file(
+                extension, file_name=f"lecture_{next(self.message_ids)}.{extension}",
+                mime_type='application/octet-stream'
+            )}
+        if kind == 'photo':
+            return {'photo': [
+                self._file('jpg', width=90, height=67),
+                self._file('jpg', width=320, height=240),
+                self._file('jpg', width=1280, height=960),
+            ]}
+        if kind == 'video':
+            return {'video': self._file('mp4', width=1280, height=720, duration=600, mime_type='video/mp4')}
+        if kind == 'audio':
+            return {'audio': self._file('mp3', duration=1800, mime_type='audio/mpeg', title='محاضرة')}
+        if kind == 'voice':
+            return {'voice': self._file('ogg', duration=45, mime_type='audio/ogg')}
+        return {'text': 'رسالة نصية لا تُؤرشف'}
+
+    def _message(self, kind: str, media_group_id: Optional[str] = None) -> Dict[str, Any]:
+        now = int(time.time())
+        chat_id = TARGET_GROUP_ID if self.random.random() >= self.foreign_ratio else TARGET_GROUP_ID - 1
+        message: Dict[str, Any] = {
+            'message_id': next(self.message_ids),
+            'date': now,
+            'chat': {'id': chat_id, 'type': 'supergroup', 'title': 'Archive'},
+            'from': {'id': 2000 + self.random.randint(0, 50), 'is_bot': False, 'first_name': 'Student'},
+            **self._media(kind)
+        }
+        if kind != 'text':
+            caption = f"ملخص الفصل {self.random.randint(1, 12)}"
+            if self.random.random() < self.tagged_ratio:
+                caption += f"\n\n{UPLOADER_TAG} user{self.random.randint(1, 500)}"
+            message['caption'] = caption
+        if media_group_id:
+            message['media_group_id'] = media_group_id
+        if self.random.random() < self.forward_ratio:
+            message['forward_origin'] = {
+                'type': 'channel',
+                'chat': {'id': -1002000000000, 'type': 'channel', 'title': 'Course Channel'},
+                'message_id': self.random.randint(1, 10000),
+                'date': now - self.random.randint(60, 86400),
+            }
+        return message
+
+    def generate(self, count: int, mix: Dict[str, int]) -> List[Dict[str, Any]]:
+        """توليد count تحديثاً حسب التوزيع (الألبوم يولّد 2-10 رسائل متتالية)"""
+        kinds, weights = zip(*mix.items())
+        updates: List[Dict[str, Any]] = []
+        while len(updates) < count:
+            kind = self.random.choices(kinds, weights)[0]
+            if kind == 'album':
+                group_id = f"album-{next(self.album_ids)}"
+                size = min(self.random.randint(2, 10), count - len(updates))
+                messages = [
+                    self._message(self.random.choice(('photo', 'video', 'document')), group_id)
+                    for _ in range(size)
+                ]
+            else:
+                messages = [self._message(kind)]
+            updates.extend({'update_id': next(self.update_ids), 'message': m} for m in messages)
+        return updates
+
+
+class LoopMonitor:
+    """قياس حجب حلقة الأحداث بمؤقت دوري"""
+
+    def __init__(self, tick: float = LOOP_TICK):
+        self.tick = tick
+        self.lags: List[float] = []
+        self._task: Optional[asyncio.Task] = None
+
+    async def _run(self) -> None:
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(self.tick)
+            self.lags.append(max(0.0, time.perf_counter() - start - self.tick))
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    def summary(self) -> Dict[str, float]:
+        return {
+            'loop_lag_max_ms': round(max(self.lags, default=0.0) * 1000, 2),
+            'loop_blocked_ms': round(sum(self.lags) * 1000, 2),
+        }
+
+
+async def ingest(application: Any, payloads: List[Dict[str, Any]], concurrency: int) -> Dict[str, Any]:
+    """تمرير التحديثات عبر process_update بتوازي محدد"""
+    from telegram import Update
+
+    updates = [Update.de_json(payload, application.bot) for payload in payloads]
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: List[float] = []
+    errors = 0
+
+    async def process(update: Any) -> None:
+        nonlocal errors
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                await application.process_update(update)
+            except Exception:
+                errors += 1
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    monitor = LoopMonitor()
+    monitor.start()
+    wall_start = time.perf_counter()
+    await asyncio.gather(*(process(update) for update in updates))
+    wall = time.perf_counter() - wall_start
+    await monitor.stop()
+
+    result = summarize(latencies, wall, errors)
+    result['updates_per_second'] = result.pop('rps')
+    result.update(monitor.summary())
+    return result
+
+
+async def run_scenarios(args: argparse.Namespace, db: FakeDatabase, telegram: FakeTelegram) -> Dict[str, Any]:
+    """تشغيل سيناريو لكل مستوى توازي على نفس التطبيق"""
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from src.bot.main import create_bot_application
+
+    application = create_bot_application()
+    await application.initialize()
+
+    mix = dict(DEFAULT_MIX)
+    for item in filter(None, args.mix.split(',')):
+        kind, _, weight = item.partition('=')
+        mix[kind.strip()] = int(weight)
+
+    scenarios: Dict[str, Any] = {}
+    try:
+        for concurrency in args.concurrency:
+            factory = UpdateFactory(args.seed, args.forward_ratio, args.tagged_ratio, args.foreign_ratio)
+            payloads = factory.generate(args.updates, mix)
+            rows_before = len(db.table('files'))
+            db_before = sum(db.calls.values())
+            tg_before = sum(telegram.calls.values())
+
+            print(f"▶️ ingest_c{concurrency} ({len(payloads)} تحديث، توازي {concurrency})")
+            result = await ingest(application, payloads, concurrency)
+
+            stored = len(db.table('files')) - rows_before
+            duration = result['requests'] / result['updates_per_second'] if result['updates_per_second'] else 0
+            result['files_stored'] = stored
+            result['files_per_second'] = round(stored / duration, 2) if duration else 0.0
+            result['db_calls_per_update'] = round((sum(db.calls.values()) - db_before) / len(payloads), 2)
+            result['telegram_calls_per_update'] = round(
+                (sum(telegram.calls.values()) - tg_before) / len(payloads), 2
+            )
+            scenarios[f"ingest_c{concurrency}"] = result
+    finally:
+        await application.shutdown()
+    return scenarios
+
+
+def parse_args(argv: List[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='قياس سرعة أرشفة البوت بدون شبكة')
+    parser.add_argument('--updates', type=int, default=500, help='عدد التحديثات لكل سيناريو')
+    parser.add_argument('--concurrency', type=lambda v: [int(x) for x in v.split(',')], default=[1, 8],
+                        help='مستويات التوازي مفصولة بفواصل (1 = سلوك run_polling الافتراضي)')
+    parser.add_argument('--mix', default='', help='تعديل التوزيع مثل document=60,album=0')
+    parser.add_argument('--forward-ratio', type=float, default=0.3, help='نسبة الرسائل المحوّلة')
+    parser.add_argument('--tagged-ratio', type=float, default=0.2, help='نسبة الرسائل التي تحمل وسم الرافع')
+    parser.add_argument('--foreign-ratio', type=float, default=0.02, help='نسبة رسائل من مجموعات أخرى')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--tg-latency-ms', type=float, default=20.0)
+    parser.add_argument('--tg-throttle-every', type=int, default=0, help='إرجاع 429 كل N استدعاء (0 = معطل)')
+    parser.add_argument('--db-latency-ms', type=float, default=10.0)
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+    parser.add_argument('--save-baseline', action='store_true', help='حفظ النتائج كخط أساس جديد')
+    parser.add_argument('--threshold', type=float, default=0.25, help='نسبة التراجع المسموح بها')
+    parser.add_argument('--output', help='حفظ النتائج في ملف JSON')
+    return parser.parse_args(argv)
+
+
+def main(argv: List[str] = None) -> int:
+    args = parse_args(sys.argv[1:] if argv is None else argv)
+    logging.basicConfig(level=logging.WARNING)
+    logging.getLogger().setLevel(logging.WARNING)
+
+    db = FakeDatabase()
+    behaviour = TelegramBehaviour(latency_ms=args.tg_latency_ms, throttle_every=args.tg_throttle_every)
+
+    with FakePostgrest(db, latency_ms=args.db_latency_ms) as postgrest, FakeTelegram(behaviour) as telegram:
+        configure_environment(postgrest.url, telegram.url)
+        scenarios = asyncio.run(run_scenarios(args, db, telegram))
+        logging.getLogger().setLevel(logging.WARNING)
+
+    results: Dict[str, Any] = {
+        'meta': {
+            'updates': args.updates,
+            'tg_latency_ms': args.tg_latency_ms,
+            'db_latency_ms': args.db_latency_ms,
+            'seed': args.seed,
+        },
+        'scenarios': scenarios,
+        'db_calls': {f"{method} {table}": n for (method, table), n in sorted(db.calls.items())},
+    }
+
+    print("\n📊 النتائج:")
+    print_results(results)
+
+    if args.output:
+        save_baseline(args.output, results)
+
+    if args.save_baseline:
+        save_baseline(args.baseline, results)
+        print(f"\n💾 تم حفظ خط الأساس: {args.baseline}")
+        return 0
+
+    regressions = compare_to_baseline(args.baseline, results, args.threshold)
+    if regressions:
+        print(f"\n❌ تراجع في الأداء يتجاوز {args.threshold:.0%}:")
+        for line in regressions:
+            print(f"  - {line}")
+        return 1
+
+    print("\n✅ لا يوجد تراجع مقارنة بخط الأساس")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
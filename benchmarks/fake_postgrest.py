@@ -0,0 +1,300 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Fake PostgREST Server
+خادم PostgREST وهمي في الذاكرة يكفي لاستعلامات supabase-py المستخدمة في المشروع
+"""
+
+import json
+import re
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlsplit
+
+# أعمدة افتراضية عند الإدراج
+TABLE_DEFAULTS: Dict[str, Dict[str, Any]] = {
+    'users': {'is_active': False, 'is_admin': False, 'email': None, 'password_hash': None, 'last_login': None},
+    'otp_codes': {'is_used': False},
+    'files': {
+        'file_size': 0, 'folder_id': None, 'file_url': None, 'caption': None,
+        'uploaded_by': None, 'file_unique_id': None
+    },
+    'share_links': {'access_count': 0, 'revoked_at': None},
+    'roles': {'permissions': {}},
+}
+# جداول يضبط فيها trigger عمود updated_at عند الإدراج والتعديل
+UPDATED_AT_TABLES = {'files'}
+
+_EMBED_RE = re.compile(r'^(\w+)\((.*)\)$')
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def _split_top_level(value: str) -> List[str]:
+    """تقسيم select على الفواصل خارج الأقواس"""
+    parts, depth, current = [], 0, ''
+    for ch in value:
+        if ch == ',' and depth == 0:
+            parts.append(current)
+            current = ''
+            continue
+        depth += ch == '('
+        depth -= ch == ')'
+        current += ch
+    if current:
+        parts.append(current)
+    return [p.strip() for p in parts if p.strip()]
+
+
+def _coerce(raw: str, sample: Any) -> Any:
+    """تحويل قيمة الفلتر لنوع قيمة العمود"""
+    if raw == 'null':
+        return None
+    if isinstance(sample, bool):
+        return raw == 'true'
+    if isinstance(sample, int):
+        try:
+            return int(raw)
+        except ValueError:
+            return raw
+    if isinstance(sample, float):
+        return float(raw)
+    return raw
+
+
+def _like(pattern: str, value: Any, ignore_case: bool) -> bool:
+    if value is None:
+        return False
+    regex = '^' + re.escape(pattern).replace('%', '.*').replace(r'\*', '.*').replace('_', '.') + '$'
+    return re.match(regex, str(value), re.IGNORECASE if ignore_case else 0) is not None
+
+
+def _matches(row: Dict[str, Any], column: str, expression: str) -> bool:
+    negate = expression.startswith('not.')
+    if negate:
+        expression = expression[4:]
+    op, _, raw = expression.partition('.')
+    value = row.get(column)
+
+    if op == 'is':
+        result = value is None if raw == 'null' else value is (raw == 'true')
+    elif op == 'in':
+        items = [item.strip().strip('"') for item in raw.strip('()').split(',') if item.strip()]
+        result = value in [_coerce(item, value) for item in items]
+    elif op in ('like', 'ilike'):
+        result = _like(raw, value, op == 'ilike')
+    else:
+        target = _coerce(raw, value)
+        if value is None or target is None:
+            result = op == 'eq' and value is target
+        else:
+            try:
+                result = {
+                    'eq': value == target, 'neq': value != target,
+                    'gt': value > target, 'gte': value >= target,
+                    'lt': value < target, 'lte': value <= target,
+                }[op]
+            except (KeyError, TypeError):
+                result = False
+    return not result if negate else result
+
+
+class FakeDatabase:
+    """قاعدة بيانات في الذاكرة مع عداد للاستدعاءات"""
+
+    def __init__(self) -> None:
+        self.tables: Dict[str, List[Dict[str, Any]]] = {}
+        self.sequences: Counter = Counter()
+        self.rpcs: Dict[str, Callable[['FakeDatabase', Dict[str, Any]], Any]] = {}
+        self.calls: Counter = Counter()
+        self.lock = threading.RLock()
+
+    def table(self, name: str) -> List[Dict[str, Any]]:
+        return self.tables.setdefault(name, [])
+
+    def insert(self, name: str, row: Dict[str, Any]) -> Dict[str, Any]:
+        with self.lock:
+            record = dict(TABLE_DEFAULTS.get(name, {}))
+            record.update(row)
+            if 'id' not in record or record['id'] is None:
+                self.sequences[name] += 1
+                record['id'] = self.sequences[name]
+            else:
+                self.sequences[name] = max(self.sequences[name], record['id'])
+            record.setdefault('created_at', _now())
+            if name in UPDATED_AT_TABLES:
+                record['updated_at'] = _now()
+            self.table(name).append(record)
+            return record
+
+    def register_rpc(self, name: str, handler: Callable[['FakeDatabase', Dict[str, Any]], Any]) -> None:
+        self.rpcs[name] = handler
+
+    def filtered(self, name: str, filters: List[Tuple[str, str]]) -> List[Dict[str, Any]]:
+        rows = self.table(name)
+        for column, expression in filters:
+            rows = [row for row in rows if _matches(row, column, expression)]
+        return rows
+
+    def project(self, row: Dict[str, Any], select: str) -> Dict[str, Any]:
+        """تطبيق select مع دعم الجداول المضمنة (users(*), roles(permissions))"""
+        result: Dict[str, Any] = {}
+        for column in _split_top_level(select or '*'):
+            embed = _EMBED_RE.match(column)
+            if embed:
+                table, inner = embed.groups()
+                foreign_key = table[:-1] + '_id' if table.endswith('s') else table + '_id'
+                related = [r for r in self.table(table) if r.get('id') == row.get(foreign_key)]
+                result[table] = self.project(related[0], inner) if related else None
+            elif column == '*':
+                result.update(row)
+            else:
+                result[column] = row.get(column)
+        return result
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server: '_Server'
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+    def _send(self, status: int, payload: Any = None, headers: Optional[Dict[str, str]] = None) -> None:
+        body = b'' if payload is None else json.dumps(payload, default=str).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(body)
+
+    def _read_body(self) -> Any:
+        # يجب قراءة الجسم دائماً (حتى مع DELETE) حتى لا يفسد الاتصال المستمر
+        length = int(self.headers.get('Content-Length') or 0)
+        raw = self.rfile.read(length) if length else b''
+        return json.loads(raw) if raw else None
+
+    def _route(self) -> Tuple[str, List[Tuple[str, str]]]:
+        parts = urlsplit(self.path)
+        return parts.path, parse_qsl(parts.query, keep_blank_values=True)
+
+    def _handle(self) -> None:
+        if self.server.latency:
+            time.sleep(self.server.latency)
+
+        db = self.server.db
+        body = self._read_body()
+        path, params = self._route()
+        match = re.match(r'^/rest/v1/(rpc/)?(\w+)$', path)
+        if not match:
+            return self._send(404, {'message': 'not found'})
+
+        is_rpc, name = bool(match.group(1)), match.group(2)
+        db.calls[(self.command, ('rpc:' if is_rpc else '') + name)] += 1
+        prefer = self.headers.get('Prefer', '')
+
+        with db.lock:
+            if is_rpc:
+                handler = db.rpcs.get(name)
+                result = handler(db, body or {}) if handler else None
+                return self._send(200 if result is not None else 204, result)
+
+            control = {'select', 'order', 'limit', 'offset', 'columns', 'on_conflict'}
+            filters = [(k, v) for k, v in params if k not in control]
+            options = {k: v for k, v in params if k in control}
+
+            if self.command == 'POST':
+                payload = body
+                rows = [db.insert(name, row) for row in (payload if isinstance(payload, list) else [payload])]
+                return self._send(201, rows if 'return=representation' in prefer else None)
+
+            rows = db.filtered(name, filters)
+
+            if self.command == 'PATCH':
+                changes = body or {}
+                for row in rows:
+                    row.update(changes)
+                    if name in UPDATED_AT_TABLES:
+                        row['updated_at'] = _now()
+                return self._send(200, rows if 'return=representation' in prefer else None)
+
+            if self.command == 'DELETE':
+                table = db.table(name)
+                ids = {id(row) for row in rows}
+                table[:] = [row for row in table if id(row) not in ids]
+                if name == 'files':
+                    # مثل trigger record_file_event (أحداث الحذف فقط يكفي للمزامنة)
+                    for row in rows:
+                        db.insert('file_events', {'event_type': 'delete', 'file_id': row['id']})
+                return self._send(200, rows if 'return=representation' in prefer else None)
+
+            for spec in reversed((options.get('order') or '').split(',')):
+                if not spec:
+                    continue
+                column, _, direction = spec.partition('.')
+                rows = sorted(
+                    rows,
+                    key=lambda r: (r.get(column) is None, r.get(column)),
+                    reverse=direction.startswith('desc')
+                )
+
+            total = len(rows)
+            offset = int(options.get('offset') or 0)
+            limit = options.get('limit')
+            rows = rows[offset:offset + int(limit)] if limit is not None else rows[offset:]
+            data = [db.project(row, options.get('select', '*')) for row in rows]
+
+            headers = {}
+            if 'count=' in prefer:
+                end = offset + len(data) - 1
+                headers['Content-Range'] = f"{offset}-{end}/{total}" if data else f"*/{total}"
+            return self._send(200, data, headers)
+
+    do_GET = do_HEAD = do_POST = do_PATCH = do_DELETE = _handle
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, db: FakeDatabase, latency: float):
+        super().__init__(('127.0.0.1', 0), _Handler)
+        self.db = db
+        self.latency = latency
+
+
+class FakePostgrest:
+    """تشغيل خادم PostgREST الوهمي في خيط خلفي"""
+
+    def __init__(self, db: Optional[FakeDatabase] = None, latency_ms: float = 0.0):
+        self.db = db or FakeDatabase()
+        self._server = _Server(self.db, latency_ms / 1000)
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> 'FakePostgrest':
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> 'FakePostgrest':
+        return self.start()
+
+    def __exit__(self, *exc: Any) -> None:
+        self.stop()
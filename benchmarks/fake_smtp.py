@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Fake SMTP Server
+خادم SMTP وهمي (بدون TLS) لاختبار طابور البريد: يعدّ الاتصالات وعمليات الدخول والرسائل
+
+استخدمه مع SMTP_STARTTLS=false
+"""
+
+import socketserver
+import threading
+import time
+from collections import Counter
+from email import message_from_bytes
+from email.message import Message
+from typing import Any, List, Optional
+
+
+class SMTPBehaviour:
+    """إعدادات سلوك الخادم الوهمي"""
+
+    def __init__(self, latency_ms: float = 0.0, fail_every: int = 0, drop_after: int = 0):
+        self.latency = latency_ms / 1000
+        # رفض مؤقت (451) لكل رسالة رقم fail_every
+        self.fail_every = fail_every
+        # قطع الاتصال بعد drop_after رسالة (محاكاة مهلة الخادم)
+        self.drop_after = drop_after
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    server: '_Server'
+
+    def _reply(self, line: str) -> None:
+        self.wfile.write((line + '\r\n').encode('ascii'))
+
+    def _read_data(self) -> bytes:
+        lines = []
+        while True:
+            line = self.rfile.readline()
+            if not line or line in (b'.\r\n', b'.\n'):
+                break
+            lines.append(line[1:] if line.startswith(b'..') else line)
+        return b''.join(lines)
+
+    def handle(self) -> None:
+        server = self.server
+        behaviour = server.behaviour
+        server.count('connections')
+        self._reply('220 fake-smtp ready')
+        sent_here = 0
+
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode('utf-8', 'replace').strip()
+            verb = command.split(' ', 1)[0].upper()
+
+            if verb in ('EHLO', 'HELO'):
+                self.wfile.write(b'250-fake-smtp\r\n250-AUTH PLAIN LOGIN\r\n250 8BITMIME\r\n')
+            elif verb == 'AUTH':
+                server.count('logins')
+                if command.upper().startswith('AUTH LOGIN'):
+                    self._reply('334 VXNlcm5hbWU6')
+                    self.rfile.readline()
+                    self._reply('334 UGFzc3dvcmQ6')
+                    self.rfile.readline()
+                self._reply('235 2.7.0 Authentication successful')
+            elif verb in ('MAIL', 'RCPT', 'RSET', 'NOOP'):
+                self._reply('250 OK')
+            elif verb == 'DATA':
+                self._reply('354 End data with <CR><LF>.<CR><LF>')
+                raw = self._read_data()
+                if behaviour.latency:
+                    time.sleep(behaviour.latency)
+                number = server.count('attempts')
+                if behaviour.fail_every and number % behaviour.fail_every == 0:
+                    self._reply('451 4.3.0 Temporary failure')
+                    continue
+                with server.lock:
+                    server.messages.append(message_from_bytes(raw))
+                self._reply('250 OK queued')
+                sent_here += 1
+                if behaviour.drop_after and sent_here >= behaviour.drop_after:
+                    return
+            elif verb == 'QUIT':
+                self._reply('221 Bye')
+                return
+            else:
+                self._reply('502 Command not implemented')
+
+
+class _Server(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, behaviour: SMTPBehaviour):
+        super().__init__(('127.0.0.1', 0), _Handler)
+        self.behaviour = behaviour
+        self.calls: Counter = Counter()
+        self.messages: List[Message] = []
+        self.lock = threading.Lock()
+
+    def count(self, name: str) -> int:
+        with self.lock:
+            self.calls[name] += 1
+            return self.calls[name]
+
+
+class FakeSMTP:
+    """تشغيل خادم SMTP الوهمي في خيط خلفي"""
+
+    def __init__(self, behaviour: Optional[SMTPBehaviour] = None):
+        self.behaviour = behaviour or SMTPBehaviour()
+        self._server = _Server(self.behaviour)
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def host(self) -> str:
+        return self._server.server_address[0]
+
+    @property
+    def port(self) -> int:
+        return self._server.server_address[1]
+
+    @property
+    def calls(self) -> Counter:
+        return self._server.calls
+
+    @property
+    def messages(self) -> List[Message]:
+        return self._server.messages
+
+    def start(self) -> 'FakeSMTP':
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> 'FakeSMTP':
+        return self.start()
+
+    def __exit__(self, *exc: Any) -> None:
+        self.stop()
@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Fake Telegram Bot API Server
+خادم Bot API وهمي: getFile وتحميل الملفات وsend* وdeleteMessage مع تأخير و429 قابلة للضبط
+"""
+
+import hashlib
+import itertools
+import json
+import re
+import threading
+import time
+from collections import Counter, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Optional
+from urllib.parse import parse_qsl, urlsplit
+
+MISSING_PREFIX = 'missing-'
+CHUNK_SIZE = 64 * 1024
+
+_CONTENT_TYPES = {
+    'jpg': 'image/jpeg',
+    'mp4': 'video/mp4',
+    'mp3': 'audio/mpeg',
+    'ogg': 'audio/ogg',
+    'pdf': 'application/pdf',
+}
+
+_SEND_FIELDS = {
+    'sendDocument': 'document',
+    'sendPhoto': 'photo',
+    'sendVideo': 'video',
+    'sendAudio': 'audio',
+    'sendVoice': 'voice',
+}
+
+
+class TelegramBehaviour:
+    """إعدادات سلوك الخادم الوهمي"""
+
+    def __init__(
+        self,
+        file_size: int = 1024 * 1024,
+        latency_ms: float = 0.0,
+        throttle_every: int = 0,
+        retry_after: int = 1,
+        bandwidth_mbps: float = 0.0,
+        rate_per_second: int = 0
+    ):
+        self.file_size = file_size
+        self.latency = latency_ms / 1000
+        self.throttle_every = throttle_every
+        self.retry_after = retry_after
+        self.bandwidth = bandwidth_mbps * 1024 * 1024 / 8
+        # حد مثل تليجرام: أكثر من rate_per_second استدعاء لنفس التوكن خلال ثانية = 429
+        self.rate_per_second = rate_per_second
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server: '_Server'
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+    def _json(self, status: int, payload: Dict[str, Any]) -> None:
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        try:
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def _params(self) -> Dict[str, Any]:
+        parts = urlsplit(self.path)
+        params: Dict[str, Any] = dict(parse_qsl(parts.query))
+        length = int(self.headers.get('Content-Length') or 0)
+        if length:
+            body = self.rfile.read(length)
+            content_type = self.headers.get('Content-Type', '')
+            if content_type.startswith('application/json'):
+                params.update(json.loads(body))
+            elif content_type.startswith('application/x-www-form-urlencoded'):
+                params.update(parse_qsl(body.decode('utf-8')))
+            else:
+                # multipart: يكفي استخراج chat_id
+                match = re.search(rb'name="chat_id"\r\n\r\n([^\r]+)', body)
+                if match:
+                    params['chat_id'] = match.group(1).decode()
+        return params
+
+    def _handle(self) -> None:
+        behaviour = self.server.behaviour
+        if behaviour.latency:
+            time.sleep(behaviour.latency)
+
+        path = urlsplit(self.path).path
+        file_match = re.match(r'^/file/bot([^/]+)/(.+)$', path)
+        if file_match:
+            return self._download(file_match.group(1), file_match.group(2))
+
+        api_match = re.match(r'^/bot([^/]+)/(\w+)$', path)
+        if not api_match:
+            return self._json(404, {'ok': False, 'error_code': 404, 'description': 'Not Found'})
+
+        token, method = api_match.groups()
+        params = self._params()
+        self.server.calls[(token, method)] += 1
+
+        if self._over_rate(token) or (
+            behaviour.throttle_every and next(self.server.counter) % behaviour.throttle_every == 0
+        ):
+            return self._json(429, {
+                'ok': False,
+                'error_code': 429,
+                'description': f'Too Many Requests: retry after {behaviour.retry_after}',
+                'parameters': {'retry_after': behaviour.retry_after}
+            })
+
+        handler = getattr(self, f'_api_{method}', None)
+        if handler:
+            return handler(params)
+        if method in _SEND_FIELDS:
+            return self._send_media(method, params)
+        return self._json(200, {'ok': True, 'result': True})
+
+    def _over_rate(self, token: str) -> bool:
+        limit = self.server.behaviour.rate_per_second
+        if not limit:
+            return False
+        now = time.monotonic()
+        with self.server.lock:
+            recent = self.server.recent.setdefault(token, deque())
+            while recent and now - recent[0] >= 1.0:
+                recent.popleft()
+            if len(recent) >= limit:
+                self.server.calls[(token, '429')] += 1
+                return True
+            recent.append(now)
+            return False
+
+    def _file_meta(self, file_id: str) -> Dict[str, Any]:
+        digest = hashlib.sha1(file_id.encode()).hexdigest()
+        extension = file_id.rsplit('.', 1)[-1] if '.' in file_id else 'bin'
+        return {
+            'file_id': file_id,
+            'file_unique_id': 'U' + digest[:15],
+            'file_size': self.server.behaviour.file_size,
+            'file_path': f"documents/{digest}.{extension}"
+        }
+
+    def _api_getMe(self, params: Dict[str, Any]) -> None:
+        self._json(200, {'ok': True, 'result': {
+            'id': 1000, 'is_bot': True, 'first_name': 'Fake Archive Bot', 'username': 'fake_archive_bot',
+            'can_join_groups': True, 'can_read_all_group_messages': True, 'supports_inline_queries': False
+        }})
+
+    def _api_getUpdates(self, params: Dict[str, Any]) -> None:
+        # long polling بدون تحديثات (يكفي لتشغيل البوت بوضع polling)
+        time.sleep(min(float(params.get('timeout') or 0), 1.0))
+        self._json(200, {'ok': True, 'result': []})
+
+    def _api_getFile(self, params: Dict[str, Any]) -> None:
+        file_id = params.get('file_id', '')
+        if file_id.startswith(MISSING_PREFIX):
+            return self._json(400, {
+                'ok': False,
+                'error_code': 400,
+                'description': 'Bad Request: wrong file_id or the file is temporarily unavailable'
+            })
+        self._json(200, {'ok': True, 'result': self._file_meta(file_id)})
+
+    def _send_media(self, method: str, params: Dict[str, Any]) -> None:
+        message_id = next(self.server.message_ids)
+        file_id = f"fake-{method}-{message_id}"
+        meta = self._file_meta(file_id)
+        field = _SEND_FIELDS[method]
+        result: Dict[str, Any] = {
+            'message_id': message_id,
+            'date': int(time.time()),
+            'chat': {'id': int(params.get('chat_id') or 0), 'type': 'supergroup'},
+            field: [meta] if field == 'photo' else meta
+        }
+        self._json(200, {'ok': True, 'result': result})
+
+    def _download(self, token: str, file_path: str) -> None:
+        behaviour = self.server.behaviour
+        self.server.calls[(token, 'download')] += 1
+        size = behaviour.file_size
+        start, end = 0, size - 1
+
+        range_header = self.headers.get('Range')
+        match = re.match(r'bytes=(\d*)-(\d*)', range_header or '')
+        if match:
+            if match.group(1):
+                start = int(match.group(1))
+                end = int(match.group(2)) if match.group(2) else size - 1
+            else:
+                start = max(0, size - int(match.group(2)))
+            end = min(end, size - 1)
+
+        extension = file_path.rsplit('.', 1)[-1]
+        self.send_response(206 if match else 200)
+        self.send_header('Content-Type', _CONTENT_TYPES.get(extension, 'application/octet-stream'))
+        self.send_header('Content-Length', str(end - start + 1))
+        self.send_header('Accept-Ranges', 'bytes')
+        if match:
+            self.send_header('Content-Range', f"bytes {start}-{end}/{size}")
+        self.end_headers()
+
+        chunk = b'\x00' * CHUNK_SIZE
+        remaining = end - start + 1
+        try:
+            while remaining > 0:
+                piece = chunk[:min(CHUNK_SIZE, remaining)]
+                self.wfile.write(piece)
+                remaining -= len(piece)
+                if behaviour.bandwidth:
+                    time.sleep(len(piece) / behaviour.bandwidth)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    do_GET = do_POST = _handle
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, behaviour: TelegramBehaviour):
+        super().__init__(('127.0.0.1', 0), _Handler)
+        self.behaviour = behaviour
+        self.calls: Counter = Counter()
+        self.counter = itertools.count(1)
+        self.message_ids = itertools.count(1000)
+        self.recent: Dict[str, deque] = {}
+        self.lock = threading.Lock()
+
+
+class FakeTelegram:
+    """تشغيل خادم Bot API الوهمي في خيط خلفي"""
+
+    def __init__(self, behaviour: Optional[TelegramBehaviour] = None):
+        self.behaviour = behaviour or TelegramBehaviour()
+        self._server = _Server(self.behaviour)
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def calls(self) -> Counter:
+        return self._server.calls
+
+    def start(self) -> 'FakeTelegram':
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> 'FakeTelegram':
+        return self.start()
+
+    def __exit__(self, *exc: Any) -> None:
+        self.stop()
@@ -25,6 +25,7 @@ CREATE TABLE IF NOT EXISTS otp_codes (
     code VARCHAR(6) NOT NULL,
     expires_at TIMESTAMP WITH TIME ZONE NOT NULL,
     is_used BOOLEAN DEFAULT FALSE,
+    delivery_status TEXT DEFAULT 'queued',  -- queued / sent / retrying / failed
     created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
 );
 
@@ -55,12 +56,16 @@ CREATE TABLE files (
     file_type TEXT NOT NULL,
     mime_type TEXT,
     telegram_file_id TEXT NOT NULL,
+    file_unique_id TEXT,                   -- معرف ثابت للمحتوى (ETag للبث)
+    bot_id BIGINT,                         -- البوت الذي أصدر telegram_file_id (NULL = الرئيسي)
     file_url TEXT,
     message_id INTEGER,
     caption TEXT,                          -- الوصف المرافق للملف
     uploaded_by INTEGER REFERENCES users(id) ON DELETE SET NULL,  -- من قام بالرفع
-    folder_id INTEGER,                     -- للمجلدات المستقبلية
-    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+    folder_id INTEGER,                     -- المجلد المباشر (NULL = الجذر)
+    folder_path TEXT,                      -- نسخة من folders.path للاستعلام عن شجرة كاملة بالفهرس
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
 );
 
 -- 6. جدول الجلسات (Sessions)
@@ -80,9 +85,100 @@ CREATE TABLE IF NOT EXISTS share_links (
     created_by INTEGER REFERENCES users(id) ON DELETE SET NULL,
     expires_at TIMESTAMP WITH TIME ZONE NOT NULL,
     access_count INTEGER DEFAULT 0,
+    revoked_at TIMESTAMP WITH TIME ZONE,   -- تاريخ الإلغاء (NULL = فعال)
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
+-- 8. سجل أحداث الملفات (Server-Sent Events)
+-- يملؤه trigger على files، ومعرّفه المتسلسل هو Last-Event-ID
+CREATE TABLE IF NOT EXISTS file_events (
+    id BIGSERIAL PRIMARY KEY,
+    event_type TEXT NOT NULL,              -- insert أو delete
+    file_id INTEGER NOT NULL,
+    payload JSONB,                         -- الحقول الافتراضية لقائمة الملفات (insert فقط)
     created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
 );
 
+-- 9. جدول المجلدات (Folders) بمسار مادي من المعرفات: /1/7/42/
+-- المسار من المعرفات وليس الأسماء حتى لا تتطلب إعادة التسمية تعديل الشجرة
+-- الإجماليات في folder_counters (الجدول 11) وتُقرأ مع المجلد من العرض folder_totals
+CREATE TABLE IF NOT EXISTS folders (
+    id SERIAL PRIMARY KEY,
+    name TEXT NOT NULL,
+    parent_id INTEGER REFERENCES folders(id) ON DELETE RESTRICT,
+    path TEXT NOT NULL DEFAULT '',
+    depth INTEGER NOT NULL DEFAULT 0,
+    created_by INTEGER REFERENCES users(id) ON DELETE SET NULL,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    UNIQUE(parent_id, name)
+);
+
+-- 10. إحصائيات التخزين (Storage Stats) تُحدّث تدريجياً عبر trigger على files
+-- dimension: total / type / uploader / day / month ، key: القيمة ('' للإجمالي)
+-- كل عداد موزع على عدة صفوف (shard) تُجمع عند القراءة من العرض storage_totals،
+-- حتى لا ينتظر كل رفع وحذف قفل صف ('total', '') نفسه
+CREATE TABLE IF NOT EXISTS storage_stats (
+    dimension TEXT NOT NULL,
+    key TEXT NOT NULL,
+    shard SMALLINT NOT NULL DEFAULT 0,
+    file_count BIGINT NOT NULL DEFAULT 0,
+    total_bytes BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    PRIMARY KEY (dimension, key, shard)
+);
+
+-- 11. عدادات المجلدات (Folder Counters) موزعة على عدة صفوف (shard) تُجمع عند القراءة،
+-- حتى لا ينتظر كل رفع وحذف قفل صفوف الأسلاف نفسها
+-- file_count: الملفات المباشرة، total_*: الشجرة كاملة
+CREATE TABLE IF NOT EXISTS folder_counters (
+    folder_id INTEGER NOT NULL REFERENCES folders(id) ON DELETE CASCADE,
+    shard SMALLINT NOT NULL DEFAULT 0,
+    file_count BIGINT NOT NULL DEFAULT 0,
+    total_files BIGINT NOT NULL DEFAULT 0,
+    total_bytes BIGINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (folder_id, shard)
+);
+
+-- 12. file_id البوتات المساعدة (File Copies) لنفس رسالة مجموعة التخزين
+-- file_id صالح فقط للبوت الذي أصدره؛ مهمة helper_updates تجمع ما يراه كل بوت مساعد
+-- حتى تتوزع قراءات الملف على المجمع بدلاً من البوت الذي استقبله وحده
+CREATE TABLE IF NOT EXISTS file_copies (
+    message_id BIGINT NOT NULL,
+    bot_id BIGINT NOT NULL,
+    telegram_file_id TEXT NOT NULL,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    PRIMARY KEY (message_id, bot_id)
+);
+
+ALTER TABLE share_links ADD COLUMN IF NOT EXISTS revoked_at TIMESTAMP WITH TIME ZONE;
+ALTER TABLE files ADD COLUMN IF NOT EXISTS file_unique_id TEXT;
+ALTER TABLE files ADD COLUMN IF NOT EXISTS bot_id BIGINT;
+ALTER TABLE otp_codes ADD COLUMN IF NOT EXISTS delivery_status TEXT DEFAULT 'queued';
+ALTER TABLE files ADD COLUMN IF NOT EXISTS folder_path TEXT;
+ALTER TABLE files ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW();
+ALTER TABLE storage_stats ADD COLUMN IF NOT EXISTS shard SMALLINT NOT NULL DEFAULT 0;
+-- الإجماليات انتقلت إلى folder_counters ويعيد reconcile_storage_stats حسابها في آخر الملف
+ALTER TABLE folders
+    DROP COLUMN IF EXISTS file_count,
+    DROP COLUMN IF EXISTS total_files,
+    DROP COLUMN IF EXISTS total_bytes;
+
+DO $$
+BEGIN
+    IF (SELECT array_length(conkey, 1) FROM pg_constraint WHERE conname = 'storage_stats_pkey') = 2 THEN
+        ALTER TABLE storage_stats DROP CONSTRAINT storage_stats_pkey;
+        ALTER TABLE storage_stats ADD PRIMARY KEY (dimension, key, shard);
+    END IF;
+END $$;
+
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conname = 'files_folder_id_fkey') THEN
+        ALTER TABLE files ADD CONSTRAINT files_folder_id_fkey
+            FOREIGN KEY (folder_id) REFERENCES folders(id) ON DELETE RESTRICT;
+    END IF;
+END $$;
+
 -- ========================================
 -- الفهارس (Indexes)
 -- ========================================
@@ -92,9 +188,17 @@ CREATE INDEX IF NOT EXISTS idx_users_email ON users(email);
 CREATE INDEX IF NOT EXISTS idx_files_created_at ON files(created_at DESC);
 CREATE INDEX IF NOT EXISTS idx_files_file_type ON files(file_type);
 CREATE INDEX IF NOT EXISTS idx_files_uploaded_by ON files(uploaded_by);
+CREATE INDEX IF NOT EXISTS idx_files_telegram_file_id ON files(telegram_file_id);
 CREATE INDEX IF NOT EXISTS idx_sessions_token ON sessions(session_token);
 CREATE INDEX IF NOT EXISTS idx_share_links_token ON share_links(token);
 CREATE INDEX IF NOT EXISTS idx_otp_codes_email ON otp_codes(email);
+CREATE INDEX IF NOT EXISTS idx_file_events_created_at ON file_events(created_at);
+CREATE INDEX IF NOT EXISTS idx_files_updated_at ON files(updated_at DESC);
+-- تصفح مجلد: (folder_id, created_at) / شجرة كاملة: نطاق على folder_path
+CREATE INDEX IF NOT EXISTS idx_files_folder_created ON files(folder_id, created_at DESC);
+CREATE INDEX IF NOT EXISTS idx_files_folder_path ON files(folder_path text_pattern_ops);
+CREATE INDEX IF NOT EXISTS idx_folders_parent ON folders(parent_id, name);
+CREATE INDEX IF NOT EXISTS idx_folders_path ON folders(path text_pattern_ops);
 
 -- ========================================
 -- البيانات الافتراضية (Default Data)
@@ -173,6 +277,432 @@ BEGIN
 END;
 $$ LANGUAGE plpgsql;
 
+-- دالة لزيادة عدادات الوصول لروابط المشاركة دفعة واحدة
+-- p_counts: {"token": عدد_مرات_الوصول, ...}
+CREATE OR REPLACE FUNCTION increment_share_link_access(p_counts JSONB)
+RETURNS void AS $$
+BEGIN
+    UPDATE share_links s
+    SET access_count = s.access_count + c.value::INTEGER
+    FROM jsonb_each_text(p_counts) AS c(token, value)
+    WHERE s.token = c.token;
+END;
+$$ LANGUAGE plpgsql;
+
+-- تسجيل إضافة وحذف الملفات في file_events (من البوت والموقع والتنظيف)
+CREATE OR REPLACE FUNCTION record_file_event()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO file_events (event_type, file_id, payload)
+        VALUES ('insert', NEW.id, jsonb_build_object(
+            'id', NEW.id,
+            'file_name', NEW.file_name,
+            'file_size', NEW.file_size,
+            'file_type', NEW.file_type,
+            'mime_type', NEW.mime_type,
+            'telegram_file_id', NEW.telegram_file_id,
+            'message_id', NEW.message_id,
+            'caption', NEW.caption,
+            'created_at', NEW.created_at
+        ));
+        RETURN NEW;
+    END IF;
+
+    INSERT INTO file_events (event_type, file_id) VALUES ('delete', OLD.id);
+    RETURN OLD;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS files_record_event ON files;
+CREATE TRIGGER files_record_event
+    AFTER INSERT OR DELETE ON files
+    FOR EACH ROW EXECUTE FUNCTION record_file_event();
+
+-- حذف نسخ البوتات المساعدة مع الملف (لا يوجد مفتاح أجنبي: النسخة قد تصل قبل السجل)
+CREATE OR REPLACE FUNCTION files_delete_copies()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF OLD.message_id IS NOT NULL THEN
+        DELETE FROM file_copies WHERE message_id = OLD.message_id;
+    END IF;
+    RETURN OLD;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS files_delete_copies ON files;
+CREATE TRIGGER files_delete_copies
+    AFTER DELETE ON files
+    FOR EACH ROW EXECUTE FUNCTION files_delete_copies();
+
+-- ========================================
+-- Folders: المسارات والإجماليات التراكمية
+-- ========================================
+
+-- معرفات المجلد وجميع أسلافه من المسار '/1/7/42/' => {1,7,42}
+CREATE OR REPLACE FUNCTION folder_path_ids(p_path TEXT)
+RETURNS INTEGER[] AS $$
+    SELECT COALESCE(string_to_array(trim(both '/' from p_path), '/')::INTEGER[], '{}');
+$$ LANGUAGE sql IMMUTABLE;
+
+-- صف العداد الذي تكتب فيه هذه الجلسة: المعاملات المتزامنة من اتصالات مختلفة
+-- تحدّث صفوفاً مختلفة بدلاً من انتظار قفل صف واحد
+CREATE OR REPLACE FUNCTION counter_shard()
+RETURNS SMALLINT AS $$
+    SELECT (pg_backend_pid() % 16)::SMALLINT;
+$$ LANGUAGE sql STABLE;
+
+-- المجلدات مع مجموع عداداتها (مصدر كل قراءة تحتاج الإجماليات)
+CREATE OR REPLACE VIEW folder_totals AS
+SELECT f.id, f.name, f.parent_id, f.path, f.depth, f.created_by, f.created_at,
+       c.file_count, c.total_files, c.total_bytes
+FROM folders f
+CROSS JOIN LATERAL (
+    SELECT COALESCE(SUM(fc.file_count), 0)::BIGINT AS file_count,
+           COALESCE(SUM(fc.total_files), 0)::BIGINT AS total_files,
+           COALESCE(SUM(fc.total_bytes), 0)::BIGINT AS total_bytes
+    FROM folder_counters fc
+    WHERE fc.folder_id = f.id
+) c;
+
+-- إضافة (أو طرح) ملفات وبايتات إلى المجلد وجميع أسلافه في صفوف هذه الجلسة
+-- (p_direct للمجلد نفسه فقط). القفل المشترك على المجلد يمنع move_folder من تغيير
+-- مساره قبل انتهاء المعاملة، ولا يتعارض مع الرفع المتزامن إلى نفس المجلد
+DROP FUNCTION IF EXISTS folder_rollup(INTEGER, BIGINT, BIGINT);
+CREATE OR REPLACE FUNCTION folder_rollup(p_folder_id INTEGER, p_direct BIGINT, p_files BIGINT, p_bytes BIGINT)
+RETURNS void AS $$
+DECLARE
+    v_path TEXT;
+BEGIN
+    IF p_folder_id IS NULL OR (p_direct = 0 AND p_files = 0 AND p_bytes = 0) THEN
+        RETURN;
+    END IF;
+
+    SELECT path INTO v_path FROM folders WHERE id = p_folder_id FOR SHARE;
+
+    INSERT INTO folder_counters AS c (folder_id, shard, file_count, total_files, total_bytes)
+    SELECT a.id, counter_shard(), CASE WHEN a.id = p_folder_id THEN p_direct ELSE 0 END, p_files, p_bytes
+    FROM unnest(folder_path_ids(v_path)) AS a(id)
+    ORDER BY a.id
+    ON CONFLICT (folder_id, shard) DO UPDATE
+    SET file_count = c.file_count + EXCLUDED.file_count,
+        total_files = c.total_files + EXCLUDED.total_files,
+        total_bytes = c.total_bytes + EXCLUDED.total_bytes;
+END;
+$$ LANGUAGE plpgsql;
+
+-- ضبط folder_path وupdated_at قبل الحفظ
+CREATE OR REPLACE FUNCTION files_set_folder_path()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'INSERT' OR NEW.folder_id IS DISTINCT FROM OLD.folder_id THEN
+        NEW.folder_path := (SELECT path FROM folders WHERE id = NEW.folder_id FOR SHARE);
+    END IF;
+    IF TG_OP = 'UPDATE' THEN
+        NEW.updated_at := NOW();
+    END IF;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS files_folder_path ON files;
+CREATE TRIGGER files_folder_path
+    BEFORE INSERT OR UPDATE ON files
+    FOR EACH ROW EXECUTE FUNCTION files_set_folder_path();
+
+-- تحديث الإجماليات عند إضافة ملف أو حذفه أو نقله أو تغيير حجمه
+CREATE OR REPLACE FUNCTION files_folder_rollup()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP IN ('DELETE', 'UPDATE') AND OLD.folder_id IS NOT NULL THEN
+        PERFORM folder_rollup(OLD.folder_id, -1, -1, -COALESCE(OLD.file_size, 0));
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') AND NEW.folder_id IS NOT NULL THEN
+        PERFORM folder_rollup(NEW.folder_id, 1, 1, COALESCE(NEW.file_size, 0));
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS files_folder_rollup_insert_delete ON files;
+CREATE TRIGGER files_folder_rollup_insert_delete
+    AFTER INSERT OR DELETE ON files
+    FOR EACH ROW EXECUTE FUNCTION files_folder_rollup();
+
+DROP TRIGGER IF EXISTS files_folder_rollup_update ON files;
+CREATE TRIGGER files_folder_rollup_update
+    AFTER UPDATE OF folder_id, file_size ON files
+    FOR EACH ROW
+    WHEN (OLD.folder_id IS DISTINCT FROM NEW.folder_id OR OLD.file_size IS DISTINCT FROM NEW.file_size)
+    EXECUTE FUNCTION files_folder_rollup();
+
+-- إنشاء مجلد مع حساب مساره
+DROP FUNCTION IF EXISTS create_folder(TEXT, INTEGER, INTEGER);
+CREATE OR REPLACE FUNCTION create_folder(p_name TEXT, p_parent_id INTEGER, p_created_by INTEGER)
+RETURNS SETOF folder_totals AS $$
+DECLARE
+    v_parent folders;
+    v_id INTEGER;
+BEGIN
+    IF p_parent_id IS NOT NULL THEN
+        SELECT * INTO v_parent FROM folders WHERE id = p_parent_id;
+        IF NOT FOUND THEN
+            RAISE EXCEPTION 'parent folder % not found', p_parent_id;
+        END IF;
+    END IF;
+
+    INSERT INTO folders (name, parent_id, created_by)
+    VALUES (p_name, p_parent_id, p_created_by)
+    RETURNING id INTO v_id;
+
+    UPDATE folders
+    SET path = COALESCE(v_parent.path, '/') || v_id || '/',
+        depth = COALESCE(v_parent.depth + 1, 0)
+    WHERE id = v_id;
+
+    RETURN QUERY SELECT * FROM folder_totals WHERE id = v_id;
+END;
+$$ LANGUAGE plpgsql;
+
+-- نقل مجلد بشجرته: تعديل المسارات بنطاق على الفهرس ونقل الإجماليات بين الأسلاف
+DROP FUNCTION IF EXISTS move_folder(INTEGER, INTEGER);
+CREATE OR REPLACE FUNCTION move_folder(p_folder_id INTEGER, p_new_parent_id INTEGER)
+RETURNS SETOF folder_totals AS $$
+DECLARE
+    v_folder folders;
+    v_parent folders;
+    v_totals folder_totals;
+    v_new_path TEXT;
+    v_depth_delta INTEGER;
+BEGIN
+    SELECT * INTO v_folder FROM folders WHERE id = p_folder_id FOR UPDATE;
+    IF NOT FOUND THEN
+        RAISE EXCEPTION 'folder % not found', p_folder_id;
+    END IF;
+
+    IF p_new_parent_id IS NOT NULL THEN
+        SELECT * INTO v_parent FROM folders WHERE id = p_new_parent_id;
+        IF NOT FOUND THEN
+            RAISE EXCEPTION 'parent folder % not found', p_new_parent_id;
+        END IF;
+        IF v_parent.path LIKE v_folder.path || '%' THEN
+            RAISE EXCEPTION 'cannot move a folder into itself';
+        END IF;
+    END IF;
+
+    v_new_path := COALESCE(v_parent.path, '/') || v_folder.id || '/';
+    v_depth_delta := COALESCE(v_parent.depth + 1, 0) - v_folder.depth;
+
+    -- قفل الشجرة ينتظر معاملات الملفات الجارية فيها (FOR SHARE في folder_rollup)
+    -- ويمنع الجديدة حتى النهاية، فتكون الإجماليات المقروءة بعده نهائية
+    PERFORM 1 FROM folders WHERE path LIKE v_folder.path || '%' ORDER BY id FOR UPDATE;
+    SELECT * INTO v_totals FROM folder_totals WHERE id = p_folder_id;
+
+    -- طرح إجماليات الشجرة من الأسلاف القدامى وإضافتها للجدد (بدون المجلد نفسه)
+    PERFORM folder_rollup(v_folder.parent_id, 0, -v_totals.total_files, -v_totals.total_bytes);
+    PERFORM folder_rollup(p_new_parent_id, 0, v_totals.total_files, v_totals.total_bytes);
+
+    UPDATE folders
+    SET path = v_new_path || substr(path, length(v_folder.path) + 1),
+        depth = depth + v_depth_delta
+    WHERE path LIKE v_folder.path || '%';
+
+    UPDATE folders SET parent_id = p_new_parent_id WHERE id = p_folder_id;
+
+    UPDATE files
+    SET folder_path = v_new_path || substr(folder_path, length(v_folder.path) + 1)
+    WHERE folder_path LIKE v_folder.path || '%';
+
+    RETURN QUERY SELECT * FROM folder_totals WHERE id = p_folder_id;
+END;
+$$ LANGUAGE plpgsql;
+
+-- ========================================
+-- Storage Stats: عدادات تراكمية وتصحيح دوري
+-- ========================================
+
+-- مفاتيح الإحصائيات لصف ملف واحد: (dimension, key)
+CREATE OR REPLACE FUNCTION storage_stats_keys(p_file files)
+RETURNS TABLE(dimension TEXT, key TEXT) AS $$
+    SELECT * FROM (VALUES
+        ('total', ''),
+        ('type', COALESCE(p_file.file_type, 'other')),
+        ('uploader', COALESCE(p_file.uploaded_by::TEXT, 'bot')),
+        ('day', to_char(p_file.created_at AT TIME ZONE 'UTC', 'YYYY-MM-DD')),
+        ('month', to_char(p_file.created_at AT TIME ZONE 'UTC', 'YYYY-MM'))
+    ) AS k(dimension, key);
+$$ LANGUAGE sql STABLE;
+
+-- مجموع صفوف كل عداد (مصدر القراءة)
+CREATE OR REPLACE VIEW storage_totals AS
+SELECT dimension, key, SUM(file_count)::BIGINT AS file_count, SUM(total_bytes)::BIGINT AS total_bytes
+FROM storage_stats
+GROUP BY dimension, key;
+
+-- إضافة (أو طرح) ملف من جميع العدادات في نفس المعاملة (في صفوف هذه الجلسة)
+CREATE OR REPLACE FUNCTION storage_stats_apply(p_file files, p_sign INTEGER)
+RETURNS void AS $$
+BEGIN
+    INSERT INTO storage_stats AS s (dimension, key, shard, file_count, total_bytes)
+    SELECT k.dimension, k.key, counter_shard(), p_sign, p_sign * COALESCE(p_file.file_size, 0)
+    FROM storage_stats_keys(p_file) k
+    ON CONFLICT (dimension, key, shard) DO UPDATE
+    SET file_count = s.file_count + EXCLUDED.file_count,
+        total_bytes = s.total_bytes + EXCLUDED.total_bytes,
+        updated_at = NOW();
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION files_storage_stats()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP IN ('DELETE', 'UPDATE') THEN
+        PERFORM storage_stats_apply(OLD, -1);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM storage_stats_apply(NEW, 1);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS files_storage_stats_insert_delete ON files;
+CREATE TRIGGER files_storage_stats_insert_delete
+    AFTER INSERT OR DELETE ON files
+    FOR EACH ROW EXECUTE FUNCTION files_storage_stats();
+
+DROP TRIGGER IF EXISTS files_storage_stats_update ON files;
+CREATE TRIGGER files_storage_stats_update
+    AFTER UPDATE OF file_size, file_type, uploaded_by, created_at ON files
+    FOR EACH ROW
+    WHEN (OLD.file_size IS DISTINCT FROM NEW.file_size
+          OR OLD.file_type IS DISTINCT FROM NEW.file_type
+          OR OLD.uploaded_by IS DISTINCT FROM NEW.uploaded_by
+          OR OLD.created_at IS DISTINCT FROM NEW.created_at)
+    EXECUTE FUNCTION files_storage_stats();
+
+-- الفرق بين عدادات المجلدات والقيم الفعلية من files (قراءة فقط)
+-- العدادات وfiles من نفس اللقطة، لأن trigger يحدّث العداد في معاملة الملف نفسها
+DROP FUNCTION IF EXISTS reconcile_folder_counters();
+CREATE OR REPLACE FUNCTION folder_counters_drift()
+RETURNS TABLE(folder_id INTEGER, file_count BIGINT, total_files BIGINT, total_bytes BIGINT) AS $$
+    WITH direct AS (
+        SELECT folder_id, COUNT(*) AS file_count, COALESCE(SUM(file_size), 0) AS total_bytes
+        FROM files
+        WHERE folder_id IS NOT NULL
+        GROUP BY folder_id
+    ),
+    actual AS (
+        SELECT a.id AS folder_id,
+               SUM(CASE WHEN a.id = d.folder_id THEN d.file_count ELSE 0 END) AS file_count,
+               SUM(d.file_count) AS total_files,
+               SUM(d.total_bytes) AS total_bytes
+        FROM direct d
+        JOIN folders f ON f.id = d.folder_id
+        CROSS JOIN LATERAL unnest(folder_path_ids(f.path)) AS a(id)
+        GROUP BY a.id
+    ),
+    counted AS (
+        SELECT folder_id, SUM(file_count) AS file_count, SUM(total_files) AS total_files,
+               SUM(total_bytes) AS total_bytes
+        FROM folder_counters
+        GROUP BY folder_id
+    )
+    SELECT COALESCE(a.folder_id, c.folder_id),
+           (COALESCE(a.file_count, 0) - COALESCE(c.file_count, 0))::BIGINT,
+           (COALESCE(a.total_files, 0) - COALESCE(c.total_files, 0))::BIGINT,
+           (COALESCE(a.total_bytes, 0) - COALESCE(c.total_bytes, 0))::BIGINT
+    FROM actual a
+    FULL OUTER JOIN counted c ON c.folder_id = a.folder_id
+    WHERE COALESCE(a.file_count, 0) <> COALESCE(c.file_count, 0)
+       OR COALESCE(a.total_files, 0) <> COALESCE(c.total_files, 0)
+       OR COALESCE(a.total_bytes, 0) <> COALESCE(c.total_bytes, 0);
+$$ LANGUAGE sql STABLE;
+
+-- الفرق بين عدادات الإحصائيات والقيم الفعلية من files (قراءة فقط، نفس اللقطة)
+CREATE OR REPLACE FUNCTION storage_stats_drift()
+RETURNS TABLE(dimension TEXT, key TEXT, file_count BIGINT, total_bytes BIGINT) AS $$
+    WITH actual AS (
+        SELECT k.dimension, k.key, COUNT(*) AS file_count, COALESCE(SUM(f.file_size), 0) AS total_bytes
+        FROM files f, LATERAL storage_stats_keys(f) k
+        GROUP BY k.dimension, k.key
+    )
+    SELECT COALESCE(a.dimension, s.dimension),
+           COALESCE(a.key, s.key),
+           (COALESCE(a.file_count, 0) - COALESCE(s.file_count, 0))::BIGINT,
+           (COALESCE(a.total_bytes, 0) - COALESCE(s.total_bytes, 0))::BIGINT
+    FROM actual a
+    FULL OUTER JOIN storage_totals s ON s.dimension = a.dimension AND s.key = a.key
+    WHERE COALESCE(a.file_count, 0) <> COALESCE(s.file_count, 0)
+       OR COALESCE(a.total_bytes, 0) <> COALESCE(s.total_bytes, 0);
+$$ LANGUAGE sql STABLE;
+
+-- تصحيح عدادات الإحصائيات والمجلدات من جدول files (مهمة دورية)
+-- بدون قفل files: كل فرق يُحسب من لقطة واحدة ويُضاف إلى الصف 0 بدلاً من استبدال
+-- القيمة، فالرفع والحذف المتزامنان يضيفان فروقهما ولا يضيعان. الحساب الطويل قراءة
+-- فقط، والكتابة (جمع الصفوف في الصف 0 والتصحيح) في آخر المعاملة فلا تُقفل صفوف
+-- العدادات إلا لحظات
+-- يعيد عدد العدادات التي تم تصحيحها
+CREATE OR REPLACE FUNCTION reconcile_storage_stats()
+RETURNS INTEGER AS $$
+DECLARE
+    v_stats JSONB;
+    v_folders JSONB;
+BEGIN
+    SELECT COALESCE(jsonb_agg(d), '[]') INTO v_stats FROM storage_stats_drift() d;
+    SELECT COALESCE(jsonb_agg(d), '[]') INTO v_folders FROM folder_counters_drift() d;
+
+    -- جمع صفوف كل عداد في الصف 0 حتى لا تتراكم الصفوف، مع الفروق
+    WITH moved AS (
+        DELETE FROM storage_stats WHERE shard <> 0
+        RETURNING dimension, key, file_count, total_bytes
+    ),
+    delta AS (
+        SELECT dimension, key, file_count, total_bytes FROM moved
+        UNION ALL
+        SELECT * FROM jsonb_to_recordset(v_stats) AS d(dimension TEXT, key TEXT, file_count BIGINT, total_bytes BIGINT)
+    )
+    INSERT INTO storage_stats AS s (dimension, key, shard, file_count, total_bytes)
+    SELECT dimension, key, 0, SUM(file_count), SUM(total_bytes)
+    FROM delta
+    GROUP BY dimension, key
+    ORDER BY dimension, key
+    ON CONFLICT (dimension, key, shard) DO UPDATE
+    SET file_count = s.file_count + EXCLUDED.file_count,
+        total_bytes = s.total_bytes + EXCLUDED.total_bytes,
+        updated_at = NOW();
+
+    WITH moved AS (
+        DELETE FROM folder_counters WHERE shard <> 0
+        RETURNING folder_id, file_count, total_files, total_bytes
+    ),
+    delta AS (
+        SELECT folder_id, file_count, total_files, total_bytes FROM moved
+        UNION ALL
+        SELECT d.folder_id, d.file_count, d.total_files, d.total_bytes
+        FROM jsonb_to_recordset(v_folders) AS d(folder_id INTEGER, file_count BIGINT, total_files BIGINT, total_bytes BIGINT)
+        -- تجاهل مجلد حُذف بعد اللقطة (عداداته حُذفت معه)
+        JOIN folders f ON f.id = d.folder_id
+    )
+    INSERT INTO folder_counters AS c (folder_id, shard, file_count, total_files, total_bytes)
+    SELECT folder_id, 0, SUM(file_count), SUM(total_files), SUM(total_bytes)
+    FROM delta
+    GROUP BY folder_id
+    ORDER BY folder_id
+    ON CONFLICT (folder_id, shard) DO UPDATE
+    SET file_count = c.file_count + EXCLUDED.file_count,
+        total_files = c.total_files + EXCLUDED.total_files,
+        total_bytes = c.total_bytes + EXCLUDED.total_bytes;
+
+    DELETE FROM storage_stats WHERE file_count = 0 AND total_bytes = 0 AND dimension <> 'total';
+    DELETE FROM folder_counters WHERE file_count = 0 AND total_files = 0 AND total_bytes = 0;
+    RETURN jsonb_array_length(v_stats) + jsonb_array_length(v_folders);
+END;
+$$ LANGUAGE plpgsql;
+
+-- ملء العدادات للملفات الموجودة مسبقاً
+SELECT reconcile_storage_stats();
+
 -- دالة للتحقق من صلاحيات المستخدم
 CREATE OR REPLACE FUNCTION check_user_permission(
     p_user_id INTEGER,
@@ -194,6 +724,105 @@ BEGIN
 END;
 $$ LANGUAGE plpgsql;
 
+-- ========================================
+-- Auth: كل عملية في استدعاء واحد ومعاملة واحدة
+-- ========================================
+
+-- إنشاء مستخدم بواسطة الأدمن (FALSE إذا كان الرقم التعريفي موجوداً)
+CREATE OR REPLACE FUNCTION create_user_by_admin(p_user_id TEXT, p_full_name TEXT)
+RETURNS BOOLEAN AS $$
+BEGIN
+    INSERT INTO users (user_id, full_name, is_active)
+    VALUES (p_user_id, p_full_name, FALSE)
+    ON CONFLICT (user_id) DO NOTHING;
+    RETURN FOUND;
+END;
+$$ LANGUAGE plpgsql;
+
+-- جلسة جديدة بعد التحقق من كلمة المرور مع تحديث آخر دخول
+-- p_password_hash: تشفير بالتكلفة الحالية (NULL = بدون ترقية)
+CREATE OR REPLACE FUNCTION open_session(
+    p_user_id INTEGER,
+    p_session_token TEXT,
+    p_expires_at TIMESTAMPTZ,
+    p_password_hash TEXT DEFAULT NULL
+)
+RETURNS void AS $$
+BEGIN
+    INSERT INTO sessions (user_id, session_token, expires_at)
+    VALUES (p_user_id, p_session_token, p_expires_at);
+
+    UPDATE users
+    SET last_login = NOW(),
+        password_hash = COALESCE(p_password_hash, password_hash)
+    WHERE id = p_user_id;
+END;
+$$ LANGUAGE plpgsql;
+
+-- فحص رمز OTP بدون استهلاكه: valid / invalid / expired
+-- يُستدعى قبل تشفير كلمة المرور حتى لا تستهلك الرموز الخاطئة وقت bcrypt؛
+-- activate_user يعيد الفحص مع القفل لأن الرمز قد يُستخدم بين الاستدعاءين
+CREATE OR REPLACE FUNCTION check_otp(
+    p_user_id INTEGER,
+    p_email TEXT,
+    p_code TEXT
+)
+RETURNS TEXT AS $$
+DECLARE
+    v_expires_at TIMESTAMPTZ;
+BEGIN
+    SELECT expires_at INTO v_expires_at
+    FROM otp_codes
+    WHERE user_id = p_user_id AND email = p_email AND code = p_code AND NOT is_used
+    ORDER BY created_at DESC
+    LIMIT 1;
+    IF NOT FOUND THEN
+        RETURN 'invalid';
+    END IF;
+    IF v_expires_at < NOW() THEN
+        RETURN 'expired';
+    END IF;
+    RETURN 'valid';
+END;
+$$ LANGUAGE plpgsql STABLE;
+
+-- تفعيل الحساب برمز OTP: activated / invalid / expired
+-- قفل الرمز يمنع استخدامه مرتين في طلبين متزامنين
+CREATE OR REPLACE FUNCTION activate_user(
+    p_user_id INTEGER,
+    p_email TEXT,
+    p_code TEXT,
+    p_password_hash TEXT
+)
+RETURNS TEXT AS $$
+DECLARE
+    v_otp otp_codes;
+BEGIN
+    SELECT * INTO v_otp
+    FROM otp_codes
+    WHERE user_id = p_user_id AND email = p_email AND code = p_code AND NOT is_used
+    ORDER BY created_at DESC
+    LIMIT 1
+    FOR UPDATE;
+    IF NOT FOUND THEN
+        RETURN 'invalid';
+    END IF;
+    IF v_otp.expires_at < NOW() THEN
+        RETURN 'expired';
+    END IF;
+
+    UPDATE users
+    SET email = p_email,
+        password_hash = p_password_hash,
+        is_active = TRUE,
+        activated_at = NOW()
+    WHERE id = p_user_id;
+
+    UPDATE otp_codes SET is_used = TRUE WHERE id = v_otp.id;
+    RETURN 'activated';
+END;
+$$ LANGUAGE plpgsql;
+
 -- ========================================
 -- Notes
 -- ========================================
@@ -3,13 +3,24 @@
 """
 Telegram Archive Bot v3.0
 نقطة البدء الرئيسية للمشروع
+
+الأوامر:
+    python run.py [supervise]   تشغيل البوت والـ API والمهام كعمليات مستقلة مع المراقبة
+    python run.py api           خادم الـ API فقط (gunicorn)
+    python run.py bot           البوت فقط (polling)
+    python run.py jobs          المهام الدورية فقط (التنظيف)
+    python run.py webhook       مستقبل webhook مستقل
+    python run.py set-webhook | delete-webhook
+    python run.py export [--format csv] [--state FILE] [--output FILE]   تصدير جدول الملفات
 """
 
 import sys
 import os
+import gc
 import logging
-import asyncio
-from threading import Thread
+import argparse
+import shutil
+import tempfile
 
 # إضافة مجلد src إلى المسار
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
@@ -21,52 +32,66 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
-def run_bot_async():
-    """تشغيل البوت في event loop منفصل"""
-    try:
-        from src.bot.main import create_bot_application
-        
-        logger.info("🤖 بدء تشغيل البوت...")
-        
-        # إنشاء event loop جديد للـ thread
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        
-        # إنشاء وتشغيل التطبيق
-        application = create_bot_application()
-        
-        # تشغيل البوت
-        loop.run_until_complete(application.initialize())
-        loop.run_until_complete(application.start())
-        loop.run_until_complete(application.updater.start_polling())
-        
-        logger.info("✅ البوت يعمل الآن")
-        
-        # الإبقاء على البوت يعمل
-        loop.run_forever()
-        
-    except Exception as e:
-        logger.error(f"❌ خطأ في تشغيل البوت: {e}")
-        import traceback
-        traceback.print_exc()
+def setup_metrics_dir():
+    """تجهيز مجلد مقاييس Prometheus المشترك بين العمليات"""
+    metrics_dir = os.environ.get('PROMETHEUS_MULTIPROC_DIR')
+    if not metrics_dir:
+        metrics_dir = os.path.join(tempfile.gettempdir(), 'archive-metrics')
+        os.environ['PROMETHEUS_MULTIPROC_DIR'] = metrics_dir
+    
+    # حذف ملفات التشغيل السابق حتى لا تختلط العدادات
+    # (العمليات التي يشغلها المراقب تشترك في المجلد الذي جهزه)
+    if not os.environ.get('ARCHIVE_SUPERVISED'):
+        shutil.rmtree(metrics_dir, ignore_errors=True)
+    os.makedirs(metrics_dir, exist_ok=True)
+
+
+def gunicorn_child_exit(server, worker):
+    """تنظيف مقاييس العامل المنتهي"""
+    from src.utils.metrics import mark_process_dead
+    mark_process_dead(worker.pid)
+
+
+def gunicorn_pre_fork(server, worker):
+    """
+    نقل كائنات العملية الأم إلى الجيل الدائم قبل fork: جامع القمامة في العامل
+    لا يكتب على صفحاتها فتبقى مشتركة (نسخ عند الكتابة)
+    """
+    gc.freeze()
+
+
+def gunicorn_post_worker_init(worker):
+    """
+    إنشاء عملاء الشبكة الخاصة بالعامل (لا يُشارك اتصال أنشأته العملية الأم).
+    بعد تثبيت معالجات إشارات العامل: في post_fork تضيع SIGTERM التي تصل أثناء التجهيز
+    """
+    from src.api.main import init_worker
+    init_worker()
+
+
+def load_api_app():
+    """تطبيق الـ API (في العملية الأم مع WEB_PRELOAD، أو في كل عامل بدونه)"""
+    from src.api.main import create_app
+    return create_app()
 
 
-def run_server():
-    """تشغيل الخادم"""
+def run_server(app=None, port=None):
+    """تشغيل الخادم (بدون app: تطبيق الـ API من create_app)"""
     try:
-        from src.api.main import app
         from src.core.config import config
+        serve_api = app is None
+        port = port or config.PORT
         
-        logger.info(f"🌐 بدء تشغيل الخادم على المنفذ {config.PORT}...")
+        logger.info(f"🌐 بدء تشغيل الخادم على المنفذ {port}...")
         
         # استخدام Gunicorn في الإنتاج إذا كان متاحاً
         try:
             import gunicorn.app.base
             
             class StandaloneApplication(gunicorn.app.base.BaseApplication):
-                def __init__(self, app, options=None):
+                def __init__(self, loader, options=None):
                     self.options = options or {}
-                    self.application = app
+                    self.loader = loader
                     super().__init__()
 
                 def load_config(self):
@@ -75,26 +100,44 @@ def run_server():
                             self.cfg.set(key.lower(), value)
 
                 def load(self):
-                    return self.application
+                    return self.loader()
 
             options = {
-                'bind': f'{config.HOST}:{config.PORT}',
-                'workers': 2,
-                'worker_class': 'sync',
-                'timeout': 120,
+                'bind': f'{config.HOST}:{port}',
+                'workers': config.get_web_workers(),
+                'worker_class': config.WEB_WORKER_CLASS,
+                'threads': config.WEB_THREADS,
+                'timeout': config.WEB_TIMEOUT,
+                'graceful_timeout': config.DRAIN_TIMEOUT_SECONDS,
                 'accesslog': '-',
                 'errorlog': '-',
                 'loglevel': 'info',
+                'child_exit': gunicorn_child_exit,
             }
+            if serve_api:
+                options['preload_app'] = config.WEB_PRELOAD
+                options['post_worker_init'] = gunicorn_post_worker_init
+                if config.WEB_PRELOAD:
+                    options['pre_fork'] = gunicorn_pre_fork
             
-            logger.info("🚀 استخدام Gunicorn للإنتاج")
-            StandaloneApplication(app, options).run()
+            if serve_api and config.SSE_ENABLED and not config.get_sse_max_clients():
+                logger.warning(
+                    f"⚠️ /api/events معطل مع {config.WEB_WORKER_CLASS} و WEB_THREADS={config.WEB_THREADS}"
+                    " (استخدم gthread بعدة خيوط)"
+                )
+            logger.info(
+                f"🚀 استخدام Gunicorn للإنتاج ({options['workers']} عامل، {options['worker_class']}"
+                f"{'، تحميل مسبق' if options.get('preload_app') else ''})"
+            )
+            StandaloneApplication(load_api_app if serve_api else lambda: app, options).run()
             
         except ImportError:
             logger.warning("⚠️ Gunicorn غير متاح، استخدام Flask development server")
+            if serve_api:
+                app = load_api_app()
             app.run(
                 host=config.HOST,
-                port=config.PORT,
+                port=port,
                 debug=False,
                 threaded=True
             )
@@ -103,20 +146,104 @@ def run_server():
         logger.error(f"❌ خطأ في تشغيل الخادم: {e}")
         import traceback
         traceback.print_exc()
+        # رمز خروج غير صفري حتى يعيد المراقب تشغيل العملية
+        sys.exit(1)
+
+
+def run_webhook_receiver():
+    """تشغيل مستقبل webhook مستقل (يمكن تشغيل عدة نسخ خلف موزع حمل)"""
+    from src.core.config import config
+    from src.bot.main import create_bot_application
+    from src.bot.webhook import WebhookDispatcher, create_webhook_app
+    
+    config.validate()
+    dispatcher = WebhookDispatcher(create_bot_application, config.WEBHOOK_SECRET)
+    run_server(create_webhook_app(dispatcher), config.WEBHOOK_PORT)
+
+
+def manage_webhook(command):
+    """تسجيل أو إلغاء webhook لدى تليجرام"""
+    from src.bot.main import create_bot_application
+    from src.bot.webhook import set_webhook, delete_webhook
+    
+    application = create_bot_application()
+    if command == 'set-webhook':
+        set_webhook(application)
+    else:
+        delete_webhook(application)
+
+
+def run_supervisor():
+    """تشغيل جميع الأدوار كعمليات مستقلة ومراقبتها"""
+    from src.core.config import config
+    from src.core.supervisor import Supervisor, build_role_specs
+    
+    config.validate()
+    shutil.rmtree(config.HEARTBEAT_DIR, ignore_errors=True)
+    specs = build_role_specs(os.path.abspath(__file__), config.SUPERVISOR_ROLES)
+    logger.info(f"🧭 المراقب يشغّل: {', '.join(spec.name for spec in specs)}")
+    sys.exit(Supervisor(specs).run())
+
+
+def run_bot():
+    """تشغيل البوت كعملية مستقلة"""
+    from src.bot.main import run_bot
+    run_bot()
+
+
+def run_jobs():
+    """تشغيل المهام الدورية كعملية مستقلة"""
+    from src.jobs.runner import run_jobs
+    run_jobs()
+
+
+def run_export(argv=None):
+    """تصدير جدول الملفات (NDJSON أو CSV) إلى ملف أو stdout"""
+    from src.core.export import run_export as export
+    export(argv)
+
+
+COMMANDS = {
+    'supervise': run_supervisor,
+    'api': run_server,
+    'bot': run_bot,
+    'jobs': run_jobs,
+    'webhook': run_webhook_receiver,
+}
 
 
 def main():
     """نقطة البدء الرئيسية"""
+    # قبل أي استيراد حتى يشمل التقرير وحدات التطبيق ومكتباته
+    if os.getenv('STARTUP_TIMING_REPORT', 'false').lower() == 'true':
+        from src.utils.startup import install_import_timer
+        install_import_timer()
+    
+    parser = argparse.ArgumentParser(description='Telegram Archive Bot v3.0')
+    parser.add_argument(
+        'command', nargs='?', default='supervise',
+        choices=list(COMMANDS) + ['set-webhook', 'delete-webhook', 'export']
+    )
+    # خيارات export تُمرر كما هي إلى محللها
+    command = parser.parse_args(sys.argv[1:2]).command
+    if command == 'export':
+        run_export(sys.argv[2:])
+        return
+    if len(sys.argv) > 2:
+        parser.error(f"unrecognized arguments: {' '.join(sys.argv[2:])}")
+    
+    if command in ('set-webhook', 'delete-webhook'):
+        manage_webhook(command)
+        return
+    
     logger.info("=" * 60)
-    logger.info("🚀 Telegram Archive Bot v3.0")
+    logger.info(f"🚀 Telegram Archive Bot v3.0 ({command})")
     logger.info("=" * 60)
     
-    # تشغيل البوت في thread منفصل
-    bot_thread = Thread(target=run_bot_async, daemon=True)
-    bot_thread.start()
+    # يجب تجهيز مجلد المقاييس قبل استيراد أي وحدة تنشئ مقاييس
+    setup_metrics_dir()
     
-    # تشغيل الخادم في الـ thread الرئيسي
-    run_server()
+    COMMANDS[command]()
 
 
 if __name__ == '__main__':
@@ -7,18 +7,46 @@ Flask Server v3.0 للأرشيف
 
 import os
 import logging
+import math
 import threading
 import time
 from datetime import datetime
+from urllib.parse import urlencode
 from typing import Dict, Any, Tuple, Optional
-from flask import Flask, request, jsonify, send_from_directory, Response, stream_with_context, render_template
+from flask import Blueprint, Flask, current_app, request, jsonify, send_from_directory, Response, stream_with_context, render_template, g, make_response
 from flask_cors import CORS
+from werkzeug.middleware.proxy_fix import ProxyFix
 import requests
-from supabase import create_client, Client
+from supabase import Client, create_client
 from ..core.auth import AuthManager
+from ..core.hashing import HasherBusy, PasswordHasher
+from ..core.rate_governor import Throttled, create_telegram_governor
+from ..core.rate_limit import create_auth_limiters
 from ..core.permissions import PermissionManager
+from ..core.bot_pool import NOT_FOUND, OK, THROTTLED, BotTokenPool, UnknownBot, classify
+from ..core.share_links import STREAM_SCOPES, ShareLinkManager
+from ..core.folders import FolderManager
+from ..core.stats import StatsManager
+from ..core.events import EventBus, RESET
+from ..core.export import EXPORT_FORMATS, CatalogExporter, export_filename
 from ..core.config import config
+from ..db import create_repositories
+from ..bot.main import create_bot_application
+from ..bot.webhook import WebhookDispatcher, register_webhook_route
+from ..jobs.cleanup import cleanup_deleted_files
+from ..jobs.runner import create_job_runner
 from ..utils.email import email_service
+from ..utils import metrics
+from ..utils.timing import span, get_spans, server_timing_header
+from ..utils.profiler import RequestProfiler
+from ..utils import http_cache
+from ..utils.compression import compress_response
+from ..utils.json_provider import install_json_provider
+from ..utils.zipstream import ZipMember, stream_zip
+from ..utils.segmented import SegmentedFetch
+from ..utils.singleflight import SingleFlight, StreamCoalescer
+from ..utils.lazy import Lazy
+from ..utils import startup
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -30,28 +58,93 @@ BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__fil
 TEMPLATE_DIR = os.path.join(BASE_DIR, 'templates')
 STATIC_DIR = os.path.join(BASE_DIR, 'static')
 
-# طباعة المسارات للتأكد (مهم للتصحيح)
-logger.info(f"📁 BASE_DIR: {BASE_DIR}")
-logger.info(f"📄 TEMPLATE_DIR: {TEMPLATE_DIR}")
-logger.info(f"📄 Templates exist: {os.path.exists(TEMPLATE_DIR)}")
-if os.path.exists(TEMPLATE_DIR):
-    logger.info(f"📄 Template files: {os.listdir(TEMPLATE_DIR)}")
+# كائنات الخدمة تُنشأ عند أول استخدام وبنسخة مستقلة في كل عامل؛ الاستيراد نفسه
+# بلا اتصالات شبكة حتى يمكن تحميله في عملية gunicorn الأم ومشاركة صفحاته بعد fork
+def _create_supabase() -> Client:
+    client = create_client(config.SUPABASE_URL, config.SUPABASE_KEY)
+    # عميل PostgREST يُنشأ عند أول table(): إنشاؤه هنا ليدخل في تجهيز العامل لا في أول طلب
+    client.postgrest
+    return metrics.instrument_supabase(client)
 
-app = Flask(__name__, template_folder=TEMPLATE_DIR, static_folder=STATIC_DIR)
-CORS(app)
-app.secret_key = os.getenv('SECRET_KEY', os.urandom(24).hex())
-
-# التحقق من الإعدادات
-config.validate()
-
-# إنشاء عميل Supabase
-supabase: Client = create_client(config.SUPABASE_URL, config.SUPABASE_KEY)
+supabase = Lazy(_create_supabase, 'supabase')
 TELEGRAM_API_URL = config.TELEGRAM_API_URL
 TARGET_GROUP_ID = config.TARGET_GROUP_ID
 
-# إنشاء مديري المصادقة والصلاحيات
-auth_manager = AuthManager(supabase)
-permission_manager = PermissionManager(supabase)
+# إنشاء مديري المصادقة والصلاحيات (bcrypt في مجمع عمليات منفصل)
+password_hasher = PasswordHasher(
+    rounds=config.BCRYPT_ROUNDS,
+    workers=config.HASH_WORKERS,
+    max_pending=config.HASH_MAX_PENDING,
+    timeout=config.HASH_TIMEOUT_SECONDS
+)
+# المستودعات (Postgres مباشر للاستعلامات المتكررة إذا توفر DATABASE_URL)
+repos = Lazy(lambda: create_repositories(supabase), 'repos')
+auth_manager = Lazy(lambda: AuthManager(repos, password_hasher), 'auth_manager')
+permission_manager = Lazy(lambda: PermissionManager(repos), 'permission_manager')
+
+# مجمع توكنات البوتات لطلبات getFile والتحميل (بمعدل منظم بين جميع العمليات)
+bot_pool = Lazy(lambda: BotTokenPool(
+    config.BOT_TOKEN,
+    config.HELPER_BOT_TOKENS,
+    penalty_seconds=config.BOT_POOL_PENALTY_SECONDS,
+    api_base=config.TELEGRAM_API_BASE,
+    governor=create_telegram_governor(1 + len(config.HELPER_BOT_TOKENS)),
+    http_pool_size=config.TELEGRAM_HTTP_POOL_SIZE
+), 'bot_pool')
+
+# حدود محاولات المصادقة (تُفحص قبل أي تشفير، مشتركة بين جميع العمليات)
+auth_ip_limiter, auth_account_limiter = create_auth_limiters()
+
+# مدير روابط المشاركة
+share_link_manager = Lazy(
+    lambda: ShareLinkManager(
+        repos, config.SHARE_LINK_SECRET, file_cache_seconds=config.SHARE_LINK_FILE_CACHE_SECONDS
+    ),
+    'share_link_manager'
+)
+
+# مدير المجلدات
+folder_manager = Lazy(lambda: FolderManager(repos), 'folder_manager')
+
+# إحصائيات التخزين
+stats_manager = Lazy(lambda: StatsManager(repos), 'stats_manager')
+
+# التقاط ملفات تعريف الأداء عند الطلب
+request_profiler = RequestProfiler(config.PROFILE_DIR)
+
+# مُعرّفات الطلبات الشرطية: حالة القوائم لفترة قصيرة، وfile_unique_id لكل file_id
+listing_validators = http_cache.LRUCache(maxsize=256, ttl=config.LISTING_VALIDATOR_TTL_SECONDS)
+stream_validators = http_cache.LRUCache(maxsize=4096)
+
+# نتائج getFile (التوكن ومسار التحميل) مع دمج الطلبات المتزامنة، وتحميل مشترك لكل ملف
+telegram_files = http_cache.LRUCache(maxsize=4096, ttl=config.FILE_PATH_CACHE_SECONDS)
+get_file_flights = SingleFlight()
+stream_coalescer = StreamCoalescer(window=config.STREAM_SHARED_WINDOW_MB * 1024 * 1024)
+
+# أحداث الملفات لاتصالات SSE
+event_bus = Lazy(lambda: EventBus(
+    repos,
+    poll_interval=config.EVENTS_POLL_INTERVAL_SECONDS,
+    replay_limit=config.EVENTS_REPLAY_LIMIT,
+    max_subscribers=config.get_sse_max_clients(),
+    settle_seconds=config.EVENTS_SETTLE_SECONDS
+), 'event_bus')
+
+# عملاء الشبكة التي يجهزها كل عامل بعد fork (init_worker)
+WORKER_CLIENTS = (supabase, repos, bot_pool)
+
+# المسارات تُسجل على Blueprint وتُربط بالتطبيق في create_app
+api = Blueprint('api', __name__)
+
+# الأعمدة المسموح بطلبها عبر ?fields= (file_url غير مسموح لأنه يحتوي على توكن البوت)
+FILE_FIELDS = (
+    'id', 'file_name', 'file_size', 'file_type', 'mime_type', 'telegram_file_id',
+    'file_unique_id', 'message_id', 'caption', 'uploaded_by', 'folder_id', 'created_at'
+)
+FILE_LIST_DEFAULT_FIELDS = (
+    'id', 'file_name', 'file_size', 'file_type', 'mime_type',
+    'telegram_file_id', 'message_id', 'caption', 'folder_id', 'created_at'
+)
 
 def get_file_type(mime_type: str) -> str:
     """تحديد نوع الملف من MIME type"""
@@ -63,22 +156,125 @@ def get_file_type(mime_type: str) -> str:
         return 'audio'
     return 'document'
 
-def get_current_user() -> Optional[Dict[str, Any]]:
-    """الحصول على المستخدم الحالي من الجلسة"""
+def get_current_user(stream_scope: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """
+    الحصول على المستخدم الحالي من الجلسة
+    
+    stream_scope: قبول ?token= برمز بث قصير لهذا المسار (EventSource لا يستطيع إرسال
+    ترويسات)؛ رمز الجلسة لا يُقبل في الرابط لأنه يظهر في السجلات
+    """
     session_token = request.headers.get('Authorization')
+    if not session_token and stream_scope and request.args.get('token'):
+        user_db_id = share_link_manager.verify_stream_token(request.args['token'], stream_scope)
+        user = repos.users.get(user_db_id) if user_db_id else None
+        if not user or not user.get('is_active'):
+            return None
+        return {
+            'user_id': user['id'],
+            'user_identifier': user['user_id'],
+            'full_name': user['full_name'],
+            'email': user['email'],
+            'is_admin': user['is_admin']
+        }
     if not session_token:
         return None
     
-    success, user_data = auth_manager.verify_session(session_token)
+    with span('verify_session'):
+        success, user_data = auth_manager.verify_session(session_token)
     if success:
         return user_data
     return None
 
+# ========================================
+# Metrics
+# ========================================
+
+def _redacted_path() -> str:
+    """المسار مع الاستعلام بدون ?token= (ملفات التعريف تُحفظ وتُعرض للمشرفين)"""
+    args = [(key, value) for key, value in request.args.items(multi=True) if key != 'token']
+    return f"{request.path}?{urlencode(args)}" if args else request.path
+
+@api.before_app_request
+def _start_request_timer() -> None:
+    """بدء قياس زمن الطلب والتقاط ملف التعريف إذا كان المسار مفعلاً"""
+    g.request_start = time.perf_counter()
+    if request.url_rule:
+        g.profile_capture = request_profiler.start(request.url_rule.rule)
+
+@api.after_app_request
+def _observe_request(response: Response) -> Response:
+    """تسجيل زمن الطلب حسب المسار (وليس الرابط الفعلي لتجنب تضخم التسميات)"""
+    start = g.get('request_start')
+    if start is None:
+        return response
+    
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    request_profiler.finish(g.pop('profile_capture', None), f"{request.method} {_redacted_path()}")
+    metrics.observe_since(
+        metrics.HTTP_REQUEST_DURATION, start,
+        route, request.method, str(response.status_code)
+    )
+    
+    total_ms = (time.perf_counter() - start) * 1000
+    if config.SERVER_TIMING_ENABLED:
+        response.headers['Server-Timing'] = server_timing_header(total_ms)
+    if total_ms >= config.TIMING_LOG_THRESHOLD_MS:
+        spans = get_spans()
+        fields = ' '.join(f"{name}={data['dur']}ms" for name, data in spans.items())
+        logger.info(
+            f"⏱️ {request.method} {route} {response.status_code} total={total_ms:.1f}ms {fields}",
+            extra={'route': route, 'status': response.status_code, 'total_ms': round(total_ms, 1), 'spans': spans}
+        )
+    return response
+
+@api.after_app_request
+def _compress_response(response: Response) -> Response:
+    """ضغط ردود JSON الكبيرة (يعمل قبل _observe_request لأن Flask يعكس ترتيب التسجيل)"""
+    return compress_response(response)
+
+@api.route('/metrics')
+def metrics_endpoint() -> Any:
+    """تصدير المقاييس بصيغة Prometheus"""
+    if config.METRICS_TOKEN and request.headers.get('Authorization') != f"Bearer {config.METRICS_TOKEN}":
+        return jsonify({'error': 'غير مصرح'}), 401
+    
+    data, content_type = metrics.render_metrics()
+    return Response(data, mimetype=content_type)
+
 # ========================================
 # Authentication Routes
 # ========================================
 
-@app.route('/api/auth/register/verify', methods=['POST'])
+def _auth_rejected(reason: str, retry_after: float, status: int = 429) -> Tuple[Any, int]:
+    """رفض طلب مصادقة قبل التشفير مع Retry-After"""
+    metrics.AUTH_REJECTED.labels(reason).inc()
+    response = jsonify({'success': False, 'error': 'محاولات كثيرة، حاول لاحقاً'})
+    response.headers['Retry-After'] = str(max(1, math.ceil(retry_after)))
+    return response, status
+
+def _telegram_throttled(e: Throttled, body: Any = "Telegram is busy, retry later") -> Tuple[Any, int]:
+    """رد 503 مع Retry-After عندما يطلب تليجرام (أو منظم المعدل) الانتظار"""
+    logger.warning(f"⏳ {e}")
+    response = make_response(body, 503)
+    response.headers['Retry-After'] = str(max(1, math.ceil(e.retry_after)))
+    return response, 503
+
+def _unknown_bot(e: UnknownBot) -> Tuple[Any, int]:
+    """رد 503 لملف أصدره بوت ليس في المجمع (إعداد ناقص، السجل لا يُحذف)"""
+    logger.error(f"❌ {e}: أضف توكنه إلى HELPER_BOT_TOKENS")
+    return "File is served by a bot that is not configured", 503
+
+def _check_auth_limits(account: str) -> Optional[Tuple[Any, int]]:
+    """تسجيل محاولة للـ IP وللحساب؛ يعيد رد 429 عند تجاوز أحدهما"""
+    wait = auth_ip_limiter.hit(request.remote_addr or 'unknown')
+    if wait is not None:
+        return _auth_rejected('ip_limit', wait)
+    wait = auth_account_limiter.hit(account)
+    if wait is not None:
+        return _auth_rejected('account_limit', wait)
+    return None
+
+@api.route('/api/auth/register/verify', methods=['POST'])
 def verify_registration():
     """التحقق من بيانات المستخدم (الخطوة 2)"""
     try:
@@ -98,7 +294,7 @@ def verify_registration():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/auth/register/send-otp', methods=['POST'])
+@api.route('/api/auth/register/send-otp', methods=['POST'])
 def send_otp():
     """إرسال رمز OTP (الخطوة 3)"""
     try:
@@ -118,7 +314,24 @@ def send_otp():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/auth/register/activate', methods=['POST'])
+@api.route('/api/auth/register/otp-status', methods=['GET'])
+def otp_delivery_status():
+    """حالة إرسال رمز التحقق بالبريد"""
+    try:
+        user_db_id = request.args.get('user_db_id', type=int)
+        email = request.args.get('email')
+        
+        if not user_db_id or not email:
+            return jsonify({'error': 'البيانات غير مكتملة'}), 400
+        
+        status = auth_manager.get_otp_delivery_status(user_db_id, email)
+        if status is None:
+            return jsonify({'success': False, 'error': 'لا يوجد رمز تحقق'}), 404
+        return jsonify({'success': True, 'status': status})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@api.route('/api/auth/register/activate', methods=['POST'])
 def activate_account():
     """تفعيل الحساب بعد التحقق من OTP"""
     try:
@@ -131,16 +344,23 @@ def activate_account():
         if not all([user_db_id, email, otp_code, password]):
             return jsonify({'error': 'البيانات غير مكتملة'}), 400
         
+        rejected = _check_auth_limits(f"activate:{user_db_id}")
+        if rejected:
+            return rejected
+        
         success, message = auth_manager.verify_otp_and_activate(user_db_id, email, otp_code, password)
         
         if success:
+            auth_account_limiter.reset(f"activate:{user_db_id}")
             return jsonify({'success': True, 'message': message})
         else:
             return jsonify({'success': False, 'error': message}), 400
+    except HasherBusy:
+        return _auth_rejected('hasher_busy', 1, 503)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/auth/login', methods=['POST'])
+@api.route('/api/auth/login', methods=['POST'])
 def login():
     """تسجيل الدخول"""
     try:
@@ -151,16 +371,24 @@ def login():
         if not email or not password:
             return jsonify({'error': 'البيانات غير مكتملة'}), 400
         
+        account = f"login:{email.strip().lower()}"
+        rejected = _check_auth_limits(account)
+        if rejected:
+            return rejected
+        
         success, user_data, message = auth_manager.login(email, password)
         
         if success:
+            auth_account_limiter.reset(account)
             return jsonify({'success': True, 'user': user_data, 'message': message})
         else:
             return jsonify({'success': False, 'error': message}), 401
+    except HasherBusy:
+        return _auth_rejected('hasher_busy', 1, 503)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/auth/logout', methods=['POST'])
+@api.route('/api/auth/logout', methods=['POST'])
 def logout():
     """تسجيل الخروج"""
     try:
@@ -173,7 +401,7 @@ def logout():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/auth/me', methods=['GET'])
+@api.route('/api/auth/me', methods=['GET'])
 def get_current_user_info():
     """الحصول على معلومات المستخدم الحالي"""
     user = get_current_user()
@@ -190,7 +418,21 @@ def get_current_user_info():
 # Admin Routes
 # ========================================
 
-@app.route('/api/admin/users/create', methods=['POST'])
+@api.route('/api/auth/stream-token', methods=['POST'])
+def issue_stream_token():
+    """رمز قصير العمر لـ ?token= في /api/events أو /api/files/zip بدلاً من رمز الجلسة"""
+    user = get_current_user()
+    if not user:
+        return jsonify({'error': 'غير مصرح'}), 401
+    
+    scope = (request.get_json(silent=True) or {}).get('scope')
+    if scope not in STREAM_SCOPES:
+        return jsonify({'error': f"scope يجب أن يكون: {', '.join(STREAM_SCOPES)}"}), 400
+    
+    token = share_link_manager.generate_stream_token(user['user_id'], scope, config.STREAM_TOKEN_SECONDS)
+    return jsonify({'success': True, 'token': token, 'expires_in': int(config.STREAM_TOKEN_SECONDS)})
+
+@api.route('/api/admin/users/create', methods=['POST'])
 def admin_create_user():
     """إنشاء مستخدم جديد بواسطة الأدمن"""
     user = get_current_user()
@@ -214,7 +456,7 @@ def admin_create_user():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/admin/users', methods=['GET'])
+@api.route('/api/admin/users', methods=['GET'])
 def admin_get_users():
     """الحصول على جميع المستخدمين"""
     user = get_current_user()
@@ -227,7 +469,20 @@ def admin_get_users():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/admin/roles', methods=['GET'])
+@api.route('/api/stats', methods=['GET'])
+def get_stats():
+    """إحصائيات التخزين حسب النوع والرافع والشهر واليوم (للأدمن)"""
+    user = get_current_user()
+    if not user or not user.get('is_admin'):
+        return jsonify({'error': 'غير مصرح'}), 403
+    
+    try:
+        days = min(max(int(request.args.get('days', 30)), 1), 366)
+        return jsonify({'success': True, 'days': days, **stats_manager.get_stats(days)})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@api.route('/api/admin/roles', methods=['GET'])
 def admin_get_roles():
     """الحصول على جميع الصلاحيات"""
     user = get_current_user()
@@ -240,7 +495,57 @@ def admin_get_roles():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/admin/roles/create', methods=['POST'])
+@api.route('/api/admin/profile', methods=['GET', 'POST'])
+def admin_profile():
+    """تفعيل التقاط ملفات التعريف لأول N طلب على مسار (POST) أو عرض الحالة (GET)"""
+    user = get_current_user()
+    if not user or not user.get('is_admin'):
+        return jsonify({'error': 'غير مصرح'}), 403
+    
+    try:
+        if request.method == 'GET':
+            return jsonify({'success': True, **request_profiler.status()})
+        
+        data = request.json
+        route = data.get('route')
+        count = int(data.get('count', 5))
+        mode = data.get('mode', 'cprofile')
+        with_tracemalloc = bool(data.get('tracemalloc', False))
+        
+        if not route:
+            return jsonify({'error': 'المسار مطلوب'}), 400
+        
+        if route not in {rule.rule for rule in current_app.url_map.iter_rules()}:
+            return jsonify({'error': 'المسار غير موجود'}), 400
+        
+        if count < 1 or count > 100:
+            return jsonify({'error': 'عدد الطلبات يجب أن يكون بين 1 و 100'}), 400
+        
+        profile_id = request_profiler.arm(route, count, mode, with_tracemalloc)
+        return jsonify({'success': True, 'profile_id': profile_id})
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@api.route('/api/admin/profile/<profile_id>/download', methods=['GET'])
+def admin_download_profile(profile_id: str):
+    """تحميل نتائج التحليل كملف ZIP"""
+    user = get_current_user()
+    if not user or not user.get('is_admin'):
+        return jsonify({'error': 'غير مصرح'}), 403
+    
+    data = request_profiler.bundle(profile_id)
+    if data is None:
+        return jsonify({'error': 'التحليل غير موجود'}), 404
+    
+    return Response(
+        data,
+        mimetype='application/zip',
+        headers={'Content-Disposition': f'attachment; filename="profile-{profile_id}.zip"'}
+    )
+
+@api.route('/api/admin/roles/create', methods=['POST'])
 def admin_create_role():
     """إنشاء صلاحية جديدة"""
     user = get_current_user()
@@ -265,7 +570,7 @@ def admin_create_role():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/admin/users/<int:user_id>/roles', methods=['POST'])
+@api.route('/api/admin/users/<int:user_id>/roles', methods=['POST'])
 def admin_assign_role(user_id):
     """إسناد صلاحية لمستخدم"""
     user = get_current_user()
@@ -292,7 +597,7 @@ def admin_assign_role(user_id):
 # File Routes
 # ========================================
 
-@app.route('/')
+@api.route('/')
 def index() -> Any:
     """صفحة الموقع الرئيسية"""
     try:
@@ -307,46 +612,240 @@ def index() -> Any:
                 return f.read()
         return f"<h1>Error</h1><p>{str(e)}</p><p>TEMPLATE_DIR: {TEMPLATE_DIR}</p>", 500
 
-@app.route('/stream/<file_id>')
+def stream_telegram_file(
+    file_id: str, cache_control: str = "public, max-age=3600", bot_id: Optional[int] = None
+) -> Any:
+    """بث ملف من تليجرام (مشترك بين /stream وروابط المشاركة، bot_id إذا كان معروفاً من السجل)"""
+    # محتوى file_unique_id لا يتغير، لذلك يكفي كمُعرّف ثابت للإعادة بـ 304
+    # قبل أي استدعاء لتليجرام (ومن الذاكرة قبل قاعدة البيانات)
+    unique_id = stream_validators.get(file_id)
+    if unique_id is None and request.if_none_match:
+        unique_id = repos.files.find_unique_id(file_id)
+        if unique_id:
+            stream_validators.set(file_id, unique_id)
+    
+    if unique_id and http_cache.is_not_modified(unique_id):
+        return http_cache.not_modified_response(unique_id, cache_control=cache_control)
+    
+    # معلومات الملف من الذاكرة أو getFile واحد لجميع الطلبات المتزامنة
+    resolved = resolve_telegram_file(file_id, bot_id)
+    
+    if not resolved:
+        logger.warning(f"⚠️ الملف {file_id} غير موجود في تليجرام. جاري الحذف...")
+        repos.files.delete_by_telegram_id(file_id)
+        listing_validators.clear()
+        share_link_manager.forget()
+        event_bus.notify()
+        return "File deleted", 404
+    
+    file_info = resolved[1]
+    unique_id = file_info.get('file_unique_id')
+    if unique_id:
+        stream_validators.set(file_id, unique_id)
+        if http_cache.is_not_modified(unique_id):
+            return http_cache.not_modified_response(unique_id, cache_control=cache_control)
+    
+    # Range (تقديم الفيديو والاستكمال) يُمرر إلى تليجرام
+    total = file_info.get('file_size')
+    start, stop = 0, total
+    if request.range and total:
+        bounds = request.range.range_for_length(total)
+        if bounds is None:
+            return Response(status=416, headers={'Content-Range': f"bytes */{total}"})
+        start, stop = bounds
+    
+    # الانضمام لتحميل جارٍ لنفس الملف أو بدء تحميل جديد
+    try:
+        meta, chunks = stream_coalescer.open(
+            file_id, start, lambda offset: _open_download(resolved[0], file_info['file_path'], offset, total)
+        )
+    except Exception as e:
+        # مسار التحميل ربما انتهت صلاحيته: getFile جديد ومحاولة واحدة أخرى
+        logger.warning(f"⚠️ إعادة محاولة تحميل {file_id}: {e}")
+        telegram_files.pop(file_id)
+        resolved = resolve_telegram_file(file_id, bot_id)
+        if not resolved:
+            return "File not found", 404
+        meta, chunks = stream_coalescer.open(
+            file_id, start, lambda offset: _open_download(resolved[0], resolved[1]['file_path'], offset, total)
+        )
+    
+    content_type = meta.get('content_type')
+    
+    # تحديد طريقة العرض (inline للمعاينة، attachment للتحميل)
+    # PDF يجب أن يعرض inline للمعاينة
+    disposition = "inline" if content_type and (
+        content_type.startswith('image/') or 
+        content_type.startswith('video/') or 
+        content_type == 'application/pdf'
+    ) else "attachment"
+    
+    headers = {"Content-Disposition": disposition, "Accept-Ranges": "bytes"}
+    status = 200
+    if total:
+        headers['Content-Length'] = str(stop - start)
+        chunks = _limit_bytes(chunks, stop - start)
+        if request.range:
+            status = 206
+            headers['Content-Range'] = f"bytes {start}-{stop - 1}/{total}"
+    
+    response = Response(
+        stream_with_context(metrics.count_stream_bytes(chunks)),
+        status=status,
+        mimetype=content_type,
+        headers=headers
+    )
+    return http_cache.apply_validators(response, unique_id, cache_control=cache_control)
+
+def resolve_telegram_file(file_id: str, bot_id: Optional[int] = None) -> Optional[Tuple[str, Dict[str, Any]]]:
+    """
+    (التوكن، نتيجة getFile) من الذاكرة، أو None إذا لم يعد الملف موجوداً في تليجرام
+    
+    bot_id: البوت الذي أصدر file_id (يُبحث عنه في قاعدة البيانات مع نسخ البوتات المساعدة
+    إذا لم يُمرر وفي المجمع أكثر من بوت)
+
+    Raises:
+        Throttled: حد المعدل (الملف موجود، لا يُحذف سجله)
+        UnknownBot: البوت الذي أصدر file_id ليس في المجمع (لا يُحذف سجله)
+    """
+    resolved = telegram_files.get(file_id)
+    if resolved:
+        return resolved
+    
+    def fetch() -> Optional[Tuple[str, Dict[str, Any]]]:
+        issuer, copies, source = bot_id, None, None
+        if bot_pool.size > 1:
+            # المصدر ونسخ البوتات المساعدة حتى يذهب getFile إلى الأقل حملاً منها
+            source = repos.files.find_source(file_id) or {}
+            if issuer is None:
+                issuer = source.get('bot_id')
+            copies = repos.files.copies([source.get('message_id')]).get(source.get('message_id'))
+        r, token = bot_pool.get_file(file_id, issuer, copies)
+        status = classify(r)
+        if status == NOT_FOUND and source is None and bot_id is None:
+            # 400 من الرئيسي لا يكفي للحذف إذا أصدر الملف بوت آخر (أُزيل من الإعدادات)
+            issuer = (repos.files.find_source(file_id) or {}).get('bot_id')
+            if bot_pool.token_for(issuer) != token:
+                r, token = bot_pool.get_file(file_id, issuer)
+                status = classify(r)
+        if status == NOT_FOUND:
+            return None
+        if status == THROTTLED:
+            raise Throttled(bot_pool.retry_after(r))
+        if status != OK:
+            raise Exception(r.json().get('description', f"getFile {r.status_code}"))
+        return token, r.json()['result']
+    
+    resolved = get_file_flights.do(file_id, fetch)
+    if resolved:
+        telegram_files.set(file_id, resolved)
+    return resolved
+
+STREAM_CHUNK_SIZE = 256 * 1024
+
+def _open_range(token: str, file_path: str, first: int, last: Optional[int] = None):
+    """طلب تحميل لمدى من البايتات (يحجز التوكن حتى انتهاء القراءة)"""
+    range_header = f"bytes={first}-{last if last is not None else ''}"
+    req = bot_pool.download(token, file_path, headers={'Range': range_header} if first or last is not None else None)
+    if req.status_code not in (200, 206):
+        req.close()
+        bot_pool.release(token)
+        raise Exception(f"download {req.status_code}")
+    return req
+
+def _open_download(
+    token: str,
+    file_path: str,
+    start: int,
+    total: Optional[int] = None
+) -> Tuple[Dict[str, Any], Any]:
+    """
+    فتح تحميل من تليجرام ابتداءً من start (يُستدعى من خيط التحميل المشترك)
+    
+    الملفات الكبيرة تُجلب بمقاطع Range متوازية؛ المقطع الأول يُفتح هنا لمعرفة
+    نوع المحتوى ودعم الخادم لـ Range قبل بدء البث.
+    """
+    segment = config.STREAM_SEGMENT_MB * 1024 * 1024
+    parallel = min(config.STREAM_PARALLEL_SEGMENTS, config.STREAM_SEGMENT_MEMORY_MB // max(config.STREAM_SEGMENT_MB, 1))
+    segmented = total and parallel > 1 and total - start >= 2 * segment
+    
+    req = _open_range(token, file_path, start, start + segment - 1 if segmented else None)
+    meta = {'content_type': req.headers.get('content-type')}
+    chunks = bot_pool.iter_download(token, req, chunk_size=STREAM_CHUNK_SIZE)
+    
+    if segmented and req.status_code == 206:
+        def open_segment(first: int, last: int):
+            return bot_pool.iter_download(
+                token, _open_range(token, file_path, first, last), chunk_size=STREAM_CHUNK_SIZE
+            )
+        return meta, SegmentedFetch(
+            open_segment, start, total - 1,
+            segment_size=segment, parallel=parallel, first_chunks=chunks
+        )
+    
+    if start and req.status_code == 200:
+        # الخادم تجاهل Range
+        chunks = _skip_bytes(chunks, start)
+    return meta, chunks
+
+def _skip_bytes(chunks, count: int):
+    """تجاوز أول count بايت"""
+    try:
+        for chunk in chunks:
+            if count >= len(chunk):
+                count -= len(chunk)
+                continue
+            yield chunk[count:]
+            count = 0
+    finally:
+        chunks.close()
+
+def _limit_bytes(chunks, count: int):
+    """أول count بايت فقط، مع إغلاق المصدر مبكراً (يفصل المشترك عن التحميل المشترك)"""
+    try:
+        for chunk in chunks:
+            if count <= 0:
+                break
+            yield chunk[:count]
+            count -= len(chunk)
+    finally:
+        chunks.close()
+
+@api.route('/stream/<file_id>')
 def stream_file(file_id: str) -> Tuple[Any, int]:
     """بث الملف مع دعم المعاينة في المتصفح"""
     try:
-        # جلب معلومات الملف من تليجرام
-        r = requests.get(f"{TELEGRAM_API_URL}/getFile?file_id={file_id}")
-        
-        if r.status_code != 200 or not r.json().get('ok'):
-            logger.warning(f"⚠️ الملف {file_id} غير موجود في تليجرام. جاري الحذف...")
-            supabase.table('files').delete().eq('telegram_file_id', file_id).execute()
-            return "File deleted", 404
-            
-        file_path = r.json()['result']['file_path']
-        download_url = f"https://api.telegram.org/file/bot{BOT_TOKEN}/{file_path}"
-        
-        # طلب البث من تليجرام
-        req = requests.get(download_url, stream=True)
-        content_type = req.headers.get('content-type')
-        
-        # تحديد طريقة العرض (inline للمعاينة، attachment للتحميل)
-        # PDF يجب أن يعرض inline للمعاينة
-        disposition = "inline" if content_type and (
-            content_type.startswith('image/') or 
-            content_type.startswith('video/') or 
-            content_type == 'application/pdf'
-        ) else "attachment"
-        
-        return Response(
-            stream_with_context(req.iter_content(chunk_size=1024 * 1024)),
-            mimetype=content_type,
-            headers={
-                "Content-Disposition": disposition,
-                "Cache-Control": "public, max-age=3600"
-            }
-        )
+        return stream_telegram_file(file_id)
+    except Throttled as e:
+        return _telegram_throttled(e)
+    except UnknownBot as e:
+        return _unknown_bot(e)
     except Exception as e:
         logger.error(f"❌ خطأ في البث: {e}")
         return str(e), 500
 
-@app.route('/api/files', methods=['GET'])
+def get_listing_state(
+    search: str,
+    folder: Optional[Dict[str, Any]] = None,
+    scoped: bool = False,
+    recursive: bool = False
+) -> Tuple[Optional[int], Optional[str], int]:
+    """
+    حالة القائمة المستخدمة في ETag: (أحدث id، أحدث created_at، العدد الكلي)
+    
+    العدد يكشف الحذف والنقل، وأحدث ملف يكشف الإضافة. تُحفظ لثوانٍ قليلة حتى لا
+    يكلف التحديث المتكرر من العملاء أي استعلام.
+    """
+    key = (search, folder['path'] if folder else None, scoped, recursive)
+    state = listing_validators.get(key)
+    if state is None:
+        newest, total = repos.files.listing_state(search, folder, scoped, recursive)
+        newest = newest or {}
+        state = (newest.get('id'), newest.get('created_at'), total)
+        listing_validators.set(key, state)
+    return state
+
+@api.route('/api/files', methods=['GET'])
 def get_files():
     """الحصول على قائمة الملفات مع Pagination"""
     user = get_current_user()
@@ -358,29 +857,54 @@ def get_files():
         per_page = int(request.args.get('per_page', 30))
         search = request.args.get('search', '')
         
-        start = (page - 1) * per_page
-        end = start + per_page - 1
+        # الأعمدة المطلوبة (تُمرر إلى استعلام الصفحة)
+        fields_param = request.args.get('fields', '')
+        fields = [f.strip() for f in fields_param.split(',') if f.strip()] or list(FILE_LIST_DEFAULT_FIELDS)
+        unknown = [f for f in fields if f not in FILE_FIELDS]
+        if unknown:
+            return jsonify({
+                'error': f"حقول غير معروفة: {', '.join(unknown)}",
+                'allowed_fields': list(FILE_FIELDS)
+            }), 400
         
-        query = supabase.table('files').select('*', count='exact')
+        # المجلد: بدون folder_id = كل الملفات، root = ملفات الجذر المباشرة
+        folder_param = request.args.get('folder_id', '')
+        recursive = request.args.get('recursive', '').lower() in ('1', 'true', 'yes')
+        scoped = bool(folder_param)
+        folder = None
+        if folder_param and folder_param != 'root':
+            folder = folder_manager.get_folder(int(folder_param))
+            if not folder:
+                return jsonify({'error': 'المجلد غير موجود'}), 404
         
-        # البحث
-        if search:
-            query = query.ilike('file_name', f'%{search}%')
+        start = (page - 1) * per_page
         
-        # الترتيب والتقسيم
-        result = query.order('created_at', desc=True).range(start, end).execute()
+        # التحقق من نسخة العميل قبل جلب الصفحة كاملة
+        newest_id, newest_created_at, total = get_listing_state(search, folder, scoped, recursive)
+        etag = http_cache.make_etag(
+            'files', newest_id, newest_created_at, total, page, per_page, search, ','.join(fields),
+            folder['path'] if folder else folder_param, recursive
+        )
+        last_modified = http_cache.parse_timestamp(newest_created_at)
+        cache_control = 'private, no-cache'
+        if http_cache.is_not_modified(etag, last_modified):
+            return http_cache.not_modified_response(etag, last_modified, cache_control)
         
-        return jsonify({
+        # البحث والترتيب والتقسيم
+        files, total = repos.files.list_page(fields, search, folder, scoped, recursive, start, per_page)
+        
+        response = jsonify({
             'success': True,
-            'files': result.data,
-            'total': result.count,
+            'files': files,
+            'total': total,
             'page': page,
             'per_page': per_page
         })
+        return http_cache.apply_validators(response, etag, last_modified, cache_control)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/upload', methods=['POST'])
+@api.route('/api/upload', methods=['POST'])
 def upload_file() -> Tuple[Any, int]:
     """رفع ملف جديد"""
     user = get_current_user()
@@ -388,7 +912,9 @@ def upload_file() -> Tuple[Any, int]:
         return jsonify({'error': 'غير مصرح'}), 401
     
     # التحقق من صلاحية الرفع
-    if not permission_manager.check_permission(user['user_id'], 'upload'):
+    with span('check_permission'):
+        allowed = permission_manager.check_permission(user['user_id'], 'upload')
+    if not allowed:
         return jsonify({'error': 'ليس لديك صلاحية رفع الملفات'}), 403
     
     try:
@@ -405,6 +931,7 @@ def upload_file() -> Tuple[Any, int]:
         filename = file.filename
         mime_type = file.content_type or 'application/octet-stream'
         file_size = len(file_data)
+        metrics.UPLOAD_SIZE.observe(file_size)
         
         ftype = get_file_type(mime_type)
         endpoint = 'sendDocument'
@@ -423,7 +950,7 @@ def upload_file() -> Tuple[Any, int]:
         
         data = {'chat_id': TARGET_GROUP_ID, 'caption': full_caption}
         
-        resp = requests.post(f"{TELEGRAM_API_URL}/{endpoint}", files=files, data=data)
+        resp, _ = bot_pool.call(endpoint, http_method='POST', primary_only=True, files=files, data=data)
         if not resp.ok:
             raise Exception(f"Telegram Error: {resp.text}")
             
@@ -431,15 +958,16 @@ def upload_file() -> Tuple[Any, int]:
         
         # استخراج file_id
         if 'document' in result:
-            fid = result['document']['file_id']
+            media = result['document']
         elif 'photo' in result:
-            fid = result['photo'][-1]['file_id']
+            media = result['photo'][-1]
         elif 'video' in result:
-            fid = result['video']['file_id']
+            media = result['video']
         elif 'audio' in result:
-            fid = result['audio']['file_id']
+            media = result['audio']
         else:
-            fid = None
+            media = {}
+        fid = media.get('file_id')
 
         if not fid:
             raise Exception("No file_id")
@@ -450,21 +978,28 @@ def upload_file() -> Tuple[Any, int]:
             'file_type': ftype,
             'mime_type': mime_type,
             'telegram_file_id': fid,
+            'file_unique_id': media.get('file_unique_id'),
+            'bot_id': bot_pool.primary_bot_id,
             'message_id': result['message_id'],
             'caption': caption,
             'uploaded_by': user['user_id'],
+            'folder_id': _optional_folder_id(request.form.get('folder_id')),
             'created_at': datetime.utcnow().isoformat()
         }
         
-        supabase.table('files').insert(db_data).execute()
+        repos.files.insert(db_data)
+        listing_validators.clear()
+        event_bus.notify()
         logger.info(f"✅ تم رفع الملف: {filename} بواسطة {user['full_name']}")
         return jsonify({'success': True})
         
+    except Throttled as e:
+        return _telegram_throttled(e, jsonify({'success': False, 'error': 'تليجرام مشغول، حاول بعد قليل'}))
     except Exception as e:
         logger.error(f"❌ فشل الرفع: {e}")
         return jsonify({'success': False, 'error': str(e)}), 500
 
-@app.route('/api/delete_file', methods=['POST'])
+@api.route('/api/delete_file', methods=['POST'])
 def delete_file() -> Tuple[Any, int]:
     """حذف ملف"""
     user = get_current_user()
@@ -472,7 +1007,9 @@ def delete_file() -> Tuple[Any, int]:
         return jsonify({'error': 'غير مصرح'}), 401
     
     # التحقق من صلاحية الحذف
-    if not permission_manager.check_permission(user['user_id'], 'delete'):
+    with span('check_permission'):
+        allowed = permission_manager.check_permission(user['user_id'], 'delete')
+    if not allowed:
         return jsonify({'error': 'ليس لديك صلاحية حذف الملفات'}), 403
     
     try:
@@ -482,13 +1019,16 @@ def delete_file() -> Tuple[Any, int]:
         
         if msg_id:
             # حذف من تليجرام
-            requests.post(f"{TELEGRAM_API_URL}/deleteMessage", json={
+            bot_pool.call('deleteMessage', http_method='POST', primary_only=True, json={
                 'chat_id': TARGET_GROUP_ID, 'message_id': msg_id
             })
 
         if db_id:
             # حذف من قاعدة البيانات
-            supabase.table('files').delete().eq('id', db_id).execute()
+            repos.files.delete(db_id)
+            listing_validators.clear()
+            share_link_manager.forget([db_id])
+            event_bus.notify()
             logger.info(f"🗑️ تم حذف الملف: ID={db_id} بواسطة {user['full_name']}")
             
         return jsonify({'success': True})
@@ -496,7 +1036,496 @@ def delete_file() -> Tuple[Any, int]:
         logger.error(f"❌ فشل الحذف: {e}")
         return jsonify({'success': False, 'error': str(e)}), 500
 
-@app.route('/api/cleanup', methods=['POST'])
+# حدود Bot API: deleteMessages يقبل 100 رسالة كحد أقصى
+DELETE_MESSAGES_BATCH = 100
+BULK_DELETE_MAX_ITEMS = 1000
+
+def _delete_telegram_messages(message_ids: list) -> Dict[int, bool]:
+    """حذف رسائل من المجموعة بدفعات deleteMessages (message_id -> نجاح الدفعة)"""
+    results: Dict[int, bool] = {}
+    for i in range(0, len(message_ids), DELETE_MESSAGES_BATCH):
+        batch = message_ids[i:i + DELETE_MESSAGES_BATCH]
+        payload = {'chat_id': TARGET_GROUP_ID, 'message_ids': batch}
+        ok = False
+        try:
+            resp, _ = bot_pool.call('deleteMessages', http_method='POST', primary_only=True, json=payload)
+            if classify(resp) == THROTTLED:
+                # منظم المعدل يؤخر المحاولة الثانية حتى انتهاء retry_after
+                resp, _ = bot_pool.call('deleteMessages', http_method='POST', primary_only=True, json=payload)
+            ok = resp.ok
+            if not ok:
+                logger.warning(f"⚠️ فشل deleteMessages لدفعة من {len(batch)} رسالة: {resp.text}")
+        except Exception as e:
+            logger.warning(f"⚠️ خطأ في deleteMessages: {e}")
+        results.update({message_id: ok for message_id in batch})
+    return results
+
+@api.route('/api/files/bulk_delete', methods=['POST'])
+def bulk_delete_files() -> Tuple[Any, int]:
+    """حذف عدة ملفات في طلب واحد مع نتيجة لكل ملف"""
+    user = get_current_user()
+    if not user:
+        return jsonify({'error': 'غير مصرح'}), 401
+    
+    with span('check_permission'):
+        allowed = permission_manager.check_permission(user['user_id'], 'delete')
+    if not allowed:
+        return jsonify({'error': 'ليس لديك صلاحية حذف الملفات'}), 403
+    
+    try:
+        data = request.json or {}
+        try:
+            ids = list(dict.fromkeys(int(file_id) for file_id in data.get('ids', [])))
+        except (TypeError, ValueError):
+            return jsonify({'error': 'معرفات غير صالحة'}), 400
+        
+        if not ids:
+            return jsonify({'error': 'لم يتم تحديد ملفات'}), 400
+        if len(ids) > BULK_DELETE_MAX_ITEMS:
+            return jsonify({'error': f'الحد الأقصى {BULK_DELETE_MAX_ITEMS} ملف في الطلب'}), 400
+        
+        rows = repos.files.get_many(ids, ('id', 'message_id'))
+        message_by_id = {row['id']: row.get('message_id') for row in rows}
+        
+        telegram = _delete_telegram_messages(
+            sorted({message_id for message_id in message_by_id.values() if message_id})
+        )
+        
+        # صفوف الدفعات الفاشلة تبقى حتى لا تُفقد رسائل ما زالت في المجموعة
+        deleted = [file_id for file_id, message_id in message_by_id.items()
+                   if not message_id or telegram.get(message_id)]
+        if deleted:
+            repos.files.delete_many(deleted)
+            listing_validators.clear()
+            share_link_manager.forget(deleted)
+            event_bus.notify()
+        
+        results = []
+        for file_id in ids:
+            if file_id not in message_by_id:
+                results.append({'id': file_id, 'status': 'not_found'})
+                continue
+            message_id = message_by_id[file_id]
+            if message_id and not telegram.get(message_id):
+                results.append({'id': file_id, 'status': 'failed', 'telegram': 'failed'})
+                continue
+            results.append({
+                'id': file_id,
+                'status': 'deleted',
+                'telegram': 'deleted' if message_id else 'no_message'
+            })
+        
+        failed = len(message_by_id) - len(deleted)
+        if failed:
+            logger.warning(f"⚠️ تعذر حذف {failed} رسالة من تليجرام، بقيت ملفاتها في قاعدة البيانات")
+        logger.info(f"🗑️ تم حذف {len(deleted)} ملف دفعة واحدة بواسطة {user['full_name']}")
+        return jsonify({'success': True, 'deleted': len(deleted), 'failed': failed, 'results': results})
+    except Exception as e:
+        logger.error(f"❌ فشل الحذف الجماعي: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+# الأنواع المضغوطة أصلاً (صور، فيديو، zip ...) تُخزن في الأرشيف بدون ضغط
+ZIP_DEFLATE_MIMETYPES = {
+    'application/json', 'application/xml', 'application/javascript', 'application/x-ndjson',
+    'application/msword', 'application/vnd.ms-excel', 'application/rtf', 'image/svg+xml', 'image/bmp'
+}
+ZIP_CHUNK_SIZE = 256 * 1024
+
+def _open_telegram_stream(
+    telegram_file_id: str, bot_id: Optional[int] = None, copies: Optional[Dict[int, str]] = None
+):
+    """فتح تحميل ملف من تليجرام (يُستدعى في خيط الجلب المسبق)"""
+    r, token = bot_pool.get_file(telegram_file_id, bot_id, copies)
+    if classify(r) != OK:
+        raise Exception(r.json().get('description', f"getFile {r.status_code}"))
+    
+    req = bot_pool.download(token, r.json()['result']['file_path'])
+    if not req.ok:
+        req.close()
+        bot_pool.release(token)
+        raise Exception(f"download {req.status_code}")
+    return bot_pool.iter_download(token, req, chunk_size=ZIP_CHUNK_SIZE)
+
+@api.route('/api/files/zip', methods=['GET', 'POST'])
+def download_zip():
+    """تحميل عدة ملفات كأرشيف ZIP يُنشأ أثناء البث"""
+    user = get_current_user(stream_scope='zip')
+    if not user:
+        return jsonify({'error': 'غير مصرح'}), 401
+    
+    try:
+        if request.method == 'POST':
+            raw_ids = (request.get_json(silent=True) or {}).get('ids') or request.form.get('ids', '').split(',')
+        else:
+            raw_ids = request.args.get('ids', '').split(',')
+        try:
+            ids = list(dict.fromkeys(int(file_id) for file_id in raw_ids if str(file_id).strip()))
+        except (TypeError, ValueError):
+            return jsonify({'error': 'معرفات غير صالحة'}), 400
+        
+        if not ids:
+            return jsonify({'error': 'لم يتم تحديد ملفات'}), 400
+        if len(ids) > config.ZIP_MAX_FILES:
+            return jsonify({'error': f'الحد الأقصى {config.ZIP_MAX_FILES} ملف في الأرشيف'}), 400
+        
+        rows = repos.files.get_many(
+            ids, ('id', 'file_name', 'file_size', 'mime_type', 'telegram_file_id', 'bot_id', 'message_id', 'created_at')
+        )
+        if not rows:
+            return jsonify({'error': 'الملفات غير موجودة'}), 404
+        copies = repos.files.copies([row.get('message_id') for row in rows]) if bot_pool.size > 1 else {}
+        
+        # نفس ترتيب الطلب
+        order = {file_id: index for index, file_id in enumerate(ids)}
+        rows.sort(key=lambda row: order[row['id']])
+        
+        members = []
+        for row in rows:
+            mime_type = row.get('mime_type') or ''
+            members.append(ZipMember(
+                row['file_name'],
+                lambda file_id=row['telegram_file_id'], bot_id=row.get('bot_id'), copies=copies.get(row.get('message_id')):
+                    _open_telegram_stream(file_id, bot_id, copies),
+                size=row.get('file_size') or None,
+                compress=mime_type.startswith('text/') or mime_type in ZIP_DEFLATE_MIMETYPES,
+                date_time=http_cache.parse_timestamp(row.get('created_at'))
+            ))
+        
+        filename = f"archive-{datetime.utcnow().strftime('%Y%m%d-%H%M%S')}.zip"
+        logger.info(f"📦 تحميل {len(members)} ملف كأرشيف ZIP بواسطة {user['full_name']}")
+        return Response(
+            stream_with_context(metrics.count_stream_bytes(
+                stream_zip(members, prefetch=config.ZIP_PREFETCH, queue_chunks=config.ZIP_QUEUE_CHUNKS)
+            )),
+            mimetype='application/zip',
+            headers={'Content-Disposition': f'attachment; filename="{filename}"', 'Cache-Control': 'no-store'}
+        )
+    except Exception as e:
+        logger.error(f"❌ فشل إنشاء الأرشيف: {e}")
+        return jsonify({'error': str(e)}), 500
+
+# ========================================
+# Folder Routes
+# ========================================
+
+def _optional_folder_id(value: Any) -> Optional[int]:
+    """تحويل معرف مجلد من الطلب (None أو "root" = الجذر)"""
+    if value is None or value == '' or value == 'root':
+        return None
+    return int(value)
+
+@api.route('/api/folders', methods=['GET'])
+def get_folders():
+    """المجلدات الفرعية لمجلد مع إجمالياتها ومسار التنقل"""
+    user = get_current_user()
+    if not user:
+        return jsonify({'error': 'غير مصرح'}), 401
+    
+    try:
+        parent_id = _optional_folder_id(request.args.get('parent_id'))
+        folder = None
+        if parent_id is not None:
+            folder = folder_manager.get_folder(parent_id)
+            if not folder:
+                return jsonify({'error': 'المجلد غير موجود'}), 404
+        
+        return jsonify({
+            'success': True,
+            'folder': folder,
+            'breadcrumbs': folder_manager.get_breadcrumbs(folder) if folder else [],
+            'folders': folder_manager.list_children(parent_id)
+        })
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@api.route('/api/folders/create', methods=['POST'])
+def create_folder():
+    """إنشاء مجلد"""
+    user = get_current_user()
+    if not user:
+        return jsonify({'error': 'غير مصرح'}), 401
+    
+    if not permission_manager.check_permission(user['user_id'], 'edit'):
+        return jsonify({'error': 'ليس لديك صلاحية إدارة المجلدات'}), 403
+    
+    try:
+        data = request.json
+        success, folder, message = folder_manager.create_folder(
+            data.get('name'), _optional_folder_id(data.get('parent_id')), user['user_id']
+        )
+        
+        if success:
+            return jsonify({'success': True, 'folder': folder, 'message': message})
+        else:
+            return jsonify({'success': False, 'error': message}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@api.route('/api/folders/<int:folder_id>/rename', methods=['POST'])
+def rename_folder(folder_id: int):
+    """إعادة تسمية مجلد"""
+    user = get_current_user()
+    if not user:
+        return jsonify({'error': 'غير مصرح'}), 401
+    
+    if not permission_manager.check_permission(user['user_id'], 'edit'):
+        return jsonify({'error': 'ليس لديك صلاحية إدارة المجلدات'}), 403
+    
+    try:
+        success, message = folder_manager.rename_folder(folder_id, request.json.get('name'))
+        
+        if success:
+            return jsonify({'success': True, 'message': message})
+        else:
+            return jsonify({'success': False, 'error': message}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@api.route('/api/folders/<int:folder_id>/move', methods=['POST'])
+def move_folder(folder_id: int):
+    """نقل مجلد بشجرته"""
+    user = get_current_user()
+    if not user:
+        return jsonify({'error': 'غير مصرح'}), 401
+    
+    if not permission_manager.check_permission(user['user_id'], 'edit'):
+        return jsonify({'error': 'ليس لديك صلاحية إدارة المجلدات'}), 403
+    
+    try:
+        success, message = folder_manager.move_folder(
+            folder_id, _optional_folder_id(request.json.get('parent_id'))
+        )
+        
+        if success:
+            listing_validators.clear()
+            return jsonify({'success': True, 'message': message})
+        else:
+            return jsonify({'success': False, 'error': message}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@api.route('/api/folders/<int:folder_id>/delete', methods=['POST'])
+def delete_folder(folder_id: int):
+    """حذف مجلد فارغ"""
+    user = get_current_user()
+    if not user:
+        return jsonify({'error': 'غير مصرح'}), 401
+    
+    if not permission_manager.check_permission(user['user_id'], 'delete'):
+        return jsonify({'error': 'ليس لديك صلاحية حذف المجلدات'}), 403
+    
+    try:
+        success, message = folder_manager.delete_folder(folder_id)
+        
+        if success:
+            return jsonify({'success': True, 'message': message})
+        else:
+            return jsonify({'success': False, 'error': message}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@api.route('/api/files/move', methods=['POST'])
+def move_files():
+    """نقل ملفات إلى مجلد"""
+    user = get_current_user()
+    if not user:
+        return jsonify({'error': 'غير مصرح'}), 401
+    
+    if not permission_manager.check_permission(user['user_id'], 'edit'):
+        return jsonify({'error': 'ليس لديك صلاحية نقل الملفات'}), 403
+    
+    try:
+        data = request.json
+        file_ids = [int(file_id) for file_id in data.get('file_ids', [])]
+        success, moved, message = folder_manager.move_files(
+            file_ids, _optional_folder_id(data.get('folder_id'))
+        )
+        
+        if success:
+            listing_validators.clear()
+            return jsonify({'success': True, 'moved': moved, 'message': message})
+        else:
+            return jsonify({'success': False, 'error': message}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+# ========================================
+# File Events (SSE)
+# ========================================
+
+def _sse_message(event: Dict[str, Any]) -> str:
+    """تنسيق حدث بصيغة text/event-stream"""
+    if event is RESET:
+        return "event: reset\ndata: {}\n\n"
+    data = current_app.json.dumps({'type': event['type'], 'file_id': event['file_id'], 'file': event['file']})
+    return f"id: {event['id']}\nevent: file\ndata: {data}\n\n"
+
+@api.route('/api/events', methods=['GET'])
+def file_events():
+    """بث أحداث إضافة وحذف الملفات (Server-Sent Events) مع الاستئناف من Last-Event-ID"""
+    user = get_current_user(stream_scope='events')
+    if not user:
+        return jsonify({'error': 'غير مصرح'}), 401
+    
+    # مع عمال sync يحجز كل متصفح مفتوح عاملاً كاملاً: الواجهة تكتفي بتحديث القائمة يدوياً
+    if not config.get_sse_max_clients():
+        return jsonify({'error': 'بث الأحداث غير مفعّل على هذا الخادم'}), 503
+    
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    try:
+        last_event_id = int(last_event_id) if last_event_id else None
+    except ValueError:
+        last_event_id = None
+    
+    subscription = event_bus.subscribe(last_event_id)
+    if subscription is None:
+        response = jsonify({'error': 'عدد الاتصالات كبير، حاول لاحقاً'})
+        response.headers['Retry-After'] = '10'
+        return response, 503
+    
+    def generate():
+        try:
+            # retry: مدة انتظار المتصفح قبل إعادة الاتصال
+            yield "retry: 3000\n\n"
+            deadline = time.monotonic() + config.get_sse_connection_seconds()
+            while time.monotonic() < deadline:
+                event = subscription.get(timeout=config.SSE_HEARTBEAT_SECONDS)
+                if event is None:
+                    # تعليق للإبقاء على الاتصال عبر الوسطاء واكتشاف العملاء المنقطعين
+                    yield ": ping\n\n"
+                    continue
+                yield _sse_message(event)
+                if event is RESET:
+                    break
+        finally:
+            event_bus.unsubscribe(subscription)
+    
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+# ========================================
+# Share Link Routes
+# ========================================
+
+@api.route('/api/share/create', methods=['POST'])
+def create_share_link():
+    """إنشاء رابط مشاركة لملف"""
+    user = get_current_user()
+    if not user:
+        return jsonify({'error': 'غير مصرح'}), 401
+    
+    try:
+        data = request.json
+        file_db_id = data.get('file_id')
+        expires_in_hours = int(data.get('expires_in_hours', 24))
+        
+        if not file_db_id:
+            return jsonify({'error': 'معرف الملف مطلوب'}), 400
+        
+        if expires_in_hours < 1 or expires_in_hours > config.SHARE_LINK_MAX_HOURS:
+            return jsonify({'error': 'مدة صلاحية الرابط غير صالحة'}), 400
+        
+        success, link, message = share_link_manager.create_link(
+            int(file_db_id), user['user_id'], expires_in_hours
+        )
+        
+        if success:
+            link['url'] = f"{request.host_url}s/{link['token']}"
+            return jsonify({'success': True, 'link': link, 'message': message})
+        else:
+            return jsonify({'success': False, 'error': message}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@api.route('/api/share/revoke', methods=['POST'])
+def revoke_share_link():
+    """إلغاء رابط مشاركة"""
+    user = get_current_user()
+    if not user:
+        return jsonify({'error': 'غير مصرح'}), 401
+    
+    try:
+        data = request.json
+        link_id = data.get('link_id')
+        
+        if not link_id:
+            return jsonify({'error': 'معرف الرابط مطلوب'}), 400
+        
+        success, message = share_link_manager.revoke_link(int(link_id), user)
+        
+        if success:
+            return jsonify({'success': True, 'message': message})
+        else:
+            return jsonify({'success': False, 'error': message}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@api.route('/s/<token>')
+def shared_file(token: str) -> Tuple[Any, int]:
+    """فتح ملف عبر رابط مشاركة (بدون تسجيل دخول)"""
+    try:
+        link = share_link_manager.verify_token(token)
+        if not link:
+            return "Link expired or invalid", 404
+        
+        file_info = share_link_manager.get_file_info(link['file_id'])
+        if not file_info:
+            return "File not found", 404
+        
+        share_link_manager.record_access(token)
+        return stream_telegram_file(
+            file_info['telegram_file_id'],
+            cache_control="private, max-age=300",
+            bot_id=file_info.get('bot_id')
+        )
+    except Throttled as e:
+        return _telegram_throttled(e)
+    except UnknownBot as e:
+        return _unknown_bot(e)
+    except Exception as e:
+        logger.error(f"❌ خطأ في رابط المشاركة: {e}")
+        return str(e), 500
+
+@api.route('/api/admin/export', methods=['GET'])
+def admin_export() -> Any:
+    """
+    تصدير جدول الملفات كاملاً بصيغة NDJSON أو CSV (للنسخ الاحتياطي والتكامل)
+    
+    ?format=ndjson|csv &fields=... &uploaders=1 &since=<X-Export-Watermark من تصدير سابق>
+    """
+    user = get_current_user()
+    if not user or not user.get('is_admin'):
+        return jsonify({'error': 'غير مصرح'}), 403
+    
+    fmt = request.args.get('format', 'ndjson')
+    since = request.args.get('since', '')
+    fields = [f.strip() for f in request.args.get('fields', '').split(',') if f.strip()]
+    with_uploaders = request.args.get('uploaders', '').lower() in ('1', 'true', 'yes')
+    try:
+        exporter = CatalogExporter(repos, config.EXPORT_BATCH_SIZE, config.EXPORT_SAFETY_LAG_SECONDS)
+        watermark, chunks = exporter.open(fmt, fields, since or None, with_uploaders)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f"❌ فشل بدء التصدير: {e}")
+        return jsonify({'error': str(e)}), 500
+    
+    logger.info(f"📤 تصدير الملفات ({fmt}{'، تغييرات' if since else ''}) بواسطة {user['full_name']}")
+    return Response(
+        stream_with_context(metrics.count_stream_bytes(chunks)),
+        mimetype=EXPORT_FORMATS[fmt],
+        headers={
+            'Content-Disposition': f'attachment; filename="{export_filename(fmt, bool(since))}"',
+            'X-Export-Watermark': watermark,
+            'Cache-Control': 'no-store',
+            'X-Accel-Buffering': 'no'
+        }
+    )
+
+@api.route('/api/cleanup', methods=['POST'])
 def cleanup() -> Tuple[Any, int]:
     """تنظيف الملفات المحذوفة"""
     user = get_current_user()
@@ -505,19 +1534,7 @@ def cleanup() -> Tuple[Any, int]:
     
     try:
         logger.info("🧹 بدء عملية التنظيف اليدوي...")
-        result = supabase.table('files').select('id, telegram_file_id').execute()
-        files = result.data
-        
-        deleted_count = 0
-        for file in files:
-            file_id = file['telegram_file_id']
-            r = requests.get(f"{TELEGRAM_API_URL}/getFile?file_id={file_id}")
-            
-            if r.status_code != 200 or not r.json().get('ok'):
-                supabase.table('files').delete().eq('id', file['id']).execute()
-                deleted_count += 1
-            
-            time.sleep(0.3)
+        deleted_count = cleanup_deleted_files(repos, bot_pool, 'manual')
         
         logger.info(f"✅ انتهت عملية التنظيف. تم حذف {deleted_count} ملف")
         return jsonify({'success': True, 'deleted_count': deleted_count})
@@ -525,45 +1542,67 @@ def cleanup() -> Tuple[Any, int]:
         logger.error(f"❌ فشل التنظيف: {e}")
         return jsonify({'success': False, 'error': str(e)}), 500
 
-@app.route('/health')
+@api.route('/health')
 def health() -> Any:
     """فحص صحة الخادم"""
     return jsonify({'status': 'ok', 'version': '3.0'})
 
-def cleanup_deleted_files() -> None:
-    """تنظيف دوري تلقائي للملفات المحذوفة"""
-    time.sleep(5 * 60)
+# ========================================
+# Application Factory
+# ========================================
+
+def create_app() -> Flask:
+    """
+    إنشاء تطبيق Flask: التحقق من الإعدادات وربط المسارات فقط، وعملاء الشبكة
+    تُنشأ عند أول استخدام في كل عملية (آمن للتحميل المسبق في gunicorn)
+    """
+    started = time.perf_counter()
+    config.validate()
+    logger.info(f"📄 TEMPLATE_DIR: {TEMPLATE_DIR} (موجود: {os.path.exists(TEMPLATE_DIR)})")
     
-    while True:
+    flask_app = Flask(__name__, template_folder=TEMPLATE_DIR, static_folder=STATIC_DIR)
+    CORS(flask_app)
+    if config.TRUSTED_PROXY_COUNT:
+        flask_app.wsgi_app = ProxyFix(flask_app.wsgi_app, x_for=config.TRUSTED_PROXY_COUNT)
+    install_json_provider(flask_app)
+    flask_app.secret_key = config.SECRET_KEY or os.urandom(24).hex()
+    flask_app.register_blueprint(api)
+    
+    # استقبال تحديثات البوت عبر webhook مع الـ API
+    if config.BOT_MODE == 'webhook':
+        webhook_dispatcher = WebhookDispatcher(create_bot_application, config.WEBHOOK_SECRET)
+        register_webhook_route(flask_app, webhook_dispatcher)
+    
+    startup.record_phase('create_app', started)
+    startup.log_report(config.STARTUP_TIMING_TOP)
+    return flask_app
+
+def init_worker() -> None:
+    """تجهيز عملاء الشبكة في العامل بعد fork حتى لا يدفع أول طلب تكلفة إنشائها"""
+    for client in WORKER_CLIENTS:
         try:
-            logger.info("🧹 بدء عملية التنظيف التلقائي...")
-            
-            result = supabase.table('files').select('id, telegram_file_id, file_name').execute()
-            files = result.data
-            
-            deleted_count = 0
-            for file in files:
-                file_id = file['telegram_file_id']
-                r = requests.get(f"{TELEGRAM_API_URL}/getFile?file_id={file_id}")
-                
-                if r.status_code != 200 or not r.json().get('ok'):
-                    supabase.table('files').delete().eq('id', file['id']).execute()
-                    deleted_count += 1
-                    logger.info(f"🗑️ تم حذف: {file.get('file_name', 'unknown')}")
-                
-                time.sleep(0.5)
-            
-            logger.info(f"✅ انتهت عملية التنظيف التلقائي. تم حذف {deleted_count} ملف")
-            
+            client.get()
         except Exception as e:
-            logger.error(f"❌ خطأ في التنظيف التلقائي: {e}")
-        
-        time.sleep(6 * 60 * 60)
+            # يُعاد إنشاء العميل عند أول استخدام
+            logger.warning(f"⚠️ تعذر تجهيز {client!r}: {e}")
+
+_app: Optional[Flask] = None
+_app_lock = threading.Lock()
+
+def __getattr__(name: str) -> Any:
+    """توافق مع from src.api.main import app (و gunicorn src.api.main:app)"""
+    global _app
+    if name != 'app':
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    with _app_lock:
+        if _app is None:
+            _app = create_app()
+    return _app
 
 if __name__ == '__main__':
-    # بدء خيط التنظيف التلقائي
-    cleanup_thread = threading.Thread(target=cleanup_deleted_files, daemon=True)
-    cleanup_thread.start()
+    # بدء المهام الدورية (في الإنتاج تعمل كعملية مستقلة: python run.py jobs)
+    jobs_thread = threading.Thread(target=create_job_runner(repos, bot_pool).run, daemon=True)
+    jobs_thread.start()
     
     logger.info("=" * 60)
     logger.info("🚀 بدء تشغيل خادم الأرشيف v3.0...")
@@ -573,4 +1612,4 @@ if __name__ == '__main__':
     logger.info("=" * 60)
     
     port = int(os.environ.get('PORT', 8080))
-    app.run(host='0.0.0.0', port=port)
+    create_app().run(host='0.0.0.0', port=port)
@@ -6,14 +6,14 @@ Bot Handlers Module
 """
 
 import logging
-from datetime import datetime
+from datetime import datetime, timezone
 from typing import Optional, Dict, Any
 
 from telegram import Update, PhotoSize, Document, Video, Audio, Message
 from telegram.ext import ContextTypes
-from supabase import Client
-
 from ..core.config import config
+from ..db.base import FileRepository
+from ..utils import metrics
 
 logger = logging.getLogger(__name__)
 
@@ -21,8 +21,8 @@ logger = logging.getLogger(__name__)
 class FileHandler:
     """معالج الملفات"""
     
-    def __init__(self, supabase: Client, target_group_id: int):
-        self.supabase = supabase
+    def __init__(self, files: FileRepository, target_group_id: int):
+        self.files = files
         self.target_group_id = target_group_id
     
     async def handle_file(
@@ -41,6 +41,11 @@ class FileHandler:
             
             if file_info:
                 await self._save_to_database(file_info)
+                metrics.BOT_INGESTED_FILES.labels(file_info['file_type']).inc()
+                if message.date:
+                    metrics.BOT_INGEST_LAG.observe(
+                        (datetime.now(timezone.utc) - message.date).total_seconds()
+                    )
                 logger.info(
                     f"✅ تم حفظ الملف: {file_info['file_name']} "
                     f"(النوع: {file_info['file_type']})"
@@ -56,6 +61,7 @@ class FileHandler:
     ) -> Optional[Dict[str, Any]]:
         """استخراج معلومات الملف من الرسالة"""
         file_id = None
+        file_unique_id = None
         file_name = "Unnamed"
         file_type = "unknown"
         file_size = 0
@@ -65,6 +71,7 @@ class FileHandler:
         if message.document:
             doc = message.document
             file_id = doc.file_id
+            file_unique_id = doc.file_unique_id
             file_name = doc.file_name or "document"
             file_type = "document"
             file_size = doc.file_size or 0
@@ -73,6 +80,7 @@ class FileHandler:
         elif message.photo:
             photo = message.photo[-1]  # أكبر حجم
             file_id = photo.file_id
+            file_unique_id = photo.file_unique_id
             file_name = f"photo_{message.message_id}.jpg"
             file_type = "photo"
             file_size = photo.file_size or 0
@@ -81,6 +89,7 @@ class FileHandler:
         elif message.video:
             video = message.video
             file_id = video.file_id
+            file_unique_id = video.file_unique_id
             file_name = video.file_name or f"video_{message.message_id}.mp4"
             file_type = "video"
             file_size = video.file_size or 0
@@ -89,6 +98,7 @@ class FileHandler:
         elif message.audio:
             audio = message.audio
             file_id = audio.file_id
+            file_unique_id = audio.file_unique_id
             file_name = audio.file_name or f"audio_{message.message_id}.mp3"
             file_type = "audio"
             file_size = audio.file_size or 0
@@ -97,6 +107,7 @@ class FileHandler:
         elif message.voice:
             voice = message.voice
             file_id = voice.file_id
+            file_unique_id = voice.file_unique_id
             file_name = f"voice_{message.message_id}.ogg"
             file_type = "voice"
             file_size = voice.file_size or 0
@@ -127,6 +138,8 @@ class FileHandler:
         
         return {
             "file_id": file_id,
+            "file_unique_id": file_unique_id,
+            "bot_id": context.bot.id,
             "file_name": file_name,
             "file_type": file_type,
             "file_size": file_size,
@@ -141,8 +154,10 @@ class FileHandler:
     async def _save_to_database(self, file_info: Dict[str, Any]) -> None:
         """حفظ معلومات الملف في قاعدة البيانات"""
         try:
-            self.supabase.table('files').insert({
+            self.files.insert({
                 "telegram_file_id": file_info["file_id"],
+                "file_unique_id": file_info["file_unique_id"],
+                "bot_id": file_info["bot_id"],
                 "file_name": file_info["file_name"],
                 "file_type": file_info["file_type"],
                 "file_size": file_info["file_size"],
@@ -152,7 +167,7 @@ class FileHandler:
                 "caption": file_info["caption"],
                 "uploaded_by": file_info["uploaded_by"],
                 "created_at": file_info["uploaded_at"]
-            }).execute()
+            })
         
         except Exception as e:
             logger.error(f"❌ خطأ في حفظ الملف في قاعدة البيانات: {e}")
@@ -162,8 +177,8 @@ class FileHandler:
 class DeletionHandler:
     """معالج حذف الرسائل"""
     
-    def __init__(self, supabase: Client, target_group_id: int):
-        self.supabase = supabase
+    def __init__(self, files: FileRepository, target_group_id: int):
+        self.files = files
         self.target_group_id = target_group_id
     
     async def handle_deletion(
@@ -180,11 +195,7 @@ class DeletionHandler:
             deleted_message_id = update.message.message_id
             
             # حذف السجل من قاعدة البيانات
-            result = self.supabase.table('files').delete().eq(
-                'message_id', deleted_message_id
-            ).execute()
-            
-            if result.data:
+            if self.files.delete_by_message_id(deleted_message_id):
                 logger.info(
                     f"✅ تم حذف الملف من قاعدة البيانات "
                     f"(message_id: {deleted_message_id})"
@@ -5,12 +5,15 @@ Telegram File Archive Bot v3.0
 نقطة بدء البوت الرئيسية
 """
 
+import asyncio
 import logging
-from telegram import Update
 from telegram.ext import Application, MessageHandler, filters
 
 from supabase import create_client
 from ..core.config import config
+from ..db import create_repositories
+from ..utils import heartbeat
+from ..utils.metrics import instrument_supabase
 from .handlers import FileHandler, DeletionHandler
 
 # إعداد السجلات
@@ -32,14 +35,22 @@ def create_bot_application() -> Application:
         raise
     
     # إنشاء عميل Supabase
-    supabase = create_client(config.SUPABASE_URL, config.SUPABASE_KEY)
+    supabase = instrument_supabase(create_client(config.SUPABASE_URL, config.SUPABASE_KEY))
+    
+    repos = create_repositories(supabase)
     
     # إنشاء المعالجات
-    file_handler = FileHandler(supabase, config.TARGET_GROUP_ID)
-    deletion_handler = DeletionHandler(supabase, config.TARGET_GROUP_ID)
+    file_handler = FileHandler(repos.files, config.TARGET_GROUP_ID)
+    deletion_handler = DeletionHandler(repos.files, config.TARGET_GROUP_ID)
     
-    # إنشاء التطبيق
-    application = Application.builder().token(config.BOT_TOKEN).build()
+    # إنشاء التطبيق (TELEGRAM_API_BASE يسمح بخادم Bot API محلي أو وهمي)
+    application = (
+        Application.builder()
+        .token(config.BOT_TOKEN)
+        .base_url(f"{config.TELEGRAM_API_BASE}/bot")
+        .base_file_url(f"{config.TELEGRAM_API_BASE}/file/bot")
+        .build()
+    )
     
     # تسجيل معالجات الرسائل
     application.add_handler(
@@ -57,13 +68,27 @@ def create_bot_application() -> Application:
     return application
 
 
+async def _start_heartbeat(application: Application) -> None:
+    """تحديث ملف النبض من داخل حلقة الأحداث (يتوقف إذا تجمدت الحلقة)"""
+    path = heartbeat.heartbeat_path('bot')
+    
+    async def beat() -> None:
+        while True:
+            heartbeat.touch(path)
+            await asyncio.sleep(config.HEARTBEAT_INTERVAL_SECONDS)
+    
+    application.bot_data['heartbeat_task'] = asyncio.create_task(beat())
+
+
 def run_bot():
-    """تشغيل البوت"""
+    """تشغيل البوت (polling) كعملية مستقلة"""
     logger.info("🚀 بدء تشغيل البوت...")
     
     try:
         application = create_bot_application()
-        application.run_polling(allowed_updates=Update.ALL_TYPES)
+        application.post_init = _start_heartbeat
+        # run_polling يتعامل مع SIGTERM/SIGINT ويوقف البوت بهدوء
+        application.run_polling(allowed_updates=config.ALLOWED_UPDATES)
     
     except Exception as e:
         logger.error(f"❌ خطأ في تشغيل البوت: {e}")
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Bot Webhook Module
+استقبال تحديثات تليجرام عبر webhook وتمريرها لمعالجات البوت
+
+كل عملية تشغّل تطبيق البوت في حلقة أحداث خاصة بها داخل خيط خلفي، لذلك يمكن
+تشغيل أكثر من نسخة من المستقبل خلف موزع حمل دون أي حالة مشتركة بينها.
+"""
+
+import asyncio
+import hmac
+import logging
+import os
+import threading
+from typing import Any, Callable, Dict, Optional
+
+from flask import Flask, Response, jsonify, request
+from telegram import Update
+from telegram.ext import Application
+
+from ..core.config import config
+from ..utils import metrics
+
+logger = logging.getLogger(__name__)
+
+SECRET_HEADER = 'X-Telegram-Bot-Api-Secret-Token'
+
+
+class WebhookDispatcher:
+    """تمرير تحديثات webhook إلى تطبيق البوت في حلقة أحداث خلفية"""
+
+    def __init__(
+        self,
+        application_factory: Callable[[], Application],
+        secret: str,
+        process_timeout: float = 25.0
+    ):
+        self.application_factory = application_factory
+        self.secret = secret
+        self.process_timeout = process_timeout
+        self._application: Optional[Application] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._pid: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def verify(self, token: Optional[str]) -> bool:
+        """التحقق من السر المرسل في ترويسة تليجرام"""
+        if not self.secret:
+            return False
+        return hmac.compare_digest((token or '').encode(), self.secret.encode())
+
+    def _ensure_started(self) -> None:
+        """تشغيل تطبيق البوت مرة واحدة لكل عملية (بعد fork في gunicorn)"""
+        if self._loop and self._pid == os.getpid():
+            return
+
+        with self._lock:
+            if self._loop and self._pid == os.getpid():
+                return
+
+            loop = asyncio.new_event_loop()
+            application = self.application_factory()
+            threading.Thread(target=loop.run_forever, name='bot-webhook-loop', daemon=True).start()
+            asyncio.run_coroutine_threadsafe(application.initialize(), loop).result(timeout=30)
+
+            self._application, self._loop, self._pid = application, loop, os.getpid()
+            logger.info(f"🤖 تم تشغيل مستقبل webhook (pid {self._pid})")
+
+    def dispatch(self, payload: Dict[str, Any]) -> bool:
+        """معالجة تحديث واحد وانتظار انتهائه قبل الرد على تليجرام"""
+        self._ensure_started()
+        update = Update.de_json(payload, self._application.bot)
+        if update is None:
+            return False
+
+        # الرد بعد انتهاء المعالجة يجعل max_connections حداً طبيعياً للضغط
+        future = asyncio.run_coroutine_threadsafe(
+            self._application.process_update(update), self._loop
+        )
+        future.result(timeout=self.process_timeout)
+        return True
+
+    def shutdown(self) -> None:
+        """إيقاف تطبيق البوت وحلقة الأحداث"""
+        if not self._loop or self._pid != os.getpid():
+            return
+        try:
+            asyncio.run_coroutine_threadsafe(self._application.shutdown(), self._loop).result(timeout=10)
+        except Exception as e:
+            logger.warning(f"⚠️ خطأ أثناء إيقاف مستقبل webhook: {e}")
+        self._loop.call_soon_threadsafe(self._loop.stop)
+
+
+def register_webhook_route(app: Flask, dispatcher: WebhookDispatcher, path: str = None) -> None:
+    """إضافة مسار webhook إلى تطبيق Flask"""
+
+    def telegram_webhook() -> Any:
+        if not dispatcher.verify(request.headers.get(SECRET_HEADER)):
+            metrics.BOT_WEBHOOK_UPDATES.labels('forbidden').inc()
+            return jsonify({'ok': False}), 403
+
+        payload = request.get_json(silent=True)
+        if not isinstance(payload, dict):
+            metrics.BOT_WEBHOOK_UPDATES.labels('invalid').inc()
+            return jsonify({'ok': False}), 400
+
+        try:
+            dispatched = dispatcher.dispatch(payload)
+        except Exception as e:
+            # رد غير 2xx يجعل تليجرام يعيد إرسال التحديث لاحقاً
+            logger.error(f"❌ خطأ في معالجة تحديث webhook: {e}")
+            metrics.BOT_WEBHOOK_UPDATES.labels('error').inc()
+            return jsonify({'ok': False}), 500
+
+        metrics.BOT_WEBHOOK_UPDATES.labels('processed' if dispatched else 'ignored').inc()
+        return jsonify({'ok': True})
+
+    app.add_url_rule(path or config.WEBHOOK_PATH, 'telegram_webhook', telegram_webhook, methods=['POST'])
+
+
+def create_webhook_app(dispatcher: WebhookDispatcher) -> Flask:
+    """تطبيق مستقل يستقبل webhook فقط (لتشغيل عدة نسخ خلف موزع حمل)"""
+    app = Flask(__name__)
+    register_webhook_route(app, dispatcher)
+
+    @app.route('/health')
+    def health() -> Response:
+        return jsonify({'status': 'ok', 'role': 'webhook'})
+
+    return app
+
+
+async def _set_webhook(application: Application) -> bool:
+    async with application:
+        return await application.bot.set_webhook(
+            url=config.get_webhook_url(),
+            secret_token=config.WEBHOOK_SECRET,
+            allowed_updates=config.ALLOWED_UPDATES,
+            max_connections=config.WEBHOOK_MAX_CONNECTIONS
+        )
+
+
+async def _delete_webhook(application: Application) -> bool:
+    async with application:
+        return await application.bot.delete_webhook()
+
+
+def set_webhook(application: Application) -> bool:
+    """تسجيل رابط webhook لدى تليجرام (مرة واحدة عند النشر وليس لكل نسخة)"""
+    if not config.WEBHOOK_URL:
+        raise ValueError("❌ WEBHOOK_URL غير محدد")
+    result = asyncio.run(_set_webhook(application))
+    logger.info(f"✅ تم تسجيل webhook: {config.get_webhook_url()} (التحديثات: {', '.join(config.ALLOWED_UPDATES)})")
+    return result
+
+
+def delete_webhook(application: Application) -> bool:
+    """إلغاء webhook والعودة إلى polling"""
+    result = asyncio.run(_delete_webhook(application))
+    logger.info("✅ تم إلغاء webhook")
+    return result
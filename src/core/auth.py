@@ -5,39 +5,39 @@ Authentication System
 نظام المصادقة والتحقق من المستخدمين
 """
 
-import os
 import secrets
 import string
 from datetime import datetime, timedelta
 from typing import Optional, Dict, Any, Tuple
 from functools import wraps
-import bcrypt
 from flask import request, jsonify, session
-from supabase import Client
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-
-# إعدادات البريد الإلكتروني
-SMTP_SERVER = os.getenv('SMTP_SERVER', 'smtp.gmail.com')
-SMTP_PORT = int(os.getenv('SMTP_PORT', '587'))
-SMTP_EMAIL = os.getenv('SMTP_EMAIL')
-SMTP_PASSWORD = os.getenv('SMTP_PASSWORD')
+from .hashing import HasherBusy, PasswordHasher
+from ..db import Repositories
+from ..utils.email import email_service
 
 class AuthManager:
     """مدير نظام المصادقة"""
     
-    def __init__(self, supabase: Client):
-        self.supabase = supabase
+    def __init__(self, repos: Repositories, hasher: Optional[PasswordHasher] = None):
+        self.repos = repos
+        self.hasher = hasher or PasswordHasher(workers=0)
     
     def hash_password(self, password: str) -> str:
-        """تشفير كلمة المرور"""
-        salt = bcrypt.gensalt()
-        return bcrypt.hashpw(password.encode('utf-8'), salt).decode('utf-8')
+        """تشفير كلمة المرور (في مجمع التشفير)"""
+        return self.hasher.hash(password)
     
     def verify_password(self, password: str, password_hash: str) -> bool:
-        """التحقق من كلمة المرور"""
-        return bcrypt.checkpw(password.encode('utf-8'), password_hash.encode('utf-8'))
+        """التحقق من كلمة المرور (في مجمع التشفير)"""
+        return self.hasher.verify(password, password_hash)
+    
+    def _upgraded_password_hash(self, password: str) -> Optional[str]:
+        """التشفير بالتكلفة الحالية بعد تسجيل دخول ناجح (يُحفظ مع الجلسة)"""
+        try:
+            return self.hash_password(password)
+        except Exception as e:
+            # فشل الترقية لا يمنع تسجيل الدخول؛ ستُعاد المحاولة في الدخول التالي
+            print(f"⚠️ تعذر ترقية تشفير كلمة المرور: {e}")
+            return None
     
     def generate_otp(self) -> str:
         """توليد رمز OTP من 6 أرقام"""
@@ -47,69 +47,20 @@ class AuthManager:
         """توليد رمز جلسة عشوائي"""
         return secrets.token_urlsafe(32)
     
-    def send_otp_email(self, email: str, otp_code: str) -> bool:
-        """إرسال رمز OTP إلى البريد الإلكتروني"""
-        try:
-            if not SMTP_EMAIL or not SMTP_PASSWORD:
-                print("⚠️ تحذير: إعدادات البريد الإلكتروني غير مكتملة")
-                return False
-            
-            msg = MIMEMultipart('alternative')
-            msg['Subject'] = 'رمز التحقق - نظام الأرشيف'
-            msg['From'] = SMTP_EMAIL
-            msg['To'] = email
-            
-            html = f"""
-            <html dir="rtl">
-                <body style="font-family: 'Cairo', Arial, sans-serif; background-color: #f8fafc; padding: 20px;">
-                    <div style="max-width: 600px; margin: 0 auto; background: white; border-radius: 12px; padding: 30px; box-shadow: 0 4px 12px rgba(0,0,0,0.1);">
-                        <h2 style="color: #2563eb; text-align: center;">رمز التحقق</h2>
-                        <p style="font-size: 16px; color: #1e293b; text-align: center;">
-                            مرحباً، تم طلب رمز التحقق لتفعيل حسابك في نظام الأرشيف.
-                        </p>
-                        <div style="background: #eff6ff; border-radius: 8px; padding: 20px; margin: 20px 0; text-align: center;">
-                            <p style="font-size: 14px; color: #64748b; margin-bottom: 10px;">رمز التحقق الخاص بك:</p>
-                            <h1 style="color: #2563eb; font-size: 36px; letter-spacing: 8px; margin: 0;">{otp_code}</h1>
-                        </div>
-                        <p style="font-size: 14px; color: #64748b; text-align: center;">
-                            هذا الرمز صالح لمدة 10 دقائق فقط.
-                        </p>
-                        <p style="font-size: 12px; color: #94a3b8; text-align: center; margin-top: 30px;">
-                            إذا لم تطلب هذا الرمز، يرجى تجاهل هذه الرسالة.
-                        </p>
-                    </div>
-                </body>
-            </html>
-            """
-            
-            part = MIMEText(html, 'html')
-            msg.attach(part)
-            
-            with smtplib.SMTP(SMTP_SERVER, SMTP_PORT) as server:
-                server.starttls()
-                server.login(SMTP_EMAIL, SMTP_PASSWORD)
-                server.send_message(msg)
-            
-            return True
-        except Exception as e:
-            print(f"❌ خطأ في إرسال البريد: {e}")
-            return False
+    def send_otp_email(self, email: str, otp_code: str, otp_id: Optional[int] = None) -> bool:
+        """إضافة رمز OTP إلى طابور البريد (حالة الإرسال تُسجل في otp_codes.delivery_status)"""
+        def record_status(status: str, error: Optional[str]) -> None:
+            if otp_id is not None:
+                self.repos.otp.set_delivery_status(otp_id, status)
+        
+        return email_service.send_otp_email(email, otp_code, record_status)
     
     def create_user_by_admin(self, user_id: str, full_name: str) -> Tuple[bool, str]:
         """إنشاء مستخدم جديد بواسطة الأدمن (الخطوة 1)"""
         try:
-            # التحقق من عدم وجود المستخدم مسبقاً
-            result = self.supabase.table('users').select('id').eq('user_id', user_id).execute()
-            if result.data:
+            # الإنشاء والتحقق من عدم وجود الرقم التعريفي في استدعاء واحد
+            if not self.repos.users.create_by_admin(user_id, full_name):
                 return False, "الرقم التعريفي موجود مسبقاً"
-            
-            # إنشاء المستخدم
-            data = {
-                'user_id': user_id,
-                'full_name': full_name,
-                'is_active': False
-            }
-            self.supabase.table('users').insert(data).execute()
             return True, "تم إنشاء المستخدم بنجاح"
         except Exception as e:
             return False, f"خطأ: {str(e)}"
@@ -117,13 +68,11 @@ class AuthManager:
     def verify_user_data(self, user_id: str, full_name: str) -> Tuple[bool, Optional[int], str]:
         """التحقق من بيانات المستخدم (الخطوة 2)"""
         try:
-            result = self.supabase.table('users').select('*').eq('user_id', user_id).eq('full_name', full_name).execute()
+            user = self.repos.users.find_by_identity(user_id, full_name)
             
-            if not result.data:
+            if not user:
                 return False, None, "البيانات غير متطابقة"
             
-            user = result.data[0]
-            
             if user['is_active']:
                 return False, None, "الحساب مفعل بالفعل"
             
@@ -145,48 +94,39 @@ class AuthManager:
                 'code': otp_code,
                 'expires_at': expires_at.isoformat()
             }
-            self.supabase.table('otp_codes').insert(data).execute()
+            otp_id = self.repos.otp.create(data)
             
-            # إرسال البريد
-            if self.send_otp_email(email, otp_code):
-                return True, "تم إرسال رمز التحقق إلى بريدك الإلكتروني"
+            # إرسال البريد في الخلفية (الطلب لا ينتظر خادم SMTP)
+            if self.send_otp_email(email, otp_code, otp_id):
+                return True, "جاري إرسال رمز التحقق إلى بريدك الإلكتروني"
             else:
                 # في حالة فشل الإرسال، نعيد الرمز للاختبار
                 return True, f"رمز التحقق (للاختبار): {otp_code}"
         except Exception as e:
             return False, f"خطأ: {str(e)}"
     
+    def get_otp_delivery_status(self, user_db_id: int, email: str) -> Optional[str]:
+        """حالة إرسال آخر رمز تحقق (queued / sent / retrying / failed)"""
+        return self.repos.otp.latest_delivery_status(user_db_id, email)
+    
     def verify_otp_and_activate(self, user_db_id: int, email: str, otp_code: str, password: str) -> Tuple[bool, str]:
         """التحقق من OTP وتفعيل الحساب"""
         try:
-            # التحقق من الرمز
-            result = self.supabase.table('otp_codes').select('*').eq('user_id', user_db_id).eq('email', email).eq('code', otp_code).eq('is_used', False).execute()
-            
-            if not result.data:
+            # فحص الرمز أولاً حتى لا تحجز الرموز الخاطئة مجمع التشفير، ثم التفعيل
+            # واستهلاك الرمز في معاملة واحدة (تعيد الفحص مع قفل الرمز)
+            status = self.repos.users.check_otp(user_db_id, email, otp_code)
+            if status == 'valid':
+                password_hash = self.hash_password(password)
+                status = self.repos.users.activate(user_db_id, email, otp_code, password_hash)
+            
+            if status == 'invalid':
                 return False, "رمز التحقق غير صحيح"
-            
-            otp_record = result.data[0]
-            
-            # التحقق من صلاحية الرمز
-            expires_at = datetime.fromisoformat(otp_record['expires_at'].replace('Z', '+00:00'))
-            if datetime.now(expires_at.tzinfo) > expires_at:
+            if status == 'expired':
                 return False, "رمز التحقق منتهي الصلاحية"
             
-            # تشفير كلمة المرور
-            password_hash = self.hash_password(password)
-            
-            # تفعيل الحساب
-            self.supabase.table('users').update({
-                'email': email,
-                'password_hash': password_hash,
-                'is_active': True,
-                'activated_at': datetime.utcnow().isoformat()
-            }).eq('id', user_db_id).execute()
-            
-            # تعليم الرمز كمستخدم
-            self.supabase.table('otp_codes').update({'is_used': True}).eq('id', otp_record['id']).execute()
-            
             return True, "تم تفعيل الحساب بنجاح"
+        except HasherBusy:
+            raise
         except Exception as e:
             return False, f"خطأ: {str(e)}"
     
@@ -194,31 +134,24 @@ class AuthManager:
         """تسجيل الدخول"""
         try:
             # البحث عن المستخدم
-            result = self.supabase.table('users').select('*').eq('email', email).eq('is_active', True).execute()
+            user = self.repos.users.find_active_by_email(email)
             
-            if not result.data:
+            if not user:
                 return False, None, "البريد الإلكتروني أو كلمة المرور غير صحيحة"
             
-            user = result.data[0]
-            
             # التحقق من كلمة المرور
             if not self.verify_password(password, user['password_hash']):
                 return False, None, "البريد الإلكتروني أو كلمة المرور غير صحيحة"
             
-            # إنشاء جلسة
+            new_hash = None
+            if self.hasher.needs_rehash(user['password_hash']):
+                new_hash = self._upgraded_password_hash(password)
+            
+            # إنشاء جلسة وتحديث آخر تسجيل دخول (وترقية التشفير) في استدعاء واحد
             session_token = self.generate_session_token()
             expires_at = datetime.utcnow() + timedelta(days=7)
             
-            self.supabase.table('sessions').insert({
-                'user_id': user['id'],
-                'session_token': session_token,
-                'expires_at': expires_at.isoformat()
-            }).execute()
-            
-            # تحديث آخر تسجيل دخول
-            self.supabase.table('users').update({
-                'last_login': datetime.utcnow().isoformat()
-            }).eq('id', user['id']).execute()
+            self.repos.sessions.open(user['id'], session_token, expires_at.isoformat(), new_hash)
             
             return True, {
                 'user_id': user['id'],
@@ -228,25 +161,25 @@ class AuthManager:
                 'is_admin': user['is_admin'],
                 'session_token': session_token
             }, "تم تسجيل الدخول بنجاح"
+        except HasherBusy:
+            raise
         except Exception as e:
             return False, None, f"خطأ: {str(e)}"
     
     def verify_session(self, session_token: str) -> Tuple[bool, Optional[Dict[str, Any]]]:
         """التحقق من صلاحية الجلسة"""
         try:
-            result = self.supabase.table('sessions').select('*, users(*)').eq('session_token', session_token).execute()
+            session_data = self.repos.sessions.get_with_user(session_token)
             
-            if not result.data:
+            if not session_data:
                 return False, None
             
-            session_data = result.data[0]
-            
             # التحقق من صلاحية الجلسة
             expires_at = datetime.fromisoformat(session_data['expires_at'].replace('Z', '+00:00'))
             if datetime.now(expires_at.tzinfo) > expires_at:
                 return False, None
             
-            user = session_data['users']
+            user = session_data['user']
             return True, {
                 'user_id': user['id'],
                 'user_identifier': user['user_id'],
@@ -261,7 +194,7 @@ class AuthManager:
     def logout(self, session_token: str) -> bool:
         """تسجيل الخروج"""
         try:
-            self.supabase.table('sessions').delete().eq('session_token', session_token).execute()
+            self.repos.sessions.delete(session_token)
             return True
         except Exception as e:
             print(f"❌ خطأ في تسجيل الخروج: {e}")
@@ -270,16 +203,10 @@ class AuthManager:
     def get_user_permissions(self, user_id: int) -> Dict[str, bool]:
         """الحصول على صلاحيات المستخدم"""
         try:
-            result = self.supabase.table('user_roles').select('roles(permissions)').eq('user_id', user_id).execute()
-            
-            if not result.data:
-                return {}
-            
             # دمج جميع الصلاحيات
             all_permissions = {}
-            for role in result.data:
-                permissions = role['roles']['permissions']
-                all_permissions.update(permissions)
+            for role in self.repos.roles.roles_for_user(user_id):
+                all_permissions.update(role['permissions'] or {})
             
             return all_permissions
         except Exception as e:
@@ -0,0 +1,399 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Bot Token Pool
+مجمع توكنات البوتات: توزيع الاستدعاءات العامة، وتوجيه ما يعتمد على file_id إلى البوت الذي أصدره
+"""
+
+import logging
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from ..utils.metrics import TELEGRAM_CALL_DURATION, observe_since
+from ..utils.timing import span
+from .rate_governor import DEFAULT_MAX_WAIT, RateGovernor
+
+logger = logging.getLogger(__name__)
+
+TELEGRAM_API_BASE = 'https://api.telegram.org'
+
+# تصنيف استجابات Bot API: حذف السجل مسموح فقط عند NOT_FOUND
+OK = 'ok'
+NOT_FOUND = 'not_found'
+TOO_BIG = 'too_big'
+THROTTLED = 'throttled'
+ERROR = 'error'
+
+# دوال ترسل رسائل إلى المحادثة (تخضع لحد المحادثة بالإضافة لحد البوت)
+_CHAT_LIMITED_PREFIXES = ('send', 'copy', 'forward')
+
+
+class UnknownBot(Exception):
+    """file_id صادر من بوت ليس في المجمع: لا يمكن قراءته، ولا يعني أنه محذوف"""
+
+    def __init__(self, bot_id: int):
+        super().__init__(f"البوت {bot_id} ليس في المجمع")
+        self.bot_id = bot_id
+
+
+def classify(response: requests.Response) -> str:
+    """
+    تصنيف استجابة Bot API
+
+    400 (file_id غير صالح أو محذوف) هو الوحيد الذي يعني أن الملف لم يعد موجوداً.
+    429 وأخطاء الخادم والتوكن (401/404) لا تقول شيئاً عن الملف.
+    """
+    try:
+        payload = response.json()
+    except ValueError:
+        payload = {}
+    if response.status_code == 200 and payload.get('ok'):
+        return OK
+    if response.status_code == 429:
+        return THROTTLED
+    if response.status_code == 400:
+        description = str(payload.get('description', '')).lower()
+        return TOO_BIG if 'too big' in description else NOT_FOUND
+    return ERROR
+
+
+class _TokenState:
+    """حالة توكن واحد داخل المجمع"""
+
+    __slots__ = ('token', 'is_primary', 'in_flight', 'recent', 'penalised_until')
+
+    def __init__(self, token: str, is_primary: bool):
+        self.token = token
+        self.is_primary = is_primary
+        self.in_flight = 0
+        self.recent: deque = deque()
+        self.penalised_until = 0.0
+
+
+class BotTokenPool:
+    """
+    مجمع توكنات مع محاسبة المعدل لكل توكن
+
+    كل طلب يذهب إلى التوكن الأقل حملاً (الطلبات الجارية + طلبات آخر نافذة زمنية)،
+    والتوكن الذي يحصل على 429 يُستبعد مؤقتاً حتى انتهاء retry_after.
+    مع governor تنتظر الاستدعاءات دورها في حدود البوت والمحادثة المشتركة بين
+    العمليات، وretry_after يُطبق على جميع العمليات.
+    البوتات المساعدة يجب أن تكون مشرفين في مجموعة التخزين.
+
+    file_id صالح فقط للبوت الذي أصدره: getFile يذهب إلى توكن ذلك البوت
+    (token_for) أو إلى بوت مساعد لديه file_id خاص به لنفس الرسالة (copies)،
+    والتحميل بنفس التوكن الذي أعاد file_path.
+    """
+
+    def __init__(
+        self,
+        primary_token: str,
+        helper_tokens: Optional[List[str]] = None,
+        window_seconds: float = 1.0,
+        penalty_seconds: float = 30.0,
+        api_base: str = TELEGRAM_API_BASE,
+        governor: Optional[RateGovernor] = None,
+        http_pool_size: int = 10
+    ):
+        tokens = [primary_token] + [
+            t for t in (helper_tokens or []) if t and t != primary_token
+        ]
+        self._states = [_TokenState(t, i == 0) for i, t in enumerate(tokens)]
+        self._by_token: Dict[str, _TokenState] = {s.token: s for s in self._states}
+        self._lock = threading.Lock()
+        self.window_seconds = window_seconds
+        self.penalty_seconds = penalty_seconds
+        self.api_base = api_base
+        self.governor = governor
+        self.session = requests.Session()
+        # اتصالات دائمة تكفي للتحميلات المقطعة المتوازية (الافتراضي 10 لكل خادم)
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=http_pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    @property
+    def size(self) -> int:
+        """عدد التوكنات في المجمع"""
+        return len(self._states)
+
+    @property
+    def primary_token(self) -> str:
+        """توكن البوت الرئيسي"""
+        return self._states[0].token
+
+    @property
+    def helper_tokens(self) -> List[str]:
+        """توكنات البوتات المساعدة"""
+        return [s.token for s in self._states[1:]]
+
+    def api_url(self, token: str, method: str) -> str:
+        """رابط دالة في Bot API لتوكن معين"""
+        return f"{self.api_base}/bot{token}/{method}"
+
+    def file_url(self, token: str, file_path: str) -> str:
+        """رابط تحميل ملف لتوكن معين"""
+        return f"{self.api_base}/file/bot{token}/{file_path}"
+
+    def _load(self, state: _TokenState, now: float) -> int:
+        """حمل التوكن الحالي"""
+        while state.recent and now - state.recent[0] > self.window_seconds:
+            state.recent.popleft()
+        return state.in_flight + len(state.recent)
+
+    @staticmethod
+    def bot_id(token: str) -> int:
+        """معرّف البوت من توكنه (الجزء قبل النقطتين)"""
+        return int(token.split(':', 1)[0])
+
+    @property
+    def primary_bot_id(self) -> int:
+        """معرّف البوت الرئيسي (يُحفظ مع الملفات التي يرفعها)"""
+        return self.bot_id(self.primary_token)
+
+    def token_for(self, bot_id: Optional[int]) -> Optional[str]:
+        """
+        توكن البوت الذي أصدر file_id (الرئيسي للسجلات القديمة بدون bot_id)
+
+        None لبوت ليس في المجمع: توكن آخر يحصل على 400 لنفس file_id، وهذا
+        يُصنف NOT_FOUND ويحذف سجلاً لملف موجود.
+        """
+        if bot_id is None:
+            return self.primary_token
+        for state in self._states:
+            if state.token.split(':', 1)[0] == str(bot_id):
+                return state.token
+        return None
+
+    @staticmethod
+    def bot_key(token: str) -> str:
+        """مفتاح البوت في منظم المعدل (المعرّف فقط، بدون السر)"""
+        return f"bot:{token.split(':', 1)[0]}"
+
+    def acquire(self, primary_only: bool = False, tokens: Optional[Sequence[str]] = None) -> str:
+        """
+        حجز التوكن الأقل حملاً (والأقرب دوراً في منظم المعدل)
+
+        tokens: حصر الاختيار في هذه التوكنات (مثل البوتات التي لديها file_id للملف)
+        """
+        if tokens:
+            pool = [self._by_token[t] for t in tokens]
+        else:
+            pool = self._states[:1] if primary_only else self._states
+
+        waits: Dict[str, float] = {}
+        if self.governor is not None and len(pool) > 1:
+            waits = {s.token: self.governor.wait_time(self.bot_key(s.token)) for s in pool}
+
+        with self._lock:
+            now = time.monotonic()
+            candidates = [s for s in pool if s.penalised_until <= now]
+            if not candidates:
+                # جميع التوكنات معاقبة: نختار الأقرب لانتهاء العقوبة
+                candidates = [min(pool, key=lambda s: s.penalised_until)]
+
+            state = min(candidates, key=lambda s: (waits.get(s.token, 0.0), self._load(s, now)))
+            state.in_flight += 1
+            state.recent.append(now)
+            return state.token
+
+    def release(self, token: str, retry_after: Optional[float] = None) -> None:
+        """تحرير التوكن بعد انتهاء الطلب مع تطبيق عقوبة 429 إن وجدت"""
+        with self._lock:
+            state = self._by_token[token]
+            state.in_flight = max(0, state.in_flight - 1)
+            if retry_after is not None:
+                state.penalised_until = max(
+                    state.penalised_until,
+                    time.monotonic() + retry_after
+                )
+
+        if retry_after is not None:
+            logger.warning(
+                f"⚠️ التوكن ...{token[-6:]} تجاوز حد المعدل، "
+                f"استبعاد لمدة {retry_after:.0f} ثانية"
+            )
+
+    def retry_after(self, response: requests.Response) -> Optional[float]:
+        """استخراج مدة الانتظار من استجابة 429"""
+        if response.status_code != 429:
+            return None
+        try:
+            return float(response.json()['parameters']['retry_after'])
+        except Exception:
+            return float(self.penalty_seconds)
+
+    def _rate_keys(self, method: str, token: str, kwargs: Dict[str, Any], bucket: Optional[str]) -> List[str]:
+        """مفاتيح منظم المعدل للاستدعاء: البوت، والمحادثة لدوال الإرسال، ودلو المستدعي"""
+        keys = [self.bot_key(token)]
+        if method.startswith(_CHAT_LIMITED_PREFIXES):
+            params = kwargs.get('json') or kwargs.get('data') or kwargs.get('params') or {}
+            if params.get('chat_id') is not None:
+                keys.append(f"chat:{params['chat_id']}")
+        if bucket:
+            keys.append(bucket)
+        return keys
+
+    def call(
+        self,
+        method: str,
+        http_method: str = 'GET',
+        primary_only: bool = False,
+        token: Optional[str] = None,
+        bucket: Optional[str] = None,
+        max_wait: Optional[float] = DEFAULT_MAX_WAIT,
+        **kwargs: Any
+    ) -> Tuple[requests.Response, str]:
+        """
+        استدعاء دالة في Bot API عبر التوكن الأقل حملاً
+
+        Args:
+            bucket: مفتاح إضافي في منظم المعدل (مثل cleanup للمهام الخلفية)
+            max_wait: أقصى انتظار للدور (None = بلا حد)
+
+        Returns:
+            (الاستجابة، التوكن المستخدم)
+
+        Raises:
+            Throttled: إذا كان دور الاستدعاء أبعد من max_wait
+        """
+        if token is None:
+            token = self.acquire(primary_only)
+        else:
+            self._track(token)
+        return self._send(method, http_method, token, bucket, max_wait, kwargs), token
+
+    def _send(
+        self,
+        method: str,
+        http_method: str,
+        token: str,
+        bucket: Optional[str],
+        max_wait: Optional[float],
+        kwargs: Dict[str, Any]
+    ) -> requests.Response:
+        """تنفيذ استدعاء على توكن محجوز مسبقاً (يُحرر عند الانتهاء)"""
+        retry_after = None
+        status = 'error'
+        keys: List[str] = []
+        start = time.perf_counter()
+        try:
+            if self.governor is not None:
+                keys = self._rate_keys(method, token, kwargs, bucket)
+                status = 'throttled'
+                self.governor.acquire(keys, max_wait)
+                status = 'error'
+                start = time.perf_counter()
+            with span('telegram'):
+                response = self.session.request(
+                    http_method, self.api_url(token, method), **kwargs
+                )
+            status = str(response.status_code)
+            retry_after = self.retry_after(response)
+            if retry_after is not None and keys:
+                # 429 لدالة إرسال سببه حد المحادثة غالباً، وإلا فحد البوت
+                chat_keys = [key for key in keys if key.startswith('chat:')]
+                self.governor.penalise(chat_keys[0] if chat_keys else keys[0], retry_after)
+            return response
+        finally:
+            observe_since(TELEGRAM_CALL_DURATION, start, method, status)
+            self.release(token, retry_after)
+
+    def _track(self, token: str) -> None:
+        """تسجيل طلب على توكن محدد مسبقاً"""
+        with self._lock:
+            state = self._by_token[token]
+            state.in_flight += 1
+            state.recent.append(time.monotonic())
+
+    def get_file(
+        self,
+        file_id: str,
+        bot_id: Optional[int] = None,
+        copies: Optional[Dict[int, str]] = None,
+        bucket: Optional[str] = None,
+        max_wait: Optional[float] = DEFAULT_MAX_WAIT
+    ) -> Tuple[requests.Response, str]:
+        """
+        استدعاء getFile بتوكن البوت الذي أصدر file_id أو بوت مساعد لديه نسخة منه
+
+        بوت آخر يحصل على 400 لنفس file_id، أي "غير موجود" خاطئ، لذلك كل توكن
+        يُرسل file_id الخاص به (copies: {bot_id: file_id} من نفس الرسالة) ويُختار
+        الأقل حملاً بينها. 400 من نسخة مساعدة يُعاد بتوكن المصدر الذي يقرر وحده
+        أن الملف محذوف.
+
+        Raises:
+            UnknownBot: البوت الذي أصدر file_id ليس في المجمع
+        """
+        issuer = self.token_for(bot_id)
+        file_ids: Dict[str, str] = {issuer: file_id} if issuer else {}
+        for helper_id, helper_file_id in (copies or {}).items():
+            token = self.token_for(helper_id)
+            if token is not None:
+                file_ids.setdefault(token, helper_file_id)
+        if not file_ids:
+            raise UnknownBot(bot_id)
+
+        token = self.acquire(tokens=list(file_ids))
+        r = self._send('getFile', 'GET', token, bucket, max_wait, {'params': {'file_id': file_ids[token]}})
+        if issuer and token != issuer and classify(r) == NOT_FOUND:
+            self._track(issuer)
+            token = issuer
+            r = self._send('getFile', 'GET', token, bucket, max_wait, {'params': {'file_id': file_id}})
+        elif not issuer and classify(r) == NOT_FOUND:
+            # لا يوجد من يؤكد الحذف
+            raise UnknownBot(bot_id)
+        return r, token
+
+    def download(
+        self,
+        token: str,
+        file_path: str,
+        headers: Optional[Dict[str, str]] = None
+    ) -> requests.Response:
+        """فتح تحميل ملف بنفس التوكن الذي أعاد file_path (headers لتمرير Range)"""
+        self._track(token)
+        start = time.perf_counter()
+        try:
+            with span('telegram'):
+                response = self.session.get(self.file_url(token, file_path), headers=headers, stream=True)
+            observe_since(TELEGRAM_CALL_DURATION, start, 'download', str(response.status_code))
+            return response
+        except Exception:
+            observe_since(TELEGRAM_CALL_DURATION, start, 'download', 'error')
+            self.release(token)
+            raise
+
+    def iter_download(
+        self,
+        token: str,
+        response: requests.Response,
+        chunk_size: int = 1024 * 1024
+    ) -> Iterator[bytes]:
+        """قراءة محتوى التحميل مع تحرير التوكن عند الانتهاء"""
+        try:
+            for chunk in response.iter_content(chunk_size=chunk_size):
+                yield chunk
+        finally:
+            response.close()
+            self.release(token)
+
+    def stats(self) -> List[Dict[str, Any]]:
+        """حالة التوكنات الحالية (للمراقبة)"""
+        with self._lock:
+            now = time.monotonic()
+            return [
+                {
+                    'token': f"...{s.token[-6:]}",
+                    'primary': s.is_primary,
+                    'in_flight': s.in_flight,
+                    'recent_calls': self._load(s, now),
+                    'penalised_for': max(0.0, round(s.penalised_until - now, 1)),
+                    'rate_wait': round(self.governor.wait_time(self.bot_key(s.token)), 2) if self.governor else 0.0
+                }
+                for s in self._states
+            ]
@@ -6,7 +6,13 @@ Configuration Module
 """
 
 import os
-from typing import Optional
+import tempfile
+from typing import List, Optional
+
+
+def _split_env_list(name: str) -> List[str]:
+    """قراءة متغير بيئي يحتوي على قائمة مفصولة بفواصل"""
+    return [item.strip() for item in os.getenv(name, '').split(',') if item.strip()]
 
 
 class Config:
@@ -16,23 +22,180 @@ class Config:
     BOT_TOKEN: str = os.getenv('BOT_TOKEN', '')
     TARGET_GROUP_ID: int = int(os.getenv('TARGET_GROUP_ID', '0'))
     
+    # Helper Bots (أعضاء في مجموعة التخزين لتوزيع طلبات التحميل)
+    HELPER_BOT_TOKENS: List[str] = _split_env_list('HELPER_BOT_TOKENS')
+    BOT_POOL_PENALTY_SECONDS: int = int(os.getenv('BOT_POOL_PENALTY_SECONDS', '30'))
+    
+    # Bot Ingestion Mode (polling أو webhook)
+    BOT_MODE: str = os.getenv('BOT_MODE', 'polling').lower()
+    # أنواع التحديثات المطلوبة من تليجرام (المعالجات تستخدم الرسائل فقط)
+    ALLOWED_UPDATES: List[str] = _split_env_list('ALLOWED_UPDATES') or ['message']
+    WEBHOOK_URL: str = os.getenv('WEBHOOK_URL', '').rstrip('/')
+    WEBHOOK_PATH: str = '/' + os.getenv('WEBHOOK_PATH', 'telegram/webhook').strip('/')
+    WEBHOOK_SECRET: str = os.getenv('WEBHOOK_SECRET', '')
+    WEBHOOK_PORT: int = int(os.getenv('WEBHOOK_PORT', os.getenv('PORT', '8080')))
+    WEBHOOK_MAX_CONNECTIONS: int = int(os.getenv('WEBHOOK_MAX_CONNECTIONS', '40'))
+    
     # Supabase Configuration
     SUPABASE_URL: str = os.getenv('SUPABASE_URL', '')
     SUPABASE_KEY: str = os.getenv('SUPABASE_KEY', '')
     
+    # Direct Postgres (الاستعلامات المتكررة بدون رحلة PostgREST)
+    # DB_BACKEND: auto (postgres إذا توفر DATABASE_URL و psycopg) أو supabase أو postgres
+    DB_BACKEND: str = os.getenv('DB_BACKEND', 'auto').lower()
+    DATABASE_URL: str = os.getenv('DATABASE_URL', '')
+    DB_POOL_MIN_SIZE: int = int(os.getenv('DB_POOL_MIN_SIZE', '1'))
+    DB_POOL_MAX_SIZE: int = int(os.getenv('DB_POOL_MAX_SIZE', '10'))
+    # false خلف pooler بوضع transaction (منفذ 6543 في Supabase) لأنه لا يحفظ الاستعلامات المحضرة
+    DB_PREPARE_STATEMENTS: bool = os.getenv('DB_PREPARE_STATEMENTS', 'true').lower() == 'true'
+    DB_STATEMENT_TIMEOUT_MS: int = int(os.getenv('DB_STATEMENT_TIMEOUT_MS', '5000'))
+    
+    # نسخة SQLite محلية من جدول files للقائمة والبحث (فارغ = معطلة)
+    FILES_REPLICA_PATH: str = os.getenv('FILES_REPLICA_PATH', '')
+    FILES_REPLICA_SYNC_SECONDS: float = float(os.getenv('FILES_REPLICA_SYNC_SECONDS', '2'))
+    # القراءة من الأساسي إذا كانت آخر مزامنة ناجحة أقدم من هذا
+    FILES_REPLICA_MAX_LAG_SECONDS: float = float(os.getenv('FILES_REPLICA_MAX_LAG_SECONDS', '30'))
+    FILES_REPLICA_FULL_SYNC_MINUTES: float = float(os.getenv('FILES_REPLICA_FULL_SYNC_MINUTES', '60'))
+    # عرض النسخة القديمة عند تعذر الوصول لقاعدة البيانات بدلاً من الخطأ
+    FILES_REPLICA_SERVE_STALE: bool = os.getenv('FILES_REPLICA_SERVE_STALE', 'false').lower() == 'true'
+    
     # Email Configuration
     SMTP_SERVER: str = os.getenv('SMTP_SERVER', 'smtp.gmail.com')
     SMTP_PORT: int = int(os.getenv('SMTP_PORT', '587'))
     SMTP_EMAIL: str = os.getenv('SMTP_EMAIL', '')
     SMTP_PASSWORD: str = os.getenv('SMTP_PASSWORD', '')
+    SMTP_STARTTLS: bool = os.getenv('SMTP_STARTTLS', 'true').lower() == 'true'
+    SMTP_TIMEOUT_SECONDS: float = float(os.getenv('SMTP_TIMEOUT_SECONDS', '10'))
+    # إغلاق اتصال SMTP الدائم بعد هذه المدة بدون رسائل
+    SMTP_IDLE_SECONDS: float = float(os.getenv('SMTP_IDLE_SECONDS', '60'))
+    MAIL_BATCH_SIZE: int = int(os.getenv('MAIL_BATCH_SIZE', '20'))
+    MAIL_MAX_RETRIES: int = int(os.getenv('MAIL_MAX_RETRIES', '5'))
     
     # Server Configuration
-    SECRET_KEY: str = os.getenv('SECRET_KEY', os.urandom(24).hex())
+    # ثابت بين العمليات وإعادة التشغيل (قيمة عشوائية تختلف في كل عامل gunicorn)
+    SECRET_KEY: str = os.getenv('SECRET_KEY', '')
     PORT: int = int(os.getenv('PORT', '8080'))
     HOST: str = os.getenv('HOST', '0.0.0.0')
     
-    # Telegram API
-    TELEGRAM_API_URL: str = f"https://api.telegram.org/bot{BOT_TOKEN}"
+    # Process Topology (python run.py supervise)
+    SUPERVISOR_ROLES: List[str] = _split_env_list('SUPERVISOR_ROLES') or ['bot', 'api', 'jobs']
+    # /api/events يحجز خيطاً لكل متصفح مفتوح، لذلك الافتراضي معه gthread بعدة خيوط
+    SSE_ENABLED: bool = os.getenv('SSE_ENABLED', 'true').lower() == 'true'
+    # 0 = تلقائي (2 × عدد المعالجات + 1)
+    WEB_WORKERS: int = int(os.getenv('WEB_WORKERS', '0'))
+    WEB_WORKER_CLASS: str = os.getenv('WEB_WORKER_CLASS', 'gthread' if SSE_ENABLED else 'sync')
+    WEB_THREADS: int = int(os.getenv('WEB_THREADS', '8' if SSE_ENABLED else '1'))
+    WEB_TIMEOUT: int = int(os.getenv('WEB_TIMEOUT', '120'))
+    # تحميل التطبيق في العملية الأم قبل fork (صفحات الكود مشتركة بين العمال)
+    WEB_PRELOAD: bool = os.getenv('WEB_PRELOAD', 'true').lower() == 'true'
+    # تقرير زمن استيراد الوحدات عند الإقلاع
+    STARTUP_TIMING_REPORT: bool = os.getenv('STARTUP_TIMING_REPORT', 'false').lower() == 'true'
+    STARTUP_TIMING_TOP: int = int(os.getenv('STARTUP_TIMING_TOP', '15'))
+    HEARTBEAT_DIR: str = os.getenv('HEARTBEAT_DIR', os.path.join(tempfile.gettempdir(), 'archive-heartbeats'))
+    HEARTBEAT_INTERVAL_SECONDS: int = int(os.getenv('HEARTBEAT_INTERVAL_SECONDS', '10'))
+    HEALTH_CHECK_INTERVAL_SECONDS: int = int(os.getenv('HEALTH_CHECK_INTERVAL_SECONDS', '15'))
+    HEALTH_MAX_AGE_SECONDS: int = int(os.getenv('HEALTH_MAX_AGE_SECONDS', '60'))
+    DRAIN_TIMEOUT_SECONDS: int = int(os.getenv('DRAIN_TIMEOUT_SECONDS', '30'))
+    RESTART_BACKOFF_MAX_SECONDS: int = int(os.getenv('RESTART_BACKOFF_MAX_SECONDS', '60'))
+    
+    # Background Jobs
+    CLEANUP_INTERVAL_HOURS: float = float(os.getenv('CLEANUP_INTERVAL_HOURS', '6'))
+    # معدل getFile للتنظيف لكل بوت (يترك بقية الحد للطلبات التفاعلية)
+    CLEANUP_CALLS_PER_SECOND: float = float(os.getenv('CLEANUP_CALLS_PER_SECOND', '2'))
+    # تصحيح عدادات storage_stats من جدول files (مسح كامل، لذلك نادراً)
+    STATS_RECONCILE_INTERVAL_HOURS: float = float(os.getenv('STATS_RECONCILE_INTERVAL_HOURS', '24'))
+    # سحب file_id البوتات المساعدة من رسائل مجموعة التخزين (getUpdates)
+    HELPER_UPDATES_INTERVAL_SECONDS: float = float(os.getenv('HELPER_UPDATES_INTERVAL_SECONDS', '30'))
+    
+    # HTTP Caching (مدة الاحتفاظ بحالة القوائم لطلبات If-None-Match المتكررة)
+    LISTING_VALIDATOR_TTL_SECONDS: float = float(os.getenv('LISTING_VALIDATOR_TTL_SECONDS', '2'))
+    
+    # Response Compression
+    COMPRESS_ENABLED: bool = os.getenv('COMPRESS_ENABLED', 'true').lower() == 'true'
+    COMPRESS_MIN_SIZE: int = int(os.getenv('COMPRESS_MIN_SIZE', '1024'))
+    GZIP_LEVEL: int = int(os.getenv('GZIP_LEVEL', '6'))
+    BROTLI_QUALITY: int = int(os.getenv('BROTLI_QUALITY', '5'))
+    
+    # File Events (SSE)
+    EVENTS_POLL_INTERVAL_SECONDS: float = float(os.getenv('EVENTS_POLL_INTERVAL_SECONDS', '1'))
+    EVENTS_REPLAY_LIMIT: int = int(os.getenv('EVENTS_REPLAY_LIMIT', '500'))
+    EVENTS_RETENTION_HOURS: float = float(os.getenv('EVENTS_RETENTION_HOURS', '24'))
+    # انتظار معرّف حدث ناقص (معاملة لم تُثبت بعد) قبل اعتباره ملغى
+    EVENTS_SETTLE_SECONDS: float = float(os.getenv('EVENTS_SETTLE_SECONDS', '5'))
+    # كل اتصال SSE يحجز خيطاً؛ الحد الفعلي في get_sse_max_clients
+    SSE_MAX_CLIENTS_PER_PROCESS: int = int(os.getenv('SSE_MAX_CLIENTS_PER_PROCESS', '50'))
+    SSE_HEARTBEAT_SECONDS: float = float(os.getenv('SSE_HEARTBEAT_SECONDS', '15'))
+    # إغلاق الاتصال دورياً ليعيد المتصفح الاتصال بـ Last-Event-ID (أقل من WEB_TIMEOUT دائماً)
+    SSE_MAX_CONNECTION_SECONDS: float = float(os.getenv('SSE_MAX_CONNECTION_SECONDS', '55'))
+    
+    # Streaming: getFile مرة لكل ملف (مسار التحميل صالح ساعة على الأقل) وتحميل مشترك للمشاهدين المتزامنين
+    FILE_PATH_CACHE_SECONDS: float = float(os.getenv('FILE_PATH_CACHE_SECONDS', '1800'))
+    STREAM_SHARED_WINDOW_MB: int = int(os.getenv('STREAM_SHARED_WINDOW_MB', '8'))
+    # الملفات الأكبر من مقطعين تُجلب بمقاطع Range متوازية (الذاكرة لكل تحميل ≤ STREAM_SEGMENT_MEMORY_MB)
+    STREAM_SEGMENT_MB: int = int(os.getenv('STREAM_SEGMENT_MB', '4'))
+    STREAM_PARALLEL_SEGMENTS: int = int(os.getenv('STREAM_PARALLEL_SEGMENTS', '4'))
+    STREAM_SEGMENT_MEMORY_MB: int = int(os.getenv('STREAM_SEGMENT_MEMORY_MB', '16'))
+    
+    # Bulk ZIP Download (الذاكرة ≈ (ZIP_PREFETCH + 1) × ZIP_QUEUE_CHUNKS × 256KB)
+    ZIP_MAX_FILES: int = int(os.getenv('ZIP_MAX_FILES', '500'))
+    ZIP_PREFETCH: int = int(os.getenv('ZIP_PREFETCH', '2'))
+    ZIP_QUEUE_CHUNKS: int = int(os.getenv('ZIP_QUEUE_CHUNKS', '8'))
+    
+    # Catalogue Export (صفوف كل صفحة من الاستعلام)
+    EXPORT_BATCH_SIZE: int = int(os.getenv('EXPORT_BATCH_SIZE', '1000'))
+    # العلامة المحفوظة تتأخر بهذا القدر لتشمل المعاملات التي تُثبت بعد التصدير
+    EXPORT_SAFETY_LAG_SECONDS: float = float(os.getenv('EXPORT_SAFETY_LAG_SECONDS', '300'))
+    
+    # Share Links Configuration
+    # يجب أن يكون ثابتاً بين جميع العمليات وإلا ستفشل الروابط في عمليات أخرى (مطلوب في validate)
+    SHARE_LINK_SECRET: str = os.getenv('SHARE_LINK_SECRET', '') or SECRET_KEY
+    SHARE_LINK_MAX_HOURS: int = int(os.getenv('SHARE_LINK_MAX_HOURS', str(24 * 30)))
+    # أقصى مدة يبقى فيها ملف محذوف من عملية أخرى متاحاً عبر /s/<token>
+    SHARE_LINK_FILE_CACHE_SECONDS: float = float(os.getenv('SHARE_LINK_FILE_CACHE_SECONDS', '60'))
+    # مدة رموز ?token= لـ /api/events و /api/files/zip (تُطلب من /api/auth/stream-token)
+    STREAM_TOKEN_SECONDS: float = float(os.getenv('STREAM_TOKEN_SECONDS', '300'))
+    
+    # Metrics Configuration (فارغ = /metrics بدون مصادقة)
+    METRICS_TOKEN: str = os.getenv('METRICS_TOKEN', '')
+    
+    # Request Timing & Profiling
+    SERVER_TIMING_ENABLED: bool = os.getenv('SERVER_TIMING_ENABLED', 'true').lower() == 'true'
+    TIMING_LOG_THRESHOLD_MS: float = float(os.getenv('TIMING_LOG_THRESHOLD_MS', '1000'))
+    PROFILE_DIR: str = os.getenv('PROFILE_DIR', os.path.join(tempfile.gettempdir(), 'archive-profiles'))
+    
+    # Telegram API (يمكن توجيهه لخادم Bot API محلي أو خادم وهمي للاختبار)
+    TELEGRAM_API_BASE: str = os.getenv('TELEGRAM_API_BASE', 'https://api.telegram.org').rstrip('/')
+    TELEGRAM_API_URL: str = f"{TELEGRAM_API_BASE}/bot{BOT_TOKEN}"
+    # Telegram Rate Governor: حدود Bot API مشتركة بين العمليات عبر ملف حالة (فارغ = داخل العملية فقط)
+    TELEGRAM_RATE_STATE_FILE: str = os.getenv(
+        'TELEGRAM_RATE_STATE_FILE', os.path.join(tempfile.gettempdir(), 'archive-telegram-rate')
+    )
+    TELEGRAM_BOT_RATE_PER_SECOND: float = float(os.getenv('TELEGRAM_BOT_RATE_PER_SECOND', '25'))
+    TELEGRAM_BOT_BURST: float = float(os.getenv('TELEGRAM_BOT_BURST', '5'))
+    TELEGRAM_CHAT_RATE_PER_MINUTE: float = float(os.getenv('TELEGRAM_CHAT_RATE_PER_MINUTE', '20'))
+    TELEGRAM_CHAT_BURST: float = float(os.getenv('TELEGRAM_CHAT_BURST', '3'))
+    # الطلبات التفاعلية ترد بـ 503 بدلاً من الانتظار أطول من هذا
+    TELEGRAM_MAX_WAIT_SECONDS: float = float(os.getenv('TELEGRAM_MAX_WAIT_SECONDS', '10'))
+    # اتصالات HTTP الدائمة لكل عملية (التحميلات المقطعة تفتح عدة اتصالات لكل ملف)
+    TELEGRAM_HTTP_POOL_SIZE: int = int(os.getenv('TELEGRAM_HTTP_POOL_SIZE', '32'))
+    
+    # Password Hashing (bcrypt في مجمع عمليات منفصل عن عمال الطلبات)
+    BCRYPT_ROUNDS: int = int(os.getenv('BCRYPT_ROUNDS', '12'))
+    HASH_WORKERS: int = int(os.getenv('HASH_WORKERS', '1'))
+    HASH_MAX_PENDING: int = int(os.getenv('HASH_MAX_PENDING', '4'))
+    HASH_TIMEOUT_SECONDS: float = float(os.getenv('HASH_TIMEOUT_SECONDS', '10'))
+    
+    # Auth Rate Limits (تُطبق قبل أي تشفير، مشتركة بين العمليات عبر ملف حالة؛ فارغ = داخل كل عملية)
+    LOGIN_RATE_STATE_FILE: str = os.getenv(
+        'LOGIN_RATE_STATE_FILE', os.path.join(tempfile.gettempdir(), 'archive-login-rate')
+    )
+    LOGIN_RATE_SLOTS: int = int(os.getenv('LOGIN_RATE_SLOTS', '8192'))
+    LOGIN_IP_LIMIT: int = int(os.getenv('LOGIN_IP_LIMIT', '20'))
+    LOGIN_IP_WINDOW_SECONDS: float = float(os.getenv('LOGIN_IP_WINDOW_SECONDS', '300'))
+    LOGIN_ACCOUNT_LIMIT: int = int(os.getenv('LOGIN_ACCOUNT_LIMIT', '10'))
+    LOGIN_ACCOUNT_WINDOW_SECONDS: float = float(os.getenv('LOGIN_ACCOUNT_WINDOW_SECONDS', '900'))
+    # عدد البروكسيات أمام التطبيق (لقراءة IP العميل من X-Forwarded-For)
+    TRUSTED_PROXY_COUNT: int = int(os.getenv('TRUSTED_PROXY_COUNT', '0'))
     
     # OTP Configuration
     OTP_EXPIRY_MINUTES: int = 10
@@ -55,6 +218,13 @@ class Config:
             if not getattr(cls, var):
                 missing_vars.append(var)
         
+        if cls.BOT_MODE == 'webhook' and not cls.WEBHOOK_SECRET:
+            missing_vars.append('WEBHOOK_SECRET')
+        
+        # بدون مفتاح ثابت تختلف تواقيع روابط المشاركة بين العمال وبعد كل إعادة تشغيل
+        if not cls.SHARE_LINK_SECRET:
+            missing_vars.append('SHARE_LINK_SECRET (أو SECRET_KEY)')
+        
         if missing_vars:
             raise ValueError(
                 f"❌ المتغيرات البيئية التالية مفقودة: {', '.join(missing_vars)}"
@@ -62,10 +232,47 @@ class Config:
         
         return True
     
+    @classmethod
+    def get_web_workers(cls) -> int:
+        """عدد عمال gunicorn (تلقائياً حسب المعالجات المتاحة)"""
+        if cls.WEB_WORKERS > 0:
+            return cls.WEB_WORKERS
+        try:
+            cpus = len(os.sched_getaffinity(0))
+        except AttributeError:
+            cpus = os.cpu_count() or 1
+        return cpus * 2 + 1
+    
+    @classmethod
+    def get_sse_max_clients(cls) -> int:
+        """
+        عدد اتصالات SSE المسموح بها في العامل الواحد
+
+        0 مع عمال sync أو خيط واحد (الاتصال يحجز العامل كاملاً)، وأقل من عدد
+        الخيوط مع gthread ليبقى خيط واحد على الأقل لبقية الطلبات.
+        """
+        if not cls.SSE_ENABLED:
+            return 0
+        if cls.WEB_WORKER_CLASS in ('gevent', 'eventlet'):
+            return cls.SSE_MAX_CLIENTS_PER_PROCESS
+        if cls.WEB_WORKER_CLASS == 'sync' or cls.WEB_THREADS <= 1:
+            return 0
+        return min(cls.SSE_MAX_CLIENTS_PER_PROCESS, cls.WEB_THREADS - 1)
+    
+    @classmethod
+    def get_sse_connection_seconds(cls) -> float:
+        """مدة اتصال SSE الواحد، بحد أقصى نصف WEB_TIMEOUT"""
+        return min(cls.SSE_MAX_CONNECTION_SECONDS, cls.WEB_TIMEOUT / 2)
+    
+    @classmethod
+    def get_webhook_url(cls) -> str:
+        """الرابط الكامل الذي يرسل إليه تليجرام التحديثات"""
+        return f"{cls.WEBHOOK_URL}{cls.WEBHOOK_PATH}"
+    
     @classmethod
     def get_telegram_file_url(cls, file_path: str) -> str:
         """الحصول على رابط ملف من تليجرام"""
-        return f"https://api.telegram.org/file/bot{cls.BOT_TOKEN}/{file_path}"
+        return f"{cls.TELEGRAM_API_BASE}/file/bot{cls.BOT_TOKEN}/{file_path}"
 
 
 # إنشاء نسخة واحدة من الإعدادات
@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+File Events Module
+توزيع أحداث إضافة وحذف الملفات على المشتركين (SSE)
+
+مصدر الأحداث جدول file_events الذي يملؤه trigger على جدول files، لذلك تصل
+أحداث البوت والتنظيف وجميع العمليات الأخرى. كل عملية تشغّل خيط استطلاع واحداً
+(فقط عند وجود مشتركين) يوزع الأحداث الجديدة على طوابير المشتركين في الذاكرة،
+فلا تتغير تكلفة قاعدة البيانات بزيادة عدد المتصفحات المتصلة.
+
+معرّف BIGSERIAL يُحجز قبل COMMIT، فقد يظهر حدث بمعرّف أصغر بعد حدث أكبر منه.
+الاستطلاع يعيد قراءة ما بعد آخر حدث موزع، ويؤجل الحدث الذي يسبقه معرّف ناقص
+حتى يظهر أو تمر settle_seconds (معاملة ألغيت)، فتصل الأحداث بترتيب المعرّف
+ويبقى Last-Event-ID صالحاً للاستئناف.
+"""
+
+import logging
+import os
+import queue
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from ..db.base import Repositories
+
+from ..utils import metrics
+
+logger = logging.getLogger(__name__)
+
+# حدث خاص: فات المشترك أكثر مما يمكن إعادته، يجب إعادة تحميل القائمة
+RESET = {'type': 'reset'}
+
+
+class Subscription:
+    """طابور أحداث مشترك واحد"""
+
+    def __init__(self, last_id: int, maxsize: int):
+        self.last_id = last_id
+        self._queue: 'queue.Queue[Dict[str, Any]]' = queue.Queue(maxsize)
+        self.closed = False
+
+    def offer(self, event: Dict[str, Any]) -> None:
+        """إضافة حدث إذا كان أحدث من آخر حدث وصل للمشترك"""
+        if self.closed or event['id'] <= self.last_id:
+            return
+        try:
+            self._queue.put_nowait(event)
+            self.last_id = event['id']
+        except queue.Full:
+            # مشترك بطيء: نغلقه ونطلب منه إعادة التحميل بدلاً من حجز الذاكرة
+            self.reset()
+
+    def reset(self) -> None:
+        self.closed = True
+        try:
+            self._queue.put_nowait(RESET)
+        except queue.Full:
+            with self._queue.mutex:
+                self._queue.queue.clear()
+            self._queue.put_nowait(RESET)
+
+    def get(self, timeout: float) -> Optional[Dict[str, Any]]:
+        """انتظار الحدث التالي (None عند انتهاء المهلة)"""
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+class EventBus:
+    """ناشر أحداث الملفات داخل العملية مع الاستطلاع من قاعدة البيانات"""
+
+    def __init__(
+        self,
+        repos: Repositories,
+        poll_interval: float = 1.0,
+        replay_limit: int = 500,
+        max_subscribers: int = 200,
+        queue_size: int = 1000,
+        settle_seconds: float = 5.0
+    ):
+        self.repos = repos
+        self.poll_interval = poll_interval
+        self.replay_limit = replay_limit
+        self.max_subscribers = max_subscribers
+        self.queue_size = queue_size
+        self.settle_seconds = settle_seconds
+
+        self._subscribers: List[Subscription] = []
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._pid: Optional[int] = None
+        self._last_id = 0
+        # أول ظهور لكل حدث مؤجل خلف معرّف ناقص
+        self._first_seen: Dict[int, float] = {}
+
+    def _fetch_since(self, last_id: int, limit: int) -> List[Dict[str, Any]]:
+        return [
+            {'id': row['id'], 'type': row['event_type'], 'file_id': row['file_id'], 'file': row.get('payload')}
+            for row in self.repos.events.since(last_id, limit)
+        ]
+
+    def _settled(self, events: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        الأحداث الجاهزة للتوزيع بالترتيب بعد self._last_id
+
+        الحدث الذي يسبقه معرّف ناقص ينتظر (مع ما بعده) حتى يظهر الناقص في
+        استطلاع لاحق أو تمر settle_seconds على ظهور الحدث.
+        """
+        now = time.monotonic()
+        ready: List[Dict[str, Any]] = []
+        expected = self._last_id + 1
+        for event in events:
+            first_seen = self._first_seen.setdefault(event['id'], now)
+            if event['id'] != expected and now - first_seen < self.settle_seconds:
+                break
+            ready.append(event)
+            expected = event['id'] + 1
+
+        last_id = ready[-1]['id'] if ready else self._last_id
+        self._first_seen = {event_id: seen for event_id, seen in self._first_seen.items() if event_id > last_id}
+        return ready
+
+    def _ensure_poller(self) -> None:
+        """تشغيل خيط الاستطلاع (مرة لكل عملية، ويتوقف عند عدم وجود مشتركين)"""
+        if self._thread and self._thread.is_alive() and self._pid == os.getpid():
+            return
+        self._last_id = self.repos.events.head()
+        self._first_seen = {}
+        self._pid = os.getpid()
+        self._thread = threading.Thread(target=self._poll, name='file-events', daemon=True)
+        self._thread.start()
+
+    def subscribe(self, last_event_id: Optional[int] = None) -> Optional[Subscription]:
+        """
+        اشتراك جديد، مع إعادة الأحداث الفائتة بعد last_event_id
+
+        Returns:
+            الاشتراك، أو None إذا امتلأ الحد الأقصى للمشتركين في هذه العملية
+        """
+        with self._lock:
+            if len(self._subscribers) >= self.max_subscribers:
+                return None
+
+            self._ensure_poller()
+            if last_event_id is None:
+                subscription = Subscription(self._last_id, self.queue_size)
+            else:
+                # القفل يمنع خيط الاستطلاع من تمرير أحداث أحدث قبل إعادة الفائتة بالترتيب
+                subscription = Subscription(last_event_id, self.queue_size)
+                backlog = self._fetch_since(last_event_id, self.replay_limit + 1)
+                if len(backlog) > self.replay_limit:
+                    subscription.reset()
+                # ما بعد آخر حدث موزع قد يسبقه معرّف لم يُثبت بعد: يصل من خيط الاستطلاع
+                for event in backlog[:self.replay_limit]:
+                    if event['id'] > self._last_id:
+                        break
+                    subscription.offer(event)
+
+            self._subscribers.append(subscription)
+            metrics.SSE_CLIENTS.inc()
+            return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        with self._lock:
+            if subscription in self._subscribers:
+                self._subscribers.remove(subscription)
+                metrics.SSE_CLIENTS.dec()
+
+    def notify(self) -> None:
+        """إيقاظ خيط الاستطلاع فوراً بعد تعديل الملفات في هذه العملية"""
+        self._wake.set()
+
+    def _poll(self) -> None:
+        while True:
+            with self._lock:
+                if not self._subscribers:
+                    self._thread = None
+                    return
+
+            try:
+                events = self._fetch_since(self._last_id, self.replay_limit)
+            except Exception as e:
+                logger.warning(f"⚠️ فشل جلب أحداث الملفات: {e}")
+                events = []
+
+            with self._lock:
+                ready = self._settled(events)
+                for event in ready:
+                    for subscription in self._subscribers:
+                        subscription.offer(event)
+                if ready:
+                    self._last_id = ready[-1]['id']
+
+            # دفعة ممتلئة وُزعت كاملة تعني وجود المزيد: نكمل بدون انتظار
+            if len(events) < self.replay_limit or len(ready) < len(events):
+                self._wake.wait(self.poll_interval)
+                self._wake.clear()
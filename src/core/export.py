@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Catalogue Export
+تصدير جدول الملفات كاملاً أو تغييراته منذ علامة بصيغة NDJSON أو CSV
+"""
+
+import argparse
+import base64
+import csv
+import io
+import json
+import logging
+import os
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+from ..db import Repositories
+from ..db.base import Row
+from ..utils.http_cache import parse_timestamp
+
+logger = logging.getLogger(__name__)
+
+# كل أعمدة files عدا file_url (يحتوي على توكن البوت)
+EXPORT_FIELDS = (
+    'id', 'file_name', 'file_size', 'file_type', 'mime_type', 'telegram_file_id', 'file_unique_id',
+    'message_id', 'caption', 'uploaded_by', 'folder_id', 'folder_path', 'created_at', 'updated_at'
+)
+EXPORT_FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv; charset=utf-8'
+}
+
+
+def encode_watermark(newest: Optional[Row], event_id: int) -> str:
+    """علامة نصية لموضع التصدير: آخر (updated_at, id) وآخر حدث حذف"""
+    data = {
+        'u': newest['updated_at'] if newest else None,
+        'i': newest['id'] if newest else 0,
+        'e': event_id
+    }
+    return base64.urlsafe_b64encode(json.dumps(data, separators=(',', ':')).encode()).decode().rstrip('=')
+
+
+def decode_watermark(token: str) -> Tuple[Optional[str], int, int]:
+    """(updated_at، id، رقم آخر حدث) من العلامة، ValueError إذا كانت تالفة"""
+    try:
+        data = json.loads(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)))
+        return data['u'], int(data['i']), int(data['e'])
+    except Exception:
+        raise ValueError("علامة التصدير غير صالحة")
+
+
+class CatalogExporter:
+    """
+    تصدير صفحة بعد صفحة بترتيب المفتاح (id، أو (updated_at, id) للتغييرات):
+    الذاكرة ثابتة مهما كان حجم الأرشيف والصفوف تبدأ بالوصول بعد أول صفحة.
+
+    التصدير يتوقف عند آخر صف وآخر حدث قبل أول صف، لكن العلامة المحفوظة تتأخر
+    عنهما safety_lag: updated_at هو وقت بدء المعاملة ومعرّف الحدث يُحجز قبل
+    COMMIT، فمعاملة تُثبت بعد التصدير قد تحمل مفتاحاً أقدم من آخر صف مُصدَّر.
+    التصدير التالي يعيد نافذة التأخير (قد يتكرر صف أو حذف)، ولا يضيع إلا ما
+    استمرت معاملته أطول من safety_lag.
+    """
+
+    def __init__(self, repos: Repositories, batch_size: int = 1000, safety_lag: float = 300.0):
+        self.repos = repos
+        self.batch_size = batch_size
+        self.safety_lag = safety_lag
+
+    def open(
+        self,
+        fmt: str = 'ndjson',
+        fields: Optional[Sequence[str]] = None,
+        since: Optional[str] = None,
+        with_uploaders: bool = False
+    ) -> Tuple[str, Iterator[bytes]]:
+        """
+        التحقق من الطلب وأخذ العلامة الحالية
+
+        Args:
+            since: علامة تصدير سابق (تغييرات فقط، مع صفوف حذف {id, deleted})
+
+        Returns:
+            (العلامة الجديدة، مولد أجزاء المخرجات)
+        """
+        if fmt not in EXPORT_FORMATS:
+            raise ValueError(f"صيغة غير مدعومة: {fmt}")
+        fields = list(fields or EXPORT_FIELDS)
+        unknown = [field for field in fields if field not in EXPORT_FIELDS]
+        if unknown:
+            raise ValueError(f"حقول غير معروفة: {', '.join(unknown)}")
+        start = decode_watermark(since) if since else None
+
+        newest, event_id = self.repos.files.sync_heads()
+        watermark = self._settled_watermark(newest, event_id)
+
+        # أعمدة المفتاح والرافع تُجلب دائماً وتُحذف من المخرجات إن لم تُطلب
+        select = list(dict.fromkeys(
+            ['id'] + (['updated_at'] if start else []) + (['uploaded_by'] if with_uploaders else []) + fields
+        ))
+        columns = fields + (['uploader_name'] if with_uploaders else []) + (['deleted'] if start else [])
+        if start:
+            rows = self._changes(select, start, newest, event_id)
+        else:
+            rows = self._all(select)
+        if with_uploaders:
+            rows = self._with_uploaders(rows)
+
+        encode = self._ndjson if fmt == 'ndjson' else self._csv
+        return watermark, encode(self._logged(rows, bool(start)), columns)
+
+    def _settled_watermark(self, newest: Optional[Row], event_id: int) -> str:
+        """
+        علامة متأخرة safety_lag عن (newest, event_id)
+
+        الصف غير المرئي الآن بدأت معاملته بعد now - lag فمفتاحه بعد cutoff.
+        معرّف حدثه حُجز بعد cutoff أيضاً، وكل حدث بدأ قبل cutoff - lag حُجز معرّفه
+        قبل cutoff، لذلك آخر معرّف قبل cutoff - lag أصغر من معرّفات الأحداث المتأخرة.
+        """
+        cutoff = datetime.fromtimestamp(time.time() - self.safety_lag, timezone.utc)
+        if newest and self._key(newest) > (cutoff, 0):
+            newest = {'updated_at': cutoff.isoformat(), 'id': 0}
+        settled_event = self.repos.files.event_id_before((cutoff - timedelta(seconds=self.safety_lag)).isoformat())
+        return encode_watermark(newest, min(event_id, settled_event))
+
+    def _all(self, select: List[str]) -> Iterator[List[Row]]:
+        """كل الصفوف بترتيب id"""
+        after_id = 0
+        while True:
+            batch = self.repos.files.scan(after_id, select, self.batch_size)
+            if batch:
+                yield batch
+            if len(batch) < self.batch_size:
+                return
+            after_id = batch[-1]['id']
+
+    def _changes(
+        self, select: List[str], start: Tuple[Optional[str], int, int], newest: Optional[Row], event_id: int
+    ) -> Iterator[List[Row]]:
+        """الصفوف المعدلة بعد العلامة حتى newest، ثم أحداث الحذف حتى event_id"""
+        updated_at, after_id, after_event = start
+        head = self._key(newest) if newest else None
+        while head is not None:
+            batch = self.repos.files.changed_since(updated_at, after_id, select, self.batch_size)
+            rows = [row for row in batch if self._key(row) <= head]
+            if rows:
+                yield [{**row, 'deleted': False} for row in rows]
+            if len(rows) < len(batch) or len(batch) < self.batch_size:
+                break
+            updated_at, after_id = batch[-1]['updated_at'], batch[-1]['id']
+
+        while after_event < event_id:
+            events = [event for event in self.repos.files.deleted_since(after_event, self.batch_size)
+                      if event['id'] <= event_id]
+            if not events:
+                break
+            yield [{'id': event['file_id'], 'deleted': True} for event in events]
+            after_event = events[-1]['id']
+
+    def _with_uploaders(self, batches: Iterator[List[Row]]) -> Iterator[List[Row]]:
+        """إضافة uploader_name (استعلام واحد لكل صفحة عن الأسماء غير المعروفة)"""
+        names: Dict[int, str] = {}
+        for batch in batches:
+            missing = {row['uploaded_by'] for row in batch if row.get('uploaded_by')} - names.keys()
+            if missing:
+                names.update(self.repos.users.names(list(missing)))
+            yield [
+                row if row.get('deleted') else {**row, 'uploader_name': names.get(row.get('uploaded_by'))}
+                for row in batch
+            ]
+
+    def _logged(self, batches: Iterator[List[Row]], incremental: bool) -> Iterator[List[Row]]:
+        count = 0
+        try:
+            for batch in batches:
+                count += len(batch)
+                yield batch
+        except Exception as e:
+            logger.error(f"❌ توقف التصدير بعد {count} صف: {e}")
+            raise
+        logger.info(f"📤 تم تصدير {count} صف{' (تغييرات)' if incremental else ''}")
+
+    @staticmethod
+    def _ndjson(batches: Iterator[List[Row]], columns: List[str]) -> Iterator[bytes]:
+        for batch in batches:
+            yield ''.join(
+                json.dumps({column: row[column] for column in columns if column in row},
+                           ensure_ascii=False, separators=(',', ':'), default=str) + '\n'
+                for row in batch
+            ).encode('utf-8')
+
+    @staticmethod
+    def _csv(batches: Iterator[List[Row]], columns: List[str]) -> Iterator[bytes]:
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, columns, extrasaction='ignore', lineterminator='\n')
+        writer.writeheader()
+        for batch in batches:
+            writer.writerows(batch)
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+        if buffer.tell():
+            yield buffer.getvalue().encode('utf-8')
+
+    @staticmethod
+    def _key(row: Row) -> Tuple[datetime, int]:
+        return parse_timestamp(row['updated_at']), row['id']
+
+
+def export_filename(fmt: str, incremental: bool = False) -> str:
+    kind = 'changes' if incremental else 'files'
+    return f"{kind}-{datetime.utcnow().strftime('%Y%m%d-%H%M%S')}.{fmt}"
+
+
+def run_export(argv: Optional[List[str]] = None) -> None:
+    """
+    python run.py export [--format csv] [--uploaders] [--state FILE] [--output FILE]
+
+    مع --state: تُقرأ العلامة من الملف (تغييرات فقط) وتُحفظ العلامة الجديدة بعد
+    نجاح التصدير، للمزامنة الليلية.
+    """
+    from supabase import create_client
+    from .config import config
+    from ..db import create_repositories
+    from ..utils.metrics import instrument_supabase
+
+    parser = argparse.ArgumentParser(prog='run.py export', description='تصدير جدول الملفات')
+    parser.add_argument('--format', choices=list(EXPORT_FORMATS), default='ndjson')
+    parser.add_argument('--fields', default='', help='أعمدة مفصولة بفواصل (الافتراضي: الكل)')
+    parser.add_argument('--uploaders', action='store_true', help='إضافة uploader_name')
+    parser.add_argument('--since', default='', help='علامة تصدير سابق')
+    parser.add_argument('--state', default='', help='ملف العلامة (يُقرأ ويُحدّث)')
+    parser.add_argument('--output', default='-', help='ملف المخرجات (الافتراضي: stdout)')
+    args = parser.parse_args(argv)
+
+    since = args.since
+    if not since and args.state and os.path.exists(args.state):
+        with open(args.state) as f:
+            since = f.read().strip()
+
+    config.validate()
+    supabase = instrument_supabase(create_client(config.SUPABASE_URL, config.SUPABASE_KEY))
+    exporter = CatalogExporter(
+        create_repositories(supabase), config.EXPORT_BATCH_SIZE, config.EXPORT_SAFETY_LAG_SECONDS
+    )
+    fields = [field.strip() for field in args.fields.split(',') if field.strip()]
+    try:
+        watermark, chunks = exporter.open(args.format, fields, since or None, args.uploaders)
+    except ValueError as e:
+        parser.error(str(e))
+
+    if args.output == '-':
+        for chunk in chunks:
+            sys.stdout.buffer.write(chunk)
+        sys.stdout.buffer.flush()
+    else:
+        # الكتابة إلى ملف مؤقت حتى لا يبقى تصدير ناقص باسم الملف النهائي
+        with open(args.output + '.tmp', 'wb') as f:
+            for chunk in chunks:
+                f.write(chunk)
+        os.replace(args.output + '.tmp', args.output)
+
+    if args.state:
+        with open(args.state + '.tmp', 'w') as f:
+            f.write(watermark)
+        os.replace(args.state + '.tmp', args.state)
+    logger.info(f"🔖 علامة التصدير: {watermark}")
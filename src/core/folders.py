@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Folders System
+شجرة المجلدات بمسار مادي من المعرفات (/1/7/42/)
+
+تصفح مجلد هو استعلام بالفهرس (folder_id, created_at)، وتصفح شجرة كاملة نطاق
+على folder_path بالفهرس text_pattern_ops. عدد الملفات وحجمها لكل مجلد تحدّثه
+triggers في قاعدة البيانات عند الإضافة والحذف والنقل، فلا تحتاج القراءة أي تجميع.
+"""
+
+from typing import Any, Dict, List, Optional, Tuple
+
+from ..db.base import Repositories
+
+MAX_FOLDER_NAME_LENGTH = 255
+
+
+class FolderManager:
+    """مدير المجلدات"""
+
+    def __init__(self, repos: Repositories):
+        self.repos = repos
+
+    @staticmethod
+    def _validate_name(name: Optional[str]) -> Optional[str]:
+        """التحقق من اسم المجلد (يعيد رسالة الخطأ أو None)"""
+        if not name or not name.strip():
+            return "اسم المجلد مطلوب"
+        if len(name) > MAX_FOLDER_NAME_LENGTH:
+            return "اسم المجلد طويل جداً"
+        if '/' in name:
+            return "اسم المجلد لا يمكن أن يحتوي على /"
+        return None
+
+    def get_folder(self, folder_id: int) -> Optional[Dict[str, Any]]:
+        """الحصول على مجلد مع إجمالياته"""
+        return self.repos.folders.get(folder_id)
+
+    def list_children(self, parent_id: Optional[int] = None) -> List[Dict[str, Any]]:
+        """المجلدات الفرعية المباشرة (parent_id = None للجذر)"""
+        return self.repos.folders.children(parent_id)
+
+    def get_breadcrumbs(self, folder: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """سلسلة الأسلاف من الجذر حتى المجلد (من المسار مباشرة بدون استعلام تكراري)"""
+        ids = [int(part) for part in folder['path'].strip('/').split('/') if part]
+        if not ids:
+            return []
+        rows = self.repos.folders.get_many(ids, ('id', 'name', 'depth'))
+        return sorted(rows, key=lambda row: row['depth'])
+
+    def create_folder(
+        self,
+        name: str,
+        parent_id: Optional[int],
+        created_by: int
+    ) -> Tuple[bool, Optional[Dict[str, Any]], str]:
+        """إنشاء مجلد جديد"""
+        error = self._validate_name(name)
+        if error:
+            return False, None, error
+
+        try:
+            folder = self.repos.folders.create(name.strip(), parent_id, created_by)
+            return True, folder, "تم إنشاء المجلد بنجاح"
+        except Exception as e:
+            return False, None, f"خطأ: {str(e)}"
+
+    def rename_folder(self, folder_id: int, name: str) -> Tuple[bool, str]:
+        """إعادة تسمية مجلد (المسار من المعرفات فلا تتغير الشجرة)"""
+        error = self._validate_name(name)
+        if error:
+            return False, error
+
+        try:
+            if not self.repos.folders.rename(folder_id, name.strip()):
+                return False, "المجلد غير موجود"
+            return True, "تم تغيير اسم المجلد بنجاح"
+        except Exception as e:
+            return False, f"خطأ: {str(e)}"
+
+    def move_folder(self, folder_id: int, new_parent_id: Optional[int]) -> Tuple[bool, str]:
+        """نقل مجلد بكامل شجرته إلى مجلد آخر (None = الجذر)"""
+        if new_parent_id == folder_id:
+            return False, "لا يمكن نقل المجلد إلى نفسه"
+
+        try:
+            self.repos.folders.move(folder_id, new_parent_id)
+            # مسارات ملفات الشجرة تغيرت في قاعدة البيانات
+            self.repos.files.changed()
+            return True, "تم نقل المجلد بنجاح"
+        except Exception as e:
+            if 'into itself' in str(e):
+                return False, "لا يمكن نقل المجلد إلى أحد مجلداته الفرعية"
+            return False, f"خطأ: {str(e)}"
+
+    def delete_folder(self, folder_id: int) -> Tuple[bool, str]:
+        """حذف مجلد فارغ فقط"""
+        try:
+            folder = self.get_folder(folder_id)
+            if not folder:
+                return False, "المجلد غير موجود"
+            if folder['total_files'] or self.list_children(folder_id):
+                return False, "لا يمكن حذف مجلد غير فارغ"
+
+            self.repos.folders.delete(folder_id)
+            return True, "تم حذف المجلد بنجاح"
+        except Exception as e:
+            return False, f"خطأ: {str(e)}"
+
+    def move_files(self, file_ids: List[int], folder_id: Optional[int]) -> Tuple[bool, int, str]:
+        """نقل ملفات إلى مجلد (None = الجذر) في استعلام واحد"""
+        if not file_ids:
+            return False, 0, "لم يتم تحديد ملفات"
+
+        try:
+            if folder_id is not None and not self.get_folder(folder_id):
+                return False, 0, "المجلد غير موجود"
+
+            moved = self.repos.files.move_to_folder(file_ids, folder_id)
+            return True, moved, f"تم نقل {moved} ملف"
+        except Exception as e:
+            return False, 0, f"خطأ: {str(e)}"
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Password Hashing Module
+تشغيل bcrypt في مجمع عمليات محدود بدلاً من عامل الطلبات
+
+bcrypt بتكلفة 12 يستهلك ~250ms من المعالج، فتشغيله داخل عامل gunicorn يوقف
+تصفح الملفات أثناء تسجيلات الدخول المتزامنة. هنا يعمل في عمليات منفصلة بأولوية
+أقل، مع حد أقصى للطلبات المنتظرة: ما يزيد عنه أو ما يتجاوز المهلة يُرفض
+(HasherBusy) بدلاً من أن يتراكم.
+"""
+
+import atexit
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional
+
+import bcrypt
+
+logger = logging.getLogger(__name__)
+
+
+class HasherBusy(Exception):
+    """امتلأ طابور التشفير أو انتهت المهلة (يجب الرد بـ 503 مع Retry-After)"""
+
+
+def _lower_priority() -> None:
+    """عمليات التشفير بأولوية أقل من عمال الطلبات"""
+    try:
+        os.nice(5)
+    except OSError:
+        pass
+
+
+def _hash(password: str, rounds: int) -> str:
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds)).decode('utf-8')
+
+
+def _check(password: str, password_hash: str) -> bool:
+    return bcrypt.checkpw(password.encode('utf-8'), password_hash.encode('utf-8'))
+
+
+def hash_rounds(password_hash: str) -> Optional[int]:
+    """تكلفة bcrypt من الهاش ($2b$12$...)"""
+    try:
+        return int(password_hash.split('$')[2])
+    except (IndexError, ValueError):
+        return None
+
+
+class PasswordHasher:
+    """
+    مجمع عمليات bcrypt
+
+    Args:
+        rounds: تكلفة bcrypt للهاشات الجديدة
+        workers: عدد العمليات (0 = التشغيل في نفس العملية، مع بقاء حد الانتظار)
+        max_pending: أقصى عدد عمليات تشفير جارية أو منتظرة في هذه العملية
+        timeout: أقصى مدة انتظار للنتيجة
+    """
+
+    def __init__(self, rounds: int = 12, workers: int = 1, max_pending: int = 4, timeout: float = 10.0):
+        self.rounds = rounds
+        self.workers = workers
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._pid: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        """إنشاء المجمع عند أول استخدام في كل عملية (بعد fork الخاص بـ gunicorn)"""
+        pid = os.getpid()
+        if self._executor is not None and self._pid == pid:
+            return self._executor
+        with self._lock:
+            if self._executor is None or self._pid != pid:
+                # forkserver: لا نستنسخ عاملاً متعدد الخيوط قد يحمل أقفالاً
+                method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context(method),
+                    initializer=_lower_priority
+                )
+                self._pid = pid
+                atexit.register(self.shutdown)
+                logger.info(f"🔐 مجمع التشفير يعمل ({self.workers} عملية)")
+        return self._executor
+
+    def _wait(self, func, *args):
+        """تشغيل في المجمع؛ الموضع يُحرر عند انتهاء العملية فعلاً لا عند انتهاء المهلة"""
+        if not self._slots.acquire(blocking=False):
+            raise HasherBusy()
+        try:
+            future = self._get_executor().submit(func, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeout:
+            # العملية ما زالت تشغل موضعها؛ المهمة المنتظرة تُلغى فيتحرر موضعها
+            future.cancel()
+            logger.warning(f"⚠️ تجاوز التشفير {self.timeout:.0f} ثانية")
+            raise HasherBusy()
+
+    def _run(self, func, *args):
+        if self.workers <= 0:
+            if not self._slots.acquire(blocking=False):
+                raise HasherBusy()
+            try:
+                return func(*args)
+            finally:
+                self._slots.release()
+        try:
+            return self._wait(func, *args)
+        except BrokenProcessPool:
+            # عملية تشفير ماتت (OOM مثلاً): مجمع جديد ومحاولة واحدة أخرى
+            logger.warning("⚠️ إعادة إنشاء مجمع التشفير")
+            self._executor = None
+            return self._wait(func, *args)
+
+    def hash(self, password: str) -> str:
+        """تشفير كلمة مرور بالتكلفة الحالية"""
+        return self._run(_hash, password, self.rounds)
+
+    def verify(self, password: str, password_hash: str) -> bool:
+        """التحقق من كلمة المرور"""
+        return self._run(_check, password, password_hash)
+
+    def needs_rehash(self, password_hash: str) -> bool:
+        """هل الهاش أضعف من التكلفة الحالية؟"""
+        rounds = hash_rounds(password_hash)
+        return rounds is not None and rounds < self.rounds
+
+    def shutdown(self) -> None:
+        if self._executor is not None and self._pid == os.getpid():
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
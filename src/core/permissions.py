@@ -6,20 +6,19 @@ RBAC Permission System
 """
 
 from typing import Dict, List, Optional, Any, Tuple
-from supabase import Client
+from ..db import Repositories
 
 class PermissionManager:
     """مدير نظام الصلاحيات"""
     
-    def __init__(self, supabase: Client):
-        self.supabase = supabase
+    def __init__(self, repos: Repositories):
+        self.repos = repos
     
     def create_role(self, name: str, description: str, permissions: Dict[str, bool]) -> Tuple[bool, str]:
         """إنشاء صلاحية جديدة"""
         try:
             # التحقق من عدم وجود الصلاحية مسبقاً
-            result = self.supabase.table('roles').select('id').eq('name', name).execute()
-            if result.data:
+            if self.repos.roles.find_by_name(name):
                 return False, "اسم الصلاحية موجود مسبقاً"
             
             data = {
@@ -27,7 +26,7 @@ class PermissionManager:
                 'description': description,
                 'permissions': permissions
             }
-            self.supabase.table('roles').insert(data).execute()
+            self.repos.roles.create(data)
             return True, "تم إنشاء الصلاحية بنجاح"
         except Exception as e:
             return False, f"خطأ: {str(e)}"
@@ -48,7 +47,7 @@ class PermissionManager:
             if not update_data:
                 return False, "لا توجد بيانات للتحديث"
             
-            self.supabase.table('roles').update(update_data).eq('id', role_id).execute()
+            self.repos.roles.update(role_id, update_data)
             return True, "تم تحديث الصلاحية بنجاح"
         except Exception as e:
             return False, f"خطأ: {str(e)}"
@@ -57,11 +56,10 @@ class PermissionManager:
         """حذف صلاحية"""
         try:
             # التحقق من عدم استخدام الصلاحية
-            result = self.supabase.table('user_roles').select('id').eq('role_id', role_id).execute()
-            if result.data:
+            if self.repos.roles.is_assigned(role_id):
                 return False, "لا يمكن حذف الصلاحية لأنها مستخدمة من قبل مستخدمين"
             
-            self.supabase.table('roles').delete().eq('id', role_id).execute()
+            self.repos.roles.delete(role_id)
             return True, "تم حذف الصلاحية بنجاح"
         except Exception as e:
             return False, f"خطأ: {str(e)}"
@@ -69,8 +67,7 @@ class PermissionManager:
     def get_all_roles(self) -> List[Dict[str, Any]]:
         """الحصول على جميع الصلاحيات"""
         try:
-            result = self.supabase.table('roles').select('*').execute()
-            return result.data if result.data else []
+            return self.repos.roles.list_all()
         except Exception as e:
             print(f"❌ خطأ في الحصول على الصلاحيات: {e}")
             return []
@@ -78,8 +75,7 @@ class PermissionManager:
     def get_role_by_id(self, role_id: int) -> Optional[Dict[str, Any]]:
         """الحصول على صلاحية محددة"""
         try:
-            result = self.supabase.table('roles').select('*').eq('id', role_id).execute()
-            return result.data[0] if result.data else None
+            return self.repos.roles.get(role_id)
         except Exception as e:
             print(f"❌ خطأ في الحصول على الصلاحية: {e}")
             return None
@@ -88,21 +84,15 @@ class PermissionManager:
         """إسناد صلاحية لمستخدم"""
         try:
             # التحقق من وجود المستخدم
-            user_result = self.supabase.table('users').select('id').eq('id', user_id).execute()
-            if not user_result.data:
+            if not self.repos.users.get(user_id):
                 return False, "المستخدم غير موجود"
             
             # التحقق من وجود الصلاحية
-            role_result = self.supabase.table('roles').select('id').eq('id', role_id).execute()
-            if not role_result.data:
+            if not self.repos.roles.get(role_id):
                 return False, "الصلاحية غير موجودة"
             
             # إسناد الصلاحية
-            data = {
-                'user_id': user_id,
-                'role_id': role_id
-            }
-            self.supabase.table('user_roles').insert(data).execute()
+            self.repos.roles.assign(user_id, role_id)
             return True, "تم إسناد الصلاحية بنجاح"
         except Exception as e:
             if 'duplicate key' in str(e).lower():
@@ -112,7 +102,7 @@ class PermissionManager:
     def remove_role_from_user(self, user_id: int, role_id: int) -> Tuple[bool, str]:
         """إزالة صلاحية من مستخدم"""
         try:
-            self.supabase.table('user_roles').delete().eq('user_id', user_id).eq('role_id', role_id).execute()
+            self.repos.roles.unassign(user_id, role_id)
             return True, "تم إزالة الصلاحية بنجاح"
         except Exception as e:
             return False, f"خطأ: {str(e)}"
@@ -120,8 +110,7 @@ class PermissionManager:
     def get_user_roles(self, user_id: int) -> List[Dict[str, Any]]:
         """الحصول على صلاحيات مستخدم محدد"""
         try:
-            result = self.supabase.table('user_roles').select('*, roles(*)').eq('user_id', user_id).execute()
-            return [item['roles'] for item in result.data] if result.data else []
+            return self.repos.roles.roles_for_user(user_id)
         except Exception as e:
             print(f"❌ خطأ في الحصول على صلاحيات المستخدم: {e}")
             return []
@@ -156,8 +145,7 @@ class PermissionManager:
         """التحقق من صلاحية معينة للمستخدم"""
         try:
             # التحقق من الأدمن أولاً
-            user_result = self.supabase.table('users').select('is_admin').eq('id', user_id).execute()
-            if user_result.data and user_result.data[0]['is_admin']:
+            if self.repos.users.is_admin(user_id):
                 return True  # الأدمن له جميع الصلاحيات
             
             # الحصول على صلاحيات المستخدم
@@ -170,8 +158,7 @@ class PermissionManager:
     def get_users_with_role(self, role_id: int) -> List[Dict[str, Any]]:
         """الحصول على جميع المستخدمين الذين لديهم صلاحية معينة"""
         try:
-            result = self.supabase.table('user_roles').select('*, users(*)').eq('role_id', role_id).execute()
-            return [item['users'] for item in result.data] if result.data else []
+            return self.repos.roles.users_with_role(role_id)
         except Exception as e:
             print(f"❌ خطأ في الحصول على المستخدمين: {e}")
             return []
@@ -179,8 +166,7 @@ class PermissionManager:
     def get_all_users_with_permissions(self) -> List[Dict[str, Any]]:
         """الحصول على جميع المستخدمين مع صلاحياتهم"""
         try:
-            users_result = self.supabase.table('users').select('*').execute()
-            users = users_result.data if users_result.data else []
+            users = self.repos.users.list_all()
             
             # إضافة الصلاحيات لكل مستخدم
             for user in users:
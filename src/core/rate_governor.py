@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Telegram Rate Governor
+تنظيم معدل استدعاءات Bot API بين جميع العمليات (عمال gunicorn والمهام)
+
+كل مفتاح (bot:<id>، chat:<id>، cleanup ...) دلو رموز بخوارزمية GCRA: حالته رقم
+واحد (الوقت النظري للطلب التالي)، فيُخزن في ملف مشترك (mmap) ويُحدث تحت قفل
+fcntl. المستدعي يحجز دوره ثم ينتظر خارج القفل، فالطلبات تصطف بالمعدل المسموح
+بدلاً من أن تنطلق دفعة واحدة وتحصل على 429. retry_after من تليجرام يؤخر
+المفتاح لجميع العمليات.
+"""
+
+import hashlib
+import logging
+import mmap
+import os
+import struct
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows: التنظيم داخل العملية فقط
+    fcntl = None
+
+from ..utils.metrics import TELEGRAM_RATE_WAIT
+from .config import config
+
+logger = logging.getLogger(__name__)
+
+# (hash المفتاح، الوقت النظري للطلب التالي)
+_SLOT = struct.Struct('<Qd')
+# max_wait غير محدد: استخدام القيمة الافتراضية للمنظم
+DEFAULT_MAX_WAIT: Any = object()
+
+
+class Throttled(Exception):
+    """تجاوز حد تليجرام: الانتظار المطلوب أطول من المسموح للمستدعي"""
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"Telegram rate limit, retry after {retry_after:.1f}s")
+        self.retry_after = retry_after
+
+
+class RateGovernor:
+    """
+    دلاء رموز مشتركة بين العمليات
+
+    Args:
+        path: ملف الحالة المشترك (None = داخل العملية فقط)
+        limits: نوع المفتاح (ما قبل ':') -> (طلبات في الثانية، أقصى دفعة)
+        max_wait: أقصى انتظار افتراضي قبل رفع Throttled
+        slots: عدد المفاتيح التي تتسع لها الحالة
+    """
+
+    def __init__(
+        self,
+        path: Optional[str],
+        limits: Dict[str, Tuple[float, float]],
+        max_wait: Optional[float] = 10.0,
+        slots: int = 1024
+    ):
+        self.path = path if fcntl else None
+        self.limits = limits
+        self.max_wait = max_wait
+        self.slots = slots
+        self._lock = threading.Lock()
+        self._map: Optional[mmap.mmap] = None
+        self._fd: Optional[int] = None
+        self._pid: Optional[int] = None
+
+    def _open(self) -> mmap.mmap:
+        """فتح الحالة في كل عملية (قفل flock مرتبط بالملف المفتوح فلا يُورث عبر fork)"""
+        if self._map is not None and self._pid == os.getpid():
+            return self._map
+        size = self.slots * _SLOT.size
+        if self.path:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            try:
+                if os.fstat(fd).st_size < size:
+                    os.ftruncate(fd, size)
+            finally:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+            self._fd, self._map = fd, mmap.mmap(fd, size)
+        else:
+            self._fd, self._map = None, mmap.mmap(-1, size)
+        self._pid = os.getpid()
+        return self._map
+
+    @contextmanager
+    def _locked(self) -> Iterator[mmap.mmap]:
+        """قفل الخيوط ثم قفل الملف"""
+        with self._lock:
+            state = self._open()
+            if self._fd is not None:
+                fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                yield state
+            finally:
+                if self._fd is not None:
+                    fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def _params(self, key: str) -> Tuple[float, float]:
+        """(الفاصل بين الطلبات، سماحية الدفعة) لمفتاح"""
+        rate, burst = self.limits.get(key.split(':', 1)[0], (0.0, 1.0))
+        if rate <= 0:
+            return 0.0, 0.0
+        interval = 1.0 / rate
+        return interval, max(burst - 1, 0) * interval
+
+    def _slot(self, state: mmap.mmap, key: str, now: float) -> int:
+        """
+        موضع المفتاح في الحالة
+
+        البحث يستمر حتى المفتاح أو أول موضع فارغ، لأن المفتاح قد يكون بعد
+        مواضع خاملة تجاوزها عند إدراجه؛ إذا لم يوجد يأخذ أول موضع خامل (أو
+        الفارغ، أو أقدم مفتاح عند الامتلاء).
+        """
+        digest = int.from_bytes(hashlib.blake2b(key.encode('utf-8'), digest_size=8).digest(), 'little') or 1
+        start = digest % self.slots
+        free: Optional[int] = None
+        oldest, oldest_tat = start, float('inf')
+        for probe in range(self.slots):
+            index = (start + probe) % self.slots
+            stored, tat = _SLOT.unpack_from(state, index * _SLOT.size)
+            if stored == digest:
+                return index
+            if stored == 0:
+                if free is None:
+                    free = index
+                break
+            if free is None and tat < now - 3600:
+                free = index
+            if tat < oldest_tat:
+                oldest, oldest_tat = index, tat
+        index = oldest if free is None else free
+        _SLOT.pack_into(state, index * _SLOT.size, digest, 0.0)
+        return index
+
+    @staticmethod
+    def _read(state: mmap.mmap, index: int) -> float:
+        return _SLOT.unpack_from(state, index * _SLOT.size)[1]
+
+    @staticmethod
+    def _write(state: mmap.mmap, index: int, tat: float) -> None:
+        digest = _SLOT.unpack_from(state, index * _SLOT.size)[0]
+        _SLOT.pack_into(state, index * _SLOT.size, digest, tat)
+
+    def _reserve(self, keys: List[str], max_wait: Optional[float]) -> float:
+        """حجز دور على جميع المفاتيح (تحت القفل)؛ يعيد الانتظار حتى الدور"""
+        with self._locked() as state:
+            now = time.time()
+            slots = []
+            wait = 0.0
+            for key in keys:
+                interval, tolerance = self._params(key)
+                index = self._slot(state, key, now)
+                wait = max(wait, self._read(state, index) - tolerance - now)
+                slots.append((index, interval))
+            if max_wait is not None and wait > max_wait:
+                raise Throttled(wait)
+            # الحجز عند وقت الدور على جميع المفاتيح
+            turn = now + wait
+            for index, interval in slots:
+                self._write(state, index, max(self._read(state, index), turn) + interval)
+        return wait
+
+    def acquire(self, keys: Iterable[str], max_wait: Optional[float] = DEFAULT_MAX_WAIT) -> float:
+        """
+        حجز طلب على جميع المفاتيح والانتظار حتى دوره
+
+        Returns:
+            مدة الانتظار بالثواني
+
+        Raises:
+            Throttled: إذا كان الانتظار أطول من max_wait (بدون حجز، None = بلا حد)
+        """
+        keys = [key for key in keys if key]
+        if max_wait is DEFAULT_MAX_WAIT:
+            max_wait = self.max_wait
+        wait = self._reserve(keys, max_wait)
+
+        if keys:
+            TELEGRAM_RATE_WAIT.labels(keys[0].split(':', 1)[0]).observe(wait)
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    def try_acquire(self, key: str) -> Optional[float]:
+        """حجز طلب فوراً؛ يعيد الثواني المتبقية بدون حجز إذا لم يحن دوره"""
+        try:
+            self._reserve([key], 0.0)
+        except Throttled as e:
+            return e.retry_after
+        return None
+
+    def penalise(self, key: str, retry_after: float) -> None:
+        """لا طلبات على المفتاح قبل retry_after ثانية (في جميع العمليات)"""
+        _, tolerance = self._params(key)
+        with self._locked() as state:
+            now = time.time()
+            index = self._slot(state, key, now)
+            self._write(state, index, max(self._read(state, index), now + retry_after + tolerance))
+        logger.warning(f"⚠️ تليجرام طلب الانتظار {retry_after:.0f} ثانية ({key.split(':', 1)[0]})")
+
+    def wait_time(self, key: str) -> float:
+        """الانتظار الحالي لطلب جديد على المفتاح (بدون حجز)"""
+        _, tolerance = self._params(key)
+        with self._locked() as state:
+            now = time.time()
+            tat = self._read(state, self._slot(state, key, now))
+        return max(0.0, tat - tolerance - now)
+
+
+    def reset(self, key: str) -> None:
+        """نسيان حالة المفتاح (دلو ممتلئ من جديد)"""
+        with self._locked() as state:
+            self._write(state, self._slot(state, key, time.time()), 0.0)
+
+def create_telegram_governor(bots: int = 1) -> RateGovernor:
+    """منظم حدود Bot API من الإعدادات (دلو cleanup يتسع بعدد البوتات)"""
+    return RateGovernor(
+        config.TELEGRAM_RATE_STATE_FILE or None,
+        {
+            'bot': (config.TELEGRAM_BOT_RATE_PER_SECOND, config.TELEGRAM_BOT_BURST),
+            'chat': (config.TELEGRAM_CHAT_RATE_PER_MINUTE / 60, config.TELEGRAM_CHAT_BURST),
+            'cleanup': (config.CLEANUP_CALLS_PER_SECOND * bots, 1),
+        },
+        max_wait=config.TELEGRAM_MAX_WAIT_SECONDS
+    )
@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Rate Limiting Module
+تحديد معدل المحاولات (لكل IP ولكل حساب) بين جميع العمليات
+
+العدادات في منظم معدل مشترك (ملف mmap تحت قفل fcntl)، فالحد يسري على جميع عمال
+gunicorn معاً بدلاً من الحد × عدد العمال. كل مفتاح دلو GCRA: limit محاولة فوراً
+ثم محاولة كل window / limit ثانية، أي limit محاولة في أي window ثانية على المدى
+الطويل، والحالة رقم واحد لكل مفتاح مهما كان الحد.
+"""
+
+from typing import Dict, Optional, Tuple
+
+from .config import config
+from .rate_governor import RateGovernor
+
+
+class AttemptLimiter:
+    """حد المحاولات لنوع من المفاتيح (ip، account) في منظم مشترك"""
+
+    def __init__(self, governor: RateGovernor, kind: str):
+        self.governor = governor
+        self.kind = kind
+
+    def hit(self, key: str) -> Optional[float]:
+        """تسجيل محاولة؛ يعيد الثواني المتبقية إذا كان المفتاح فوق الحد (ولا تُسجّل)"""
+        return self.governor.try_acquire(f"{self.kind}:{key}")
+
+    def reset(self, key: str) -> None:
+        self.governor.reset(f"{self.kind}:{key}")
+
+
+def _window_limit(limit: int, window: float) -> Tuple[float, float]:
+    """(محاولات في الثانية، أقصى دفعة) لحد limit خلال window ثانية (0 = بلا حد)"""
+    if limit <= 0 or window <= 0:
+        return 0.0, 1.0
+    return limit / window, float(limit)
+
+
+def create_auth_limiters() -> Tuple[AttemptLimiter, AttemptLimiter]:
+    """حدود المصادقة من الإعدادات: (لكل IP، لكل حساب)"""
+    limits: Dict[str, Tuple[float, float]] = {
+        'ip': _window_limit(config.LOGIN_IP_LIMIT, config.LOGIN_IP_WINDOW_SECONDS),
+        'account': _window_limit(config.LOGIN_ACCOUNT_LIMIT, config.LOGIN_ACCOUNT_WINDOW_SECONDS),
+    }
+    governor = RateGovernor(config.LOGIN_RATE_STATE_FILE or None, limits, max_wait=0.0, slots=config.LOGIN_RATE_SLOTS)
+    return AttemptLimiter(governor, 'ip'), AttemptLimiter(governor, 'account')
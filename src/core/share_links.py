@@ -0,0 +1,321 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Share Links System
+نظام روابط المشاركة الموقعة بـ HMAC
+"""
+
+import atexit
+import base64
+import hashlib
+import hmac
+import logging
+import os
+import struct
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, Optional, Set, Tuple
+
+from ..db.base import Repositories
+from ..utils.http_cache import LRUCache
+
+logger = logging.getLogger(__name__)
+
+# file_id (4) + expires_at (4) + nonce (6)
+_PAYLOAD_FORMAT = '>II6s'
+_PAYLOAD_SIZE = struct.calcsize(_PAYLOAD_FORMAT)
+_SIGNATURE_SIZE = 16
+
+# رموز البث: scope (1) + user_id (4) + expires_at (4) + nonce (6)
+# تُوقع بنفس المفتاح مع بادئة مختلفة حتى لا يصلح رمز من نوع مكان الآخر
+_STREAM_FORMAT = '>BII6s'
+_STREAM_SIZE = struct.calcsize(_STREAM_FORMAT)
+_STREAM_DOMAIN = b'stream:'
+# المسارات التي تقبل ?token= (EventSource والروابط المباشرة لا تستطيع إرسال ترويسات)
+STREAM_SCOPES = {'events': 1, 'zip': 2}
+
+
+class ShareLinkManager:
+    """
+    مدير روابط المشاركة
+
+    الرمز يحمل معرف الملف وتاريخ الانتهاء وتوقيع HMAC، لذلك التحقق منه
+    لا يحتاج قاعدة البيانات؛ فقط مجموعة صغيرة من الروابط الملغاة تُحدَّث دورياً.
+    عدادات الوصول تُجمع في الذاكرة وتُكتب دفعة واحدة.
+
+    صفوف الملفات تُحفظ مؤقتاً لمدة قصيرة، وتُحذف فوراً عند حذف الملف من هذه
+    العملية (forget)؛ الحذف من عملية أخرى يظهر بعد انتهاء المدة على الأكثر.
+    """
+
+    def __init__(
+        self,
+        repos: Repositories,
+        secret: str,
+        revocation_refresh_seconds: int = 30,
+        revocation_retry_seconds: float = 2,
+        flush_interval_seconds: int = 10,
+        flush_threshold: int = 500,
+        file_cache_size: int = 1024,
+        file_cache_seconds: float = 60
+    ):
+        self.repos = repos
+        self._secret = secret.encode('utf-8')
+        self.revocation_refresh_seconds = revocation_refresh_seconds
+        self.revocation_retry_seconds = revocation_retry_seconds
+        self.flush_interval_seconds = flush_interval_seconds
+        self.flush_threshold = flush_threshold
+
+        # None = لم تُحمّل بعد
+        self._revoked: Optional[Set[str]] = None
+        self._revoked_refresh_at = 0.0
+        self._revoked_lock = threading.Lock()
+
+        self._file_cache = LRUCache(maxsize=file_cache_size, ttl=file_cache_seconds)
+
+        self._pending: Dict[str, int] = {}
+        self._pending_total = 0
+        self._pending_lock = threading.Lock()
+        self._flush_event = threading.Event()
+        self._flusher: Optional[threading.Thread] = None
+        self._flusher_pid: Optional[int] = None
+
+    # ========================================
+    # Tokens
+    # ========================================
+
+    def _sign(self, payload: bytes) -> bytes:
+        """توقيع الحمولة"""
+        return hmac.new(self._secret, payload, hashlib.sha256).digest()[:_SIGNATURE_SIZE]
+
+    def generate_token(self, file_db_id: int, expires_at: datetime) -> str:
+        """توليد رمز مشاركة موقع"""
+        payload = struct.pack(
+            _PAYLOAD_FORMAT,
+            file_db_id,
+            int(expires_at.timestamp()),
+            os.urandom(6)
+        )
+        raw = payload + self._sign(payload)
+        return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+    def generate_stream_token(self, user_db_id: int, scope: str, ttl_seconds: float) -> str:
+        """
+        رمز قصير العمر لمستخدم ومسار واحد (بدلاً من رمز الجلسة في الرابط)
+
+        الروابط تظهر في سجلات الوصول وملفات التعريف، فما يظهر فيها يصلح لمسار
+        واحد ولمدة قصيرة فقط.
+        """
+        payload = struct.pack(
+            _STREAM_FORMAT,
+            STREAM_SCOPES[scope],
+            user_db_id,
+            int(time.time() + ttl_seconds),
+            os.urandom(6)
+        )
+        raw = payload + self._sign(_STREAM_DOMAIN + payload)
+        return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+    def verify_stream_token(self, token: str, scope: str) -> Optional[int]:
+        """معرف المستخدم من رمز بث صالح لهذا المسار، أو None"""
+        try:
+            raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        except Exception:
+            return None
+
+        if len(raw) != _STREAM_SIZE + _SIGNATURE_SIZE:
+            return None
+
+        payload, signature = raw[:_STREAM_SIZE], raw[_STREAM_SIZE:]
+        if not hmac.compare_digest(signature, self._sign(_STREAM_DOMAIN + payload)):
+            return None
+
+        scope_id, user_db_id, expires_ts, _ = struct.unpack(_STREAM_FORMAT, payload)
+        if scope_id != STREAM_SCOPES.get(scope) or time.time() > expires_ts:
+            return None
+        return user_db_id
+
+    def verify_token(self, token: str) -> Optional[Dict[str, int]]:
+        """التحقق من الرمز بدون الرجوع لقاعدة البيانات"""
+        try:
+            raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        except Exception:
+            return None
+
+        if len(raw) != _PAYLOAD_SIZE + _SIGNATURE_SIZE:
+            return None
+
+        payload, signature = raw[:_PAYLOAD_SIZE], raw[_PAYLOAD_SIZE:]
+        if not hmac.compare_digest(signature, self._sign(payload)):
+            return None
+
+        file_db_id, expires_ts, _ = struct.unpack(_PAYLOAD_FORMAT, payload)
+        if time.time() > expires_ts:
+            return None
+
+        if self._is_revoked(token):
+            return None
+
+        return {'file_id': file_db_id, 'expires_at': expires_ts}
+
+    # ========================================
+    # Revocation
+    # ========================================
+
+    def _is_revoked(self, token: str) -> bool:
+        """
+        التحقق من مجموعة الروابط الملغاة مع تحديثها عند الحاجة
+
+        التحميل الأول ينتظره الجميع، وإذا فشل يُرفض الرابط: قبول رابط ملغى أسوأ
+        من رفض رابط صالح حتى تعود قاعدة البيانات. التحديثات اللاحقة في الخلفية
+        بالمجموعة السابقة، والتحديث الفاشل يُعاد بعد ثوانٍ لا بعد المدة كاملة.
+        """
+        if time.monotonic() >= self._revoked_refresh_at:
+            self._refresh_revoked(blocking=self._revoked is None)
+        revoked = self._revoked
+        return revoked is None or token in revoked
+
+    def _refresh_revoked(self, blocking: bool) -> None:
+        """تحميل الروابط الملغاة غير المنتهية فقط (مجموعة صغيرة)"""
+        if not self._revoked_lock.acquire(blocking=blocking):
+            return
+        try:
+            if time.monotonic() < self._revoked_refresh_at:
+                # حمّلها خيط آخر أثناء الانتظار
+                return
+            try:
+                self._revoked = set(self.repos.share_links.revoked_tokens(datetime.now(timezone.utc).isoformat()))
+                self._revoked_refresh_at = time.monotonic() + self.revocation_refresh_seconds
+            except Exception as e:
+                logger.error(f"❌ خطأ في تحديث الروابط الملغاة: {e}")
+                self._revoked_refresh_at = time.monotonic() + self.revocation_retry_seconds
+        finally:
+            self._revoked_lock.release()
+
+    def revoke_link(self, link_id: int, user: Dict[str, Any]) -> Tuple[bool, str]:
+        """إلغاء رابط مشاركة (المنشئ أو الأدمن فقط)"""
+        try:
+            link = self.repos.share_links.get(link_id)
+            if not link:
+                return False, "الرابط غير موجود"
+
+            if link['created_by'] != user['user_id'] and not user.get('is_admin'):
+                return False, "ليس لديك صلاحية إلغاء هذا الرابط"
+
+            self.repos.share_links.revoke(link_id, datetime.utcnow().isoformat())
+
+            if self._revoked is not None:
+                self._revoked.add(link['token'])
+            return True, "تم إلغاء الرابط بنجاح"
+        except Exception as e:
+            return False, f"خطأ: {str(e)}"
+
+    # ========================================
+    # Links
+    # ========================================
+
+    def create_link(
+        self,
+        file_db_id: int,
+        created_by: int,
+        expires_in_hours: int = 24
+    ) -> Tuple[bool, Optional[Dict[str, Any]], str]:
+        """إنشاء رابط مشاركة جديد"""
+        try:
+            file_info = self.get_file_info(file_db_id)
+            if not file_info:
+                return False, None, "الملف غير موجود"
+
+            expires_at = datetime.now(timezone.utc) + timedelta(hours=expires_in_hours)
+            token = self.generate_token(file_db_id, expires_at)
+
+            link_id = self.repos.share_links.create({
+                'file_id': file_db_id,
+                'token': token,
+                'created_by': created_by,
+                'expires_at': expires_at.isoformat()
+            })
+
+            return True, {
+                'id': link_id,
+                'token': token,
+                'expires_at': expires_at.isoformat()
+            }, "تم إنشاء رابط المشاركة بنجاح"
+        except Exception as e:
+            return False, None, f"خطأ: {str(e)}"
+
+    def get_file_info(self, file_db_id: int) -> Optional[Dict[str, Any]]:
+        """معلومات الملف من ذاكرة مؤقتة محدودة الحجم والمدة"""
+        info = self._file_cache.get(file_db_id)
+        if info is not None:
+            return info
+
+        rows = self.repos.files.get_many([file_db_id], ('id', 'telegram_file_id', 'bot_id', 'file_name', 'mime_type'))
+        if not rows:
+            return None
+
+        info = rows[0]
+        self._file_cache.set(file_db_id, info)
+        return info
+
+    def forget(self, file_db_ids: Optional[Iterable[int]] = None) -> None:
+        """إزالة ملفات محذوفة من الذاكرة المؤقتة (None = الكل)"""
+        if file_db_ids is None:
+            self._file_cache.clear()
+            return
+        for file_db_id in file_db_ids:
+            self._file_cache.pop(file_db_id)
+
+    # ========================================
+    # Access Counting
+    # ========================================
+
+    def record_access(self, token: str) -> None:
+        """تسجيل وصول في الذاكرة (يُكتب لاحقاً على دفعات)"""
+        self._ensure_flusher()
+        with self._pending_lock:
+            self._pending[token] = self._pending.get(token, 0) + 1
+            self._pending_total += 1
+            if self._pending_total >= self.flush_threshold:
+                self._flush_event.set()
+
+    def flush(self) -> int:
+        """كتابة العدادات المتراكمة في استدعاء RPC واحد"""
+        with self._pending_lock:
+            pending, self._pending = self._pending, {}
+            self._pending_total = 0
+
+        if not pending:
+            return 0
+
+        try:
+            self.repos.share_links.add_access(pending)
+            return len(pending)
+        except Exception as e:
+            logger.error(f"❌ خطأ في كتابة عدادات روابط المشاركة: {e}")
+            # إعادة العدادات لمحاولة لاحقة
+            with self._pending_lock:
+                for token, count in pending.items():
+                    self._pending[token] = self._pending.get(token, 0) + count
+                    self._pending_total += count
+            return 0
+
+    def _ensure_flusher(self) -> None:
+        """تشغيل خيط الكتابة الدورية (مرة لكل عملية)"""
+        pid = os.getpid()
+        if self._flusher_pid == pid and self._flusher and self._flusher.is_alive():
+            return
+        with self._pending_lock:
+            if self._flusher_pid == pid and self._flusher and self._flusher.is_alive():
+                return
+            self._flusher_pid = pid
+            self._flusher = threading.Thread(target=self._flush_loop, daemon=True)
+            self._flusher.start()
+            atexit.register(self.flush)
+
+    def _flush_loop(self) -> None:
+        """حلقة الكتابة الدورية"""
+        while True:
+            self._flush_event.wait(self.flush_interval_seconds)
+            self._flush_event.clear()
+            self.flush()
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Storage Stats Module
+إحصائيات التخزين من العرض storage_totals
+
+العدادات (عدد الملفات والحجم) لكل نوع ورافع ويوم وشهر يحدّثها trigger على
+جدول files في نفس معاملة الكتابة، لذلك القراءة لا تمر على جدول الملفات أبداً.
+مهمة دورية تعيد حسابها من files لتصحيح أي انحراف.
+"""
+
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List
+
+from ..db.base import Repositories
+
+
+class StatsManager:
+    """مدير إحصائيات التخزين"""
+
+    def __init__(self, repos: Repositories):
+        self.repos = repos
+
+    def get_stats(self, days: int = 30) -> Dict[str, Any]:
+        """
+        الإحصائيات الإجمالية وحسب النوع والرافع والشهر، وآخر days يوماً
+
+        استعلامان على المفتاح الأساسي فقط: عدد الصفوف لا يعتمد على عدد الملفات
+        """
+        since = (datetime.now(timezone.utc) - timedelta(days=days - 1)).strftime('%Y-%m-%d')
+        rows = self.repos.stats.counters(since)
+
+        grouped: Dict[str, List[Dict[str, Any]]] = {}
+        for row in rows:
+            grouped.setdefault(row['dimension'], []).append({
+                'key': row['key'],
+                'file_count': row['file_count'],
+                'total_bytes': row['total_bytes']
+            })
+
+        total = (grouped.get('total') or [{'file_count': 0, 'total_bytes': 0}])[0]
+        by_uploader = sorted(grouped.get('uploader', []), key=lambda item: -item['total_bytes'])
+        self._attach_uploader_names(by_uploader)
+
+        return {
+            'total': {'file_count': total['file_count'], 'total_bytes': total['total_bytes']},
+            'by_type': sorted(grouped.get('type', []), key=lambda item: -item['total_bytes']),
+            'by_uploader': by_uploader,
+            'by_month': sorted(grouped.get('month', []), key=lambda item: item['key']),
+            'by_day': sorted(grouped.get('day', []), key=lambda item: item['key'])
+        }
+
+    def _attach_uploader_names(self, items: List[Dict[str, Any]]) -> None:
+        """إضافة أسماء الرافعين (الملفات من البوت مفتاحها bot)"""
+        ids = [int(item['key']) for item in items if item['key'].isdigit()]
+        names: Dict[str, str] = {}
+        if ids:
+            names = {str(user_id): name for user_id, name in self.repos.users.names(ids).items()}
+        for item in items:
+            item['name'] = names.get(item['key'], 'البوت' if item['key'] == 'bot' else None)
+
+    def reconcile(self) -> int:
+        """إعادة حساب العدادات من files (يعيد عدد الصفوف المصححة)"""
+        return self.repos.stats.reconcile()
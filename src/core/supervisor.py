@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Process Supervisor
+تشغيل البوت والـ API والمهام الدورية كعمليات مستقلة ومراقبتها
+
+- إعادة تشغيل العملية المنتهية مع تأخير أسي (1، 2، 4 ... حتى RESTART_BACKOFF_MAX_SECONDS)
+- فحص صحة دوري: /health للـ API وملفات النبض للبوت والمهام
+- عند SIGTERM: تمرير الإشارة لجميع العمليات وانتظار إنهاء عملها ثم SIGKILL للمتأخرة
+"""
+
+import logging
+import os
+import signal
+import subprocess
+import sys
+import time
+from typing import Callable, Dict, List, Optional
+
+import requests
+
+from .config import config
+from ..utils import heartbeat
+
+logger = logging.getLogger(__name__)
+
+# العملية التي تعمل أطول من هذه المدة تعتبر مستقرة ويعاد عداد الفشل
+STABLE_SECONDS = 60
+MAX_HEALTH_FAILURES = 3
+
+
+def http_health(url: str, timeout: float = 5.0) -> Callable[[], bool]:
+    """فحص صحة عبر طلب HTTP"""
+    def check() -> bool:
+        try:
+            return requests.get(url, timeout=timeout).status_code == 200
+        except requests.RequestException:
+            return False
+    return check
+
+
+def heartbeat_health(path: str, max_age: float) -> Callable[[], bool]:
+    """فحص صحة عبر عمر ملف النبض"""
+    def check() -> bool:
+        last = heartbeat.age(path)
+        return last is not None and last <= max_age
+    return check
+
+
+class RoleSpec:
+    """تعريف دور تديره عملية المراقبة"""
+
+    def __init__(
+        self,
+        name: str,
+        command: List[str],
+        health_check: Optional[Callable[[], bool]] = None,
+        startup_grace: float = 30.0
+    ):
+        self.name = name
+        self.command = command
+        self.health_check = health_check
+        self.startup_grace = startup_grace
+
+
+class _Managed:
+    def __init__(self, spec: RoleSpec):
+        self.spec = spec
+        self.process: Optional[subprocess.Popen] = None
+        self.started_at = 0.0
+        self.failures = 0
+        self.restart_at: Optional[float] = 0.0
+        self.health_failures = 0
+        self.kill_at: Optional[float] = None
+
+    @property
+    def alive(self) -> bool:
+        return self.process is not None and self.process.poll() is None
+
+
+class Supervisor:
+    """مراقبة مجموعة من العمليات"""
+
+    def __init__(
+        self,
+        specs: List[RoleSpec],
+        health_interval: float = config.HEALTH_CHECK_INTERVAL_SECONDS,
+        drain_timeout: float = config.DRAIN_TIMEOUT_SECONDS,
+        backoff_max: float = config.RESTART_BACKOFF_MAX_SECONDS
+    ):
+        self.roles = [_Managed(spec) for spec in specs]
+        self.health_interval = health_interval
+        self.drain_timeout = drain_timeout
+        self.backoff_max = backoff_max
+        self._stopping = False
+        self._next_health = 0.0
+
+    def _request_stop(self, signum: int, frame: object) -> None:
+        logger.info(f"🛑 استلام الإشارة {signal.Signals(signum).name}، بدء الإيقاف التدريجي...")
+        self._stopping = True
+
+    def _start(self, role: _Managed) -> None:
+        env = dict(os.environ, ARCHIVE_ROLE=role.spec.name, ARCHIVE_SUPERVISED='1')
+        role.process = subprocess.Popen(role.spec.command, env=env)
+        role.started_at = time.monotonic()
+        role.restart_at = None
+        role.health_failures = 0
+        role.kill_at = None
+        logger.info(f"▶️ تم تشغيل {role.spec.name} (pid {role.process.pid})")
+
+    def _terminate(self, role: _Managed) -> None:
+        if role.alive:
+            role.process.send_signal(signal.SIGTERM)
+            role.kill_at = time.monotonic() + self.drain_timeout
+
+    def _reap(self, role: _Managed, now: float) -> None:
+        """اكتشاف العمليات المنتهية وجدولة إعادة تشغيلها"""
+        if role.process is None or role.alive or role.restart_at is not None:
+            return
+
+        from ..utils.metrics import mark_process_dead
+        mark_process_dead(role.process.pid)
+
+        runtime = now - role.started_at
+        role.failures = 1 if runtime >= STABLE_SECONDS else role.failures + 1
+        delay = min(self.backoff_max, 2 ** (role.failures - 1))
+        role.restart_at = now + delay
+        logger.warning(
+            f"⚠️ انتهت {role.spec.name} (رمز {role.process.returncode}) بعد {runtime:.0f} ث، "
+            f"إعادة التشغيل بعد {delay} ث"
+        )
+
+    def _check_health(self, now: float) -> None:
+        for role in self.roles:
+            check = role.spec.health_check
+            if not check or not role.alive or role.kill_at is not None:
+                continue
+            if now - role.started_at < role.spec.startup_grace:
+                continue
+
+            if check():
+                role.health_failures = 0
+                continue
+
+            role.health_failures += 1
+            logger.warning(f"⚠️ فشل فحص صحة {role.spec.name} ({role.health_failures}/{MAX_HEALTH_FAILURES})")
+            if role.health_failures >= MAX_HEALTH_FAILURES:
+                logger.error(f"❌ {role.spec.name} لا يستجيب، إعادة تشغيلها")
+                self._terminate(role)
+
+    def _tick(self) -> None:
+        now = time.monotonic()
+        for role in self.roles:
+            if role.kill_at is not None and role.alive and now >= role.kill_at:
+                logger.error(f"❌ {role.spec.name} لم تتوقف خلال المهلة، إرسال SIGKILL")
+                role.process.kill()
+            self._reap(role, now)
+            if role.restart_at is not None and now >= role.restart_at:
+                self._start(role)
+
+        if now >= self._next_health:
+            self._next_health = now + self.health_interval
+            self._check_health(now)
+
+    def _drain(self) -> None:
+        """إيقاف جميع العمليات بانتظار إنهاء عملها"""
+        for role in self.roles:
+            if role.alive:
+                role.process.send_signal(signal.SIGTERM)
+
+        deadline = time.monotonic() + self.drain_timeout
+        while time.monotonic() < deadline and any(role.alive for role in self.roles):
+            time.sleep(0.2)
+
+        for role in self.roles:
+            if role.alive:
+                logger.error(f"❌ {role.spec.name} لم تتوقف خلال {self.drain_timeout} ث، إرسال SIGKILL")
+                role.process.kill()
+                role.process.wait()
+
+    def run(self) -> int:
+        """تشغيل جميع الأدوار حتى استلام SIGTERM أو SIGINT"""
+        signal.signal(signal.SIGTERM, self._request_stop)
+        signal.signal(signal.SIGINT, self._request_stop)
+
+        for role in self.roles:
+            self._start(role)
+
+        while not self._stopping:
+            self._tick()
+            time.sleep(0.5)
+
+        self._drain()
+        logger.info("✅ تم إيقاف جميع العمليات")
+        return 0
+
+
+def build_role_specs(script: str, roles: List[str]) -> List[RoleSpec]:
+    """بناء تعريفات الأدوار القياسية (كل دور يعمل عبر: python run.py <role>)"""
+    host = config.HOST if config.HOST not in ('', '0.0.0.0', '::') else '127.0.0.1'
+    health_checks: Dict[str, Callable[[], bool]] = {
+        'api': http_health(f"http://{host}:{config.PORT}/health"),
+        'bot': heartbeat_health(heartbeat.heartbeat_path('bot'), config.HEALTH_MAX_AGE_SECONDS),
+        'jobs': heartbeat_health(heartbeat.heartbeat_path('jobs'), config.HEALTH_MAX_AGE_SECONDS),
+    }
+
+    specs = []
+    for role in roles:
+        if role == 'bot' and config.BOT_MODE == 'webhook':
+            logger.info("🔗 وضع webhook: التحديثات تصل عبر الـ API، لن يتم تشغيل عملية البوت")
+            continue
+        if role not in health_checks:
+            raise ValueError(f"❌ دور غير معروف: {role}")
+        specs.append(RoleSpec(role, [sys.executable, script, role], health_checks[role]))
+    return specs
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Data Access Layer
+طبقة الوصول للبيانات: اختيار خلفية المستودعات حسب الإعدادات
+"""
+
+import logging
+
+from supabase import Client
+
+from ..core.config import config
+from .base import Repositories
+from .supabase_backend import create_supabase_repositories
+
+logger = logging.getLogger(__name__)
+
+
+def create_repositories(supabase: Client, replica: bool = True) -> Repositories:
+    """
+    المستودعات حسب DB_BACKEND، مع النسخة المحلية للملفات إذا حُدد FILES_REPLICA_PATH
+
+    Args:
+        replica: False للعمليات التي لا تعرض القوائم (المهام) فلا تشغّل خيط مزامنة
+    """
+    repos = _create_backend(supabase)
+    if replica and config.FILES_REPLICA_PATH:
+        from .replica import FileReplica, ReplicaFiles
+        replica = FileReplica(
+            config.FILES_REPLICA_PATH,
+            repos.files,
+            sync_interval=config.FILES_REPLICA_SYNC_SECONDS,
+            max_lag=config.FILES_REPLICA_MAX_LAG_SECONDS,
+            full_sync_interval=config.FILES_REPLICA_FULL_SYNC_MINUTES * 60
+        )
+        repos.files = ReplicaFiles(repos.files, replica, serve_stale=config.FILES_REPLICA_SERVE_STALE)
+    return repos
+
+
+def _create_backend(supabase: Client) -> Repositories:
+    """
+    auto يختار Postgres المباشر إذا توفر DATABASE_URL و psycopg، وأي تعذر في
+    إعداده يعيد خلفية Supabase مع تحذير بدلاً من إيقاف التطبيق.
+    """
+    backend = config.DB_BACKEND
+    if backend == 'supabase' or (backend == 'auto' and not config.DATABASE_URL):
+        return create_supabase_repositories(supabase)
+
+    from .postgres_backend import PSYCOPG_AVAILABLE
+    if not PSYCOPG_AVAILABLE:
+        logger.warning("⚠️ psycopg غير مثبت (requirements-postgres.txt)، استخدام Supabase للوصول للبيانات")
+        return create_supabase_repositories(supabase)
+    if not config.DATABASE_URL:
+        logger.warning("⚠️ DATABASE_URL غير محدد، استخدام Supabase للوصول للبيانات")
+        return create_supabase_repositories(supabase)
+
+    from .postgres_backend import PostgresDatabase, create_postgres_repositories
+    try:
+        db = PostgresDatabase(
+            config.DATABASE_URL,
+            min_size=config.DB_POOL_MIN_SIZE,
+            max_size=config.DB_POOL_MAX_SIZE,
+            prepare=config.DB_PREPARE_STATEMENTS,
+            statement_timeout_ms=config.DB_STATEMENT_TIMEOUT_MS
+        )
+        logger.info("🐘 الوصول للبيانات عبر اتصال Postgres مباشر")
+        return create_postgres_repositories(db)
+    except Exception as e:
+        logger.warning(f"⚠️ تعذر إعداد Postgres ({e})، استخدام Supabase للوصول للبيانات")
+        return create_supabase_repositories(supabase)
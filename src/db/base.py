@@ -0,0 +1,367 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Repository Interfaces
+واجهات المستودعات المشتركة بين جميع الخلفيات
+
+التواريخ تُعاد كنصوص ISO 8601 في جميع الخلفيات (كما يعيدها PostgREST)، فلا
+يتغير شكل ردود الـ API عند تبديل الخلفية.
+"""
+
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+Row = Dict[str, Any]
+
+# أعمدة المجلد في جميع القراءات (مع الإجماليات التي تحدّثها triggers)
+FOLDER_FIELDS = 'id, name, parent_id, path, depth, file_count, total_files, total_bytes, created_at'
+
+
+class FileRepository(ABC):
+    """جدول files"""
+
+    @abstractmethod
+    def list_page(
+        self,
+        fields: Sequence[str],
+        search: str = '',
+        folder: Optional[Row] = None,
+        scoped: bool = False,
+        recursive: bool = False,
+        offset: int = 0,
+        limit: int = 30
+    ) -> Tuple[List[Row], int]:
+        """
+        صفحة من الملفات (الأحدث أولاً) مع العدد الكلي
+
+        Args:
+            fields: الأعمدة (يجب التحقق منها قبل الاستدعاء)
+            scoped: تقييد بمجلد (folder = None لملفات الجذر)
+            recursive: تضمين المجلدات الفرعية
+        """
+
+    @abstractmethod
+    def listing_state(
+        self,
+        search: str = '',
+        folder: Optional[Row] = None,
+        scoped: bool = False,
+        recursive: bool = False
+    ) -> Tuple[Optional[Row], int]:
+        """(أحدث ملف {id, created_at} أو None، العدد الكلي) لنفس شروط list_page"""
+
+    @abstractmethod
+    def get_many(self, ids: Sequence[int], fields: Sequence[str]) -> List[Row]:
+        ...
+
+    @abstractmethod
+    def find_unique_id(self, telegram_file_id: str) -> Optional[str]:
+        """file_unique_id لملف من telegram_file_id"""
+
+    @abstractmethod
+    def find_source(self, telegram_file_id: str) -> Optional[Row]:
+        """{bot_id, message_id} لملف من telegram_file_id (bot_id = None للرئيسي أو سجل قديم)"""
+
+    @abstractmethod
+    def copies(self, message_ids: Sequence[int]) -> Dict[int, Dict[int, str]]:
+        """file_id البوتات المساعدة لكل رسالة: {message_id: {bot_id: file_id}}"""
+
+    @abstractmethod
+    def add_copies(self, rows: Sequence[Row]) -> None:
+        """حفظ (أو تحديث) file_id بوت مساعد لرسائل: {message_id, bot_id, telegram_file_id}"""
+
+    @abstractmethod
+    def insert(self, row: Row) -> None:
+        ...
+
+    @abstractmethod
+    def delete(self, file_id: int) -> None:
+        ...
+
+    @abstractmethod
+    def delete_many(self, ids: Sequence[int]) -> None:
+        ...
+
+    @abstractmethod
+    def delete_by_telegram_id(self, telegram_file_id: str) -> None:
+        ...
+
+    @abstractmethod
+    def delete_by_message_id(self, message_id: int) -> int:
+        """حذف سجلات رسالة محذوفة من المجموعة (يعيد عدد السجلات)"""
+
+    @abstractmethod
+    def move_to_folder(self, ids: Sequence[int], folder_id: Optional[int]) -> int:
+        """نقل ملفات إلى مجلد (None = الجذر)، يعيد عدد الملفات المنقولة"""
+
+    def changed(self) -> None:
+        """إشعار بتعديل الملفات خارج المستودع (نقل المجلدات عبر FolderManager)"""
+
+    # ---------- قراءات المزامنة (النسخة المحلية) ----------
+
+    @abstractmethod
+    def scan(self, after_id: int, fields: Sequence[str], limit: int) -> List[Row]:
+        """صفحة بترتيب id بعد after_id (مزامنة كاملة)"""
+
+    @abstractmethod
+    def changed_since(self, updated_at: Optional[str], after_id: int, fields: Sequence[str], limit: int) -> List[Row]:
+        """الصفوف بعد العلامة (updated_at, id) بترتيبها (إضافة وتعديل ونقل)"""
+
+    @abstractmethod
+    def deleted_since(self, event_id: int, limit: int) -> List[Row]:
+        """أحداث الحذف {id, file_id} من file_events بعد event_id"""
+
+    @abstractmethod
+    def sync_heads(self) -> Tuple[Optional[Row], int]:
+        """(آخر صف معدل {updated_at, id} أو None، آخر معرف في file_events)"""
+
+    @abstractmethod
+    def event_id_before(self, created_at: str) -> int:
+        """آخر معرف في file_events لحدث أُنشئ قبل created_at (0 إذا لا يوجد)"""
+
+
+class SessionRepository(ABC):
+    """جدول sessions"""
+
+    @abstractmethod
+    def get_with_user(self, session_token: str) -> Optional[Row]:
+        """{expires_at, user: {id, user_id, full_name, email, is_admin}} أو None"""
+
+    @abstractmethod
+    def open(self, user_db_id: int, session_token: str, expires_at: str, password_hash: Optional[str] = None) -> None:
+        """
+        جلسة جديدة وتحديث last_login في معاملة واحدة (open_session)
+
+        Args:
+            password_hash: تشفير بالتكلفة الحالية لترقية كلمة المرور في نفس الاستدعاء
+        """
+
+    @abstractmethod
+    def delete(self, session_token: str) -> None:
+        ...
+
+
+class UserRepository(ABC):
+    """جدول users"""
+
+    @abstractmethod
+    def get(self, user_db_id: int) -> Optional[Row]:
+        ...
+
+    @abstractmethod
+    def find_by_identity(self, user_id: str, full_name: str) -> Optional[Row]:
+        """البحث بالرقم التعريفي والاسم (خطوة التفعيل)"""
+
+    @abstractmethod
+    def find_active_by_email(self, email: str) -> Optional[Row]:
+        ...
+
+    @abstractmethod
+    def is_admin(self, user_db_id: int) -> bool:
+        ...
+
+    @abstractmethod
+    def list_all(self) -> List[Row]:
+        ...
+
+    @abstractmethod
+    def names(self, user_db_ids: Sequence[int]) -> Dict[int, str]:
+        """{id: full_name} لعدة مستخدمين في استعلام واحد"""
+
+    @abstractmethod
+    def create_by_admin(self, user_id: str, full_name: str) -> bool:
+        """مستخدم غير مفعل جديد (False إذا كان الرقم التعريفي موجوداً)"""
+
+    @abstractmethod
+    def check_otp(self, user_db_id: int, email: str, code: str) -> str:
+        """
+        فحص رمز OTP بدون استهلاكه (check_otp)، قبل تشفير كلمة المرور
+
+        Returns:
+            valid أو invalid أو expired
+        """
+
+    @abstractmethod
+    def activate(self, user_db_id: int, email: str, code: str, password_hash: str) -> str:
+        """
+        استهلاك رمز OTP وتفعيل الحساب في معاملة واحدة (activate_user)
+
+        Returns:
+            activated أو invalid أو expired
+        """
+
+
+class RoleRepository(ABC):
+    """جدولا roles و user_roles"""
+
+    @abstractmethod
+    def list_all(self) -> List[Row]:
+        ...
+
+    @abstractmethod
+    def get(self, role_id: int) -> Optional[Row]:
+        ...
+
+    @abstractmethod
+    def find_by_name(self, name: str) -> Optional[Row]:
+        ...
+
+    @abstractmethod
+    def create(self, row: Row) -> None:
+        ...
+
+    @abstractmethod
+    def update(self, role_id: int, values: Row) -> None:
+        ...
+
+    @abstractmethod
+    def delete(self, role_id: int) -> None:
+        ...
+
+    @abstractmethod
+    def is_assigned(self, role_id: int) -> bool:
+        """هل الدور مسند لأي مستخدم؟"""
+
+    @abstractmethod
+    def assign(self, user_db_id: int, role_id: int) -> None:
+        """إسناد دور (يرفع استثناء يحتوي duplicate key إذا كان مسنداً)"""
+
+    @abstractmethod
+    def unassign(self, user_db_id: int, role_id: int) -> None:
+        ...
+
+    @abstractmethod
+    def roles_for_user(self, user_db_id: int) -> List[Row]:
+        ...
+
+    @abstractmethod
+    def users_with_role(self, role_id: int) -> List[Row]:
+        ...
+
+
+class OtpRepository(ABC):
+    """جدول otp_codes"""
+
+    @abstractmethod
+    def create(self, row: Row) -> Optional[int]:
+        """حفظ رمز جديد (يعيد معرّفه)"""
+
+    @abstractmethod
+    def set_delivery_status(self, otp_id: int, status: str) -> None:
+        ...
+
+    @abstractmethod
+    def latest_delivery_status(self, user_db_id: int, email: str) -> Optional[str]:
+        ...
+
+
+class FolderRepository(ABC):
+    """جدول folders، والإجماليات من العرض folder_totals (مجموع صفوف folder_counters)"""
+
+    @abstractmethod
+    def get(self, folder_id: int) -> Optional[Row]:
+        ...
+
+    @abstractmethod
+    def get_many(self, ids: Sequence[int], fields: Sequence[str]) -> List[Row]:
+        ...
+
+    @abstractmethod
+    def children(self, parent_id: Optional[int]) -> List[Row]:
+        """المجلدات الفرعية المباشرة مرتبة بالاسم (None = الجذر)"""
+
+    @abstractmethod
+    def create(self, name: str, parent_id: Optional[int], created_by: int) -> Optional[Row]:
+        """مجلد جديد مع مساره (create_folder)"""
+
+    @abstractmethod
+    def rename(self, folder_id: int, name: str) -> bool:
+        """False إذا لم يوجد المجلد"""
+
+    @abstractmethod
+    def move(self, folder_id: int, new_parent_id: Optional[int]) -> None:
+        """نقل الشجرة ومسارات ملفاتها (move_folder، يرفع استثناء into itself للحلقات)"""
+
+    @abstractmethod
+    def delete(self, folder_id: int) -> None:
+        ...
+
+
+class StatsRepository(ABC):
+    """العرض storage_totals (مجموع صفوف كل عداد في storage_stats)"""
+
+    @abstractmethod
+    def counters(self, since_day: str) -> List[Row]:
+        """{dimension, key, file_count, total_bytes} لكل الأبعاد، والأيام من since_day فقط"""
+
+    @abstractmethod
+    def reconcile(self) -> int:
+        """إعادة حساب العدادات من files (reconcile_storage_stats)، يعيد عدد الصفوف المصححة"""
+
+
+class ShareLinkRepository(ABC):
+    """جدول share_links"""
+
+    @abstractmethod
+    def create(self, row: Row) -> Optional[int]:
+        """حفظ رابط جديد (يعيد معرّفه)"""
+
+    @abstractmethod
+    def get(self, link_id: int) -> Optional[Row]:
+        ...
+
+    @abstractmethod
+    def revoke(self, link_id: int, revoked_at: str) -> None:
+        ...
+
+    @abstractmethod
+    def revoked_tokens(self, now: str) -> List[str]:
+        """رموز الروابط الملغاة التي لم تنته بعد (مجموعة صغيرة)"""
+
+    @abstractmethod
+    def add_access(self, counts: Dict[str, int]) -> None:
+        """إضافة عدادات الوصول {token: count} في استدعاء واحد (increment_share_link_access)"""
+
+
+class EventRepository(ABC):
+    """جدول file_events (تكتبه triggers على files)"""
+
+    @abstractmethod
+    def since(self, event_id: int, limit: int) -> List[Row]:
+        """الأحداث {id, event_type, file_id, payload} بعد event_id بترتيبها"""
+
+    @abstractmethod
+    def head(self) -> int:
+        """آخر معرف حدث (0 إذا كان الجدول فارغاً)"""
+
+    @abstractmethod
+    def prune(self, before: str) -> None:
+        """حذف الأحداث الأقدم من before"""
+
+
+class Repositories:
+    """المستودعات لخلفية واحدة"""
+
+    def __init__(
+        self,
+        backend: str,
+        files: FileRepository,
+        sessions: SessionRepository,
+        users: UserRepository,
+        roles: RoleRepository,
+        otp: OtpRepository,
+        folders: FolderRepository,
+        stats: StatsRepository,
+        share_links: ShareLinkRepository,
+        events: EventRepository
+    ):
+        self.backend = backend
+        self.files = files
+        self.sessions = sessions
+        self.users = users
+        self.roles = roles
+        self.otp = otp
+        self.folders = folders
+        self.stats = stats
+        self.share_links = share_links
+        self.events = events
@@ -0,0 +1,577 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Postgres Backend
+المستودعات عبر اتصال مباشر بـ Postgres (psycopg 3 + psycopg_pool)
+
+كل استعلام عبر PostgREST رحلة HTTPS مع ترميز JSON، بينما هنا استعلام على اتصال
+دائم من مجمع لكل عملية، والاستعلامات المتكررة (الجلسة، قائمة الملفات) تُحضّر
+مرة واحدة لكل اتصال (prepared statements). يجب تعطيل التحضير خلف pooler بوضع
+transaction (منفذ Supabase 6543).
+
+اختياري: pip install -r requirements-postgres.txt
+"""
+
+import logging
+import os
+import threading
+import time
+from datetime import date, datetime
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+from contextlib import contextmanager
+
+try:
+    import psycopg
+    from psycopg import sql
+    from psycopg.rows import dict_row
+    from psycopg.types.json import Jsonb
+    from psycopg_pool import ConnectionPool
+    PSYCOPG_AVAILABLE = True
+except ImportError:
+    PSYCOPG_AVAILABLE = False
+
+from ..utils.metrics import DB_QUERY_DURATION, observe_since
+from ..utils.timing import span
+from .base import (
+    FOLDER_FIELDS, EventRepository, FileRepository, FolderRepository, OtpRepository, Repositories, RoleRepository, Row,
+    SessionRepository, ShareLinkRepository, StatsRepository, UserRepository
+)
+
+logger = logging.getLogger(__name__)
+
+
+def _iso(row: Optional[Row]) -> Optional[Row]:
+    """التواريخ كنصوص ISO مثل PostgREST"""
+    if row is None:
+        return None
+    return {
+        key: value.isoformat() if isinstance(value, (datetime, date)) else value
+        for key, value in row.items()
+    }
+
+
+class PostgresDatabase:
+    """
+    مجمع اتصالات لكل عملية (يُنشأ عند أول استعلام بعد fork الخاص بـ gunicorn)
+
+    Args:
+        prepare: تحضير الاستعلامات من أول تنفيذ (False خلف pooler بوضع transaction)
+    """
+
+    def __init__(
+        self,
+        url: str,
+        min_size: int = 1,
+        max_size: int = 10,
+        prepare: bool = True,
+        statement_timeout_ms: int = 5000,
+        timeout: float = 10.0
+    ):
+        self.url = url
+        self.min_size = min_size
+        self.max_size = max_size
+        self.prepare = prepare
+        self.statement_timeout_ms = statement_timeout_ms
+        self.timeout = timeout
+        self._pool: Optional['ConnectionPool'] = None
+        self._pid: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def _get_pool(self) -> 'ConnectionPool':
+        pid = os.getpid()
+        if self._pool is not None and self._pid == pid:
+            return self._pool
+        with self._lock:
+            if self._pool is None or self._pid != pid:
+                options = f"-c statement_timeout={self.statement_timeout_ms}" if self.statement_timeout_ms else None
+                self._pool = ConnectionPool(
+                    self.url,
+                    min_size=self.min_size,
+                    max_size=self.max_size,
+                    timeout=self.timeout,
+                    kwargs={
+                        'row_factory': dict_row,
+                        'autocommit': True,
+                        # None = بدون تحضير، 0 = التحضير من أول تنفيذ
+                        'prepare_threshold': 0 if self.prepare else None,
+                        **({'options': options} if options else {})
+                    },
+                    name='archive-db',
+                    open=True
+                )
+                self._pid = pid
+                logger.info(f"🐘 مجمع اتصالات Postgres يعمل ({self.min_size}-{self.max_size})")
+        return self._pool
+
+    @contextmanager
+    def _cursor(self, table: str, operation: str) -> Iterator[Any]:
+        start = time.perf_counter()
+        try:
+            with span('db'), self._get_pool().connection() as conn, conn.cursor() as cur:
+                yield cur
+        finally:
+            observe_since(DB_QUERY_DURATION, start, table, operation)
+
+    def fetch_all(self, table: str, operation: str, query: Any, params: Sequence[Any] = ()) -> List[Row]:
+        with self._cursor(table, operation) as cur:
+            cur.execute(query, params)
+            return [_iso(row) for row in cur.fetchall()]
+
+    def fetch_one(self, table: str, operation: str, query: Any, params: Sequence[Any] = ()) -> Optional[Row]:
+        with self._cursor(table, operation) as cur:
+            cur.execute(query, params)
+            return _iso(cur.fetchone())
+
+    def execute(self, table: str, operation: str, query: Any, params: Sequence[Any] = ()) -> int:
+        """تنفيذ بدون نتائج (يعيد عدد الصفوف المتأثرة)"""
+        with self._cursor(table, operation) as cur:
+            cur.execute(query, params)
+            return cur.rowcount
+
+    def insert(self, table: str, row: Row, returning: Optional[str] = None) -> Optional[Row]:
+        columns = list(row)
+        query = sql.SQL("INSERT INTO {} ({}) VALUES ({}){}").format(
+            sql.Identifier(table),
+            sql.SQL(', ').join(map(sql.Identifier, columns)),
+            sql.SQL(', ').join(sql.Placeholder() * len(columns)),
+            sql.SQL(" RETURNING {}").format(sql.Identifier(returning)) if returning else sql.SQL('')
+        )
+        params = [Jsonb(value) if isinstance(value, dict) else value for value in row.values()]
+        if returning:
+            return self.fetch_one(table, 'insert', query, params)
+        self.execute(table, 'insert', query, params)
+        return None
+
+    def update(self, table: str, key: str, key_value: Any, values: Row) -> int:
+        query = sql.SQL("UPDATE {} SET {} WHERE {} = %s").format(
+            sql.Identifier(table),
+            sql.SQL(', ').join(sql.SQL("{} = %s").format(sql.Identifier(column)) for column in values),
+            sql.Identifier(key)
+        )
+        params = [Jsonb(value) if isinstance(value, dict) else value for value in values.values()]
+        return self.execute(table, 'update', query, params + [key_value])
+
+    def close(self) -> None:
+        if self._pool is not None and self._pid == os.getpid():
+            self._pool.close()
+            self._pool = None
+
+
+class PostgresFiles(FileRepository):
+    def __init__(self, db: PostgresDatabase):
+        self.db = db
+
+    @staticmethod
+    def _where(search: str, folder: Optional[Row], scoped: bool, recursive: bool) -> Tuple[Any, List[Any]]:
+        """نفس شروط _filter_folder والبحث في خلفية PostgREST"""
+        conditions, params = [], []
+        if scoped:
+            if folder is None:
+                if not recursive:
+                    conditions.append(sql.SQL("folder_id IS NULL"))
+            elif recursive:
+                conditions.append(sql.SQL("folder_path LIKE %s"))
+                params.append(f"{folder['path']}%")
+            else:
+                conditions.append(sql.SQL("folder_id = %s"))
+                params.append(folder['id'])
+        if search:
+            conditions.append(sql.SQL("file_name ILIKE %s"))
+            params.append(f"%{search}%")
+        if not conditions:
+            return sql.SQL(''), params
+        return sql.SQL(" WHERE ") + sql.SQL(" AND ").join(conditions), params
+
+    def list_page(self, fields, search='', folder=None, scoped=False, recursive=False, offset=0, limit=30):
+        where, params = self._where(search, folder, scoped, recursive)
+        # العدد في نفس الاستعلام؛ صفحة فارغة بعد النهاية تحتاج استعلام عدّ منفصل
+        query = sql.SQL("SELECT {}, count(*) OVER () AS __total FROM files{} "
+                        "ORDER BY created_at DESC LIMIT %s OFFSET %s").format(
+            sql.SQL(', ').join(map(sql.Identifier, fields)), where
+        )
+        rows = self.db.fetch_all('files', 'select', query, params + [limit, offset])
+        if rows:
+            total = rows[0]['__total']
+        else:
+            total = self.db.fetch_one(
+                'files', 'select', sql.SQL("SELECT count(*) AS total FROM files{}").format(where), params
+            )['total']
+        for row in rows:
+            del row['__total']
+        return rows, total
+
+    def listing_state(self, search='', folder=None, scoped=False, recursive=False):
+        where, params = self._where(search, folder, scoped, recursive)
+        query = sql.SQL("SELECT id, created_at, count(*) OVER () AS total FROM files{} "
+                        "ORDER BY created_at DESC LIMIT 1").format(where)
+        row = self.db.fetch_one('files', 'select', query, params)
+        if not row:
+            return None, 0
+        return {'id': row['id'], 'created_at': row['created_at']}, row['total']
+
+    def get_many(self, ids, fields):
+        query = sql.SQL("SELECT {} FROM files WHERE id = ANY(%s)").format(
+            sql.SQL(', ').join(map(sql.Identifier, fields))
+        )
+        return self.db.fetch_all('files', 'select', query, [list(ids)])
+
+    def find_unique_id(self, telegram_file_id):
+        row = self.db.fetch_one(
+            'files', 'select', "SELECT file_unique_id FROM files WHERE telegram_file_id = %s LIMIT 1",
+            [telegram_file_id]
+        )
+        return row.get('file_unique_id') if row else None
+
+    def find_source(self, telegram_file_id):
+        return self.db.fetch_one(
+            'files', 'select', "SELECT bot_id, message_id FROM files WHERE telegram_file_id = %s LIMIT 1",
+            [telegram_file_id]
+        )
+
+    def copies(self, message_ids):
+        copies: Dict[int, Dict[int, str]] = {}
+        message_ids = [message_id for message_id in message_ids if message_id]
+        if not message_ids:
+            return copies
+        rows = self.db.fetch_all(
+            'file_copies', 'select',
+            "SELECT message_id, bot_id, telegram_file_id FROM file_copies WHERE message_id = ANY(%s)",
+            [message_ids]
+        )
+        for row in rows:
+            copies.setdefault(row['message_id'], {})[row['bot_id']] = row['telegram_file_id']
+        return copies
+
+    def add_copies(self, rows):
+        if not rows:
+            return
+        self.db.execute(
+            'file_copies', 'upsert',
+            """
+            INSERT INTO file_copies (message_id, bot_id, telegram_file_id)
+            SELECT * FROM unnest(%s::BIGINT[], %s::BIGINT[], %s::TEXT[])
+            ON CONFLICT (message_id, bot_id) DO UPDATE SET telegram_file_id = EXCLUDED.telegram_file_id
+            """,
+            [[row['message_id'] for row in rows], [row['bot_id'] for row in rows],
+             [row['telegram_file_id'] for row in rows]]
+        )
+
+    def insert(self, row):
+        self.db.insert('files', row)
+
+    def delete(self, file_id):
+        self.db.execute('files', 'delete', "DELETE FROM files WHERE id = %s", [file_id])
+
+    def delete_many(self, ids):
+        self.db.execute('files', 'delete', "DELETE FROM files WHERE id = ANY(%s)", [list(ids)])
+
+    def delete_by_telegram_id(self, telegram_file_id):
+        self.db.execute('files', 'delete', "DELETE FROM files WHERE telegram_file_id = %s", [telegram_file_id])
+
+    def delete_by_message_id(self, message_id):
+        return self.db.execute('files', 'delete', "DELETE FROM files WHERE message_id = %s", [message_id])
+
+    def move_to_folder(self, ids, folder_id):
+        return self.db.execute(
+            'files', 'update', "UPDATE files SET folder_id = %s WHERE id = ANY(%s)", [folder_id, list(ids)]
+        )
+
+    def _select(self, fields):
+        return sql.SQL(', ').join(map(sql.Identifier, fields))
+
+    def scan(self, after_id, fields, limit):
+        query = sql.SQL("SELECT {} FROM files WHERE id > %s ORDER BY id LIMIT %s").format(self._select(fields))
+        return self.db.fetch_all('files', 'select', query, [after_id, limit])
+
+    def changed_since(self, updated_at, after_id, fields, limit):
+        if updated_at is None:
+            query = sql.SQL("SELECT {} FROM files ORDER BY updated_at, id LIMIT %s").format(self._select(fields))
+            return self.db.fetch_all('files', 'select', query, [limit])
+        query = sql.SQL(
+            "SELECT {} FROM files WHERE (updated_at, id) > (%s::timestamptz, %s) ORDER BY updated_at, id LIMIT %s"
+        ).format(self._select(fields))
+        return self.db.fetch_all('files', 'select', query, [updated_at, after_id, limit])
+
+    def deleted_since(self, event_id, limit):
+        return self.db.fetch_all(
+            'file_events', 'select',
+            "SELECT id, file_id FROM file_events WHERE event_type = 'delete' AND id > %s ORDER BY id LIMIT %s",
+            [event_id, limit]
+        )
+
+    def sync_heads(self):
+        newest = self.db.fetch_one(
+            'files', 'select', "SELECT updated_at, id FROM files ORDER BY updated_at DESC, id DESC LIMIT 1"
+        )
+        event = self.db.fetch_one('file_events', 'select', "SELECT max(id) AS id FROM file_events")
+        return newest, (event['id'] if event and event['id'] else 0)
+
+    def event_id_before(self, created_at):
+        event = self.db.fetch_one(
+            'file_events', 'select', "SELECT max(id) AS id FROM file_events WHERE created_at < %s", [created_at]
+        )
+        return event['id'] if event and event['id'] else 0
+
+
+class PostgresSessions(SessionRepository):
+    def __init__(self, db: PostgresDatabase):
+        self.db = db
+
+    def get_with_user(self, session_token):
+        row = self.db.fetch_one(
+            'sessions', 'select',
+            "SELECT s.expires_at, u.id, u.user_id, u.full_name, u.email, u.is_admin "
+            "FROM sessions s JOIN users u ON u.id = s.user_id WHERE s.session_token = %s",
+            [session_token]
+        )
+        if not row:
+            return None
+        expires_at = row.pop('expires_at')
+        return {'expires_at': expires_at, 'user': row}
+
+    def open(self, user_db_id, session_token, expires_at, password_hash=None):
+        self.db.execute(
+            'rpc', 'open_session', "SELECT open_session(%s, %s, %s, %s)",
+            [user_db_id, session_token, expires_at, password_hash]
+        )
+
+    def delete(self, session_token):
+        self.db.execute('sessions', 'delete', "DELETE FROM sessions WHERE session_token = %s", [session_token])
+
+
+class PostgresUsers(UserRepository):
+    def __init__(self, db: PostgresDatabase):
+        self.db = db
+
+    def get(self, user_db_id):
+        return self.db.fetch_one('users', 'select', "SELECT * FROM users WHERE id = %s", [user_db_id])
+
+    def find_by_identity(self, user_id, full_name):
+        return self.db.fetch_one(
+            'users', 'select', "SELECT * FROM users WHERE user_id = %s AND full_name = %s", [user_id, full_name]
+        )
+
+    def find_active_by_email(self, email):
+        return self.db.fetch_one(
+            'users', 'select', "SELECT * FROM users WHERE email = %s AND is_active", [email]
+        )
+
+    def is_admin(self, user_db_id):
+        row = self.db.fetch_one('users', 'select', "SELECT is_admin FROM users WHERE id = %s", [user_db_id])
+        return bool(row and row['is_admin'])
+
+    def list_all(self):
+        return self.db.fetch_all('users', 'select', "SELECT * FROM users ORDER BY id")
+
+    def names(self, user_db_ids):
+        rows = self.db.fetch_all(
+            'users', 'select', "SELECT id, full_name FROM users WHERE id = ANY(%s)", [list(user_db_ids)]
+        )
+        return {row['id']: row['full_name'] for row in rows}
+
+    def create_by_admin(self, user_id, full_name):
+        row = self.db.fetch_one(
+            'rpc', 'create_user_by_admin', "SELECT create_user_by_admin(%s, %s) AS created", [user_id, full_name]
+        )
+        return bool(row and row['created'])
+
+    def check_otp(self, user_db_id, email, code):
+        return self.db.fetch_one(
+            'rpc', 'check_otp', "SELECT check_otp(%s, %s, %s) AS status", [user_db_id, email, code]
+        )['status']
+
+    def activate(self, user_db_id, email, code, password_hash):
+        return self.db.fetch_one(
+            'rpc', 'activate_user', "SELECT activate_user(%s, %s, %s, %s) AS status",
+            [user_db_id, email, code, password_hash]
+        )['status']
+
+
+class PostgresRoles(RoleRepository):
+    def __init__(self, db: PostgresDatabase):
+        self.db = db
+
+    def list_all(self):
+        return self.db.fetch_all('roles', 'select', "SELECT * FROM roles ORDER BY id")
+
+    def get(self, role_id):
+        return self.db.fetch_one('roles', 'select', "SELECT * FROM roles WHERE id = %s", [role_id])
+
+    def find_by_name(self, name):
+        return self.db.fetch_one('roles', 'select', "SELECT id FROM roles WHERE name = %s", [name])
+
+    def create(self, row):
+        self.db.insert('roles', row)
+
+    def update(self, role_id, values):
+        self.db.update('roles', 'id', role_id, values)
+
+    def delete(self, role_id):
+        self.db.execute('roles', 'delete', "DELETE FROM roles WHERE id = %s", [role_id])
+
+    def is_assigned(self, role_id):
+        return self.db.fetch_one(
+            'user_roles', 'select', "SELECT 1 AS assigned FROM user_roles WHERE role_id = %s LIMIT 1", [role_id]
+        ) is not None
+
+    def assign(self, user_db_id, role_id):
+        self.db.insert('user_roles', {'user_id': user_db_id, 'role_id': role_id})
+
+    def unassign(self, user_db_id, role_id):
+        self.db.execute(
+            'user_roles', 'delete', "DELETE FROM user_roles WHERE user_id = %s AND role_id = %s", [user_db_id, role_id]
+        )
+
+    def roles_for_user(self, user_db_id):
+        return self.db.fetch_all(
+            'user_roles', 'select',
+            "SELECT r.* FROM user_roles ur JOIN roles r ON r.id = ur.role_id WHERE ur.user_id = %s",
+            [user_db_id]
+        )
+
+    def users_with_role(self, role_id):
+        return self.db.fetch_all(
+            'user_roles', 'select',
+            "SELECT u.* FROM user_roles ur JOIN users u ON u.id = ur.user_id WHERE ur.role_id = %s",
+            [role_id]
+        )
+
+
+class PostgresOtp(OtpRepository):
+    def __init__(self, db: PostgresDatabase):
+        self.db = db
+
+    def create(self, row):
+        result = self.db.insert('otp_codes', row, returning='id')
+        return result['id'] if result else None
+
+    def set_delivery_status(self, otp_id, status):
+        self.db.update('otp_codes', 'id', otp_id, {'delivery_status': status})
+
+    def latest_delivery_status(self, user_db_id, email):
+        row = self.db.fetch_one(
+            'otp_codes', 'select',
+            "SELECT delivery_status FROM otp_codes WHERE user_id = %s AND email = %s ORDER BY created_at DESC LIMIT 1",
+            [user_db_id, email]
+        )
+        return row.get('delivery_status') if row else None
+
+
+class PostgresFolders(FolderRepository):
+    def __init__(self, db: PostgresDatabase):
+        self.db = db
+
+    def get(self, folder_id):
+        return self.db.fetch_one(
+            'folders', 'select', f"SELECT {FOLDER_FIELDS} FROM folder_totals WHERE id = %s", [folder_id]
+        )
+
+    def get_many(self, ids, fields):
+        query = sql.SQL("SELECT {} FROM folders WHERE id = ANY(%s)").format(
+            sql.SQL(', ').join(map(sql.Identifier, fields))
+        )
+        return self.db.fetch_all('folders', 'select', query, [list(ids)])
+
+    def children(self, parent_id):
+        if parent_id is None:
+            return self.db.fetch_all(
+                'folders', 'select', f"SELECT {FOLDER_FIELDS} FROM folder_totals WHERE parent_id IS NULL ORDER BY name"
+            )
+        return self.db.fetch_all(
+            'folders', 'select', f"SELECT {FOLDER_FIELDS} FROM folder_totals WHERE parent_id = %s ORDER BY name", [parent_id]
+        )
+
+    def create(self, name, parent_id, created_by):
+        return self.db.fetch_one(
+            'rpc', 'create_folder', "SELECT * FROM create_folder(%s, %s, %s)", [name, parent_id, created_by]
+        )
+
+    def rename(self, folder_id, name):
+        return self.db.update('folders', 'id', folder_id, {'name': name}) > 0
+
+    def move(self, folder_id, new_parent_id):
+        self.db.execute('rpc', 'move_folder', "SELECT * FROM move_folder(%s, %s)", [folder_id, new_parent_id])
+
+    def delete(self, folder_id):
+        self.db.execute('folders', 'delete', "DELETE FROM folders WHERE id = %s", [folder_id])
+
+
+class PostgresStats(StatsRepository):
+    def __init__(self, db: PostgresDatabase):
+        self.db = db
+
+    def counters(self, since_day):
+        return self.db.fetch_all(
+            'storage_stats', 'select',
+            "SELECT dimension, key, file_count, total_bytes FROM storage_totals "
+            "WHERE dimension <> 'day' OR key >= %s",
+            [since_day]
+        )
+
+    def reconcile(self):
+        row = self.db.fetch_one('rpc', 'reconcile_storage_stats', "SELECT reconcile_storage_stats() AS fixed")
+        return (row['fixed'] or 0) if row else 0
+
+
+class PostgresShareLinks(ShareLinkRepository):
+    def __init__(self, db: PostgresDatabase):
+        self.db = db
+
+    def create(self, row):
+        result = self.db.insert('share_links', row, returning='id')
+        return result['id'] if result else None
+
+    def get(self, link_id):
+        return self.db.fetch_one(
+            'share_links', 'select', "SELECT id, token, created_by FROM share_links WHERE id = %s", [link_id]
+        )
+
+    def revoke(self, link_id, revoked_at):
+        self.db.update('share_links', 'id', link_id, {'revoked_at': revoked_at})
+
+    def revoked_tokens(self, now):
+        rows = self.db.fetch_all(
+            'share_links', 'select',
+            "SELECT token FROM share_links WHERE revoked_at IS NOT NULL AND expires_at > %s",
+            [now]
+        )
+        return [row['token'] for row in rows]
+
+    def add_access(self, counts):
+        self.db.execute(
+            'rpc', 'increment_share_link_access', "SELECT increment_share_link_access(%s)", [Jsonb(counts)]
+        )
+
+
+class PostgresEvents(EventRepository):
+    def __init__(self, db: PostgresDatabase):
+        self.db = db
+
+    def since(self, event_id, limit):
+        return self.db.fetch_all(
+            'file_events', 'select',
+            "SELECT id, event_type, file_id, payload FROM file_events WHERE id > %s ORDER BY id LIMIT %s",
+            [event_id, limit]
+        )
+
+    def head(self):
+        row = self.db.fetch_one('file_events', 'select', "SELECT max(id) AS id FROM file_events")
+        return row['id'] if row and row['id'] else 0
+
+    def prune(self, before):
+        self.db.execute('file_events', 'delete', "DELETE FROM file_events WHERE created_at < %s", [before])
+
+
+def create_postgres_repositories(db: PostgresDatabase) -> Repositories:
+    return Repositories(
+        'postgres',
+        files=PostgresFiles(db),
+        sessions=PostgresSessions(db),
+        users=PostgresUsers(db),
+        roles=PostgresRoles(db),
+        otp=PostgresOtp(db),
+        folders=PostgresFolders(db),
+        stats=PostgresStats(db),
+        share_links=PostgresShareLinks(db),
+        events=PostgresEvents(db)
+    )
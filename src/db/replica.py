@@ -0,0 +1,456 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Files Replica
+نسخة محلية (SQLite) من جدول files لقائمة الملفات والبحث
+
+القائمة والبحث من ملف محلي بوضع WAL بدلاً من رحلة إلى Supabase مع كل حرف
+يكتبه المستخدم، والبحث عبر فهرس FTS5 (trigram) يطابق الأجزاء مثل ILIKE. عملية
+واحدة على الجهاز (من يحصل على قفل الملف) تزامن النسخة:
+
+- تدريجياً من علامة (updated_at, id): الإضافة والتعديل ونقل المجلدات
+- الحذف من أحداث delete في file_events (علامة id منفصلة)
+- مزامنة كاملة دورية تصحح ما فات (معاملة تتأخر في الحفظ، أحداث محذوفة)
+
+القراءة من النسخة فقط إذا كانت حديثة (آخر مزامنة ناجحة خلال max_lag وبعد آخر
+كتابة من هذه العملية)، وإلا من الأساسي. serve_stale يعيد النسخة القديمة عند تعذر
+الوصول للأساسي بدلاً من الخطأ.
+"""
+
+import logging
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows: كل عملية تزامن النسخة بنفسها
+    fcntl = None
+
+from ..utils.metrics import DB_QUERY_DURATION, observe_since
+from ..utils.timing import span
+from .base import FileRepository, Row
+
+logger = logging.getLogger(__name__)
+
+# أعمدة النسخة (جميع الحقول المسموح بطلبها في القائمة + ما تحتاجه المزامنة والمجلدات)
+REPLICA_FIELDS = (
+    'id', 'file_name', 'file_size', 'file_type', 'mime_type', 'telegram_file_id', 'file_unique_id',
+    'message_id', 'caption', 'uploaded_by', 'folder_id', 'folder_path', 'created_at', 'updated_at'
+)
+
+_SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS files (
+    {', '.join(f'{field} INTEGER PRIMARY KEY' if field == 'id' else field for field in REPLICA_FIELDS)},
+    created_ts REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS files_created ON files(created_ts DESC, id DESC);
+CREATE INDEX IF NOT EXISTS files_folder_created ON files(folder_id, created_ts DESC);
+CREATE INDEX IF NOT EXISTS files_folder_path ON files(folder_path);
+CREATE VIRTUAL TABLE IF NOT EXISTS files_fts USING fts5(
+    file_name, caption, content='files', content_rowid='id', tokenize='trigram'
+);
+CREATE TRIGGER IF NOT EXISTS files_fts_insert AFTER INSERT ON files BEGIN
+    INSERT INTO files_fts(rowid, file_name, caption) VALUES (new.id, new.file_name, new.caption);
+END;
+CREATE TRIGGER IF NOT EXISTS files_fts_delete AFTER DELETE ON files BEGIN
+    INSERT INTO files_fts(files_fts, rowid, file_name, caption) VALUES ('delete', old.id, old.file_name, old.caption);
+END;
+CREATE TRIGGER IF NOT EXISTS files_fts_update AFTER UPDATE ON files BEGIN
+    INSERT INTO files_fts(files_fts, rowid, file_name, caption) VALUES ('delete', old.id, old.file_name, old.caption);
+    INSERT INTO files_fts(rowid, file_name, caption) VALUES (new.id, new.file_name, new.caption);
+END;
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+"""
+
+_UPSERT = "INSERT INTO files ({columns}, created_ts) VALUES ({values}, ?) ON CONFLICT(id) DO UPDATE SET {updates}".format(
+    columns=', '.join(REPLICA_FIELDS),
+    values=', '.join('?' * len(REPLICA_FIELDS)),
+    updates=', '.join(f'{field} = excluded.{field}' for field in REPLICA_FIELDS[1:] + ('created_ts',))
+)
+
+
+def _timestamp(value: Optional[str]) -> float:
+    """created_at كرقم للترتيب (صيغ ISO المختلفة لا تترتب نصياً بشكل موثوق)"""
+    if not value:
+        return 0.0
+    parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+
+class FileReplica:
+    """
+    ملف SQLite مع خيط مزامنة لكل عملية (واحد منها فقط يكتب)
+
+    Args:
+        primary: مستودع الملفات الأساسي (مصدر المزامنة)
+        sync_interval: الفاصل بين دورات المزامنة التدريجية
+        max_lag: أقصى عمر لآخر مزامنة ناجحة للقراءة من النسخة
+        full_sync_interval: الفاصل بين المزامنات الكاملة
+    """
+
+    def __init__(
+        self,
+        path: str,
+        primary: FileRepository,
+        sync_interval: float = 2.0,
+        max_lag: float = 30.0,
+        full_sync_interval: float = 3600.0,
+        batch_size: int = 1000
+    ):
+        self.path = path
+        self.primary = primary
+        self.sync_interval = sync_interval
+        self.max_lag = max_lag
+        self.full_sync_interval = full_sync_interval
+        self.batch_size = batch_size
+        self.enabled = True
+
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._pid: Optional[int] = None
+        self._lock_fd: Optional[int] = None
+        self._schema_pid: Optional[int] = None
+
+    # ---------- الاتصال ----------
+
+    def _conn(self) -> sqlite3.Connection:
+        """اتصال لكل خيط (sqlite3 لا يشارك الاتصال بين الخيوط، ولا يُورث عبر fork)"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None and self._local.pid == os.getpid():
+            return conn
+        conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute('PRAGMA synchronous = NORMAL')
+        self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def _ensure_schema(self) -> None:
+        if self._schema_pid == os.getpid():
+            return
+        with self._lock:
+            if self._schema_pid == os.getpid():
+                return
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            conn = self._conn()
+            conn.execute('PRAGMA journal_mode = WAL')
+            conn.executescript(_SCHEMA)
+            self._schema_pid = os.getpid()
+
+    def _meta(self) -> Dict[str, str]:
+        return {row['key']: row['value'] for row in self._conn().execute('SELECT key, value FROM meta')}
+
+    @staticmethod
+    def _set_meta(conn: sqlite3.Connection, **values: Any) -> None:
+        conn.executemany(
+            'INSERT INTO meta (key, value) VALUES (?, ?) ON CONFLICT(key) DO UPDATE SET value = excluded.value',
+            [(key, None if value is None else str(value)) for key, value in values.items()]
+        )
+
+    # ---------- الحالة ----------
+
+    def start(self) -> bool:
+        """تشغيل خيط المزامنة في هذه العملية (مرة بعد كل fork)؛ False إذا تعذر فتح النسخة"""
+        if not self.enabled:
+            return False
+        if self._thread and self._thread.is_alive() and self._pid == os.getpid():
+            return True
+        try:
+            self._ensure_schema()
+        except sqlite3.Error as e:
+            # مثلاً SQLite أقدم من 3.34 بدون tokenizer trigram
+            logger.warning(f"⚠️ تعطيل النسخة المحلية للملفات: {e}")
+            self.enabled = False
+            return False
+        with self._lock:
+            if not (self._thread and self._thread.is_alive() and self._pid == os.getpid()):
+                if self._lock_fd is not None and self._pid != os.getpid():
+                    # قفل موروث من العملية الأم: يبقى لها
+                    os.close(self._lock_fd)
+                self._pid = os.getpid()
+                self._lock_fd = None
+                self._thread = threading.Thread(target=self._sync_loop, name='files-replica', daemon=True)
+                self._thread.start()
+        return True
+
+    def wake(self) -> None:
+        """مزامنة فورية بعد كتابة من هذه العملية"""
+        self._wake.set()
+
+    def ready(self) -> bool:
+        """اكتملت مزامنة كاملة واحدة على الأقل"""
+        return self.start() and 'full_synced_at' in self._meta()
+
+    def fresh(self, written_at: float = 0.0) -> bool:
+        """آخر مزامنة ناجحة حديثة وبدأت بعد written_at"""
+        if not self.start():
+            return False
+        meta = self._meta()
+        if 'full_synced_at' not in meta or 'synced_at' not in meta:
+            return False
+        synced_at = float(meta['synced_at'])
+        return synced_at >= written_at and time.time() - synced_at <= self.max_lag
+
+    # ---------- المزامنة ----------
+
+    def _is_leader(self) -> bool:
+        """قفل ملف غير حاجز: عملية واحدة تكتب، وتتولى أخرى إذا توقفت"""
+        if fcntl is None:
+            return True
+        if self._lock_fd is not None:
+            return True
+        fd = os.open(self.path + '.lock', os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return False
+        self._lock_fd = fd
+        logger.info(f"🗂️ هذه العملية تزامن النسخة المحلية للملفات ({self.path})")
+        return True
+
+    def _sync_loop(self) -> None:
+        while True:
+            try:
+                if self._is_leader():
+                    self.sync_once()
+            except Exception as e:
+                logger.warning(f"⚠️ فشلت مزامنة النسخة المحلية للملفات: {e}")
+            self._wake.wait(self.sync_interval)
+            self._wake.clear()
+
+    def sync_once(self) -> None:
+        """دورة مزامنة واحدة (كاملة إذا حان وقتها)"""
+        self._ensure_schema()
+        started = time.time()
+        meta = self._meta()
+        full_synced_at = float(meta.get('full_synced_at') or 0)
+        if started - full_synced_at >= self.full_sync_interval:
+            self._full_sync(started)
+        else:
+            self._incremental_sync(meta)
+        self._set_meta(self._conn(), synced_at=started)
+
+    def _upsert(self, conn: sqlite3.Connection, rows: List[Row]) -> None:
+        conn.executemany(_UPSERT, [
+            tuple(row.get(field) for field in REPLICA_FIELDS) + (_timestamp(row.get('created_at')),)
+            for row in rows
+        ])
+
+    def _full_sync(self, started: float) -> None:
+        """نسخ الجدول كاملاً وحذف ما لم يعد موجوداً (القراء يرون النسخة القديمة حتى الحفظ)"""
+        newest, event_id = self.primary.sync_heads()
+        conn = self._conn()
+        conn.execute('CREATE TEMP TABLE IF NOT EXISTS seen (id INTEGER PRIMARY KEY)')
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.execute('DELETE FROM seen')
+            after_id = 0
+            while True:
+                rows = self.primary.scan(after_id, REPLICA_FIELDS, self.batch_size)
+                if not rows:
+                    break
+                self._upsert(conn, rows)
+                conn.executemany('INSERT OR IGNORE INTO seen (id) VALUES (?)', [(row['id'],) for row in rows])
+                after_id = rows[-1]['id']
+                if len(rows) < self.batch_size:
+                    break
+            removed = conn.execute('DELETE FROM files WHERE id NOT IN (SELECT id FROM seen)').rowcount
+            # التعديلات أثناء النسخ تُطبق في الدورة التدريجية التالية من علامات ما قبل النسخ
+            self._set_meta(
+                conn,
+                updated_at=newest['updated_at'] if newest else None,
+                updated_id=newest['id'] if newest else 0,
+                event_id=event_id,
+                full_synced_at=started
+            )
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        count = conn.execute('SELECT count(*) FROM files').fetchone()[0]
+        logger.info(f"🗂️ مزامنة كاملة للنسخة المحلية: {count} ملف (حذف {removed})")
+
+    def _incremental_sync(self, meta: Dict[str, str]) -> None:
+        conn = self._conn()
+        updated_at = meta.get('updated_at')
+        updated_id = int(meta.get('updated_id') or 0)
+        while True:
+            rows = self.primary.changed_since(updated_at, updated_id, REPLICA_FIELDS, self.batch_size)
+            if not rows:
+                break
+            updated_at, updated_id = rows[-1]['updated_at'], rows[-1]['id']
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                self._upsert(conn, rows)
+                self._set_meta(conn, updated_at=updated_at, updated_id=updated_id)
+                conn.execute('COMMIT')
+            except BaseException:
+                conn.execute('ROLLBACK')
+                raise
+            if len(rows) < self.batch_size:
+                break
+
+        event_id = int(meta.get('event_id') or 0)
+        while True:
+            events = self.primary.deleted_since(event_id, self.batch_size)
+            if not events:
+                break
+            event_id = events[-1]['id']
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                conn.executemany('DELETE FROM files WHERE id = ?', [(event['file_id'],) for event in events])
+                self._set_meta(conn, event_id=event_id)
+                conn.execute('COMMIT')
+            except BaseException:
+                conn.execute('ROLLBACK')
+                raise
+            if len(events) < self.batch_size:
+                break
+
+    # ---------- القراءة ----------
+
+    @staticmethod
+    def _where(search: str, folder: Optional[Row], scoped: bool, recursive: bool) -> Tuple[str, List[Any]]:
+        """نفس شروط _filter_folder والبحث في الخلفية الأساسية"""
+        conditions, params = [], []
+        if scoped:
+            if folder is None:
+                if not recursive:
+                    conditions.append('folder_id IS NULL')
+            elif recursive:
+                conditions.append('folder_path GLOB ?')
+                params.append(f"{folder['path']}*")
+            else:
+                conditions.append('folder_id = ?')
+                params.append(folder['id'])
+        if search:
+            # trigram يخدم LIKE من الفهرس للبحث بثلاثة أحرف فأكثر (بدون حساسية لحالة الأحرف)
+            conditions.append('id IN (SELECT rowid FROM files_fts WHERE file_name LIKE ?)')
+            params.append(f'%{search}%')
+        return (' WHERE ' + ' AND '.join(conditions) if conditions else ''), params
+
+    def _query(self, sql_text: str, params: Sequence[Any]) -> List[sqlite3.Row]:
+        start = time.perf_counter()
+        try:
+            with span('db'):
+                return self._conn().execute(sql_text, params).fetchall()
+        finally:
+            observe_since(DB_QUERY_DURATION, start, 'files_replica', 'select')
+
+    def list_page(self, fields, search='', folder=None, scoped=False, recursive=False, offset=0, limit=30):
+        where, params = self._where(search, folder, scoped, recursive)
+        rows = self._query(
+            f"SELECT {', '.join(fields)} FROM files{where} ORDER BY created_ts DESC, id DESC LIMIT ? OFFSET ?",
+            params + [limit, offset]
+        )
+        total = self._query(f"SELECT count(*) FROM files{where}", params)[0][0]
+        return [dict(row) for row in rows], total
+
+    def listing_state(self, search='', folder=None, scoped=False, recursive=False):
+        where, params = self._where(search, folder, scoped, recursive)
+        newest = self._query(f"SELECT id, created_at FROM files{where} ORDER BY created_ts DESC, id DESC LIMIT 1", params)
+        total = self._query(f"SELECT count(*) FROM files{where}", params)[0][0]
+        return (dict(newest[0]) if newest else None), total
+
+
+class ReplicaFiles(FileRepository):
+    """مستودع الملفات: القائمة والبحث من النسخة المحلية، وكل ما عداهما من الأساسي"""
+
+    def __init__(self, primary: FileRepository, replica: FileReplica, serve_stale: bool = False):
+        self.primary = primary
+        self.replica = replica
+        self.serve_stale = serve_stale
+        # آخر كتابة من هذه العملية: النسخة لا تُقرأ حتى تلحق بها (قراءة ما كتبه المستخدم)
+        self._written_at = 0.0
+        self._stale_logged_at = 0.0
+
+    def _read(self, method: str, fields: Sequence[str], *args: Any) -> Any:
+        usable = all(field in REPLICA_FIELDS for field in fields)
+        if usable and self.replica.fresh(self._written_at):
+            try:
+                return getattr(self.replica, method)(*args)
+            except sqlite3.Error as e:
+                logger.warning(f"⚠️ تعذرت القراءة من النسخة المحلية: {e}")
+        try:
+            return getattr(self.primary, method)(*args)
+        except Exception:
+            if not (usable and self.serve_stale and self.replica.ready()):
+                raise
+            if time.time() - self._stale_logged_at > 60:
+                self._stale_logged_at = time.time()
+                logger.warning("⚠️ قاعدة البيانات غير متاحة، عرض الملفات من النسخة المحلية القديمة")
+            return getattr(self.replica, method)(*args)
+
+    def changed(self) -> None:
+        self._written_at = time.time()
+        self.replica.wake()
+
+    def list_page(self, fields, search='', folder=None, scoped=False, recursive=False, offset=0, limit=30):
+        return self._read('list_page', fields, fields, search, folder, scoped, recursive, offset, limit)
+
+    def listing_state(self, search='', folder=None, scoped=False, recursive=False):
+        return self._read('listing_state', (), search, folder, scoped, recursive)
+
+    def get_many(self, ids, fields):
+        return self.primary.get_many(ids, fields)
+
+    def find_unique_id(self, telegram_file_id):
+        return self.primary.find_unique_id(telegram_file_id)
+
+    def find_source(self, telegram_file_id):
+        return self.primary.find_source(telegram_file_id)
+
+    def copies(self, message_ids):
+        return self.primary.copies(message_ids)
+
+    def add_copies(self, rows):
+        self.primary.add_copies(rows)
+
+    def insert(self, row):
+        self.primary.insert(row)
+        self.changed()
+
+    def delete(self, file_id):
+        self.primary.delete(file_id)
+        self.changed()
+
+    def delete_many(self, ids):
+        self.primary.delete_many(ids)
+        self.changed()
+
+    def delete_by_telegram_id(self, telegram_file_id):
+        self.primary.delete_by_telegram_id(telegram_file_id)
+        self.changed()
+
+    def delete_by_message_id(self, message_id):
+        deleted = self.primary.delete_by_message_id(message_id)
+        self.changed()
+        return deleted
+
+    def move_to_folder(self, ids, folder_id):
+        moved = self.primary.move_to_folder(ids, folder_id)
+        self.changed()
+        return moved
+
+    def scan(self, after_id, fields, limit):
+        return self.primary.scan(after_id, fields, limit)
+
+    def changed_since(self, updated_at, after_id, fields, limit):
+        return self.primary.changed_since(updated_at, after_id, fields, limit)
+
+    def deleted_since(self, event_id, limit):
+        return self.primary.deleted_since(event_id, limit)
+
+    def sync_heads(self):
+        return self.primary.sync_heads()
+
+    def event_id_before(self, created_at):
+        return self.primary.event_id_before(created_at)
@@ -0,0 +1,391 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Supabase Backend
+المستودعات عبر supabase-py و PostgREST (الخلفية الافتراضية والاحتياطية)
+"""
+
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from supabase import Client
+
+from .base import (
+    FOLDER_FIELDS, EventRepository, FileRepository, FolderRepository, OtpRepository, Repositories, RoleRepository, Row,
+    SessionRepository, ShareLinkRepository, StatsRepository, UserRepository
+)
+
+SESSION_USER_FIELDS = 'id, user_id, full_name, email, is_admin'
+
+
+def _first(result: Any) -> Optional[Row]:
+    return result.data[0] if result.data else None
+
+
+def _filter_folder(query: Any, folder: Optional[Row], recursive: bool) -> Any:
+    """
+    تقييد استعلام الملفات بمجلد
+
+    Args:
+        folder: المجلد، أو None لملفات الجذر المباشرة
+        recursive: تضمين المجلدات الفرعية (نطاق على folder_path)
+    """
+    if folder is None:
+        return query if recursive else query.is_('folder_id', 'null')
+    if recursive:
+        return query.like('folder_path', f"{folder['path']}%")
+    return query.eq('folder_id', folder['id'])
+
+
+class SupabaseFiles(FileRepository):
+    def __init__(self, supabase: Client):
+        self.supabase = supabase
+
+    def _filtered(self, select: str, search: str, folder: Optional[Row], scoped: bool, recursive: bool) -> Any:
+        query = self.supabase.table('files').select(select, count='exact')
+        if scoped:
+            query = _filter_folder(query, folder, recursive)
+        if search:
+            query = query.ilike('file_name', f'%{search}%')
+        return query.order('created_at', desc=True)
+
+    def list_page(self, fields, search='', folder=None, scoped=False, recursive=False, offset=0, limit=30):
+        result = self._filtered(','.join(fields), search, folder, scoped, recursive).range(
+            offset, offset + limit - 1
+        ).execute()
+        return result.data or [], result.count or 0
+
+    def listing_state(self, search='', folder=None, scoped=False, recursive=False):
+        result = self._filtered('id, created_at', search, folder, scoped, recursive).limit(1).execute()
+        return _first(result), result.count or 0
+
+    def get_many(self, ids, fields):
+        return self.supabase.table('files').select(','.join(fields)).in_('id', list(ids)).execute().data or []
+
+    def find_unique_id(self, telegram_file_id):
+        row = _first(self.supabase.table('files').select('file_unique_id').eq(
+            'telegram_file_id', telegram_file_id
+        ).limit(1).execute())
+        return row.get('file_unique_id') if row else None
+
+    def find_source(self, telegram_file_id):
+        return _first(self.supabase.table('files').select('bot_id, message_id').eq(
+            'telegram_file_id', telegram_file_id
+        ).limit(1).execute())
+
+    def copies(self, message_ids):
+        copies: Dict[int, Dict[int, str]] = {}
+        message_ids = [message_id for message_id in message_ids if message_id]
+        if not message_ids:
+            return copies
+        rows = self.supabase.table('file_copies').select('message_id, bot_id, telegram_file_id').in_(
+            'message_id', list(message_ids)
+        ).execute().data or []
+        for row in rows:
+            copies.setdefault(row['message_id'], {})[row['bot_id']] = row['telegram_file_id']
+        return copies
+
+    def add_copies(self, rows):
+        if rows:
+            self.supabase.table('file_copies').upsert(list(rows), on_conflict='message_id,bot_id').execute()
+
+    def insert(self, row):
+        self.supabase.table('files').insert(row).execute()
+
+    def delete(self, file_id):
+        self.supabase.table('files').delete().eq('id', file_id).execute()
+
+    def delete_many(self, ids):
+        self.supabase.table('files').delete().in_('id', list(ids)).execute()
+
+    def delete_by_telegram_id(self, telegram_file_id):
+        self.supabase.table('files').delete().eq('telegram_file_id', telegram_file_id).execute()
+
+    def delete_by_message_id(self, message_id):
+        result = self.supabase.table('files').delete().eq('message_id', message_id).execute()
+        return len(result.data or [])
+
+    def move_to_folder(self, ids, folder_id):
+        result = self.supabase.table('files').update({'folder_id': folder_id}).in_('id', list(ids)).execute()
+        return len(result.data or [])
+
+    def scan(self, after_id, fields, limit):
+        return self.supabase.table('files').select(','.join(fields)).gt('id', after_id).order(
+            'id'
+        ).limit(limit).execute().data or []
+
+    def changed_since(self, updated_at, after_id, fields, limit):
+        select = ','.join(fields)
+        if updated_at is None:
+            return self.supabase.table('files').select(select).order('updated_at').order(
+                'id'
+            ).limit(limit).execute().data or []
+        # بقية الصفوف بنفس updated_at ثم ما بعده (تعديل جماعي يعطي آلاف الصفوف نفس الوقت)
+        rows = self.supabase.table('files').select(select).eq('updated_at', updated_at).gt(
+            'id', after_id
+        ).order('id').limit(limit).execute().data or []
+        if len(rows) < limit:
+            rows += self.supabase.table('files').select(select).gt('updated_at', updated_at).order(
+                'updated_at'
+            ).order('id').limit(limit - len(rows)).execute().data or []
+        return rows
+
+    def deleted_since(self, event_id, limit):
+        return self.supabase.table('file_events').select('id, file_id').eq('event_type', 'delete').gt(
+            'id', event_id
+        ).order('id').limit(limit).execute().data or []
+
+    def sync_heads(self):
+        newest = _first(self.supabase.table('files').select('updated_at, id').order(
+            'updated_at', desc=True
+        ).order('id', desc=True).limit(1).execute())
+        event = _first(self.supabase.table('file_events').select('id').order('id', desc=True).limit(1).execute())
+        return newest, event['id'] if event else 0
+
+    def event_id_before(self, created_at):
+        event = _first(self.supabase.table('file_events').select('id').lt('created_at', created_at).order(
+            'id', desc=True
+        ).limit(1).execute())
+        return event['id'] if event else 0
+
+
+class SupabaseSessions(SessionRepository):
+    def __init__(self, supabase: Client):
+        self.supabase = supabase
+
+    def get_with_user(self, session_token):
+        row = _first(self.supabase.table('sessions').select(
+            f'expires_at, users({SESSION_USER_FIELDS})'
+        ).eq('session_token', session_token).execute())
+        if not row or not row.get('users'):
+            return None
+        return {'expires_at': row['expires_at'], 'user': row['users']}
+
+    def open(self, user_db_id, session_token, expires_at, password_hash=None):
+        self.supabase.rpc('open_session', {
+            'p_user_id': user_db_id,
+            'p_session_token': session_token,
+            'p_expires_at': expires_at,
+            'p_password_hash': password_hash
+        }).execute()
+
+    def delete(self, session_token):
+        self.supabase.table('sessions').delete().eq('session_token', session_token).execute()
+
+
+class SupabaseUsers(UserRepository):
+    def __init__(self, supabase: Client):
+        self.supabase = supabase
+
+    def get(self, user_db_id):
+        return _first(self.supabase.table('users').select('*').eq('id', user_db_id).execute())
+
+    def find_by_identity(self, user_id, full_name):
+        return _first(self.supabase.table('users').select('*').eq('user_id', user_id).eq(
+            'full_name', full_name
+        ).execute())
+
+    def find_active_by_email(self, email):
+        return _first(self.supabase.table('users').select('*').eq('email', email).eq('is_active', True).execute())
+
+    def is_admin(self, user_db_id):
+        row = _first(self.supabase.table('users').select('is_admin').eq('id', user_db_id).execute())
+        return bool(row and row['is_admin'])
+
+    def list_all(self):
+        return self.supabase.table('users').select('*').execute().data or []
+
+    def names(self, user_db_ids):
+        result = self.supabase.table('users').select('id, full_name').in_('id', list(user_db_ids)).execute()
+        return {row['id']: row['full_name'] for row in result.data or []}
+
+    def create_by_admin(self, user_id, full_name):
+        return bool(self.supabase.rpc('create_user_by_admin', {
+            'p_user_id': user_id,
+            'p_full_name': full_name
+        }).execute().data)
+
+    def check_otp(self, user_db_id, email, code):
+        return self.supabase.rpc('check_otp', {
+            'p_user_id': user_db_id,
+            'p_email': email,
+            'p_code': code
+        }).execute().data
+
+    def activate(self, user_db_id, email, code, password_hash):
+        return self.supabase.rpc('activate_user', {
+            'p_user_id': user_db_id,
+            'p_email': email,
+            'p_code': code,
+            'p_password_hash': password_hash
+        }).execute().data
+
+
+class SupabaseRoles(RoleRepository):
+    def __init__(self, supabase: Client):
+        self.supabase = supabase
+
+    def list_all(self):
+        return self.supabase.table('roles').select('*').execute().data or []
+
+    def get(self, role_id):
+        return _first(self.supabase.table('roles').select('*').eq('id', role_id).execute())
+
+    def find_by_name(self, name):
+        return _first(self.supabase.table('roles').select('id').eq('name', name).execute())
+
+    def create(self, row):
+        self.supabase.table('roles').insert(row).execute()
+
+    def update(self, role_id, values):
+        self.supabase.table('roles').update(values).eq('id', role_id).execute()
+
+    def delete(self, role_id):
+        self.supabase.table('roles').delete().eq('id', role_id).execute()
+
+    def is_assigned(self, role_id):
+        return bool(self.supabase.table('user_roles').select('id').eq('role_id', role_id).limit(1).execute().data)
+
+    def assign(self, user_db_id, role_id):
+        self.supabase.table('user_roles').insert({'user_id': user_db_id, 'role_id': role_id}).execute()
+
+    def unassign(self, user_db_id, role_id):
+        self.supabase.table('user_roles').delete().eq('user_id', user_db_id).eq('role_id', role_id).execute()
+
+    def roles_for_user(self, user_db_id):
+        result = self.supabase.table('user_roles').select('roles(*)').eq('user_id', user_db_id).execute()
+        return [item['roles'] for item in result.data or [] if item.get('roles')]
+
+    def users_with_role(self, role_id):
+        result = self.supabase.table('user_roles').select('users(*)').eq('role_id', role_id).execute()
+        return [item['users'] for item in result.data or [] if item.get('users')]
+
+
+class SupabaseOtp(OtpRepository):
+    def __init__(self, supabase: Client):
+        self.supabase = supabase
+
+    def create(self, row):
+        result = _first(self.supabase.table('otp_codes').insert(row).execute())
+        return result['id'] if result else None
+
+    def set_delivery_status(self, otp_id, status):
+        self.supabase.table('otp_codes').update({'delivery_status': status}).eq('id', otp_id).execute()
+
+    def latest_delivery_status(self, user_db_id, email):
+        row = _first(self.supabase.table('otp_codes').select('delivery_status').eq('user_id', user_db_id).eq(
+            'email', email
+        ).order('created_at', desc=True).limit(1).execute())
+        return row.get('delivery_status') if row else None
+
+
+class SupabaseFolders(FolderRepository):
+    def __init__(self, supabase: Client):
+        self.supabase = supabase
+
+    def get(self, folder_id):
+        return _first(self.supabase.table('folder_totals').select(FOLDER_FIELDS).eq('id', folder_id).execute())
+
+    def get_many(self, ids, fields):
+        return self.supabase.table('folders').select(','.join(fields)).in_('id', list(ids)).execute().data or []
+
+    def children(self, parent_id):
+        query = self.supabase.table('folder_totals').select(FOLDER_FIELDS)
+        if parent_id is None:
+            query = query.is_('parent_id', 'null')
+        else:
+            query = query.eq('parent_id', parent_id)
+        return query.order('name').execute().data or []
+
+    def create(self, name, parent_id, created_by):
+        result = self.supabase.rpc('create_folder', {
+            'p_name': name,
+            'p_parent_id': parent_id,
+            'p_created_by': created_by
+        }).execute()
+        return _first(result) if isinstance(result.data, list) else result.data
+
+    def rename(self, folder_id, name):
+        return bool(self.supabase.table('folders').update({'name': name}).eq('id', folder_id).execute().data)
+
+    def move(self, folder_id, new_parent_id):
+        self.supabase.rpc('move_folder', {
+            'p_folder_id': folder_id,
+            'p_new_parent_id': new_parent_id
+        }).execute()
+
+    def delete(self, folder_id):
+        self.supabase.table('folders').delete().eq('id', folder_id).execute()
+
+
+class SupabaseStats(StatsRepository):
+    def __init__(self, supabase: Client):
+        self.supabase = supabase
+
+    def counters(self, since_day):
+        rows = self.supabase.table('storage_totals').select(
+            'dimension, key, file_count, total_bytes'
+        ).neq('dimension', 'day').execute().data or []
+        return rows + (self.supabase.table('storage_totals').select(
+            'dimension, key, file_count, total_bytes'
+        ).eq('dimension', 'day').gte('key', since_day).execute().data or [])
+
+    def reconcile(self):
+        return self.supabase.rpc('reconcile_storage_stats', {}).execute().data or 0
+
+
+class SupabaseShareLinks(ShareLinkRepository):
+    def __init__(self, supabase: Client):
+        self.supabase = supabase
+
+    def create(self, row):
+        result = _first(self.supabase.table('share_links').insert(row).execute())
+        return result['id'] if result else None
+
+    def get(self, link_id):
+        return _first(self.supabase.table('share_links').select(
+            'id, token, created_by'
+        ).eq('id', link_id).execute())
+
+    def revoke(self, link_id, revoked_at):
+        self.supabase.table('share_links').update({'revoked_at': revoked_at}).eq('id', link_id).execute()
+
+    def revoked_tokens(self, now):
+        result = self.supabase.table('share_links').select('token').not_.is_(
+            'revoked_at', 'null'
+        ).gt('expires_at', now).execute()
+        return [row['token'] for row in result.data or []]
+
+    def add_access(self, counts):
+        self.supabase.rpc('increment_share_link_access', {'p_counts': counts}).execute()
+
+
+class SupabaseEvents(EventRepository):
+    def __init__(self, supabase: Client):
+        self.supabase = supabase
+
+    def since(self, event_id, limit):
+        return self.supabase.table('file_events').select('id, event_type, file_id, payload').gt(
+            'id', event_id
+        ).order('id').limit(limit).execute().data or []
+
+    def head(self):
+        row = _first(self.supabase.table('file_events').select('id').order('id', desc=True).limit(1).execute())
+        return row['id'] if row else 0
+
+    def prune(self, before):
+        self.supabase.table('file_events').delete().lt('created_at', before).execute()
+
+
+def create_supabase_repositories(supabase: Client) -> Repositories:
+    return Repositories(
+        'supabase',
+        files=SupabaseFiles(supabase),
+        sessions=SupabaseSessions(supabase),
+        users=SupabaseUsers(supabase),
+        roles=SupabaseRoles(supabase),
+        otp=SupabaseOtp(supabase),
+        folders=SupabaseFolders(supabase),
+        stats=SupabaseStats(supabase),
+        share_links=SupabaseShareLinks(supabase),
+        events=SupabaseEvents(supabase)
+    )
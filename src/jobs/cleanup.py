@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Cleanup Job
+حذف سجلات الملفات التي لم تعد موجودة في تليجرام
+"""
+
+import logging
+from typing import Any, Callable, Optional
+
+from ..core.bot_pool import NOT_FOUND, OK, THROTTLED, BotTokenPool, UnknownBot, classify
+from ..db.base import Repositories
+from ..utils import metrics
+
+logger = logging.getLogger(__name__)
+
+# محاولات الملف الواحد عند 429 (منظم المعدل ينتظر retry_after بين المحاولات)
+THROTTLED_ATTEMPTS = 3
+# الملفات تُقرأ صفحة بعد صفحة بترتيب id بدلاً من تحميل الجدول كاملاً
+SCAN_BATCH_SIZE = 500
+
+
+def cleanup_deleted_files(
+    repos: Repositories,
+    bot_pool: BotTokenPool,
+    mode: str,
+    should_stop: Optional[Callable[[], bool]] = None
+) -> int:
+    """
+    فحص جميع الملفات عبر getFile وحذف المفقودة منها
+
+    السجل يُحذف فقط عندما يقول تليجرام إن الملف غير موجود؛ حد المعدل والأخطاء
+    المؤقتة والملفات الأكبر من حد Bot API والملفات التي أصدرها بوت ليس في المجمع
+    تبقى كما هي. الإيقاع يحدده دلو cleanup في منظم المعدل بدلاً من فاصل ثابت.
+    """
+    total = max(repos.files.listing_state()[1], 1)
+    fields = ('id', 'telegram_file_id', 'bot_id', 'message_id', 'file_name')
+
+    deleted_count = 0
+    checked = 0
+    after_id = 0
+    while True:
+        files = repos.files.scan(after_id, fields, SCAN_BATCH_SIZE)
+        copies = repos.files.copies([file.get('message_id') for file in files]) if bot_pool.size > 1 else {}
+        for file in files:
+            if should_stop and should_stop():
+                logger.info(f"⏹️ تم إيقاف التنظيف بعد فحص {checked} ملف")
+                return deleted_count
+
+            checked += 1
+            metrics.CLEANUP_CHECKED_FILES.labels(mode).inc()
+            try:
+                for _ in range(THROTTLED_ATTEMPTS):
+                    r, _ = bot_pool.get_file(
+                        file['telegram_file_id'], file.get('bot_id'), copies.get(file.get('message_id')),
+                        bucket='cleanup', max_wait=None
+                    )
+                    status = classify(r)
+                    if status != THROTTLED or (should_stop and should_stop()):
+                        break
+            except UnknownBot as e:
+                # لا يمكن فحص الملف بتوكن آخر، فيبقى السجل حتى يُضاف البوت
+                logger.warning(f"⚠️ تخطي {file.get('file_name', 'unknown')} ({e})")
+                continue
+
+            if status == NOT_FOUND:
+                repos.files.delete(file['id'])
+                deleted_count += 1
+                metrics.CLEANUP_DELETED_FILES.labels(mode).inc()
+                logger.info(f"🗑️ تم حذف: {file.get('file_name', 'unknown')}")
+            elif status != OK:
+                logger.warning(f"⚠️ تخطي {file.get('file_name', 'unknown')} ({status}, {r.status_code})")
+
+            metrics.CLEANUP_PROGRESS.labels(mode).set(min(checked / total, 1.0))
+
+        if len(files) < SCAN_BATCH_SIZE:
+            break
+        after_id = files[-1]['id']
+
+    return deleted_count
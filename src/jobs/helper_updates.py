@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Helper Updates Job
+جمع file_id البوتات المساعدة لرسائل مجموعة التخزين
+"""
+
+import json
+import logging
+from typing import Any, Callable, Dict, List, Optional
+
+from ..core.bot_pool import OK, BotTokenPool, classify
+from ..db.base import Repositories
+
+logger = logging.getLogger(__name__)
+
+UPDATES_LIMIT = 100
+ALLOWED_UPDATES = json.dumps(['message', 'channel_post'])
+
+
+def media_file_id(message: Dict[str, Any]) -> Optional[str]:
+    """file_id الملف في رسالة بنفس ترتيب معالج البوت (المستند، أكبر صورة، الفيديو، الصوت)"""
+    if message.get('document'):
+        return message['document'].get('file_id')
+    if message.get('photo'):
+        return message['photo'][-1].get('file_id')
+    for field in ('video', 'audio', 'voice'):
+        if message.get(field):
+            return message[field].get('file_id')
+    return None
+
+
+def collect_helper_file_ids(
+    repos: Repositories,
+    bot_pool: BotTokenPool,
+    chat_id: int,
+    offsets: Dict[str, int],
+    should_stop: Optional[Callable[[], bool]] = None
+) -> int:
+    """
+    سحب تحديثات كل بوت مساعد (getUpdates) وحفظ file_id الخاص به لكل رسالة ملف
+
+    البوت المساعد يرى رسائل المجموعة فقط إذا كان مشرفاً فيها (أو وضع الخصوصية
+    معطلاً)، ولا يرى رسائل البوتات الأخرى: الملفات المرفوعة من الموقع تبقى على
+    البوت الرئيسي. offsets يحفظ آخر تحديث لكل توكن، وتليجرام لا يحذف التحديثات
+    قبل طلب offset بعدها، لذلك فشل الحفظ يعيدها في الدورة التالية.
+
+    Returns:
+        عدد النسخ المحفوظة
+    """
+    saved = 0
+    for token in bot_pool.helper_tokens:
+        bot_id = bot_pool.bot_id(token)
+        while not (should_stop and should_stop()):
+            params: Dict[str, Any] = {'timeout': 0, 'limit': UPDATES_LIMIT, 'allowed_updates': ALLOWED_UPDATES}
+            if token in offsets:
+                params['offset'] = offsets[token]
+            r, _ = bot_pool.call('getUpdates', token=token, params=params)
+            if classify(r) != OK:
+                # 409: للبوت webhook أو عملية أخرى تسحب تحديثاته
+                logger.warning(f"⚠️ تعذر سحب تحديثات البوت {bot_id} ({r.status_code})")
+                break
+
+            updates: List[Dict[str, Any]] = r.json().get('result') or []
+            if not updates:
+                break
+            rows = []
+            for update in updates:
+                message = update.get('message') or update.get('channel_post') or {}
+                file_id = media_file_id(message)
+                if file_id and (message.get('chat') or {}).get('id') == chat_id:
+                    rows.append({'message_id': message['message_id'], 'bot_id': bot_id, 'telegram_file_id': file_id})
+            repos.files.add_copies(rows)
+            saved += len(rows)
+            offsets[token] = updates[-1]['update_id'] + 1
+            if len(updates) < UPDATES_LIMIT:
+                break
+    return saved
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Job Runner
+تشغيل المهام الدورية في عملية مستقلة عن الـ API والبوت
+"""
+
+import logging
+import signal
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, List, Optional
+
+from supabase import create_client
+
+from ..core.bot_pool import BotTokenPool
+from ..core.config import config
+from ..core.rate_governor import create_telegram_governor
+from ..core.stats import StatsManager
+from ..db import Repositories, create_repositories
+from ..utils import heartbeat, metrics
+from .cleanup import cleanup_deleted_files
+from .helper_updates import collect_helper_file_ids
+
+logger = logging.getLogger(__name__)
+
+# تستقبل المهمة دالة تخبرها بطلب الإيقاف حتى تنهي عملها مبكراً
+JobFunc = Callable[[Callable[[], bool]], None]
+
+
+class _Job:
+    def __init__(self, name: str, interval: float, func: JobFunc, initial_delay: float):
+        self.name = name
+        self.interval = interval
+        self.func = func
+        self.next_run = time.monotonic() + initial_delay
+
+
+class JobRunner:
+    """جدولة المهام الدورية وتشغيلها بالتتابع مع ملف نبض"""
+
+    def __init__(self, heartbeat_file: Optional[str] = None):
+        self.heartbeat_file = heartbeat_file or heartbeat.heartbeat_path('jobs')
+        self._jobs: List[_Job] = []
+        self._stop = threading.Event()
+
+    def add(self, name: str, interval_seconds: float, func: JobFunc, initial_delay: float = 0) -> None:
+        """تسجيل مهمة دورية"""
+        self._jobs.append(_Job(name, interval_seconds, func, initial_delay))
+
+    def stop(self, *args: object) -> None:
+        """طلب الإيقاف (تنتهي المهمة الحالية أولاً)"""
+        self._stop.set()
+
+    @property
+    def stopping(self) -> bool:
+        return self._stop.is_set()
+
+    def _beat(self) -> None:
+        while not self._stop.is_set():
+            heartbeat.touch(self.heartbeat_file)
+            self._stop.wait(config.HEARTBEAT_INTERVAL_SECONDS)
+
+    def _run_job(self, job: _Job) -> None:
+        logger.info(f"▶️ بدء المهمة: {job.name}")
+        start = time.perf_counter()
+        status = 'ok'
+        try:
+            job.func(lambda: self._stop.is_set())
+        except Exception as e:
+            status = 'error'
+            logger.error(f"❌ فشلت المهمة {job.name}: {e}")
+        finally:
+            metrics.observe_since(metrics.JOB_DURATION, start, job.name, status)
+            job.next_run = time.monotonic() + job.interval
+
+    def run(self) -> None:
+        """حلقة الجدولة حتى طلب الإيقاف"""
+        threading.Thread(target=self._beat, name='jobs-heartbeat', daemon=True).start()
+        logger.info(f"⏱️ مشغل المهام يعمل ({', '.join(job.name for job in self._jobs)})")
+
+        while not self._stop.is_set() and self._jobs:
+            job = min(self._jobs, key=lambda j: j.next_run)
+            wait = job.next_run - time.monotonic()
+            if wait > 0:
+                self._stop.wait(wait)
+                continue
+            self._run_job(job)
+
+        logger.info("✅ تم إيقاف مشغل المهام")
+
+
+def create_job_runner(
+    repos: Optional[Repositories] = None, bot_pool: Optional[BotTokenPool] = None
+) -> JobRunner:
+    """إنشاء مشغل المهام مع المهام الافتراضية"""
+    if repos is None:
+        repos = create_repositories(
+            metrics.instrument_supabase(create_client(config.SUPABASE_URL, config.SUPABASE_KEY)), replica=False
+        )
+    if bot_pool is None:
+        bot_pool = BotTokenPool(
+            config.BOT_TOKEN,
+            config.HELPER_BOT_TOKENS,
+            penalty_seconds=config.BOT_POOL_PENALTY_SECONDS,
+            api_base=config.TELEGRAM_API_BASE,
+            governor=create_telegram_governor(1 + len(config.HELPER_BOT_TOKENS)),
+            http_pool_size=config.TELEGRAM_HTTP_POOL_SIZE
+        )
+
+    runner = JobRunner()
+
+    def cleanup(should_stop: Callable[[], bool]) -> None:
+        deleted_count = cleanup_deleted_files(repos, bot_pool, 'auto', should_stop)
+        logger.info(f"✅ انتهت عملية التنظيف التلقائي. تم حذف {deleted_count} ملف")
+
+    helper_offsets: Dict[str, int] = {}
+
+    def collect_helper_updates(should_stop: Callable[[], bool]) -> None:
+        saved = collect_helper_file_ids(repos, bot_pool, config.TARGET_GROUP_ID, helper_offsets, should_stop)
+        if saved:
+            logger.info(f"🤖 تم حفظ {saved} file_id للبوتات المساعدة")
+
+    def prune_file_events(should_stop: Callable[[], bool]) -> None:
+        cutoff = datetime.now(timezone.utc) - timedelta(hours=config.EVENTS_RETENTION_HOURS)
+        repos.events.prune(cutoff.isoformat())
+
+    def reconcile_storage_stats(should_stop: Callable[[], bool]) -> None:
+        fixed = StatsManager(repos).reconcile()
+        if fixed:
+            logger.warning(f"⚠️ تم تصحيح {fixed} من عدادات الإحصائيات")
+
+    runner.add('cleanup', config.CLEANUP_INTERVAL_HOURS * 3600, cleanup, initial_delay=5 * 60)
+    runner.add('prune_file_events', 3600, prune_file_events, initial_delay=60)
+    if bot_pool.size > 1:
+        runner.add('collect_helper_updates', config.HELPER_UPDATES_INTERVAL_SECONDS, collect_helper_updates)
+    runner.add(
+        'reconcile_storage_stats', config.STATS_RECONCILE_INTERVAL_HOURS * 3600,
+        reconcile_storage_stats, initial_delay=15 * 60
+    )
+    return runner
+
+
+def run_jobs() -> None:
+    """تشغيل مشغل المهام كعملية مستقلة"""
+    config.validate()
+    runner = create_job_runner()
+    signal.signal(signal.SIGTERM, runner.stop)
+    signal.signal(signal.SIGINT, runner.stop)
+    runner.run()
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Compression Module
+ضغط ردود JSON بـ brotli أو gzip حسب Accept-Encoding
+"""
+
+import gzip
+from typing import Optional
+
+from flask import Response, request
+
+from ..core.config import config
+from .timing import span
+
+try:
+    import brotli
+    BROTLI_AVAILABLE = True
+except ImportError:
+    BROTLI_AVAILABLE = False
+
+COMPRESSIBLE_MIMETYPES = {'application/json', 'application/x-ndjson', 'text/html', 'text/plain', 'text/csv'}
+
+
+def _choose_encoding() -> Optional[str]:
+    """اختيار أفضل ترميز يقبله العميل"""
+    offered = (['br'] if BROTLI_AVAILABLE else []) + ['gzip']
+    return request.accept_encodings.best_match(offered)
+
+
+def compress_response(response: Response) -> Response:
+    """ضغط الرد إذا كان نصياً وأكبر من COMPRESS_MIN_SIZE"""
+    if (
+        not config.COMPRESS_ENABLED
+        or response.status_code != 200
+        or response.direct_passthrough
+        or response.is_streamed
+        or response.mimetype not in COMPRESSIBLE_MIMETYPES
+        or 'Content-Encoding' in response.headers
+    ):
+        return response
+
+    response.vary.add('Accept-Encoding')
+    data = response.get_data()
+    if len(data) < config.COMPRESS_MIN_SIZE:
+        return response
+
+    encoding = _choose_encoding()
+    if not encoding:
+        return response
+
+    with span('compress'):
+        if encoding == 'br':
+            compressed = brotli.compress(data, quality=config.BROTLI_QUALITY)
+        else:
+            compressed = gzip.compress(data, compresslevel=config.GZIP_LEVEL, mtime=0)
+
+    response.set_data(compressed)
+    response.headers['Content-Encoding'] = encoding
+
+    # ETag القوي يخص تمثيلاً واحداً بالبايت، لذلك يصبح ضعيفاً بعد الضغط
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    return response
@@ -3,18 +3,347 @@
 """
 Email Utility Module
 وحدة إرسال البريد الإلكتروني
+
+الرسائل تُضاف إلى طابور في الذاكرة ويرسلها خيط خلفي واحد لكل عملية عبر اتصال
+SMTP مُصادق يُعاد استخدامه (بدون STARTTLS وتسجيل دخول لكل رسالة)، مع إرسال
+الدفعات معاً وإعادة المحاولة بتأخير متزايد. الطلب لا ينتظر خادم البريد أبداً.
 """
 
-import smtplib
+import atexit
+import heapq
+import itertools
 import logging
+import os
+import queue
+import smtplib
+import string
+import threading
+import time
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
-from typing import Optional
+from typing import Callable, List, Optional, Tuple
 
 from ..core.config import config
+from . import metrics
 
 logger = logging.getLogger(__name__)
 
+# status: queued / sent / retrying / failed
+StatusCallback = Callable[[str, Optional[str]], None]
+
+# القالب يُحلل مرة واحدة عند التحميل، وكل رسالة تعوض المتغيرات فقط
+OTP_SUBJECT = "🔐 كود التحقق - Telegram Archive Bot"
+OTP_TEMPLATE = string.Template("""\
+<!DOCTYPE html>
+<html dir="rtl" lang="ar">
+<head>
+    <meta charset="UTF-8">
+    <style>
+        body {
+            font-family: 'Cairo', 'Segoe UI', Tahoma, sans-serif;
+            background-color: #0f172a;
+            color: #e2e8f0;
+            padding: 20px;
+        }
+        .container {
+            max-width: 600px;
+            margin: 0 auto;
+            background: linear-gradient(135deg, #1e293b 0%, #0f172a 100%);
+            border-radius: 16px;
+            padding: 40px;
+            box-shadow: 0 10px 40px rgba(0, 0, 0, 0.3);
+        }
+        .logo {
+            text-align: center;
+            font-size: 48px;
+            margin-bottom: 20px;
+        }
+        h1 {
+            color: #818cf8;
+            text-align: center;
+            margin-bottom: 30px;
+        }
+        .otp-box {
+            background: rgba(129, 140, 248, 0.1);
+            border: 2px solid #818cf8;
+            border-radius: 12px;
+            padding: 30px;
+            text-align: center;
+            margin: 30px 0;
+        }
+        .otp-code {
+            font-size: 42px;
+            font-weight: 800;
+            color: #818cf8;
+            letter-spacing: 8px;
+            font-family: 'Courier New', monospace;
+        }
+        .info {
+            background: rgba(248, 113, 113, 0.1);
+            border-right: 4px solid #f87171;
+            padding: 15px;
+            border-radius: 8px;
+            margin: 20px 0;
+        }
+        .footer {
+            text-align: center;
+            color: #64748b;
+            font-size: 14px;
+            margin-top: 30px;
+            padding-top: 20px;
+            border-top: 1px solid #334155;
+        }
+    </style>
+</head>
+<body>
+    <div class="container">
+        <div class="logo">🔐</div>
+        <h1>كود التحقق</h1>
+
+        <p style="text-align: center; font-size: 18px; color: #cbd5e1;">
+            مرحباً! تم طلب كود تحقق لتفعيل حسابك في نظام أرشيف تليجرام.
+        </p>
+
+        <div class="otp-box">
+            <p style="margin: 0 0 10px 0; color: #94a3b8;">كود التحقق الخاص بك:</p>
+            <div class="otp-code">$otp_code</div>
+        </div>
+
+        <div class="info">
+            <p style="margin: 5px 0;"><strong>⏰ صلاحية الكود:</strong> $expiry_minutes دقائق</p>
+            <p style="margin: 5px 0;"><strong>⚠️ تحذير:</strong> لا تشارك هذا الكود مع أي شخص</p>
+        </div>
+
+        <p style="text-align: center; color: #94a3b8; margin-top: 30px;">
+            إذا لم تطلب هذا الكود، يمكنك تجاهل هذه الرسالة بأمان.
+        </p>
+
+        <div class="footer">
+            <p>Telegram Archive Bot v3.0</p>
+            <p>نظام إدارة الملفات الاحترافي</p>
+        </div>
+    </div>
+</body>
+</html>
+""")
+
+
+class _MailJob:
+    def __init__(self, to_email: str, subject: str, html_body: str, on_status: Optional[StatusCallback]):
+        self.to_email = to_email
+        self.subject = subject
+        self.html_body = html_body
+        self.on_status = on_status
+        self.attempts = 0
+
+
+class MailQueue:
+    """
+    طابور البريد الصادر مع خيط إرسال واتصال SMTP دائم
+
+    Args:
+        batch_size: أقصى عدد رسائل تُرسل في دورة واحدة على نفس الاتصال
+        max_retries: عدد إعادة المحاولة للأخطاء المؤقتة قبل اعتبار الرسالة فاشلة
+        retry_base: التأخير الأول لإعادة المحاولة (يتضاعف في كل مرة)
+        idle_seconds: إغلاق الاتصال بعد هذه المدة بدون رسائل
+    """
+
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        username: str,
+        password: str,
+        starttls: bool = True,
+        timeout: float = 10.0,
+        batch_size: int = 20,
+        max_retries: int = 5,
+        retry_base: float = 2.0,
+        idle_seconds: float = 60.0
+    ):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.starttls = starttls
+        self.timeout = timeout
+        self.batch_size = batch_size
+        self.max_retries = max_retries
+        self.retry_base = retry_base
+        self.idle_seconds = idle_seconds
+
+        self._queue: 'queue.Queue[_MailJob]' = queue.Queue()
+        self._retries: List[Tuple[float, int, _MailJob]] = []
+        self._sequence = itertools.count()
+        self._pending = 0
+        self._pending_lock = threading.Condition()
+        self._connection: Optional[smtplib.SMTP] = None
+        self._last_used = 0.0
+        self._thread: Optional[threading.Thread] = None
+        self._pid: Optional[int] = None
+
+    # ========================================
+    # Public API
+    # ========================================
+
+    def enqueue(
+        self,
+        to_email: str,
+        subject: str,
+        html_body: str,
+        on_status: Optional[StatusCallback] = None
+    ) -> None:
+        """إضافة رسالة إلى الطابور (لا ينتظر الإرسال)"""
+        self._ensure_sender()
+        with self._pending_lock:
+            self._pending += 1
+        self._queue.put(_MailJob(to_email, subject, html_body, on_status))
+
+    def wait_until_empty(self, timeout: Optional[float] = None) -> bool:
+        """انتظار إرسال (أو فشل) جميع الرسائل المعلقة"""
+        with self._pending_lock:
+            return self._pending_lock.wait_for(lambda: self._pending == 0, timeout)
+
+    # ========================================
+    # Sender
+    # ========================================
+
+    def _ensure_sender(self) -> None:
+        """تشغيل خيط الإرسال (مرة لكل عملية)"""
+        pid = os.getpid()
+        if self._pid == pid and self._thread and self._thread.is_alive():
+            return
+        with self._pending_lock:
+            if self._pid == pid and self._thread and self._thread.is_alive():
+                return
+            if self._pid != pid:
+                # بعد fork: الاتصال والطابور يخصان العملية الأم
+                self._queue = queue.Queue()
+                self._retries = []
+                self._pending = 0
+                self._connection = None
+            self._pid = pid
+            self._thread = threading.Thread(target=self._run, name='mail-sender', daemon=True)
+            self._thread.start()
+            atexit.register(self.wait_until_empty, self.timeout)
+
+    def _next_batch(self) -> List[_MailJob]:
+        """الرسائل الجديدة والمستحقة لإعادة المحاولة (تنتظر حتى وجود رسالة)"""
+        now = time.monotonic()
+        wait = self.idle_seconds
+        if self._retries:
+            wait = max(0.0, min(wait, self._retries[0][0] - now))
+
+        batch: List[_MailJob] = []
+        try:
+            batch.append(self._queue.get(timeout=wait))
+        except queue.Empty:
+            pass
+
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+
+        now = time.monotonic()
+        while self._retries and self._retries[0][0] <= now and len(batch) < self.batch_size:
+            batch.append(heapq.heappop(self._retries)[2])
+        return batch
+
+    def _run(self) -> None:
+        while True:
+            batch = self._next_batch()
+            if not batch:
+                if self._connection and time.monotonic() - self._last_used > self.idle_seconds:
+                    self._disconnect()
+                continue
+
+            for job in batch:
+                self._deliver(job)
+
+    def _connect(self) -> smtplib.SMTP:
+        """اتصال جديد مع TLS وتسجيل الدخول (مرة واحدة لعدة رسائل)"""
+        if self.port == 465:
+            connection: smtplib.SMTP = smtplib.SMTP_SSL(self.host, self.port, timeout=self.timeout)
+        else:
+            connection = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+            if self.starttls:
+                connection.starttls()
+        if self.username and self.password:
+            connection.login(self.username, self.password)
+        return connection
+
+    def _disconnect(self) -> None:
+        if self._connection is None:
+            return
+        try:
+            self._connection.quit()
+        except Exception:
+            pass
+        self._connection = None
+
+    def _build_message(self, job: _MailJob) -> MIMEMultipart:
+        message = MIMEMultipart('alternative')
+        message['From'] = self.username
+        message['To'] = job.to_email
+        message['Subject'] = job.subject
+        message.attach(MIMEText(job.html_body, 'html', 'utf-8'))
+        return message
+
+    def _send(self, job: _MailJob) -> None:
+        """الإرسال على الاتصال الحالي، مع إعادة الاتصال مرة إذا أغلقه الخادم"""
+        message = self._build_message(job)
+        if self._connection is None:
+            self._connection = self._connect()
+        try:
+            self._connection.send_message(message)
+        except smtplib.SMTPServerDisconnected:
+            self._connection = self._connect()
+            self._connection.send_message(message)
+        self._last_used = time.monotonic()
+
+    def _deliver(self, job: _MailJob) -> None:
+        job.attempts += 1
+        try:
+            self._send(job)
+        except Exception as e:
+            permanent = (
+                isinstance(e, smtplib.SMTPRecipientsRefused)
+                or (isinstance(e, smtplib.SMTPResponseException) and 500 <= e.smtp_code < 600)
+            )
+            if not isinstance(e, smtplib.SMTPResponseException):
+                # خطأ اتصال: اتصال جديد في المحاولة التالية
+                self._disconnect()
+
+            if permanent or job.attempts > self.max_retries:
+                logger.error(f"❌ فشل إرسال البريد إلى {job.to_email} بعد {job.attempts} محاولة: {e}")
+                self._finish(job, 'failed', str(e))
+                return
+
+            delay = self.retry_base * (2 ** (job.attempts - 1))
+            logger.warning(f"⚠️ إعادة محاولة إرسال البريد إلى {job.to_email} بعد {delay:.0f}s: {e}")
+            heapq.heappush(self._retries, (time.monotonic() + delay, next(self._sequence), job))
+            self._report(job, 'retrying', str(e))
+            return
+
+        logger.info(f"✅ تم إرسال البريد الإلكتروني إلى: {job.to_email}")
+        self._finish(job, 'sent', None)
+
+    def _report(self, job: _MailJob, status: str, error: Optional[str]) -> None:
+        metrics.MAIL_DELIVERIES.labels(status).inc()
+        if job.on_status:
+            try:
+                job.on_status(status, error)
+            except Exception as e:
+                logger.warning(f"⚠️ خطأ في تسجيل حالة البريد: {e}")
+
+    def _finish(self, job: _MailJob, status: str, error: Optional[str]) -> None:
+        self._report(job, status, error)
+        with self._pending_lock:
+            self._pending -= 1
+            self._pending_lock.notify_all()
+
 
 class EmailService:
     """خدمة إرسال البريد الإلكتروني"""
@@ -24,143 +353,41 @@ class EmailService:
         self.smtp_port = config.SMTP_PORT
         self.smtp_email = config.SMTP_EMAIL
         self.smtp_password = config.SMTP_PASSWORD
+        self.queue = MailQueue(
+            self.smtp_server,
+            self.smtp_port,
+            self.smtp_email,
+            self.smtp_password,
+            starttls=config.SMTP_STARTTLS,
+            timeout=config.SMTP_TIMEOUT_SECONDS,
+            batch_size=config.MAIL_BATCH_SIZE,
+            max_retries=config.MAIL_MAX_RETRIES,
+            idle_seconds=config.SMTP_IDLE_SECONDS
+        )
     
-    def send_otp_email(self, to_email: str, otp_code: str) -> bool:
-        """إرسال كود OTP إلى البريد الإلكتروني"""
-        
-        subject = "🔐 كود التحقق - Telegram Archive Bot"
-        
-        html_body = f"""
-        <!DOCTYPE html>
-        <html dir="rtl" lang="ar">
-        <head>
-            <meta charset="UTF-8">
-            <style>
-                body {{
-                    font-family: 'Cairo', 'Segoe UI', Tahoma, sans-serif;
-                    background-color: #0f172a;
-                    color: #e2e8f0;
-                    padding: 20px;
-                }}
-                .container {{
-                    max-width: 600px;
-                    margin: 0 auto;
-                    background: linear-gradient(135deg, #1e293b 0%, #0f172a 100%);
-                    border-radius: 16px;
-                    padding: 40px;
-                    box-shadow: 0 10px 40px rgba(0, 0, 0, 0.3);
-                }}
-                .logo {{
-                    text-align: center;
-                    font-size: 48px;
-                    margin-bottom: 20px;
-                }}
-                h1 {{
-                    color: #818cf8;
-                    text-align: center;
-                    margin-bottom: 30px;
-                }}
-                .otp-box {{
-                    background: rgba(129, 140, 248, 0.1);
-                    border: 2px solid #818cf8;
-                    border-radius: 12px;
-                    padding: 30px;
-                    text-align: center;
-                    margin: 30px 0;
-                }}
-                .otp-code {{
-                    font-size: 42px;
-                    font-weight: 800;
-                    color: #818cf8;
-                    letter-spacing: 8px;
-                    font-family: 'Courier New', monospace;
-                }}
-                .info {{
-                    background: rgba(248, 113, 113, 0.1);
-                    border-right: 4px solid #f87171;
-                    padding: 15px;
-                    border-radius: 8px;
-                    margin: 20px 0;
-                }}
-                .footer {{
-                    text-align: center;
-                    color: #64748b;
-                    font-size: 14px;
-                    margin-top: 30px;
-                    padding-top: 20px;
-                    border-top: 1px solid #334155;
-                }}
-            </style>
-        </head>
-        <body>
-            <div class="container">
-                <div class="logo">🔐</div>
-                <h1>كود التحقق</h1>
-                
-                <p style="text-align: center; font-size: 18px; color: #cbd5e1;">
-                    مرحباً! تم طلب كود تحقق لتفعيل حسابك في نظام أرشيف تليجرام.
-                </p>
-                
-                <div class="otp-box">
-                    <p style="margin: 0 0 10px 0; color: #94a3b8;">كود التحقق الخاص بك:</p>
-                    <div class="otp-code">{otp_code}</div>
-                </div>
-                
-                <div class="info">
-                    <p style="margin: 5px 0;"><strong>⏰ صلاحية الكود:</strong> 10 دقائق</p>
-                    <p style="margin: 5px 0;"><strong>⚠️ تحذير:</strong> لا تشارك هذا الكود مع أي شخص</p>
-                </div>
-                
-                <p style="text-align: center; color: #94a3b8; margin-top: 30px;">
-                    إذا لم تطلب هذا الكود، يمكنك تجاهل هذه الرسالة بأمان.
-                </p>
-                
-                <div class="footer">
-                    <p>Telegram Archive Bot v3.0</p>
-                    <p>نظام إدارة الملفات الاحترافي</p>
-                </div>
-            </div>
-        </body>
-        </html>
-        """
-        
-        return self._send_email(to_email, subject, html_body)
+    def send_otp_email(self, to_email: str, otp_code: str, on_status: Optional[StatusCallback] = None) -> bool:
+        """إضافة رسالة كود OTP إلى طابور الإرسال"""
+        html_body = OTP_TEMPLATE.substitute(
+            otp_code=otp_code,
+            expiry_minutes=config.OTP_EXPIRY_MINUTES
+        )
+        return self._send_email(to_email, OTP_SUBJECT, html_body, on_status)
     
     def _send_email(
         self,
         to_email: str,
         subject: str,
-        html_body: str
+        html_body: str,
+        on_status: Optional[StatusCallback] = None
     ) -> bool:
-        """إرسال بريد إلكتروني"""
+        """إضافة بريد إلكتروني إلى الطابور (False إذا كانت إعدادات SMTP ناقصة)"""
         
         if not all([self.smtp_email, self.smtp_password]):
             logger.error("❌ بيانات SMTP غير مكتملة")
             return False
         
-        try:
-            # إنشاء الرسالة
-            message = MIMEMultipart('alternative')
-            message['From'] = self.smtp_email
-            message['To'] = to_email
-            message['Subject'] = subject
-            
-            # إضافة المحتوى HTML
-            html_part = MIMEText(html_body, 'html', 'utf-8')
-            message.attach(html_part)
-            
-            # الاتصال بخادم SMTP وإرسال الرسالة
-            with smtplib.SMTP(self.smtp_server, self.smtp_port) as server:
-                server.starttls()
-                server.login(self.smtp_email, self.smtp_password)
-                server.send_message(message)
-            
-            logger.info(f"✅ تم إرسال البريد الإلكتروني إلى: {to_email}")
-            return True
-        
-        except Exception as e:
-            logger.error(f"❌ خطأ في إرسال البريد الإلكتروني: {e}")
-            return False
+        self.queue.enqueue(to_email, subject, html_body, on_status)
+        return True
 
 
 # إنشاء نسخة واحدة من الخدمة
@@ -0,0 +1,32 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Heartbeat Module
+ملفات نبض للعمليات التي لا تملك منفذ HTTP (البوت والمهام الدورية)
+"""
+
+import os
+import time
+from typing import Optional
+
+from ..core.config import config
+
+
+def heartbeat_path(role: str) -> str:
+    """مسار ملف النبض لدور معين"""
+    return os.path.join(config.HEARTBEAT_DIR, f"{role}.heartbeat")
+
+
+def touch(path: str) -> None:
+    """تحديث وقت ملف النبض"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'a'):
+        os.utime(path, None)
+
+
+def age(path: str) -> Optional[float]:
+    """عمر آخر نبضة بالثواني (None إذا لم توجد)"""
+    try:
+        return time.time() - os.stat(path).st_mtime
+    except FileNotFoundError:
+        return None
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+HTTP Cache Module
+الطلبات الشرطية (ETag / Last-Modified / 304) وذاكرة مؤقتة صغيرة للمُعرّفات
+"""
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Any, Hashable, Optional
+
+from flask import Response, request
+
+
+class LRUCache:
+    """ذاكرة مؤقتة محدودة الحجم مع انتهاء صلاحية اختياري (آمنة بين الخيوط)"""
+
+    def __init__(self, maxsize: int = 1024, ttl: Optional[float] = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._items: 'OrderedDict[Hashable, tuple]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Any:
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                return None
+            value, stored_at = item
+            if self.ttl is not None and time.monotonic() - stored_at > self.ttl:
+                del self._items[key]
+                return None
+            self._items.move_to_end(key)
+            return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        with self._lock:
+            self._items[key] = (value, time.monotonic())
+            self._items.move_to_end(key)
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+
+    def pop(self, key: Hashable) -> None:
+        with self._lock:
+            self._items.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._items.clear()
+
+
+def make_etag(*parts: Any) -> str:
+    """ETag قوي من مكونات الحالة (بدون علامات الاقتباس)"""
+    digest = hashlib.sha1('|'.join(str(part) for part in parts).encode('utf-8'))
+    return digest.hexdigest()[:24]
+
+
+def parse_timestamp(value: Optional[str]) -> Optional[datetime]:
+    """تحويل طابع زمني من قاعدة البيانات إلى datetime بتوقيت UTC"""
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed
+
+
+def is_not_modified(etag: Optional[str], last_modified: Optional[datetime] = None) -> bool:
+    """هل نسخة العميل ما زالت صالحة؟ (If-None-Match له الأولوية على If-Modified-Since)"""
+    if request.if_none_match:
+        # مقارنة ضعيفة كما يشترط RFC 9110 لـ If-None-Match
+        return bool(etag) and request.if_none_match.contains_weak(etag)
+
+    if last_modified and request.if_modified_since:
+        return last_modified.replace(microsecond=0) <= request.if_modified_since
+    return False
+
+
+def not_modified_response(
+    etag: Optional[str],
+    last_modified: Optional[datetime] = None,
+    cache_control: Optional[str] = None
+) -> Response:
+    """رد 304 بدون جسم مع نفس المُعرّفات"""
+    response = Response(status=304)
+    apply_validators(response, etag, last_modified, cache_control)
+    return response
+
+
+def apply_validators(
+    response: Response,
+    etag: Optional[str],
+    last_modified: Optional[datetime] = None,
+    cache_control: Optional[str] = None
+) -> Response:
+    """إضافة ETag وLast-Modified وCache-Control إلى الرد"""
+    if etag:
+        response.set_etag(etag)
+    if last_modified:
+        response.last_modified = last_modified
+    if cache_control:
+        response.headers['Cache-Control'] = cache_control
+    return response
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Lazy Resources
+موارد تُنشأ عند أول استخدام، ونسخة مستقلة لكل عملية بعد fork
+"""
+
+import os
+import threading
+from typing import Any, Callable, Generic, Optional, TypeVar
+
+T = TypeVar('T')
+
+
+class Lazy(Generic[T]):
+    """
+    وكيل يمرر الوصول للخصائص إلى المورد الحقيقي وينشئه عند أول استخدام.
+
+    المورد مرتبط بالعملية التي أنشأته: العامل بعد fork ينشئ نسخته الخاصة
+    بدلاً من مشاركة اتصالات HTTP أو خيوط أنشأتها العملية الأم.
+    """
+
+    __slots__ = ('_factory', '_name', '_lock', '_instance', '_pid')
+
+    def __init__(self, factory: Callable[[], T], name: Optional[str] = None):
+        object.__setattr__(self, '_factory', factory)
+        object.__setattr__(self, '_name', name or getattr(factory, '__name__', 'resource'))
+        object.__setattr__(self, '_lock', threading.Lock())
+        object.__setattr__(self, '_instance', None)
+        object.__setattr__(self, '_pid', None)
+
+    def get(self) -> T:
+        """المورد الخاص بهذه العملية (يُنشأ عند الحاجة)"""
+        pid = os.getpid()
+        if self._pid == pid:
+            return self._instance
+        with self._lock:
+            if self._pid != pid:
+                object.__setattr__(self, '_instance', self._factory())
+                object.__setattr__(self, '_pid', pid)
+        return self._instance
+
+    def ready(self) -> bool:
+        """هل أُنشئ المورد في هذه العملية"""
+        return self._pid == os.getpid()
+
+    def reset(self) -> None:
+        """إسقاط المورد الحالي ليُعاد إنشاؤه عند الاستخدام التالي"""
+        with self._lock:
+            object.__setattr__(self, '_instance', None)
+            object.__setattr__(self, '_pid', None)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.get(), name)
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        setattr(self.get(), name, value)
+
+    def __repr__(self) -> str:
+        state = 'ready' if self.ready() else 'pending'
+        return f"<Lazy {self._name} ({state})>"
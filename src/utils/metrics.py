@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Metrics Module
+مقاييس Prometheus للمسارات الساخنة
+
+يدعم وضع تعدد العمليات (gunicorn) عبر PROMETHEUS_MULTIPROC_DIR.
+إذا لم تكن مكتبة prometheus_client مثبتة تصبح جميع المقاييس بدون أثر.
+"""
+
+import os
+import time
+from typing import Any, Iterable, Iterator, Optional, Tuple
+
+from .timing import span
+
+try:
+    from prometheus_client import (
+        CONTENT_TYPE_LATEST,
+        REGISTRY,
+        CollectorRegistry,
+        Counter,
+        Gauge,
+        Histogram,
+        generate_latest,
+        multiprocess,
+    )
+    PROMETHEUS_AVAILABLE = True
+except ImportError:
+    PROMETHEUS_AVAILABLE = False
+
+
+class _NoopMetric:
+    """مقياس بدون أثر عند غياب prometheus_client"""
+
+    def labels(self, *args: Any, **kwargs: Any) -> '_NoopMetric':
+        return self
+
+    def observe(self, *args: Any, **kwargs: Any) -> None:
+        pass
+
+    def inc(self, *args: Any, **kwargs: Any) -> None:
+        pass
+
+    def dec(self, *args: Any, **kwargs: Any) -> None:
+        pass
+
+    def set(self, *args: Any, **kwargs: Any) -> None:
+        pass
+
+
+def _metric(kind: str, name: str, documentation: str, labels: Tuple[str, ...] = (), **kwargs: Any) -> Any:
+    """إنشاء مقياس أو بديل بدون أثر"""
+    if not PROMETHEUS_AVAILABLE:
+        return _NoopMetric()
+    cls = {'counter': Counter, 'gauge': Gauge, 'histogram': Histogram}[kind]
+    return cls(name, documentation, labels, **kwargs)
+
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+SIZE_BUCKETS = (16 * 1024, 256 * 1024, 1024 ** 2, 5 * 1024 ** 2, 20 * 1024 ** 2, 50 * 1024 ** 2, 200 * 1024 ** 2, 2 * 1024 ** 3)
+
+# HTTP
+HTTP_REQUEST_DURATION = _metric(
+    'histogram', 'archive_http_request_duration_seconds',
+    'زمن معالجة طلبات HTTP حسب المسار', ('route', 'method', 'status'),
+    buckets=LATENCY_BUCKETS
+)
+AUTH_REJECTED = _metric(
+    'counter', 'archive_auth_rejected',
+    'طلبات المصادقة المرفوضة قبل التشفير حسب السبب', ('reason',)
+)
+SSE_CLIENTS = _metric(
+    'gauge', 'archive_sse_clients',
+    'عدد اتصالات /api/events المفتوحة',
+    **({'multiprocess_mode': 'livesum'} if PROMETHEUS_AVAILABLE else {})
+)
+
+# Telegram Bot API
+TELEGRAM_CALL_DURATION = _metric(
+    'histogram', 'archive_telegram_call_duration_seconds',
+    'زمن استدعاءات Bot API حسب الدالة والحالة', ('method', 'status'),
+    buckets=LATENCY_BUCKETS
+)
+TELEGRAM_RATE_WAIT = _metric(
+    'histogram', 'archive_telegram_rate_wait_seconds',
+    'انتظار دور الاستدعاء في منظم معدل تليجرام حسب نوع المفتاح', ('kind',),
+    buckets=LATENCY_BUCKETS
+)
+
+# Supabase / PostgREST
+DB_QUERY_DURATION = _metric(
+    'histogram', 'archive_db_query_duration_seconds',
+    'زمن استعلامات قاعدة البيانات حسب الجدول والعملية', ('table', 'operation'),
+    buckets=LATENCY_BUCKETS
+)
+
+# Streaming & Uploads
+STREAM_BYTES = _metric(
+    'counter', 'archive_stream_bytes',
+    'عدد البايتات المبثوثة عبر stream_file'
+)
+UPLOAD_SIZE = _metric(
+    'histogram', 'archive_upload_size_bytes',
+    'أحجام الملفات المرفوعة من الموقع', buckets=SIZE_BUCKETS
+)
+
+# Bot ingestion
+BOT_INGESTED_FILES = _metric(
+    'counter', 'archive_bot_ingested_files',
+    'الملفات التي أرشفها البوت حسب النوع', ('file_type',)
+)
+BOT_INGEST_LAG = _metric(
+    'histogram', 'archive_bot_ingest_lag_seconds',
+    'الفرق بين وقت الرسالة ووقت حفظها', buckets=LATENCY_BUCKETS
+)
+BOT_WEBHOOK_UPDATES = _metric(
+    'counter', 'archive_bot_webhook_updates',
+    'تحديثات webhook حسب النتيجة', ('result',)
+)
+
+# Outbound mail
+MAIL_DELIVERIES = _metric(
+    'counter', 'archive_mail_deliveries',
+    'نتائج إرسال البريد حسب الحالة', ('status',)
+)
+
+# Background jobs
+JOB_DURATION = _metric(
+    'histogram', 'archive_job_duration_seconds',
+    'زمن تنفيذ المهام الدورية حسب المهمة والنتيجة', ('job', 'status'),
+    buckets=LATENCY_BUCKETS + (60.0, 300.0, 900.0, 3600.0)
+)
+
+# Cleanup
+CLEANUP_CHECKED_FILES = _metric(
+    'counter', 'archive_cleanup_checked_files',
+    'الملفات التي فحصها التنظيف', ('mode',)
+)
+CLEANUP_DELETED_FILES = _metric(
+    'counter', 'archive_cleanup_deleted_files',
+    'الملفات التي حذفها التنظيف', ('mode',)
+)
+CLEANUP_PROGRESS = _metric(
+    'gauge', 'archive_cleanup_progress_ratio',
+    'نسبة تقدم عملية التنظيف الحالية', ('mode',),
+    **({'multiprocess_mode': 'livemax'} if PROMETHEUS_AVAILABLE else {})
+)
+
+
+def observe_since(metric: Any, start: float, *labels: str) -> None:
+    """تسجيل الزمن المنقضي منذ start"""
+    if labels:
+        metric = metric.labels(*labels)
+    metric.observe(time.perf_counter() - start)
+
+
+def count_stream_bytes(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    """تمرير أجزاء البث مع عد البايتات"""
+    for chunk in chunks:
+        STREAM_BYTES.inc(len(chunk))
+        yield chunk
+
+
+def render_metrics() -> Tuple[bytes, str]:
+    """تصدير المقاييس بصيغة Prometheus (مع تجميع جميع العمليات)"""
+    if not PROMETHEUS_AVAILABLE:
+        return b'# prometheus_client is not installed\n', 'text/plain; charset=utf-8'
+
+    if os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+def mark_process_dead(pid: int) -> None:
+    """تنظيف ملفات عملية منتهية (يُستدعى من child_exit في gunicorn)"""
+    if PROMETHEUS_AVAILABLE and os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+        multiprocess.mark_process_dead(pid)
+
+
+# ========================================
+# Supabase Instrumentation
+# ========================================
+
+_OPERATIONS = {'select', 'insert', 'update', 'upsert', 'delete'}
+
+
+class _TimedQuery:
+    """غلاف لمنشئ الاستعلام يقيس زمن execute()"""
+
+    __slots__ = ('_builder', '_table', '_operation')
+
+    def __init__(self, builder: Any, table: str, operation: Optional[str]):
+        self._builder = builder
+        self._table = table
+        self._operation = operation
+
+    def __getattr__(self, name: str) -> Any:
+        attr = getattr(self._builder, name)
+
+        if name == 'execute':
+            def execute(*args: Any, **kwargs: Any) -> Any:
+                start = time.perf_counter()
+                try:
+                    with span('db'):
+                        return attr(*args, **kwargs)
+                finally:
+                    observe_since(DB_QUERY_DURATION, start, self._table, self._operation or 'unknown')
+            return execute
+
+        operation = self._operation or (name if name in _OPERATIONS else None)
+
+        if callable(attr):
+            def wrapper(*args: Any, **kwargs: Any) -> Any:
+                result = attr(*args, **kwargs)
+                if hasattr(result, 'execute'):
+                    return _TimedQuery(result, self._table, operation)
+                return result
+            return wrapper
+
+        if hasattr(attr, 'execute'):
+            return _TimedQuery(attr, self._table, operation)
+        return attr
+
+
+class InstrumentedClient:
+    """غلاف لعميل Supabase يقيس زمن الاستعلامات لكل جدول وعملية"""
+
+    def __init__(self, client: Any):
+        self._client = client
+
+    def table(self, table_name: str) -> _TimedQuery:
+        return _TimedQuery(self._client.table(table_name), table_name, None)
+
+    from_ = table
+
+    def rpc(self, fn: str, params: Optional[dict] = None, *args: Any, **kwargs: Any) -> _TimedQuery:
+        return _TimedQuery(self._client.rpc(fn, params or {}, *args, **kwargs), 'rpc', fn)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._client, name)
+
+
+def instrument_supabase(client: Any) -> Any:
+    """تغليف عميل Supabase بالقياس"""
+    return InstrumentedClient(client)
@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+On-Demand Request Profiler
+التقاط ملفات تعريف الأداء لعدد محدد من الطلبات بدون إعادة النشر
+
+الحالة (المسار المطلوب والعدد المتبقي) محفوظة في ملف مشترك داخل PROFILE_DIR
+حتى تلتقطها جميع عمليات gunicorn، والنتائج تُكتب في مجلد لكل عملية تعريف.
+"""
+
+import cProfile
+import fcntl
+import io
+import json
+import logging
+import os
+import pstats
+import secrets
+import sys
+import threading
+import time
+import tracemalloc
+import zipfile
+from collections import Counter
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+PROFILE_MODES = ('cprofile', 'sample')
+
+
+class _SamplingProfiler:
+    """محلل بالعينات: يقرأ مكدس خيط الطلب كل فترة ويجمعها بصيغة folded"""
+
+    def __init__(self, thread_id: int, interval: float = 0.005):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                frame = frame.f_back
+            if stack:
+                self.samples[';'.join(reversed(stack))] += 1
+
+    def dump(self) -> str:
+        return '\n'.join(f"{stack} {count}" for stack, count in self.samples.most_common())
+
+
+class _Capture:
+    """التقاط واحد لطلب واحد"""
+
+    def __init__(self, profile_id: str, mode: str, with_tracemalloc: bool):
+        self.profile_id = profile_id
+        self.mode = mode
+        self.with_tracemalloc = with_tracemalloc
+        self.started_tracemalloc = False
+        self.snapshot_before: Optional[tracemalloc.Snapshot] = None
+        self.profiler: Any = None
+        self.started_at = time.perf_counter()
+
+
+class RequestProfiler:
+    """مدير التقاط ملفات التعريف للطلبات"""
+
+    def __init__(self, output_dir: str):
+        self.output_dir = output_dir
+        self._state_path = os.path.join(output_dir, 'armed.json')
+        self._state_cache: Optional[Dict[str, Any]] = None
+        self._state_mtime = 0.0
+        self._state_checked_at = 0.0
+        self._active = threading.Lock()
+
+    @contextmanager
+    def _locked_state(self) -> Iterator[Dict[str, Any]]:
+        """قراءة وتعديل ملف الحالة تحت قفل بين العمليات"""
+        os.makedirs(self.output_dir, exist_ok=True)
+        with open(self._state_path, 'a+') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                f.seek(0)
+                content = f.read()
+                state = json.loads(content) if content else {}
+                yield state
+                f.seek(0)
+                f.truncate()
+                f.write(json.dumps(state))
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def arm(self, route: str, count: int, mode: str = 'cprofile', with_tracemalloc: bool = False) -> str:
+        """تفعيل الالتقاط لأول count طلب على المسار route"""
+        if mode not in PROFILE_MODES:
+            raise ValueError(f"نوع التحليل غير مدعوم: {mode}")
+
+        profile_id = time.strftime('%Y%m%d-%H%M%S-') + secrets.token_hex(3)
+        with self._locked_state() as state:
+            state.clear()
+            state.update({
+                'id': profile_id,
+                'route': route,
+                'remaining': count,
+                'mode': mode,
+                'tracemalloc': with_tracemalloc
+            })
+        os.makedirs(os.path.join(self.output_dir, profile_id), exist_ok=True)
+        logger.info(f"🔬 تفعيل التحليل {profile_id}: {route} × {count} ({mode})")
+        return profile_id
+
+    def _armed_for(self, route: str) -> bool:
+        """فحص سريع (بدون قفل) هل المسار مفعّل، مع قراءة الملف مرة كل ثانية كحد أقصى"""
+        now = time.monotonic()
+        if now - self._state_checked_at > 1.0:
+            self._state_checked_at = now
+            try:
+                mtime = os.stat(self._state_path).st_mtime
+            except OSError:
+                self._state_cache = None
+                return False
+            if mtime != self._state_mtime:
+                self._state_mtime = mtime
+                try:
+                    with open(self._state_path) as f:
+                        self._state_cache = json.loads(f.read() or '{}')
+                except (OSError, ValueError):
+                    self._state_cache = None
+
+        state = self._state_cache
+        return bool(state and state.get('route') == route and state.get('remaining', 0) > 0)
+
+    def start(self, route: str) -> Optional[_Capture]:
+        """بدء الالتقاط إذا كان المسار مفعلاً وبقيت طلبات"""
+        if not self._armed_for(route):
+            return None
+        if not self._active.acquire(blocking=False):
+            return None  # التقاط آخر جارٍ في هذه العملية
+
+        try:
+            with self._locked_state() as state:
+                if state.get('route') != route or state.get('remaining', 0) <= 0:
+                    self._active.release()
+                    return None
+                state['remaining'] -= 1
+                capture = _Capture(state['id'], state['mode'], state.get('tracemalloc', False))
+        except Exception:
+            self._active.release()
+            raise
+
+        if capture.with_tracemalloc:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(25)
+                capture.started_tracemalloc = True
+            capture.snapshot_before = tracemalloc.take_snapshot()
+
+        if capture.mode == 'cprofile':
+            capture.profiler = cProfile.Profile()
+            capture.profiler.enable()
+        else:
+            capture.profiler = _SamplingProfiler(threading.get_ident())
+            capture.profiler.start()
+        return capture
+
+    def finish(self, capture: Optional[_Capture], label: str) -> None:
+        """إيقاف الالتقاط وحفظ النتائج"""
+        if capture is None:
+            return
+        try:
+            elapsed_ms = (time.perf_counter() - capture.started_at) * 1000
+            base = os.path.join(
+                self.output_dir, capture.profile_id,
+                f"{os.getpid()}-{int(time.time() * 1000)}"
+            )
+            os.makedirs(os.path.dirname(base), exist_ok=True)
+
+            if capture.mode == 'cprofile':
+                capture.profiler.disable()
+                capture.profiler.dump_stats(base + '.prof')
+                text = io.StringIO()
+                pstats.Stats(capture.profiler, stream=text).sort_stats('cumulative').print_stats(40)
+                with open(base + '.txt', 'w') as f:
+                    f.write(f"{label} ({elapsed_ms:.1f} ms)\n\n{text.getvalue()}")
+            else:
+                capture.profiler.stop()
+                with open(base + '.folded', 'w') as f:
+                    f.write(capture.profiler.dump())
+
+            if capture.snapshot_before is not None:
+                snapshot = tracemalloc.take_snapshot()
+                diff = snapshot.compare_to(capture.snapshot_before, 'lineno')
+                with open(base + '.tracemalloc.txt', 'w') as f:
+                    f.write(f"{label} ({elapsed_ms:.1f} ms)\n\n")
+                    f.write('\n'.join(str(stat) for stat in diff[:50]))
+                if capture.started_tracemalloc:
+                    tracemalloc.stop()
+        except Exception as e:
+            logger.error(f"❌ خطأ في حفظ ملف التحليل: {e}")
+        finally:
+            self._active.release()
+
+    def status(self) -> Dict[str, Any]:
+        """الحالة الحالية والتحليلات المحفوظة"""
+        armed: Dict[str, Any] = {}
+        if os.path.exists(self._state_path):
+            with self._locked_state() as state:
+                armed = dict(state)
+
+        profiles: List[Dict[str, Any]] = []
+        if os.path.isdir(self.output_dir):
+            for name in sorted(os.listdir(self.output_dir), reverse=True):
+                path = os.path.join(self.output_dir, name)
+                if os.path.isdir(path):
+                    profiles.append({'id': name, 'files': len(os.listdir(path))})
+        return {'armed': armed, 'profiles': profiles}
+
+    def bundle(self, profile_id: str) -> Optional[bytes]:
+        """تجميع نتائج تحليل في ملف ZIP للتحميل"""
+        if os.path.basename(profile_id) != profile_id:
+            return None
+        path = os.path.join(self.output_dir, profile_id)
+        if not os.path.isdir(path):
+            return None
+
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as zf:
+            for name in sorted(os.listdir(path)):
+                zf.write(os.path.join(path, name), arcname=name)
+        return buffer.getvalue()
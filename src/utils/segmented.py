@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Segmented Fetch Module
+تحميل ملف كبير كمقاطع Range متوازية وإعادة تجميعها بالترتيب
+
+اتصال واحد بخادم تليجرام يحدّ سرعة الملف، لذلك يُقسم الملف إلى مقاطع تُجلب عبر
+عدة اتصالات في نفس الوقت. المقاطع تدخل حلقة محدودة: لا يبدأ جلب مقطع إلا إذا كان
+ضمن parallel مقطع من موضع القراءة، فالذاكرة القصوى ≈ parallel × segment_size.
+القارئ يستلم قطع المقطع الحالي فور وصولها بينما المقاطع التالية تُجلب، فالكتابة
+للعميل تتداخل مع الجلب.
+"""
+
+import logging
+import threading
+from typing import Callable, Iterable, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# open_range(first, last) -> قطع البايتات من first حتى last (شاملة)
+RangeOpener = Callable[[int, int], Iterable[bytes]]
+
+
+class _Segment:
+    """مقطع واحد: قطع تصل من خيط الجلب ويقرؤها المستهلك"""
+
+    def __init__(self, first: int, last: int):
+        self.first = first
+        self.last = last
+        self.chunks: List[bytes] = []
+        self.received = 0
+        self.done = False
+        self.error: Optional[BaseException] = None
+
+    @property
+    def size(self) -> int:
+        return self.last - self.first + 1
+
+
+class SegmentedFetch:
+    """
+    مكرر بايتات من start حتى end (شاملة) بمقاطع متوازية
+
+    Args:
+        open_range: فتح Range على المصدر
+        first_chunks: قطع مفتوحة مسبقاً للمقطع الأول (لمعرفة الترويسات والأخطاء مبكراً)
+        segment_size: حجم المقطع
+        parallel: أقصى مقاطع قيد الجلب أو بانتظار القراءة
+        retries: محاولات استكمال المقطع من موضعه عند انقطاع الاتصال
+    """
+
+    def __init__(
+        self,
+        open_range: RangeOpener,
+        start: int,
+        end: int,
+        segment_size: int = 4 * 1024 * 1024,
+        parallel: int = 4,
+        first_chunks: Optional[Iterable[bytes]] = None,
+        retries: int = 2
+    ):
+        self.open_range = open_range
+        self.retries = retries
+        self.parallel = max(1, parallel)
+        self._segments = [
+            _Segment(first, min(first + segment_size, end + 1) - 1)
+            for first in range(start, end + 1, segment_size)
+        ]
+        self._first_chunks = first_chunks
+        self._next_fetch = 0
+        self._next_read = 0
+        self._closed = False
+        self._cond = threading.Condition()
+
+    def _start(self) -> None:
+        """خيوط الجلب تبدأ مع أول قراءة (لا خيوط معلقة لمكرر لم يُقرأ)"""
+        for _ in range(min(self.parallel, len(self._segments))):
+            threading.Thread(target=self._worker, name='segment-fetch', daemon=True).start()
+
+    # ---------- الجلب ----------
+
+    def _claim(self) -> Optional[int]:
+        """المقطع التالي للجلب عندما يسمح مكان في الحلقة (None عند الانتهاء)"""
+        with self._cond:
+            while not self._closed and self._next_fetch < len(self._segments) \
+                    and self._next_fetch >= self._next_read + self.parallel:
+                self._cond.wait()
+            if self._closed or self._next_fetch >= len(self._segments):
+                return None
+            index = self._next_fetch
+            self._next_fetch += 1
+            return index
+
+    def _worker(self) -> None:
+        while True:
+            index = self._claim()
+            if index is None:
+                return
+            self._fetch(index, self._segments[index])
+
+    def _fetch(self, index: int, segment: _Segment) -> None:
+        attempts = 0
+        pending = None
+        if index == 0:
+            with self._cond:
+                pending, self._first_chunks = self._first_chunks, None
+        while True:
+            chunks, pending = pending, None
+            try:
+                if chunks is None:
+                    chunks = self.open_range(segment.first + segment.received, segment.last)
+                for chunk in chunks:
+                    chunk = chunk[:segment.size - segment.received]
+                    if not chunk:
+                        continue
+                    with self._cond:
+                        if self._closed:
+                            return
+                        segment.chunks.append(chunk)
+                        segment.received += len(chunk)
+                        self._cond.notify_all()
+                    if segment.received >= segment.size:
+                        break
+                if segment.received < segment.size:
+                    raise IOError(f"segment ended at {segment.received}/{segment.size} bytes")
+                error = None
+            except Exception as e:
+                error = e
+            finally:
+                close = getattr(chunks, 'close', None)
+                if close:
+                    close()
+
+            if error is None or attempts >= self.retries or self._closed:
+                with self._cond:
+                    segment.error = error
+                    segment.done = True
+                    self._cond.notify_all()
+                return
+            attempts += 1
+            logger.debug(f"↪️ استكمال مقطع {index} من {segment.received} بايت: {error}")
+
+    # ---------- القراءة ----------
+
+    def __iter__(self) -> Iterator[bytes]:
+        self._start()
+        try:
+            for index, segment in enumerate(self._segments):
+                while True:
+                    with self._cond:
+                        while not segment.chunks and not segment.done:
+                            self._cond.wait()
+                        chunks, segment.chunks = segment.chunks, []
+                        finished = segment.done and not chunks
+                        error = segment.error
+                    if chunks:
+                        yield b''.join(chunks) if len(chunks) > 1 else chunks[0]
+                    elif finished:
+                        break
+                if error is not None:
+                    raise error
+                with self._cond:
+                    # تحرير مكان في الحلقة للمقطع التالي
+                    self._next_read = index + 1
+                    self._cond.notify_all()
+        finally:
+            self.close()
+
+    def close(self) -> None:
+        """إيقاف خيوط الجلب (العميل أغلق الاتصال أو انتهت القراءة)"""
+        with self._cond:
+            self._closed = True
+            pending, self._first_chunks = self._first_chunks, None
+            self._cond.notify_all()
+        close = getattr(pending, 'close', None)
+        if close:
+            close()
@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Single-Flight Module
+دمج الطلبات المتزامنة لنفس المورد في طلب واحد إلى المصدر
+
+SingleFlight: استدعاء واحد (مثل getFile) لكل مفتاح، والبقية ينتظرون نتيجته.
+StreamCoalescer: تحميل واحد لكل ملف يتشارك بايتاته عدة مشاهدين. التحميل يسير
+بسرعة أسرع مشاهد (لا يسبقه بأكثر من نصف النافذة)، والمشاهد الذي يتأخر عن
+النافذة ينفصل ويكمل بتحميل خاص به من موضعه، فلا يبطئ الآخرين ولا يحجز الذاكرة.
+"""
+
+import itertools
+import logging
+import threading
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Hashable, Iterable, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# opener(start) -> (meta, chunks): meta معلومات الاستجابة (نوع المحتوى ...) وchunks البايتات من start
+Opener = Callable[[int], Tuple[Dict[str, Any], Iterable[bytes]]]
+
+
+class SingleFlight:
+    """تنفيذ واحد لكل مفتاح للاستدعاءات المتزامنة"""
+
+    class _Call:
+        def __init__(self) -> None:
+            self.done = threading.Event()
+            self.result: Any = None
+            self.error: Optional[BaseException] = None
+
+    def __init__(self) -> None:
+        self._calls: Dict[Hashable, 'SingleFlight._Call'] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: Hashable, func: Callable[[], Any]) -> Any:
+        """تنفيذ func أو انتظار التنفيذ الجاري لنفس المفتاح (الخطأ يصل للجميع)"""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = SingleFlight._Call()
+
+        if not leader:
+            call.done.wait()
+        else:
+            try:
+                call.result = func()
+            except BaseException as e:
+                call.error = e
+            finally:
+                with self._lock:
+                    del self._calls[key]
+                call.done.set()
+
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+
+class _Detached(Exception):
+    """المشترك تأخر عن نافذة التحميل المشترك"""
+
+
+class _Flight:
+    """تحميل مشترك واحد مع مخزن بايتات محدود"""
+
+    def __init__(self, key: Hashable, start: int, opener: Opener, window: int, on_done: Callable[['_Flight'], None]):
+        self.key = key
+        self.start = start
+        self.window = window
+        self.meta: Dict[str, Any] = {}
+        self.error: Optional[BaseException] = None
+        self.done = False
+        self.ready = threading.Event()
+
+        self._opener = opener
+        self._on_done = on_done
+        self._chunks: Deque[bytes] = deque()
+        self._base = start
+        self._end = start
+        self._positions: Dict[int, int] = {}
+        self._detached: set = set()
+        self._ids = itertools.count()
+        self._cond = threading.Condition()
+
+    def start_fetch(self) -> None:
+        """بدء التحميل (بعد اشتراك الطالب الأول حتى لا يتوقف المنتج فوراً)"""
+        threading.Thread(target=self._run, name='shared-stream', daemon=True).start()
+
+    # ---------- المنتج ----------
+
+    def _run(self) -> None:
+        chunks = None
+        try:
+            self.meta, chunks = self._opener(self.start)
+            self.ready.set()
+            for chunk in chunks:
+                with self._cond:
+                    # لا نسبق أسرع مشترك بأكثر من نصف النافذة
+                    while self._positions and self._end - max(self._positions.values()) >= self.window // 2:
+                        self._cond.wait(1.0)
+                    if not self._positions:
+                        break
+                    self._chunks.append(chunk)
+                    self._end += len(chunk)
+                    self._trim()
+                    self._cond.notify_all()
+        except BaseException as e:
+            self.error = e
+        finally:
+            with self._cond:
+                self.done = True
+                self._cond.notify_all()
+            self.ready.set()
+            close = getattr(chunks, 'close', None)
+            if close:
+                close()
+            self._on_done(self)
+
+    def _trim(self) -> None:
+        """فصل المتأخرين عن النافذة وحذف البايتات التي تجاوزها الجميع"""
+        floor = self._end - self.window
+        for sub_id, position in list(self._positions.items()):
+            if position < floor:
+                self._detached.add(sub_id)
+                del self._positions[sub_id]
+
+        cutoff = min(self._positions.values(), default=self._end)
+        cutoff = max(min(cutoff, self._end - self.window // 2), floor)
+        while self._chunks and self._base + len(self._chunks[0]) <= cutoff:
+            self._base += len(self._chunks.popleft())
+
+    # ---------- المشتركون ----------
+
+    def attach(self, position: int) -> Optional[int]:
+        """الاشتراك من موضع داخل النافذة الحالية (None إذا لم يعد ممكناً)"""
+        with self._cond:
+            if self.done or position < self._base or position > self._end + self.window // 2:
+                return None
+            sub_id = next(self._ids)
+            self._positions[sub_id] = position
+            return sub_id
+
+    def detach(self, sub_id: int) -> None:
+        with self._cond:
+            self._positions.pop(sub_id, None)
+            self._detached.discard(sub_id)
+            self._cond.notify_all()
+
+    def _slice(self, position: int) -> bytes:
+        offset = self._base
+        for chunk in self._chunks:
+            if position < offset + len(chunk):
+                return chunk[position - offset:]
+            offset += len(chunk)
+        return b''
+
+    def read(self, sub_id: int, position: int) -> Iterator[bytes]:
+        """بايتات المشترك من position حتى النهاية (_Detached إذا تأخر)"""
+        while True:
+            with self._cond:
+                while True:
+                    if sub_id in self._detached:
+                        raise _Detached()
+                    if position < self._end:
+                        data = self._slice(position)
+                        break
+                    if self.done:
+                        if self.error is not None:
+                            raise _Detached()
+                        return
+                    self._cond.wait(1.0)
+                self._positions[sub_id] = position + len(data)
+                self._cond.notify_all()
+            position += len(data)
+            yield data
+
+
+class StreamCoalescer:
+    """
+    تحميلات مشتركة لكل مفتاح
+
+    Args:
+        window: أقصى بايتات مخزنة لكل تحميل مشترك
+    """
+
+    def __init__(self, window: int = 8 * 1024 * 1024, ready_timeout: float = 30.0):
+        self.window = window
+        self.ready_timeout = ready_timeout
+        self._flights: Dict[Hashable, List[_Flight]] = {}
+        self._lock = threading.Lock()
+
+    def _remove(self, flight: _Flight) -> None:
+        with self._lock:
+            flights = self._flights.get(flight.key, [])
+            if flight in flights:
+                flights.remove(flight)
+            if not flights:
+                self._flights.pop(flight.key, None)
+
+    def open(self, key: Hashable, start: int, opener: Opener) -> Tuple[Dict[str, Any], Iterator[bytes]]:
+        """
+        البايتات من start لمفتاح key: الانضمام لتحميل جارٍ أو بدء تحميل جديد
+
+        Returns:
+            (meta، مولد البايتات). خطأ فتح المصدر يُرفع هنا قبل أي بايت
+        """
+        with self._lock:
+            flight, sub_id = None, None
+            for candidate in self._flights.get(key, []):
+                sub_id = candidate.attach(start)
+                if sub_id is not None:
+                    flight = candidate
+                    break
+            if flight is None:
+                flight = _Flight(key, start, opener, self.window, self._remove)
+                sub_id = flight.attach(start)
+                self._flights.setdefault(key, []).append(flight)
+                flight.start_fetch()
+
+        if not flight.ready.wait(self.ready_timeout) or (flight.error is not None and not flight.meta):
+            flight.detach(sub_id)
+            raise flight.error or TimeoutError(f"upstream not ready for {key}")
+        return flight.meta, self._read(flight, sub_id, start, opener)
+
+    def _read(self, flight: _Flight, sub_id: int, start: int, opener: Opener) -> Iterator[bytes]:
+        position = start
+        try:
+            for data in flight.read(sub_id, position):
+                position += len(data)
+                yield data
+            return
+        except _Detached:
+            logger.debug(f"↪️ مشترك متأخر ينفصل عن التحميل المشترك ({flight.key} @ {position})")
+        finally:
+            flight.detach(sub_id)
+
+        # تحميل خاص من الموضع الحالي
+        _, chunks = opener(position)
+        try:
+            for data in chunks:
+                yield data
+        finally:
+            close = getattr(chunks, 'close', None)
+            if close:
+                close()
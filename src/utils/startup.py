@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Startup Timing
+قياس زمن استيراد كل وحدة ومراحل الإقلاع (STARTUP_TIMING_REPORT=true)
+"""
+
+import logging
+import threading
+import time
+from importlib import machinery
+from typing import Callable, Dict, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+# اسم الوحدة -> [الزمن التراكمي، الزمن الذاتي] بالثواني
+_imports: Dict[str, List[float]] = {}
+_phases: List[Tuple[str, float]] = []
+_stack = threading.local()
+_installed = False
+
+
+def _timed(method: Callable, module_name: Callable[[object], str]) -> Callable:
+    """تغليف دالة تحميل لقياس زمنها (مع طرح زمن الوحدات المستوردة بداخلها)"""
+
+    def wrapper(self, target):
+        frames = _stack.__dict__.setdefault('frames', [])
+        frames.append(0.0)
+        start = time.perf_counter()
+        try:
+            return method(self, target)
+        finally:
+            elapsed = time.perf_counter() - start
+            children = frames.pop()
+            if frames:
+                frames[-1] += elapsed
+            entry = _imports.setdefault(module_name(target), [0.0, 0.0])
+            entry[0] += elapsed
+            entry[1] += elapsed - children
+
+    return wrapper
+
+
+def install_import_timer() -> None:
+    """
+    بدء قياس الاستيراد. يجب استدعاؤها قبل استيراد وحدات التطبيق؛ تُغلَّف دوال
+    التحميل على مستوى الصنف فيشمل القياس import_module و from x import y.
+    """
+    global _installed
+    if _installed:
+        return
+    _installed = True
+
+    for loader in (machinery.SourceFileLoader, machinery.SourcelessFileLoader):
+        loader.exec_module = _timed(loader.exec_module, lambda module: module.__name__)
+    # الامتدادات المترجمة تُحمَّل فعلياً في create_module
+    extension = machinery.ExtensionFileLoader
+    extension.create_module = _timed(extension.create_module, lambda spec: spec.name)
+    extension.exec_module = _timed(extension.exec_module, lambda module: module.__name__)
+
+
+def record_phase(name: str, started: float) -> None:
+    """تسجيل مرحلة إقلاع بدأت عند started (perf_counter)"""
+    _phases.append((name, time.perf_counter() - started))
+
+
+def import_report(top: int = 15) -> Dict:
+    """ملخص الاستيراد: الإجمالي، والحزم والوحدات الأبطأ حسب الزمن الذاتي"""
+    packages: Dict[str, float] = {}
+    for name, (_, own) in _imports.items():
+        root = name.split('.', 1)[0]
+        packages[root] = packages.get(root, 0.0) + own
+
+    modules = sorted(_imports.items(), key=lambda item: item[1][1], reverse=True)[:top]
+    return {
+        'total_ms': round(sum(own for _, own in _imports.values()) * 1000, 1),
+        'modules_count': len(_imports),
+        'packages': [
+            (name, round(seconds * 1000, 1))
+            for name, seconds in sorted(packages.items(), key=lambda item: item[1], reverse=True)[:top]
+        ],
+        'modules': [
+            (name, round(own * 1000, 1), round(cumulative * 1000, 1))
+            for name, (cumulative, own) in modules
+        ],
+        'phases': [(name, round(seconds * 1000, 1)) for name, seconds in _phases]
+    }
+
+
+def log_report(top: int = 15) -> None:
+    """طباعة تقرير الإقلاع (لا شيء إذا لم يُفعّل القياس)"""
+    if not _installed:
+        return
+
+    report = import_report(top)
+    phases = ' '.join(f"{name}={ms}ms" for name, ms in report['phases'])
+    logger.info(
+        f"⏱️ الإقلاع: استيراد {report['modules_count']} وحدة خلال {report['total_ms']}ms {phases}".rstrip()
+    )
+    logger.info("⏱️ الحزم: " + '، '.join(f"{name} {ms}ms" for name, ms in report['packages']))
+    for name, own_ms, cumulative_ms in report['modules']:
+        logger.info(f"⏱️   {own_ms:>8.1f}ms ذاتي {cumulative_ms:>8.1f}ms تراكمي  {name}")
@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Request Timing Module
+قياس مراحل الطلب وإخراجها في ترويسة Server-Timing
+"""
+
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List
+
+from flask import g, has_request_context
+
+
+@contextmanager
+def span(name: str) -> Iterator[None]:
+    """قياس مرحلة داخل الطلب الحالي (بدون أثر خارج سياق الطلب)"""
+    if not has_request_context():
+        yield
+        return
+
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        duration = (time.perf_counter() - start) * 1000
+        spans = g.setdefault('timing_spans', {})
+        total, count = spans.get(name, (0.0, 0))
+        spans[name] = (total + duration, count + 1)
+
+
+def get_spans() -> Dict[str, Dict[str, float]]:
+    """مراحل الطلب الحالي: {الاسم: {'dur': مللي ثانية، 'count': عدد}}"""
+    spans = g.get('timing_spans') or {}
+    return {
+        name: {'dur': round(total, 1), 'count': count}
+        for name, (total, count) in spans.items()
+    }
+
+
+def server_timing_header(total_ms: float) -> str:
+    """بناء قيمة ترويسة Server-Timing"""
+    entries: List[str] = []
+    for name, data in get_spans().items():
+        entry = f"{name};dur={data['dur']}"
+        if data['count'] > 1:
+            entry += f';desc="{data["count"]} calls"'
+        entries.append(entry)
+    entries.append(f"total;dur={round(total_ms, 1)}")
+    return ', '.join(entries)
@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Streaming ZIP Module
+إنشاء ملف ZIP أثناء البث بدون ملفات مؤقتة وبذاكرة ثابتة
+
+zipfile يكتب إلى كائن غير قابل للتنقل (seek) فيستخدم data descriptors بعد كل
+ملف، وكل ما يُكتب يُرسل للعميل فوراً. الملفات التالية تُجلب مسبقاً في خيوط
+بطوابير محدودة، فالذاكرة القصوى ≈ (prefetch + 1) × queue_chunks × حجم القطعة.
+"""
+
+import io
+import itertools
+import logging
+import queue
+import threading
+import zipfile
+from datetime import datetime
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# zipfile يحتاج ZIP64 مسبقاً للملفات التي قد تتجاوز 2GB
+_ZIP64_THRESHOLD = 2 ** 31 - 1
+_END = object()
+
+
+class ZipMember:
+    """ملف داخل الأرشيف: open_stream تُستدعى في خيط الجلب المسبق وتعيد قطع المحتوى"""
+
+    def __init__(
+        self,
+        name: str,
+        open_stream: Callable[[], Iterable[bytes]],
+        size: Optional[int] = None,
+        compress: bool = False,
+        date_time: Optional[datetime] = None
+    ):
+        self.name = name
+        self.open_stream = open_stream
+        self.size = size
+        self.compress = compress
+        self.date_time = date_time or datetime.utcnow()
+
+
+class _Sink(io.RawIOBase):
+    """مخرج غير قابل للتنقل يجمع ما يكتبه zipfile حتى يُرسل"""
+
+    def __init__(self) -> None:
+        self._chunks: List[bytes] = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return False
+
+    def tell(self) -> int:
+        return self._position
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def drain(self) -> bytes:
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+class _Prefetch:
+    """جلب ملف واحد في خيط إلى طابور محدود"""
+
+    def __init__(self, member: ZipMember, queue_chunks: int, stop: threading.Event):
+        self.member = member
+        self.chunks: 'queue.Queue' = queue.Queue(maxsize=queue_chunks)
+        self._stop = stop
+        self._thread = threading.Thread(target=self._run, name='zip-prefetch', daemon=True)
+        self._thread.start()
+
+    def _put(self, item) -> bool:
+        while not self._stop.is_set():
+            try:
+                self.chunks.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _run(self) -> None:
+        stream = None
+        try:
+            stream = self.member.open_stream()
+            for chunk in stream:
+                if chunk and not self._put(chunk):
+                    return
+            self._put(_END)
+        except Exception as e:
+            self._put(e)
+        finally:
+            close = getattr(stream, 'close', None)
+            if close:
+                close()
+
+    def __iter__(self) -> Iterator[bytes]:
+        while True:
+            item = self.chunks.get()
+            if item is _END:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+
+
+def _unique_name(name: str, used: set) -> str:
+    """تجنب تكرار الأسماء داخل الأرشيف: file.pdf ثم file (2).pdf"""
+    name = name.replace('\\', '_').lstrip('/') or 'file'
+    candidate, counter = name, 2
+    stem, dot, extension = name.rpartition('.')
+    while candidate in used:
+        candidate = f"{stem} ({counter}).{extension}" if dot and stem else f"{name} ({counter})"
+        counter += 1
+    used.add(candidate)
+    return candidate
+
+
+def stream_zip(
+    members: Iterable[ZipMember],
+    prefetch: int = 2,
+    queue_chunks: int = 8
+) -> Iterator[bytes]:
+    """
+    بث أرشيف ZIP
+
+    الملفات التي تفشل قبل أول بايت تُتجاوز وتُذكر في _errors.txt في نهاية الأرشيف
+    """
+    sink = _Sink()
+    stop = threading.Event()
+    pending = list(members)
+    window: List[_Prefetch] = []
+    errors: List[Tuple[str, str]] = []
+    used_names: set = set()
+
+    try:
+        with zipfile.ZipFile(sink, mode='w', allowZip64=True) as archive:
+            while pending or window:
+                if not window:
+                    window.append(_Prefetch(pending.pop(0), queue_chunks, stop))
+                current = window.pop(0)
+                # الملف الحالي + prefetch ملفات تالية تُجلب بالتوازي
+                while pending and len(window) < prefetch:
+                    window.append(_Prefetch(pending.pop(0), queue_chunks, stop))
+                member = current.member
+
+                entry = None
+                chunks = iter(current)
+                try:
+                    # الإدخال يُفتح بعد وصول أول قطعة حتى لا يبقى ملف فارغ عند فشل الجلب
+                    first = next(chunks, b'')
+                    info = zipfile.ZipInfo(
+                        _unique_name(member.name, used_names),
+                        date_time=member.date_time.timetuple()[:6]
+                    )
+                    info.compress_type = zipfile.ZIP_DEFLATED if member.compress else zipfile.ZIP_STORED
+                    info.file_size = member.size or 0
+                    entry = archive.open(
+                        info, 'w', force_zip64=member.size is None or member.size > _ZIP64_THRESHOLD
+                    )
+                    for chunk in itertools.chain([first], chunks):
+                        entry.write(chunk)
+                        data = sink.drain()
+                        if data:
+                            yield data
+                except Exception as e:
+                    logger.warning(f"⚠️ تعذر إضافة {member.name} إلى الأرشيف: {e}")
+                    errors.append((member.name, str(e) if entry is None else f"ناقص: {e}"))
+                finally:
+                    if entry is not None:
+                        entry.close()
+
+                data = sink.drain()
+                if data:
+                    yield data
+
+            if errors:
+                report = '\n'.join(f"{name}: {error}" for name, error in errors)
+                archive.writestr(_unique_name('_errors.txt', used_names), report)
+
+        yield sink.drain()
+    finally:
+        # العميل أغلق الاتصال أو انتهى البث: إيقاف خيوط الجلب
+        stop.set()
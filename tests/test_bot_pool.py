@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+اختبارات مجمع توكنات البوتات وجمع file_id البوتات المساعدة
+"""
+
+import json
+from types import SimpleNamespace
+
+import pytest
+import requests
+
+from src.core.bot_pool import ERROR, NOT_FOUND, OK, THROTTLED, TOO_BIG, BotTokenPool, UnknownBot, classify
+from src.jobs.helper_updates import collect_helper_file_ids
+
+PRIMARY = '1000:primary'
+HELPER = '2000:helper'
+CHAT_ID = -100123
+
+
+def _response(status, payload):
+    response = requests.Response()
+    response.status_code = status
+    response._content = json.dumps(payload).encode()
+    return response
+
+
+def _ok(result):
+    return _response(200, {'ok': True, 'result': result})
+
+
+def _bad_request(description='Bad Request: wrong file_id or the file is temporarily unavailable'):
+    return _response(400, {'ok': False, 'error_code': 400, 'description': description})
+
+
+def _throttled(retry_after):
+    return _response(429, {'ok': False, 'error_code': 429, 'parameters': {'retry_after': retry_after}})
+
+
+class _Session:
+    """جلسة HTTP وهمية: الرد من دالة لكل (التوكن، الدالة) مع تسجيل الاستدعاءات"""
+
+    def __init__(self, reply):
+        self.reply = reply
+        self.calls = []
+
+    def request(self, http_method, url, **kwargs):
+        token, method = url.rsplit('/bot', 1)[1].split('/')
+        params = kwargs.get('params') or {}
+        self.calls.append((token, method, params.get('file_id')))
+        return self.reply(token, method, params)
+
+
+def _pool(reply, helpers=(HELPER,)):
+    pool = BotTokenPool(PRIMARY, list(helpers), api_base='http://telegram.test')
+    pool.session = _Session(reply)
+    return pool
+
+
+@pytest.mark.parametrize('response, expected', [
+    (_ok({'file_path': 'documents/a.pdf'}), OK),
+    (_bad_request(), NOT_FOUND),
+    (_bad_request('Bad Request: file is too big'), TOO_BIG),
+    (_throttled(3), THROTTLED),
+    (_response(401, {'ok': False, 'description': 'Unauthorized'}), ERROR),
+    (_response(502, {}), ERROR),
+])
+def test_classify(response, expected):
+    assert classify(response) == expected
+
+
+def test_non_json_response_is_error():
+    response = requests.Response()
+    response.status_code = 502
+    response._content = b'<html>Bad Gateway</html>'
+
+    assert classify(response) == ERROR
+
+
+def test_acquire_picks_least_loaded():
+    pool = _pool(lambda *args: _ok(True))
+
+    first = pool.acquire()
+    second = pool.acquire()
+    pool.release(first)
+
+    assert {first, second} == {PRIMARY, HELPER}
+    assert pool.acquire() == first
+    assert pool.acquire(primary_only=True) == PRIMARY
+
+
+def test_throttled_token_is_ejected():
+    pool = _pool(lambda token, method, params: _throttled(30) if token == PRIMARY else _ok(True))
+
+    response, token = pool.call('getMe', token=PRIMARY)
+
+    assert classify(response) == THROTTLED
+    assert [pool.call('getMe')[1] for _ in range(3)] == [HELPER] * 3
+    stats = {s['primary']: s for s in pool.stats()}
+    assert stats[True]['penalised_for'] > 0
+    assert stats[False]['penalised_for'] == 0
+
+
+def test_all_tokens_penalised_picks_earliest():
+    pool = _pool(lambda *args: _ok(True))
+    pool.release(pool.acquire(), retry_after=60)
+    pool.release(pool.acquire(), retry_after=5)
+
+    assert pool.acquire() == HELPER
+
+
+def test_token_for_unknown_bot():
+    pool = _pool(lambda *args: _ok(True))
+
+    assert pool.token_for(None) == PRIMARY
+    assert pool.token_for(2000) == HELPER
+    assert pool.token_for(3000) is None
+    with pytest.raises(UnknownBot):
+        pool.get_file('file-1', 3000)
+    assert pool.session.calls == []
+
+
+def test_get_file_uses_helper_copy_when_issuer_is_busy():
+    pool = _pool(lambda *args: _ok({'file_path': 'documents/a.pdf'}))
+    pool.release(pool.acquire(primary_only=True), retry_after=30)
+
+    _, token = pool.get_file('primary-file', None, {2000: 'helper-file', 3000: 'unknown-bot-file'})
+
+    assert token == HELPER
+    assert pool.session.calls == [(HELPER, 'getFile', 'helper-file')]
+
+
+def test_missing_helper_copy_is_confirmed_by_issuer():
+    def reply(token, method, params):
+        return _bad_request() if token == HELPER else _ok({'file_path': 'documents/a.pdf'})
+
+    pool = _pool(reply)
+    pool.release(pool.acquire(primary_only=True), retry_after=30)
+
+    response, token = pool.get_file('primary-file', None, {2000: 'helper-file'})
+
+    assert classify(response) == OK
+    assert token == PRIMARY
+    assert pool.session.calls == [(HELPER, 'getFile', 'helper-file'), (PRIMARY, 'getFile', 'primary-file')]
+
+
+def test_missing_copy_without_known_issuer_is_not_deleted():
+    pool = _pool(lambda *args: _bad_request())
+
+    with pytest.raises(UnknownBot):
+        pool.get_file('issuer-file', 3000, {2000: 'helper-file'})
+
+
+class _Files:
+    def __init__(self):
+        self.rows = []
+
+    def add_copies(self, rows):
+        self.rows.extend(rows)
+
+
+def _message(message_id, chat_id=CHAT_ID, **media):
+    return {'message_id': message_id, 'chat': {'id': chat_id}, **media}
+
+
+def test_collect_helper_file_ids():
+    updates = [
+        {'update_id': 10, 'message': _message(1, document={'file_id': 'doc-1'})},
+        {'update_id': 11, 'message': _message(2, photo=[{'file_id': 'small'}, {'file_id': 'large'}])},
+        {'update_id': 12, 'message': _message(3, text='hello')},
+        {'update_id': 13, 'message': _message(4, chat_id=-100999, video={'file_id': 'elsewhere'})},
+        {'update_id': 14, 'channel_post': _message(5, voice={'file_id': 'voice-5'})},
+    ]
+
+    def reply(token, method, params):
+        assert token == HELPER and method == 'getUpdates'
+        return _ok([update for update in updates if update['update_id'] >= params.get('offset', 0)])
+
+    repos = SimpleNamespace(files=_Files())
+    offsets = {}
+    pool = _pool(reply)
+
+    assert collect_helper_file_ids(repos, pool, CHAT_ID, offsets) == 3
+    assert repos.files.rows == [
+        {'message_id': 1, 'bot_id': 2000, 'telegram_file_id': 'doc-1'},
+        {'message_id': 2, 'bot_id': 2000, 'telegram_file_id': 'large'},
+        {'message_id': 5, 'bot_id': 2000, 'telegram_file_id': 'voice-5'},
+    ]
+    assert offsets == {HELPER: 15}
+    # التحديثات المؤكدة لا تُعاد
+    assert collect_helper_file_ids(repos, pool, CHAT_ID, offsets) == 0
+
+
+def test_failed_save_keeps_offset():
+    class _Failing:
+        def add_copies(self, rows):
+            raise ConnectionError('database unavailable')
+
+    pool = _pool(lambda *args: _ok([{'update_id': 10, 'message': _message(1, audio={'file_id': 'a'})}]))
+    offsets = {}
+
+    with pytest.raises(ConnectionError):
+        collect_helper_file_ids(SimpleNamespace(files=_Failing()), pool, CHAT_ID, offsets)
+    assert offsets == {}
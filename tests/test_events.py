@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+اختبارات توزيع أحداث الملفات (SSE) مع المعاملات المتأخرة
+"""
+
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+from src.core import events as events_module
+from src.core.events import EventBus
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+class _Events:
+    """جدول file_events في الذاكرة: الصف يظهر عند COMMIT وليس عند حجز المعرّف"""
+
+    def __init__(self):
+        self.rows = []
+        self.lock = threading.Lock()
+
+    def commit(self, event_id):
+        with self.lock:
+            self.rows.append({'id': event_id, 'event_type': 'insert', 'file_id': event_id, 'payload': None})
+
+    def since(self, event_id, limit):
+        with self.lock:
+            return sorted((row for row in self.rows if row['id'] > event_id), key=lambda row: row['id'])[:limit]
+
+    def head(self):
+        with self.lock:
+            return max((row['id'] for row in self.rows), default=0)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = _Clock()
+    monkeypatch.setattr(events_module, 'time', clock)
+    return clock
+
+
+@pytest.fixture
+def bus():
+    events = _Events()
+    bus = EventBus(SimpleNamespace(events=events), poll_interval=0.01, settle_seconds=5)
+    bus.events = events
+    return bus
+
+
+def _ids(subscription, count):
+    return [subscription.get(timeout=2)['id'] for _ in range(count)]
+
+
+def test_late_commit_with_lower_id_is_not_skipped(clock, bus):
+    subscription = bus.subscribe()
+    bus.events.commit(1)
+    assert _ids(subscription, 1) == [1]
+
+    # المعرّف 2 محجوز لمعاملة لم تُثبت بعد
+    bus.events.commit(3)
+    assert subscription.get(timeout=0.2) is None
+
+    bus.events.commit(2)
+    assert _ids(subscription, 2) == [2, 3]
+    bus.unsubscribe(subscription)
+
+
+def test_rolled_back_id_is_skipped_after_settle(clock, bus):
+    subscription = bus.subscribe()
+    bus.events.commit(2)
+    bus.events.commit(3)
+    assert subscription.get(timeout=0.2) is None
+
+    clock.now += 6
+    assert _ids(subscription, 2) == [2, 3]
+    bus.unsubscribe(subscription)
+
+
+def test_replay_stops_at_delivered_events(clock, bus):
+    bus.events.commit(1)
+    bus.events.commit(2)
+    first = bus.subscribe()
+    bus.events.commit(4)
+
+    # استئناف من Last-Event-ID: الحدث 4 ينتظر 3 ولا يُعاد قبله
+    second = bus.subscribe(last_event_id=1)
+    assert _ids(second, 1) == [2]
+    bus.events.commit(3)
+    assert _ids(second, 2) == [3, 4]
+    assert _ids(first, 2) == [3, 4]
+    bus.unsubscribe(first)
+    bus.unsubscribe(second)
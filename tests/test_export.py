@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+اختبارات تصدير الجدول (NDJSON / CSV) وعلامات التصدير التدريجي
+"""
+
+import csv
+import io
+import json
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import pytest
+
+from src.core import export
+from src.core.export import CatalogExporter, decode_watermark, encode_watermark
+from src.utils.http_cache import parse_timestamp
+
+START = datetime(2026, 10, 1, tzinfo=timezone.utc)
+
+
+class _Files:
+    """جدول files وأحداث الحذف في الذاكرة بنفس ترتيب المستودعات"""
+
+    def __init__(self):
+        self.rows = {}
+        self.events = []
+        self.clock = START
+
+    def _tick(self):
+        self.clock += timedelta(seconds=1)
+        return self.clock.isoformat()
+
+    def insert(self, file_id, **fields):
+        self.rows[file_id] = {
+            'id': file_id, 'file_name': f'file_{file_id}.pdf', 'file_size': file_id * 100,
+            'uploaded_by': 1, 'caption': None, 'updated_at': self._tick(), **fields
+        }
+
+    def update(self, file_id, **fields):
+        self.rows[file_id].update(fields, updated_at=self._tick())
+
+    def delete(self, file_id):
+        del self.rows[file_id]
+        self.events.append({'id': len(self.events) + 1, 'file_id': file_id, 'created_at': self._tick()})
+
+    @staticmethod
+    def _select(row, fields):
+        return {field: row.get(field) for field in fields}
+
+    def scan(self, after_id, fields, limit):
+        rows = sorted((row for row in self.rows.values() if row['id'] > after_id), key=lambda row: row['id'])
+        return [self._select(row, fields) for row in rows[:limit]]
+
+    def changed_since(self, updated_at, after_id, fields, limit):
+        def key(row):
+            return parse_timestamp(row['updated_at']), row['id']
+        rows = sorted(self.rows.values(), key=key)
+        if updated_at is not None:
+            rows = [row for row in rows if key(row) > (parse_timestamp(updated_at), after_id)]
+        return [self._select(row, fields) for row in rows[:limit]]
+
+    def deleted_since(self, event_id, limit):
+        return sorted((event for event in self.events if event['id'] > event_id), key=lambda event: event['id'])[:limit]
+
+    def sync_heads(self):
+        newest = max(self.rows.values(), key=lambda row: (parse_timestamp(row['updated_at']), row['id']), default=None)
+        head = {'updated_at': newest['updated_at'], 'id': newest['id']} if newest else None
+        return head, max((event['id'] for event in self.events), default=0)
+
+    def event_id_before(self, created_at):
+        return max((event['id'] for event in self.events
+                    if parse_timestamp(event['created_at']) < parse_timestamp(created_at)), default=0)
+
+
+class _Users:
+    def __init__(self):
+        self.calls = []
+
+    def names(self, ids):
+        self.calls.append(sorted(ids))
+        return {user_id: f'User {user_id}' for user_id in ids}
+
+
+@pytest.fixture(autouse=True)
+def now(monkeypatch):
+    """الوقت الحالي للتصدير: ساعة بعد آخر تعديل في الاختبارات (بعد نافذة التأخير)"""
+    clock = SimpleNamespace(now=START + timedelta(hours=1))
+    monkeypatch.setattr(export, 'time', SimpleNamespace(time=lambda: clock.now.timestamp()))
+    return clock
+
+
+@pytest.fixture
+def repos():
+    files = _Files()
+    for file_id in range(1, 8):
+        files.insert(file_id, uploaded_by=1 + file_id % 2)
+    return SimpleNamespace(files=files, users=_Users())
+
+
+def _ndjson(chunks):
+    return [json.loads(line) for line in b''.join(chunks).decode('utf-8').splitlines()]
+
+
+def _csv(chunks):
+    return list(csv.DictReader(io.StringIO(b''.join(chunks).decode('utf-8'))))
+
+
+def test_watermark_round_trip():
+    token = encode_watermark({'updated_at': '2026-10-01T00:00:05+00:00', 'id': 9}, 4)
+
+    assert '=' not in token
+    assert decode_watermark(token) == ('2026-10-01T00:00:05+00:00', 9, 4)
+    assert decode_watermark(encode_watermark(None, 0)) == (None, 0, 0)
+
+
+@pytest.mark.parametrize('token', ['', 'garbage', 'e30', encode_watermark(None, 0)[:-3]])
+def test_bad_watermark_rejected(token):
+    with pytest.raises(ValueError):
+        decode_watermark(token)
+
+
+def test_full_ndjson_export_pages_in_id_order(repos):
+    watermark, chunks = CatalogExporter(repos, batch_size=3).open('ndjson', ['id', 'file_name'])
+    rows = _ndjson(chunks)
+
+    assert rows == [{'id': i, 'file_name': f'file_{i}.pdf'} for i in range(1, 8)]
+    assert decode_watermark(watermark) == (repos.files.rows[7]['updated_at'], 7, 0)
+
+
+def test_full_csv_export_with_uploaders(repos):
+    _, chunks = CatalogExporter(repos, batch_size=3).open('csv', ['id', 'caption'], with_uploaders=True)
+    chunks = list(chunks)
+    rows = _csv(chunks)
+
+    assert chunks[0].startswith(b'id,caption,uploader_name\n')
+    assert [row['id'] for row in rows] == [str(i) for i in range(1, 8)]
+    assert rows[0] == {'id': '1', 'caption': '', 'uploader_name': 'User 2'}
+    # الأسماء المعروفة لا تُطلب مرة أخرى في الصفحات التالية
+    assert repos.users.calls == [[1, 2]]
+
+
+def test_empty_csv_export_has_header_only():
+    repos = SimpleNamespace(files=_Files(), users=_Users())
+    watermark, chunks = CatalogExporter(repos).open('csv', ['id', 'file_name'])
+
+    assert b''.join(chunks) == b'id,file_name\n'
+    assert decode_watermark(watermark) == (None, 0, 0)
+
+
+def test_incremental_export_from_watermark(repos):
+    exporter = CatalogExporter(repos, batch_size=2)
+    watermark, chunks = exporter.open('ndjson', ['id', 'caption'])
+    list(chunks)
+
+    repos.files.update(3, caption='edited')
+    repos.files.insert(8)
+    repos.files.delete(5)
+    repos.files.delete(6)
+
+    next_watermark, chunks = exporter.open('ndjson', ['id', 'caption'], since=watermark)
+    rows = _ndjson(chunks)
+
+    assert rows == [
+        {'id': 3, 'caption': 'edited', 'deleted': False},
+        {'id': 8, 'caption': None, 'deleted': False},
+        {'id': 5, 'deleted': True},
+        {'id': 6, 'deleted': True},
+    ]
+    assert decode_watermark(next_watermark) == (repos.files.rows[8]['updated_at'], 8, 2)
+
+    # لا تغييرات بعد العلامة الجديدة
+    _, chunks = exporter.open('ndjson', ['id'], since=next_watermark)
+    assert _ndjson(chunks) == []
+
+
+def test_incremental_csv_has_deleted_column(repos):
+    exporter = CatalogExporter(repos)
+    watermark, chunks = exporter.open('csv', ['id'])
+    list(chunks)
+    repos.files.delete(2)
+
+    _, chunks = exporter.open('csv', ['id'], since=watermark)
+
+    assert _csv(chunks) == [{'id': '2', 'deleted': 'True'}]
+
+
+def test_changes_after_watermark_wait_for_next_export(repos):
+    exporter = CatalogExporter(repos, batch_size=2)
+    watermark, chunks = exporter.open('ndjson', ['id'])
+    # تعديل بعد أخذ العلامة وقبل قراءة الصفوف لا يظهر في هذا التصدير
+    repos.files.update(1, caption='late')
+
+    assert [row['id'] for row in _ndjson(chunks)] == list(range(1, 8))
+    _, chunks = exporter.open('ndjson', ['id', 'caption'], since=watermark)
+    assert _ndjson(chunks) == [{'id': 1, 'caption': 'late', 'deleted': False}]
+
+
+@pytest.mark.parametrize('fmt, fields', [('xml', None), ('ndjson', ['file_url']), ('csv', ['id', 'password_hash'])])
+def test_invalid_request_rejected(repos, fmt, fields):
+    with pytest.raises(ValueError):
+        CatalogExporter(repos).open(fmt, fields)
+
+
+def test_late_commits_below_watermark_reach_next_export(repos, now):
+    # التصدير بعد ثانيتين من آخر تعديل (+7) مع نافذة تأخير 5 ثوانٍ
+    now.now = START + timedelta(seconds=9)
+    repos.files.events.append({'id': 2, 'file_id': 9, 'created_at': (START + timedelta(seconds=2)).isoformat()})
+    exporter = CatalogExporter(repos, batch_size=2, safety_lag=5)
+    watermark, chunks = exporter.open('ndjson', ['id'])
+    list(chunks)
+
+    assert decode_watermark(watermark) == ((START + timedelta(seconds=4)).isoformat(), 0, 0)
+
+    # معاملة بدأت عند +6 (قبل آخر صف مُصدَّر) وحجزت الحدث 1 تُثبت بعد التصدير
+    late_start = (START + timedelta(seconds=6)).isoformat()
+    repos.files.insert(8)
+    repos.files.rows[8]['updated_at'] = late_start
+    del repos.files.rows[3]
+    repos.files.events.append({'id': 1, 'file_id': 3, 'created_at': late_start})
+
+    _, chunks = exporter.open('ndjson', ['id'], since=watermark)
+    rows = _ndjson(chunks)
+
+    assert {'id': 8, 'deleted': False} in rows
+    assert {'id': 3, 'deleted': True} in rows
+    # نافذة التأخير تُعاد (تكرار مقبول، لا ضياع)
+    assert [row['id'] for row in rows if not row['deleted']] == [4, 5, 6, 8, 7]
@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+اختبارات مجمع تشفير كلمات المرور
+"""
+
+import time
+
+import pytest
+
+from src.core.hashing import HasherBusy, PasswordHasher
+
+
+@pytest.fixture
+def hasher():
+    hasher = PasswordHasher(rounds=4, workers=1, max_pending=1, timeout=10)
+    hasher.verify('warm', hasher.hash('warm'))
+    yield hasher
+    hasher.shutdown()
+
+
+def test_hash_and_verify(hasher):
+    password_hash = hasher.hash('secret')
+
+    assert hasher.verify('secret', password_hash)
+    assert not hasher.verify('other', password_hash)
+    assert not hasher.needs_rehash(password_hash)
+    assert PasswordHasher(rounds=12, workers=0).needs_rehash(password_hash)
+
+
+def test_timeout_is_busy_and_keeps_slot_until_job_ends(hasher):
+    hasher.timeout = 0.2
+
+    with pytest.raises(HasherBusy):
+        hasher._run(time.sleep, 1.5)
+    # العملية ما زالت تعمل: لا موضع لطلب جديد
+    with pytest.raises(HasherBusy):
+        hasher.hash('secret')
+
+    time.sleep(2)
+    hasher.timeout = 10
+    assert hasher.verify('secret', hasher.hash('secret'))
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+اختبارات الطلبات الشرطية (ETag / Last-Modified / 304) والذاكرة المؤقتة
+"""
+
+import time
+from datetime import datetime, timezone
+
+import pytest
+from flask import Flask, jsonify
+
+from src.utils import http_cache
+
+LAST_MODIFIED = datetime(2026, 10, 1, 12, 30, 15, 123456, tzinfo=timezone.utc)
+CACHE_CONTROL = 'private, no-cache'
+
+
+@pytest.fixture
+def client():
+    app = Flask(__name__)
+    state = {'version': 1}
+
+    @app.route('/items')
+    def items():
+        etag = http_cache.make_etag('items', state['version'])
+        if http_cache.is_not_modified(etag, LAST_MODIFIED):
+            return http_cache.not_modified_response(etag, LAST_MODIFIED, CACHE_CONTROL)
+        return http_cache.apply_validators(jsonify({'version': state['version']}), etag, LAST_MODIFIED, CACHE_CONTROL)
+
+    client = app.test_client()
+    client.state = state
+    return client
+
+
+def test_make_etag_is_stable_and_sensitive():
+    assert http_cache.make_etag('a', 1) == http_cache.make_etag('a', 1)
+    assert http_cache.make_etag('a', 1) != http_cache.make_etag('a', 2)
+    assert len(http_cache.make_etag('a')) == 24
+
+
+def test_first_response_carries_validators(client):
+    response = client.get('/items')
+
+    assert response.status_code == 200
+    assert response.headers['ETag'] == f'"{http_cache.make_etag("items", 1)}"'
+    assert response.headers['Last-Modified'] == 'Thu, 01 Oct 2026 12:30:15 GMT'
+    assert response.headers['Cache-Control'] == CACHE_CONTROL
+
+
+def test_matching_etag_returns_304_without_body(client):
+    etag = client.get('/items').headers['ETag']
+    response = client.get('/items', headers={'If-None-Match': etag})
+
+    assert response.status_code == 304
+    assert response.data == b''
+    assert response.headers['ETag'] == etag
+    assert response.headers['Cache-Control'] == CACHE_CONTROL
+
+
+def test_weak_and_listed_etags_match(client):
+    etag = client.get('/items').headers['ETag']
+
+    assert client.get('/items', headers={'If-None-Match': f'W/{etag}'}).status_code == 304
+    assert client.get('/items', headers={'If-None-Match': f'"other", {etag}'}).status_code == 304
+
+
+def test_changed_state_returns_200(client):
+    etag = client.get('/items').headers['ETag']
+    client.state['version'] = 2
+    response = client.get('/items', headers={'If-None-Match': etag})
+
+    assert response.status_code == 200
+    assert response.json == {'version': 2}
+    assert response.headers['ETag'] != etag
+
+
+def test_if_modified_since(client):
+    assert client.get('/items', headers={'If-Modified-Since': 'Thu, 01 Oct 2026 12:30:15 GMT'}).status_code == 304
+    assert client.get('/items', headers={'If-Modified-Since': 'Thu, 01 Oct 2026 12:30:14 GMT'}).status_code == 200
+
+
+def test_if_none_match_takes_precedence(client):
+    response = client.get('/items', headers={
+        'If-None-Match': '"stale"',
+        'If-Modified-Since': 'Thu, 01 Oct 2026 12:30:15 GMT'
+    })
+    assert response.status_code == 200
+
+
+@pytest.mark.parametrize('value, expected', [
+    ('2026-10-01T12:30:15.123456+00:00', LAST_MODIFIED),
+    ('2026-10-01T12:30:15.123456Z', LAST_MODIFIED),
+    ('2026-10-01T12:30:15.123456', LAST_MODIFIED),
+    ('', None),
+    (None, None),
+    ('yesterday', None),
+])
+def test_parse_timestamp(value, expected):
+    assert http_cache.parse_timestamp(value) == expected
+
+
+def test_lru_cache_evicts_least_recently_used():
+    cache = http_cache.LRUCache(maxsize=2)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    cache.get('a')
+    cache.set('c', 3)
+
+    assert cache.get('a') == 1
+    assert cache.get('b') is None
+    assert cache.get('c') == 3
+
+
+def test_lru_cache_expires_items():
+    cache = http_cache.LRUCache(maxsize=4, ttl=0.05)
+    cache.set('a', 1)
+    assert cache.get('a') == 1
+
+    time.sleep(0.1)
+    assert cache.get('a') is None
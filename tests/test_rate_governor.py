@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+اختبارات منظم معدل تليجرام (GCRA)
+"""
+
+import pytest
+
+from src.core import rate_governor, rate_limit
+from src.core.rate_governor import RateGovernor, Throttled
+from src.core.rate_limit import create_auth_limiters
+
+LIMITS = {'bot': (10.0, 3.0), 'chat': (1.0, 1.0)}
+
+
+class _Clock:
+    """وقت وهمي: sleep يقدّم الساعة بدلاً من الانتظار"""
+
+    def __init__(self):
+        self.now = 1_000_000.0
+        self.slept = 0.0
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+        self.slept += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = _Clock()
+    monkeypatch.setattr(rate_governor, 'time', clock)
+    return clock
+
+
+def test_burst_then_steady_rate(clock):
+    governor = RateGovernor(None, LIMITS, max_wait=None)
+
+    waits = [governor.acquire(['bot:1']) for _ in range(13)]
+
+    assert waits[:3] == [0.0, 0.0, 0.0]
+    assert waits[3:] == pytest.approx([0.1] * 10)
+    assert clock.slept == pytest.approx(1.0)
+
+
+def test_idle_key_refills_burst(clock):
+    governor = RateGovernor(None, LIMITS, max_wait=None)
+    for _ in range(4):
+        governor.acquire(['bot:1'])
+
+    clock.now += 10
+    assert [governor.acquire(['bot:1']) for _ in range(3)] == [0.0, 0.0, 0.0]
+
+
+def test_keys_are_independent(clock):
+    governor = RateGovernor(None, LIMITS, max_wait=None)
+    for _ in range(3):
+        governor.acquire(['bot:1'])
+
+    assert governor.acquire(['bot:2']) == 0.0
+    assert governor.acquire(['bot:1']) == pytest.approx(0.1)
+
+
+def test_slowest_key_wins(clock):
+    governor = RateGovernor(None, LIMITS, max_wait=None)
+
+    assert governor.acquire(['bot:1', 'chat:-100']) == 0.0
+    assert governor.acquire(['bot:1', 'chat:-100']) == pytest.approx(1.0)
+
+
+def test_unlimited_key_type(clock):
+    governor = RateGovernor(None, LIMITS, max_wait=None)
+    assert all(governor.acquire(['other:1']) == 0.0 for _ in range(50))
+
+
+def test_max_wait_raises_without_reserving(clock):
+    governor = RateGovernor(None, LIMITS, max_wait=None)
+    governor.acquire(['chat:1'])
+
+    with pytest.raises(Throttled) as raised:
+        governor.acquire(['chat:1'], max_wait=0.5)
+    assert raised.value.retry_after == pytest.approx(1.0)
+    assert governor.wait_time('chat:1') == pytest.approx(1.0)
+
+
+def test_penalise_delays_key(clock):
+    governor = RateGovernor(None, LIMITS, max_wait=None)
+    governor.penalise('bot:1', 5)
+
+    assert governor.acquire(['bot:1']) == pytest.approx(5.0)
+    assert governor.acquire(['bot:2']) == 0.0
+
+
+def test_state_file_is_shared(clock, tmp_path):
+    path = str(tmp_path / 'governor.bin')
+    first = RateGovernor(path, LIMITS, max_wait=None)
+    second = RateGovernor(path, LIMITS, max_wait=None)
+
+    first.acquire(['chat:1'])
+    assert second.acquire(['chat:1']) == pytest.approx(1.0)
+
+
+def test_full_table_keeps_working(clock):
+    governor = RateGovernor(None, LIMITS, max_wait=None, slots=4)
+    for key in range(8):
+        governor.acquire([f'chat:{key}'])
+
+    # آخر المفاتيح ما زال محفوظاً ومفتاح جديد يأخذ أقدم موضع
+    assert governor.wait_time('chat:7') == pytest.approx(1.0)
+    assert governor.acquire(['chat:100']) == 0.0
+
+
+def test_stale_slot_reused_without_losing_later_keys(clock):
+    governor = RateGovernor(None, LIMITS, max_wait=None, slots=8)
+    for key in range(6):
+        governor.acquire([f'chat:{key}'])
+    clock.now += 7200
+    governor.acquire(['chat:5'])
+
+    # مفاتيح جديدة تأخذ المواضع الخاملة ولا تكرر موضع مفتاح نشط
+    for key in range(100, 104):
+        governor.acquire([f'chat:{key}'])
+    assert governor.wait_time('chat:5') == pytest.approx(1.0)
+
+
+def test_try_acquire_never_waits(clock):
+    governor = RateGovernor(None, LIMITS, max_wait=None)
+
+    assert [governor.try_acquire('chat:1'), governor.try_acquire('chat:1')] == [None, pytest.approx(1.0)]
+    clock.now += 1
+    assert governor.try_acquire('chat:1') is None
+    assert clock.slept == 0.0
+
+
+def test_auth_limits_are_shared_between_workers(clock, monkeypatch, tmp_path):
+    monkeypatch.setattr(rate_limit.config, 'LOGIN_RATE_STATE_FILE', str(tmp_path / 'login.bin'))
+    monkeypatch.setattr(rate_limit.config, 'LOGIN_ACCOUNT_LIMIT', 3)
+    monkeypatch.setattr(rate_limit.config, 'LOGIN_ACCOUNT_WINDOW_SECONDS', 60)
+    monkeypatch.setattr(rate_limit.config, 'LOGIN_IP_LIMIT', 0)
+    workers = [create_auth_limiters() for _ in range(2)]
+
+    waits = [workers[attempt % 2][1].hit('login:a@example.com') for attempt in range(4)]
+
+    assert waits[:3] == [None, None, None]
+    assert waits[3] == pytest.approx(20.0)
+    assert workers[0][1].hit('login:b@example.com') is None
+    assert all(workers[1][0].hit('10.0.0.1') is None for _ in range(10))
+
+    # تسجيل دخول ناجح في عامل يعيد المحاولات في الآخر
+    workers[0][1].reset('login:a@example.com')
+    assert workers[1][1].hit('login:a@example.com') is None
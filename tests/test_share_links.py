@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+اختبارات رموز المشاركة الموقعة
+"""
+
+import base64
+import time
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import pytest
+
+from src.core import share_links
+from src.core.share_links import ShareLinkManager
+
+
+class _ShareLinks:
+    def __init__(self, revoked=()):
+        self.revoked = list(revoked)
+        self.calls = 0
+        self.error = None
+
+    def revoked_tokens(self, now):
+        self.calls += 1
+        if self.error:
+            raise self.error
+        return self.revoked
+
+
+def _manager(secret='test-secret', revoked=()):
+    repos = SimpleNamespace(share_links=_ShareLinks(revoked))
+    return ShareLinkManager(repos, secret, revocation_refresh_seconds=3600)
+
+
+def _in(hours):
+    return datetime.now(timezone.utc) + timedelta(hours=hours)
+
+
+def test_token_round_trip():
+    manager = _manager()
+    expires_at = _in(1)
+    token = manager.generate_token(42, expires_at)
+
+    assert '=' not in token
+    assert manager.verify_token(token) == {'file_id': 42, 'expires_at': int(expires_at.timestamp())}
+
+
+def test_tokens_for_same_file_differ():
+    manager = _manager()
+    expires_at = _in(1)
+    assert manager.generate_token(7, expires_at) != manager.generate_token(7, expires_at)
+
+
+def test_expired_token_rejected():
+    manager = _manager()
+    assert manager.verify_token(manager.generate_token(1, _in(-1))) is None
+
+
+def test_token_from_other_secret_rejected():
+    token = _manager('other-secret').generate_token(1, _in(1))
+    assert _manager().verify_token(token) is None
+
+
+@pytest.mark.parametrize('position', [0, 4, 8, 13, 14, 29])
+def test_tampered_token_rejected(position):
+    manager = _manager()
+    token = manager.generate_token(5, _in(1))
+    raw = bytearray(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)))
+    raw[position] ^= 0x01
+    tampered = base64.urlsafe_b64encode(bytes(raw)).decode('ascii').rstrip('=')
+
+    assert manager.verify_token(tampered) is None
+
+
+@pytest.mark.parametrize('token', ['', 'not-a-token', '!!!', 'A' * 40])
+def test_malformed_token_rejected(token):
+    assert _manager().verify_token(token) is None
+
+
+def test_revoked_token_rejected():
+    manager = _manager()
+    token = manager.generate_token(3, _in(1))
+    manager.repos.share_links.revoked = [token]
+
+    assert manager.verify_token(token) is None
+    assert manager.verify_token(manager.generate_token(3, _in(1))) is not None
+    # المجموعة تُحمّل مرة واحدة خلال مدة التحديث
+    assert manager.repos.share_links.calls == 1
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = SimpleNamespace(now=1000.0)
+    monkeypatch.setattr(share_links, 'time', SimpleNamespace(monotonic=lambda: clock.now, time=time.time))
+    return clock
+
+
+def test_first_revocation_load_failure_rejects(clock):
+    manager = _manager()
+    token = manager.generate_token(3, _in(1))
+    manager.repos.share_links.error = ConnectionError('database unavailable')
+
+    assert manager.verify_token(token) is None
+    # لا ضغط على قاعدة البيانات أثناء العطل، وإعادة المحاولة بعد ثوانٍ
+    assert manager.verify_token(token) is None
+    assert manager.repos.share_links.calls == 1
+
+    manager.repos.share_links.error = None
+    clock.now += manager.revocation_retry_seconds
+    assert manager.verify_token(token) is not None
+    assert manager.repos.share_links.calls == 2
+
+
+def test_failed_refresh_keeps_last_set_and_retries_soon(clock):
+    manager = _manager()
+    revoked = manager.generate_token(3, _in(1))
+    manager.repos.share_links.revoked = [revoked]
+    assert manager.verify_token(revoked) is None
+
+    manager.repos.share_links.error = ConnectionError('database unavailable')
+    clock.now += manager.revocation_refresh_seconds
+    assert manager.verify_token(revoked) is None
+    assert manager.verify_token(manager.generate_token(4, _in(1))) is not None
+
+    late = manager.generate_token(5, _in(1))
+    manager.repos.share_links.revoked.append(late)
+    manager.repos.share_links.error = None
+    clock.now += manager.revocation_retry_seconds
+    assert manager.verify_token(late) is None
+    assert manager.repos.share_links.calls == 3
+
+
+def test_stream_token_round_trip():
+    manager = _manager()
+    token = manager.generate_stream_token(12, 'events', 60)
+
+    assert manager.verify_stream_token(token, 'events') == 12
+    # رمز البث لا يصلح لمسار آخر ولا كرابط مشاركة، والعكس
+    assert manager.verify_stream_token(token, 'zip') is None
+    assert manager.verify_token(token) is None
+    assert manager.verify_stream_token(manager.generate_token(12, _in(1)), 'events') is None
+
+
+def test_expired_stream_token_rejected():
+    manager = _manager()
+    assert manager.verify_stream_token(manager.generate_stream_token(12, 'zip', -1), 'zip') is None
+
+
+def test_stream_token_from_other_secret_rejected():
+    token = _manager('other-secret').generate_stream_token(12, 'events', 60)
+    assert _manager().verify_stream_token(token, 'events') is None
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+اختبارات دمج الطلبات المتزامنة (SingleFlight / StreamCoalescer)
+"""
+
+import threading
+import time
+
+import pytest
+
+from src.utils.singleflight import SingleFlight, StreamCoalescer
+
+DATA = bytes(range(256)) * 256
+CHUNK = 1024
+
+
+def _run_concurrently(target, count):
+    results, errors = [None] * count, [None] * count
+
+    def worker(i):
+        try:
+            results[i] = target()
+        except Exception as e:
+            errors[i] = e
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    return threads, results, errors
+
+
+class _Source:
+    """مصدر بايتات يحصي مرات الفتح، ويمكن إيقاف آخر قطعة حتى يُفتح gate"""
+
+    def __init__(self, gate=None):
+        self.opens = []
+        self.gate = gate
+
+    def __call__(self, start):
+        self.opens.append(start)
+        return {'content_type': 'application/octet-stream'}, self._chunks(start)
+
+    def _chunks(self, start):
+        for offset in range(start, len(DATA), CHUNK):
+            if self.gate is not None and offset + CHUNK >= len(DATA):
+                self.gate.wait(5)
+            yield DATA[offset:offset + CHUNK]
+
+
+def test_concurrent_calls_share_one_execution():
+    single_flight = SingleFlight()
+    release = threading.Event()
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        release.wait(5)
+        return {'file_path': 'documents/file_1.pdf'}
+
+    threads, results, errors = _run_concurrently(lambda: single_flight.do('file-1', fetch), 8)
+    time.sleep(0.2)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert len(calls) == 1
+    assert errors == [None] * 8
+    assert all(result is results[0] for result in results)
+
+
+def test_error_reaches_every_waiter():
+    single_flight = SingleFlight()
+    release = threading.Event()
+
+    def fetch():
+        release.wait(5)
+        raise RuntimeError('upstream failed')
+
+    threads, _, errors = _run_concurrently(lambda: single_flight.do('file-1', fetch), 4)
+    time.sleep(0.2)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert all(isinstance(error, RuntimeError) for error in errors)
+
+
+def test_finished_calls_are_not_cached():
+    single_flight = SingleFlight()
+    calls = []
+
+    assert single_flight.do('key', lambda: calls.append(1) or len(calls)) == 1
+    assert single_flight.do('key', lambda: calls.append(1) or len(calls)) == 2
+    assert single_flight.do('other', lambda: 'other') == 'other'
+
+
+def test_viewers_share_one_download():
+    gate = threading.Event()
+    source = _Source(gate)
+    coalescer = StreamCoalescer(window=1024 * 1024)
+
+    meta, first = coalescer.open('file-1', 0, source)
+    _, second = coalescer.open('file-1', 0, source)
+    gate.set()
+
+    assert meta == {'content_type': 'application/octet-stream'}
+    assert b''.join(first) == DATA
+    assert b''.join(second) == DATA
+    assert source.opens == [0]
+
+
+def test_viewer_from_offset():
+    source = _Source()
+    coalescer = StreamCoalescer(window=1024 * 1024)
+
+    _, chunks = coalescer.open('file-1', 1000, source)
+    assert b''.join(chunks) == DATA[1000:]
+
+
+def test_slow_viewer_detaches_and_resumes_privately():
+    source = _Source()
+    coalescer = StreamCoalescer(window=8 * CHUNK)
+
+    _, fast = coalescer.open('file-1', 0, source)
+    _, slow = coalescer.open('file-1', 0, source)
+    slow_head = next(slow)
+
+    assert b''.join(fast) == DATA
+    assert slow_head + b''.join(slow) == DATA
+    assert source.opens == [0, len(slow_head)]
+
+
+def test_open_error_raised_before_first_byte():
+    def failing(start):
+        raise ConnectionError('telegram unavailable')
+
+    with pytest.raises(ConnectionError):
+        StreamCoalescer().open('file-1', 0, failing)
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+اختبارات بث أرشيف ZIP
+"""
+
+import io
+import threading
+import zipfile
+from datetime import datetime
+
+from src.utils.zipstream import ZipMember, stream_zip
+
+DATE = datetime(2026, 10, 1, 12, 30, 14)
+
+
+def _member(name, data, chunk=4096, **kwargs):
+    def open_stream():
+        return (data[i:i + chunk] for i in range(0, len(data), chunk))
+    return ZipMember(name, open_stream, size=len(data), date_time=DATE, **kwargs)
+
+
+def _archive(chunks):
+    return zipfile.ZipFile(io.BytesIO(b''.join(chunks)))
+
+
+def test_archive_round_trip():
+    files = {
+        'lecture.pdf': bytes(range(256)) * 1000,
+        'notes.json': b'{"a": 1}\n' * 5000,
+        'empty.txt': b'',
+    }
+    members = [
+        _member(name, data, compress=name.endswith('.json'))
+        for name, data in files.items()
+    ]
+
+    archive = _archive(stream_zip(members))
+
+    assert archive.testzip() is None
+    assert archive.namelist() == list(files)
+    for name, data in files.items():
+        assert archive.read(name) == data
+    info = {item.filename: item for item in archive.infolist()}
+    assert info['notes.json'].compress_type == zipfile.ZIP_DEFLATED
+    assert info['lecture.pdf'].compress_type == zipfile.ZIP_STORED
+    assert info['lecture.pdf'].date_time == (2026, 10, 1, 12, 30, 14)
+
+
+def test_unknown_size_member():
+    data = b'x' * 100000
+    member = ZipMember('stream.bin', lambda: iter([data[:60000], data[60000:]]), date_time=DATE)
+
+    assert _archive(stream_zip([member])).read('stream.bin') == data
+
+
+def test_duplicate_and_unsafe_names():
+    members = [
+        _member('file.pdf', b'1'),
+        _member('file.pdf', b'2'),
+        _member('/etc/passwd', b'3'),
+        _member('dir\\name', b'4'),
+        _member('README', b'5'),
+        _member('README', b'6'),
+    ]
+
+    names = _archive(stream_zip(members)).namelist()
+
+    assert names == ['file.pdf', 'file (2).pdf', 'etc/passwd', 'dir_name', 'README', 'README (2)']
+
+
+def test_failed_member_is_reported_not_fatal():
+    def broken():
+        raise ConnectionError('getFile failed')
+
+    members = [_member('a.txt', b'a'), ZipMember('broken.pdf', broken, date_time=DATE), _member('b.txt', b'b')]
+
+    archive = _archive(stream_zip(members))
+
+    assert archive.namelist() == ['a.txt', 'b.txt', '_errors.txt']
+    assert archive.read('_errors.txt').decode('utf-8') == 'broken.pdf: getFile failed'
+
+
+def test_output_streams_before_archive_is_complete():
+    release = threading.Event()
+
+    def slow():
+        yield b'tail'
+        release.wait(5)
+
+    chunks = stream_zip([_member('first.bin', b'f' * 200000, chunk=65536), ZipMember('slow.bin', slow, date_time=DATE)])
+
+    received = next(chunks)
+    assert received.startswith(b'PK\x03\x04')
+    release.set()
+    assert _archive([received, *chunks]).read('first.bin') == b'f' * 200000
+
+
+def test_closing_stream_stops_prefetch():
+    started, stopped = threading.Event(), threading.Event()
+
+    def endless():
+        started.set()
+        try:
+            while True:
+                yield b'\0' * 1024
+        finally:
+            stopped.set()
+
+    chunks = stream_zip([ZipMember('endless.bin', endless, date_time=DATE)], queue_chunks=2)
+    next(chunks)
+    assert started.wait(5)
+    chunks.close()
+
+    assert stopped.wait(5)